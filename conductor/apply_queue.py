@@ -0,0 +1,159 @@
+"""Quantized apply targets and the queue of edits waiting for them.
+
+A quantize spec names the tick an edit lands on while playing:
+
+    "now"                     immediately
+    "step" | "beat" | "bar"   the next step, beat or bar boundary
+    "<N>bars"                 the next multiple of N bars (counted from tick 0)
+    "loopEnd"                 the next point where every track wraps together
+    {"atTick": n}             tick n (immediately if it has already played)
+
+Queued edits sit in an ApplyQueue ordered by target tick, then by arrival,
+and are applied just before their tick is emitted.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, NamedTuple, Optional
+
+
+_BARS = re.compile(r"^([1-9][0-9]*)bars?$")
+
+
+class Quantize(NamedTuple):
+    kind: str  # now | step | beat | bar | bars | loopEnd | tick
+    n: int = 1  # bar count for "bars", tick for "tick"
+
+    def label(self) -> Any:
+        if self.kind == "bars":
+            return f"{self.n}bars"
+        if self.kind == "tick":
+            return {"atTick": self.n}
+        return self.kind
+
+
+class Grid(NamedTuple):
+    """Tick lengths of one step, beat, bar and whole loop for a doc."""
+
+    step: int
+    beat: int
+    bar: int
+    loop: int
+
+
+def parse_quantize(spec: Any) -> Quantize:
+    """Quantize for a client spec; raises ValueError on anything else."""
+    if isinstance(spec, dict):
+        tick = spec.get("atTick")
+        if set(spec) != {"atTick"} or isinstance(tick, bool) or not isinstance(tick, int) or tick < 0:
+            raise ValueError(f"invalid quantize: {spec!r}")
+        return Quantize("tick", tick)
+    if spec in ("now", "step", "beat", "bar", "loopEnd"):
+        return Quantize(spec)
+    m = _BARS.match(spec) if isinstance(spec, str) else None
+    if m is None:
+        raise ValueError(f"invalid quantize: {spec!r}")
+    n = int(m.group(1))
+    return Quantize("bar") if n == 1 else Quantize("bars", n)
+
+
+def grid_for(doc: Dict[str, Any]) -> Grid:
+    meta = doc.get("meta") or {}
+    ppq = int(meta.get("ppq", 96))
+    spb = int(meta.get("stepsPerBar", 16))
+    step = int((ppq * 4) / spb) if spb > 0 else 0
+    bar = step * spb
+    # Tracks loop over their own lengths; all of them wrap together at the LCM
+    lengths = 1
+    for tr in doc.get("tracks") or []:
+        try:
+            lengths = math.lcm(lengths, max(1, int((tr.get("pattern") or {}).get("lengthBars", 1))))
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return Grid(step, ppq, bar, bar * lengths)
+
+
+def target_tick(q: Quantize, tick: int, grid: Grid) -> int:
+    """First tick after `tick` (already played) that q lands on.
+
+    Returns `tick` itself for "now", for a target that has already passed
+    and when the grid is degenerate, meaning "apply immediately".
+    """
+    if q.kind == "tick":
+        return q.n if q.n > tick else tick
+    size = {"step": grid.step, "beat": grid.beat, "bar": grid.bar, "bars": grid.bar * q.n, "loopEnd": grid.loop}.get(q.kind, 0)
+    if size <= 0:
+        return tick
+    return (tick // size + 1) * size
+
+
+@dataclass
+class PendingApply:
+    """An accepted edit waiting for its tick.
+
+    Patch edits keep their ops and are re-applied to whatever doc is current
+    when they fire; whole-doc edits (undo/redo/checkout) keep the doc.
+    """
+
+    apply_id: int
+    at_tick: int
+    quantize: Any
+    base_version: int
+    ops: Optional[List[Dict[str, Any]]] = None
+    doc: Optional[Dict[str, Any]] = None
+    restore: Optional[int] = None
+    origin: Any = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {"applyId": self.apply_id, "atTick": self.at_tick, "quantize": self.quantize, "baseVersion": self.base_version}
+
+
+class ApplyQueue:
+    """Time-ordered pending edits (ties keep arrival order)."""
+
+    def __init__(self) -> None:
+        self._heap: List[tuple] = []
+        self._ids = itertools.count(1)
+        self.queued = 0
+        self.applied = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, at_tick: int, quantize: Any, base_version: int, **kw: Any) -> PendingApply:
+        entry = PendingApply(next(self._ids), at_tick, quantize, base_version, **kw)
+        heapq.heappush(self._heap, (at_tick, entry.apply_id, entry))
+        self.queued += 1
+        return entry
+
+    def next_tick(self) -> Optional[int]:
+        heap = self._heap
+        return heap[0][0] if heap else None
+
+    def pop_due(self, tick: int) -> List[PendingApply]:
+        out: List[PendingApply] = []
+        while self._heap and self._heap[0][0] <= tick:
+            out.append(heapq.heappop(self._heap)[2])
+        return out
+
+    def drain(self) -> List[PendingApply]:
+        out = [e for _t, _i, e in sorted(self._heap)]
+        self._heap = []
+        return out
+
+    def last_restore(self) -> Optional[int]:
+        """History version the most recently queued undo/redo restores, if any."""
+        restores = [(i, e.restore) for _t, i, e in self._heap if e.restore is not None]
+        return max(restores)[1] if restores else None
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [e.describe() for _t, _i, e in sorted(self._heap)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"pending": len(self._heap), "queued": self.queued, "applied": self.applied, "dropped": self.dropped}
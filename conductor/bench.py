@@ -0,0 +1,163 @@
+"""Micro-benchmarks for the doc edit path on large synthetic loops.
+
+Usage: python -m conductor.bench [--tracks N] [--bars N] [--iters N] [--fixtures DIR]
+
+Compares the original patch path (deep-copy apply, full validation and
+canonicalize) with the incremental one (apply_patch_cow,
+validate_loop_incremental_compiled, canonicalize_shared) for a one-field
+velocity change, validate_loop with validate_loop_compiled on the
+synthetic doc and on the fixture docs, and the engine's doc replace
+(per-track recompilation) and tick cost.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from conductor.midi_engine import Engine, VirtualSink
+from conductor.patch_utils import apply_patch, apply_patch_cow
+from conductor.validator import canonicalize, canonicalize_shared, validate_loop, validate_loop_incremental
+from conductor.validator_compiled import validate_loop_compiled, validate_loop_incremental_compiled
+
+
+def make_large_doc(tracks: int = 16, bars: int = 64, steps_per_bar: int = 16, lanes: int = 2) -> Dict[str, Any]:
+    """A valid, canonical opxyloop-1.0 doc with a note on every step."""
+    out: List[Dict[str, Any]] = []
+    for ti in range(tracks):
+        steps = [
+            {"idx": i, "events": [{"pitch": 36 + (i + ti) % 48, "velocity": 64 + i % 64, "lengthSteps": 1}]}
+            for i in range(bars * steps_per_bar)
+        ]
+        cc_lanes = [
+            {
+                "id": f"lane{li}",
+                "dest": f"cc:{20 + li}",
+                "mode": "points",
+                "points": [{"t": {"bar": b, "step": 0}, "v": (b * 7) % 128} for b in range(bars)],
+            }
+            for li in range(lanes)
+        ]
+        out.append({
+            "id": f"t{ti:03d}",
+            "name": f"Track {ti}",
+            "type": "synth",
+            "midiChannel": ti % 16,
+            "pattern": {"lengthBars": bars, "steps": steps},
+            "ccLanes": cc_lanes,
+        })
+    return canonicalize({
+        "version": "opxyloop-1.0",
+        "meta": {"tempo": 120, "ppq": 96, "stepsPerBar": steps_per_bar},
+        "tracks": out,
+        "docVersion": 0,
+    })
+
+
+def _time(fn: Callable[[], Any], iters: int) -> float:
+    """Mean wall time per call in milliseconds."""
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(iters):
+        fn()
+    return (time.perf_counter() - t0) * 1000.0 / iters
+
+
+def bench_patch(doc: Dict[str, Any], iters: int = 50) -> Dict[str, float]:
+    n_tracks = len(doc["tracks"])
+    n_steps = len(doc["tracks"][0]["pattern"]["steps"])
+    ops = [{"op": "replace", "path": f"/tracks/{n_tracks // 2}/pattern/steps/{n_steps // 2}/events/0/velocity", "value": 101}]
+
+    def deep() -> None:
+        patched = apply_patch(doc, ops)
+        validate_loop(patched)
+        canonicalize(patched)
+
+    def incremental() -> None:
+        patched = apply_patch_cow(doc, ops)
+        validate_loop_incremental_compiled(patched, doc, ops)
+        canonicalize_shared(patched, doc)
+
+    return {
+        "applyDeepMs": _time(lambda: apply_patch(doc, ops), iters),
+        "applyCowMs": _time(lambda: apply_patch_cow(doc, ops), iters),
+        "canonicalizeMs": _time(lambda: canonicalize(doc), iters),
+        "canonicalizeSharedMs": _time(lambda: canonicalize_shared(apply_patch_cow(doc, ops), doc), iters),
+        "validateMs": _time(lambda: validate_loop(doc), iters),
+        "validateIncrementalMs": _time(lambda: validate_loop_incremental(apply_patch_cow(doc, ops), doc, ops), iters),
+        "validateIncrementalCompiledMs": _time(lambda: validate_loop_incremental_compiled(apply_patch_cow(doc, ops), doc, ops), iters),
+        "totalDeepMs": _time(deep, iters),
+        "totalIncrementalMs": _time(incremental, iters),
+    }
+
+
+def bench_engine(doc: Dict[str, Any], iters: int = 50) -> Dict[str, float]:
+    n_tracks = len(doc["tracks"])
+    n_steps = len(doc["tracks"][0]["pattern"]["steps"])
+    ops = [{"op": "replace", "path": f"/tracks/{n_tracks // 2}/pattern/steps/{n_steps // 2}/events/0/velocity", "value": 101}]
+    patched = apply_patch_cow(doc, ops)
+    eng = Engine(VirtualSink())
+    eng.load(doc)
+    eng.start()
+    interpreted = Engine(VirtualSink())
+    interpreted.load(doc)
+    interpreted._plans = []
+    interpreted.start()
+    ticks = iter(range(10**9))
+
+    def swap() -> None:
+        eng.replace_doc(patched, ops)
+        eng.replace_doc(doc, ops)
+
+    return {
+        "engineLoadMs": _time(lambda: Engine(VirtualSink()).load(doc), max(1, iters // 10)),
+        "engineReplaceMs": _time(swap, iters) / 2,
+        "tickMs": _time(lambda: eng.on_tick(next(ticks)), iters),
+        "tickInterpretedMs": _time(lambda: interpreted.on_tick(next(ticks)), max(1, iters // 10)),
+    }
+
+
+def bench_validate(docs: Dict[str, Dict[str, Any]], iters: int = 50) -> Dict[str, Dict[str, Any]]:
+    """validate_loop vs validate_loop_compiled per doc; also checks the two agree."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for name, doc in docs.items():
+        errors = validate_loop(doc)
+        out[name] = {
+            "errors": len(errors),
+            "same": validate_loop_compiled(doc) == errors,
+            "validateMs": _time(lambda: validate_loop(doc), iters),
+            "compiledMs": _time(lambda: validate_loop_compiled(doc), iters),
+        }
+    return out
+
+
+def load_fixtures(path: Path) -> Dict[str, Dict[str, Any]]:
+    return {p.name: json.loads(p.read_text()) for p in sorted(path.glob("*.json"))}
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark the doc patch path on a large synthetic loop")
+    ap.add_argument("--tracks", type=int, default=16)
+    ap.add_argument("--bars", type=int, default=64)
+    ap.add_argument("--iters", type=int, default=50)
+    ap.add_argument("--fixtures", default=str(Path(__file__).parent / "tests" / "fixtures"))
+    args = ap.parse_args(argv)
+    doc = make_large_doc(tracks=args.tracks, bars=args.bars)
+    steps = sum(len(t["pattern"]["steps"]) for t in doc["tracks"])
+    print(f"doc: {args.tracks} tracks, {steps} steps")
+    for name, ms in {**bench_patch(doc, args.iters), **bench_engine(doc, args.iters)}.items():
+        print(f"  {name:<30} {ms:9.3f} ms")
+    docs = load_fixtures(Path(args.fixtures))
+    docs["synthetic"] = doc
+    print("validate_loop vs validate_loop_compiled:")
+    for name, r in bench_validate(docs, args.iters).items():
+        same = "same errors" if r["same"] else "ERRORS DIFFER"
+        print(f"  {name:<30} {r['validateMs']:9.3f} ms -> {r['compiledMs']:9.3f} ms  ({r['errors']} errors, {same})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,161 @@
+"""Minimal CBOR (RFC 8949) codec for the conductor WS protocol.
+
+Covers the JSON data model plus byte strings: ints, floats, text, bytes,
+arrays, maps, true/false/null. Maps keep their key types (e.g. the int
+channel keys in state.ccNow). Uses the 'cbor2' package when installed and
+falls back to the pure-Python implementation below.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import Any, Callable, List, Tuple
+
+
+_pack_f32 = struct.Struct(">f").pack
+_unpack_f32 = struct.Struct(">f").unpack
+_pack_f64 = struct.Struct(">d").pack
+
+
+def _head(out: List[bytes], major: int, n: int) -> None:
+    mt = major << 5
+    if n < 24:
+        out.append(bytes((mt | n,)))
+    elif n < 0x100:
+        out.append(bytes((mt | 24, n)))
+    elif n < 0x10000:
+        out.append(bytes((mt | 25,)) + n.to_bytes(2, "big"))
+    elif n < 0x100000000:
+        out.append(bytes((mt | 26,)) + n.to_bytes(4, "big"))
+    elif n < 0x10000000000000000:
+        out.append(bytes((mt | 27,)) + n.to_bytes(8, "big"))
+    else:
+        raise ValueError("integer out of CBOR range")
+
+
+def _encode(obj: Any, out: List[bytes]) -> None:
+    # bool before int: bool is an int subclass
+    if obj is None:
+        out.append(b"\xf6")
+    elif obj is True:
+        out.append(b"\xf5")
+    elif obj is False:
+        out.append(b"\xf4")
+    elif isinstance(obj, str):
+        b = obj.encode("utf-8")
+        _head(out, 3, len(b))
+        out.append(b)
+    elif isinstance(obj, int):
+        if obj >= 0:
+            _head(out, 0, obj)
+        else:
+            _head(out, 1, -1 - obj)
+    elif isinstance(obj, float):
+        # Single precision when it round-trips exactly (NaN/inf included), else double
+        try:
+            f32 = _pack_f32(obj)
+        except OverflowError:
+            f32 = None
+        if f32 is not None and (_unpack_f32(f32)[0] == obj or obj != obj):
+            out.append(b"\xfa" + f32)
+        else:
+            out.append(b"\xfb" + _pack_f64(obj))
+    elif isinstance(obj, dict):
+        _head(out, 5, len(obj))
+        for k, v in obj.items():
+            _encode(k, out)
+            _encode(v, out)
+    elif isinstance(obj, (list, tuple)):
+        _head(out, 4, len(obj))
+        for v in obj:
+            _encode(v, out)
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        b = bytes(obj)
+        _head(out, 2, len(b))
+        out.append(b)
+    else:
+        raise TypeError(f"cannot CBOR-encode {type(obj).__name__}")
+
+
+def _py_dumps(obj: Any) -> bytes:
+    out: List[bytes] = []
+    _encode(obj, out)
+    return b"".join(out)
+
+
+def _decode(data: bytes, pos: int) -> Tuple[Any, int]:
+    ib = data[pos]
+    pos += 1
+    major = ib >> 5
+    info = ib & 0x1F
+    if major == 7:
+        if info == 20:
+            return False, pos
+        if info == 21:
+            return True, pos
+        if info == 22 or info == 23:
+            return None, pos
+        if info == 25:
+            return struct.unpack_from(">e", data, pos)[0], pos + 2
+        if info == 26:
+            return struct.unpack_from(">f", data, pos)[0], pos + 4
+        if info == 27:
+            return struct.unpack_from(">d", data, pos)[0], pos + 8
+        raise ValueError(f"unsupported CBOR simple value {info}")
+    if info < 24:
+        n = info
+    elif info <= 27:
+        size = 1 << (info - 24)
+        if pos + size > len(data):
+            raise ValueError("truncated CBOR data")
+        n = int.from_bytes(data[pos:pos + size], "big")
+        pos += size
+    else:
+        raise ValueError("indefinite-length CBOR items are not supported")
+    if major == 0:
+        return n, pos
+    if major == 1:
+        return -1 - n, pos
+    if major == 2 or major == 3:
+        end = pos + n
+        if end > len(data):
+            raise ValueError("truncated CBOR data")
+        raw = bytes(data[pos:end])
+        return (raw if major == 2 else raw.decode("utf-8")), end
+    if major == 4:
+        arr = []
+        for _ in range(n):
+            v, pos = _decode(data, pos)
+            arr.append(v)
+        return arr, pos
+    if major == 5:
+        m = {}
+        for _ in range(n):
+            k, pos = _decode(data, pos)
+            v, pos = _decode(data, pos)
+            m[k] = v
+        return m, pos
+    # major 6: tags carry no meaning for us; return the tagged item
+    return _decode(data, pos)
+
+
+def _py_loads(data: bytes) -> Any:
+    try:
+        obj, pos = _decode(data, 0)
+    except (IndexError, struct.error) as e:
+        raise ValueError("truncated CBOR data") from e
+    if pos != len(data):
+        raise ValueError("trailing bytes after CBOR item")
+    return obj
+
+
+dumps: Callable[[Any], bytes] = _py_dumps
+loads: Callable[[bytes], Any] = _py_loads
+
+try:
+    import cbor2  # type: ignore
+
+    dumps = cbor2.dumps
+    loads = cbor2.loads
+except Exception:
+    pass
@@ -2,22 +2,30 @@ from __future__ import annotations
 
 import threading
 import time
-from collections import deque
-from typing import Callable, Optional, Deque, List, Tuple
+from typing import Callable, Optional
+
+from conductor.metrics import JitterSketch
 
 
 TickHandler = Callable[[int], None]
 
 
 class InternalClock:
-    def __init__(self, bpm: float, tick_handler: TickHandler, send_midi_clock: Optional[Callable[[], None]] = None):
+    def __init__(
+        self,
+        bpm: float,
+        tick_handler: TickHandler,
+        send_midi_clock: Optional[Callable[[], None]] = None,
+        jitter_window_s: float = 10.0,
+    ):
         self.bpm = float(bpm)
         self.tick_handler = tick_handler
         self.send_midi_clock = send_midi_clock
         self._t: Optional[threading.Thread] = None
         self._stop = threading.Event()
         self._tick = 0
-        self._jitter_ms: Deque[float] = deque(maxlen=512)
+        # Written only by the clock thread; get_metrics reads without locking
+        self._jitter = JitterSketch(window_s=jitter_window_s)
         self._lock = threading.Lock()
         self._interval = 60.0 / (self.bpm * 24.0)
 
@@ -40,9 +48,7 @@ class InternalClock:
             now = time.monotonic()
             if now >= next_call:
                 # Record jitter relative to scheduled time
-                jitter_ms = max(0.0, (now - next_call) * 1000.0)
-                with self._lock:
-                    self._jitter_ms.append(jitter_ms)
+                self._jitter.observe_ms(max(0.0, (now - next_call) * 1000.0), now)
                 with self._lock:
                     interval = self._interval
                 next_call += interval
@@ -57,26 +63,14 @@ class InternalClock:
             else:
                 time.sleep(min(0.002, max(0.0, next_call - now)))
 
-    def _percentile(self, values: List[float], pct: float) -> float:
-        if not values:
-            return 0.0
-        xs = sorted(values)
-        k = (len(xs) - 1) * pct
-        f = int(k)
-        c = min(f + 1, len(xs) - 1)
-        if f == c:
-            return xs[f]
-        d0 = xs[f] * (c - k)
-        d1 = xs[c] * (k - f)
-        return d0 + d1
-
     def get_metrics(self) -> dict:
-        # Return jitter p95/p99 over recent window
-        with self._lock:
-            samples = list(self._jitter_ms)
+        # Lifetime + rolling-window jitter quantiles; never takes the clock lock
+        snap = self._jitter.snapshot(time.monotonic())
+        win = snap["window"]
         return {
-            "jitterMsP95": round(self._percentile(samples, 0.95), 3),
-            "jitterMsP99": round(self._percentile(samples, 0.99), 3),
+            "jitterMsP95": win["p95Ms"],
+            "jitterMsP99": win["p99Ms"],
+            "jitter": snap,
         }
 
     def set_bpm(self, bpm: float) -> None:
@@ -2,28 +2,47 @@ from __future__ import annotations
 
 import argparse
 import asyncio
+import hashlib
+import itertools
 import json
 import os
 import signal
 import tempfile
 import threading
 import time
-from typing import Any, Dict, Optional, Set
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Set
 
+from conductor.apply_queue import ApplyQueue, PendingApply, grid_for, parse_quantize, target_tick
 from conductor.clock import InternalClock
+from conductor.file_watch import FileWatcher
 from conductor.midi_engine import Engine
+from conductor.overlay import Overlay
 from conductor.midi_out import MidoSink, open_mido_output, open_mido_input
-from conductor.validator import validate_loop, canonicalize
-from conductor.patch_utils import apply_patch as apply_json_patch
+from conductor.history import DocHistory, share_unchanged
+from conductor.journal import JournalWriter, PatchJournal, journal_path_for
+from conductor.loop_diff import diff_loops, is_structural_ops
+from conductor.persist import PersistWorker
+from conductor.validator import canonicalize, canonicalize_shared
+from conductor.validator_compiled import validate_loop_compiled, validate_loop_incremental_compiled
+from conductor.patch_utils import apply_patch_cow
+from conductor.rebase import rebase_ops, resolve_appends
+from conductor.semantic_ops import compile_commands
 from conductor.tempo_map import bpm_to_cc80
+from conductor.trace import Tracer
+from conductor import cbor
+from conductor.ws_clients import STREAM_TOPICS, ClientSession, Outgoing, parse_encoding, parse_topics
 
 
-def _atomic_write_json(path: str, obj: Dict[str, Any]) -> None:
-    data = json.dumps(obj, ensure_ascii=False, indent=2) + "\n"
+def _encode_json(obj: Dict[str, Any]) -> bytes:
+    return (json.dumps(obj, ensure_ascii=False, indent=2) + "\n").encode("utf-8")
+
+
+def _atomic_write_bytes(path: str, data: bytes) -> None:
     d = os.path.dirname(os.path.abspath(path)) or "."
-    fd, tmp = tempfile.mkstemp(prefix=".tmp_loop_", dir=d, text=True)
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_loop_", dir=d)
     try:
-        with os.fdopen(fd, "w", encoding="utf-8") as f:
+        with os.fdopen(fd, "wb") as f:
             f.write(data)
         os.replace(tmp, path)
     finally:
@@ -41,6 +60,38 @@ will raise FileNotFoundError.
 """
 
 
+def _canonical_bytes(doc: Dict[str, Any]) -> bytes:
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+
+class DocSnapshot(NamedTuple):
+    """Serialized forms of one docVersion, computed once and reused."""
+
+    version: int
+    doc: Dict[str, Any]
+    canon_bytes: bytes
+    sha256: str
+    payload: Dict[str, Any]
+    payload_json: str
+
+
+class DocDelta(NamedTuple):
+    """RFC 6902 ops taking docVersion from_version to to_version.
+
+    ops is None when the change is not expressible as a patch (whole-doc
+    replace, external file edit, or canonicalization reordered arrays);
+    clients behind such a delta must receive a full doc.
+    """
+
+    from_version: int
+    to_version: int
+    ops: Optional[List[Dict[str, Any]]]
+
+
+def _doc_sha256(doc: Dict[str, Any]) -> str:
+    return hashlib.sha256(_canonical_bytes(doc)).hexdigest()
+
+
 def _load_json(path: str) -> Dict[str, Any]:
     # Ensure parent dir exists
     d = os.path.dirname(os.path.abspath(path)) or "."
@@ -52,15 +103,36 @@ def _load_json(path: str) -> Dict[str, Any]:
 
 
 class Conductor:
-    def __init__(self, loop_path: str, port_filter: Optional[str], bpm: float, clock_source: str = "internal"):
+    def __init__(self, loop_path: str, port_filter: Optional[str], bpm: float, clock_source: str = "internal", instrument: bool = False, tick_budget_fraction: Optional[float] = None, trace_capacity: int = 0, delta_history: int = 64, persist_delay_s: float = 0.0, journal: bool = False, compact_every: int = 500, history_size: int = 64, watch: str = "auto", rebase_window: int = 32):
         self.loop_path = loop_path
         self.doc: Dict[str, Any] = _load_json(loop_path)
+        # Journaled storage: accepted patches are appended to <loop>.journal.ndjson
+        # and the loop file is only rewritten on compaction (every compact_every
+        # entries, on edits without a patch, and on shutdown)
+        self._journal: Optional[PatchJournal] = None
+        self.compact_every = max(1, int(compact_every))
+        if journal:
+            self._journal = PatchJournal(journal_path_for(loop_path))
+            t0 = time.perf_counter()
+            self.doc, replayed = self._journal.replay(self.doc, _doc_sha256)
+            if replayed:
+                print(f"[ws] replayed {replayed} journal entries in {(time.perf_counter() - t0) * 1000.0:.1f} ms", flush=True)
         self.doc_version = int(self.doc.get("docVersion", 0))
-        # Track file mtime to detect external edits
+        # Patches are validated and canonicalized incrementally, which relies on
+        # the doc they were built on already being valid and canonical
         try:
-            self._file_mtime = os.path.getmtime(self.loop_path)
+            self._doc_valid = not validate_loop_compiled(self.doc)
+            self._doc_canonical = canonicalize(self.doc) == self.doc
         except Exception:
-            self._file_mtime = time.time()
+            self._doc_valid = self._doc_canonical = False
+        # External edits to the loop file are picked up by a FileWatcher
+        # (start_watch); it knows our own saves by the sha256 of the bytes written
+        self.watch_mode = watch
+        self._watcher: Optional[FileWatcher] = None
+        self._own_file_shas: Deque[str] = deque(maxlen=16)
+        self._watch_counts = {"reloads": 0, "ownWrites": 0, "unchanged": 0, "invalid": 0, "stale": 0}
+        # Called from the watcher thread after an external edit was adopted
+        self.on_file_reload: Optional[Callable[[], None]] = None
         self._port_filter = port_filter
         try:
             self.out = open_mido_output(port_filter)
@@ -69,9 +141,39 @@ class Conductor:
         self.clock_source = clock_source if clock_source in ("internal", "external") else "internal"
         # Never send MIDI Clock out; device remains master. Only send CC80 for tempo nudges.
         self.sink = MidoSink(self.out, also_send_clock=False)
-        self.engine = Engine(self.sink)
+        limits = {"tick_budget_fraction": tick_budget_fraction} if tick_budget_fraction else None
+        self.engine = Engine(self.sink, limits=limits, instrument=instrument)
         self.engine.load(self.doc)
+        self._doc_cache: Optional[DocSnapshot] = None
+        # Write-behind saves: persist_delay_s > 0 coalesces versions arriving within
+        # that quiet period into one write (0 = write inline on every version)
+        self._own_writes: Deque[str] = deque(maxlen=16)
+        self._persist: Optional[PersistWorker] = None
+        if persist_delay_s > 0 and self._journal is None:
+            self._persist = PersistWorker(self._write_doc, quiet_s=persist_delay_s, max_delay_s=max(1.0, 8 * persist_delay_s))
+        # Journal appends and compactions run on their own thread, in order
+        self._journal_io: Optional[JournalWriter] = JournalWriter(self._journal, self._write_doc, _doc_sha256) if self._journal is not None else None
+        # Recent versions for undo/redo/checkout; consecutive docs share untouched subtrees
+        self.history = DocHistory(history_size)
+        self.history.record(self.doc_version, self.doc)
+        # Recent per-version patches so lagging WS clients can catch up with deltas
+        self._deltas: Deque[DocDelta] = deque(maxlen=max(1, int(delta_history)))
+        # Patches up to rebase_window versions behind are rebased over the
+        # deltas since their base instead of being rejected as stale (0 = never)
+        self.rebase_window = max(0, int(rebase_window))
+        self._rebase_counts = {"rebased": 0, "conflicts": 0, "tooOld": 0}
+        # Bumped on every performance overlay change (see do_overlay)
+        self.overlay_version = 0
+        # Opt-in span tracing shared by engine, sink, clock/MIDI-in callbacks and WS handling
+        self.tracer: Optional[Tracer] = Tracer(trace_capacity) if trace_capacity > 0 else None
+        self.engine.tracer = self.tracer
+        self.sink.tracer = self.tracer
         self.playing = False
+        # Transport anchors: called (from any thread) with a reason on start/stop/
+        # locate/tempo change so the WS server can push a fresh anchor
+        self.on_transport: Optional[Callable[[str], None]] = None
+        self._anchor_seq = itertools.count(1)
+        self._anchor_tps: float = 0.0
         # Use reentrant lock: WS handler holds the lock and calls methods
         # that also acquire it (e.g., do_replace_json via _schedule_or_apply).
         # A non-reentrant Lock deadlocks in that path.
@@ -84,21 +186,19 @@ class Conductor:
         self._last_spp_ts: Optional[float] = None
 
         def on_clock_pulse(_):
-            # Adapt 24 PPQN -> meta.ppq
-            meta = self.doc.get("meta", {})
-            ppq = int(meta.get("ppq", 96))
-            ratio = max(1, ppq // 24)
-            for _ in range(ratio):
-                self.engine.on_tick(self.engine.tick + 1)
-                # Evaluate pending structural applies at bar boundary
-                self._maybe_apply_pending()
+            self._advance_pulse()
 
         def send_midi_clock():
             # Intentionally no-op: do not send MIDI clock to device
             return
 
-        # Pending structural doc replace (apply at next bar boundary)
-        self._pending_doc: Optional[Dict[str, Any]] = None
+        # Edits waiting for a quantized tick (structural ones default to the next bar)
+        self._queue = ApplyQueue()
+        # Versions produced by queued edits since the queue was last empty
+        # (whole-doc edits may follow those, and nothing else)
+        self._queue_versions: Set[int] = set()
+        # Called (from the clock thread) with each queued edit and its result
+        self.on_pending_result: Optional[Callable[[PendingApply, Dict[str, Any]], None]] = None
         self.clock: Optional[InternalClock] = None
         self.inp = None
         if self.clock_source == "internal":
@@ -130,6 +230,7 @@ class Conductor:
                         ppq = int(meta.get("ppq", 96))
                         self.engine.tick = int(msg.pos * (ppq / 4))
                         self._last_spp_ts = time.time()
+                        self._notify_transport("locate")
                     elif msg.type == "clock":
                         now = time.time()
                         if self._ext_last_ts is not None:
@@ -137,10 +238,9 @@ class Conductor:
                             # EMA for clock pulse interval
                             self._ext_interval_ema = dt if self._ext_interval_ema is None else (0.85 * self._ext_interval_ema + 0.15 * dt)
                             self._ext_bpm = float(60.0 / (max(1e-6, self._ext_interval_ema) * 24.0))
+                            self.engine.set_tempo(self._ext_bpm)
+                            self._check_anchor_tempo()
                         self._ext_last_ts = now
-                        meta = self.doc.get("meta", {})
-                        ppq = int(meta.get("ppq", 96))
-                        ratio = max(1, ppq // 24)
                         # If device sent SPP very recently but no Start/Continue observed (attach mid-play), arm playback
                         if not self.playing and self._last_spp_ts and (now - self._last_spp_ts) < 1.0:
                             try:
@@ -150,11 +250,10 @@ class Conductor:
                                 pass
                         # Only advance engine ticks while playing
                         if self.playing:
-                            for _ in range(ratio):
-                                self.engine.on_tick(self.engine.tick + 1)
-                                self._maybe_apply_pending()
+                            self._advance_pulse()
                 except Exception:
                     pass
+            on_input = self._traced_input(on_input)
             try:
                 self.inp = open_mido_input(port_filter, callback=on_input)
             except Exception:
@@ -199,15 +298,199 @@ class Conductor:
                 },
                 "ccNow": self.engine.get_cc_snapshot(),
                 "activeNotes": self.engine.get_active_notes_snapshot(),
+                "pendingApplies": self._queue.snapshot(),
+                "overlay": self.engine.get_overlay_snapshot(),
+                "overlayVersion": self.overlay_version,
             }
 
+    def doc_snapshot(self) -> DocSnapshot:
+        """Canonical bytes, SHA-256 and 'doc' payload for the current version.
+
+        Built on first use after each version change (keyed on docVersion and
+        the doc object itself) and shared by every reply and broadcast.
+        """
+        with self._lock:
+            snap = self._doc_cache
+            if snap is not None and snap.version == self.doc_version and snap.doc is self.doc:
+                return snap
+            canon_bytes = _canonical_bytes(self.doc)
+            sha = hashlib.sha256(canon_bytes).hexdigest()
+            payload = {"docVersion": self.doc_version, "json": self.doc, "sha256": sha, "path": os.path.abspath(self.loop_path)}
+            snap = DocSnapshot(self.doc_version, self.doc, canon_bytes, sha, payload, json.dumps(payload))
+            self._doc_cache = snap
+            return snap
+
     def get_doc(self) -> Dict[str, Any]:
+        return dict(self.doc_snapshot().payload)
+
+    def deltas_since(self, version: int) -> Optional[List[Dict[str, Any]]]:
+        """Concatenated ops from `version` to the current docVersion.
+
+        Returns [] when already current and None when the history no longer
+        covers `version` (or contains a non-patch change).
+        """
         with self._lock:
-            import hashlib, json
+            if version == self.doc_version:
+                return []
+            chain: List[DocDelta] = []
+            want = self.doc_version
+            for d in reversed(self._deltas):
+                if d.to_version != want:
+                    return None
+                chain.append(d)
+                if d.ops is None:
+                    return None
+                want = d.from_version
+                if want == version:
+                    break
+            else:
+                return None
+            ops: List[Dict[str, Any]] = []
+            for d in reversed(chain):
+                ops.extend(d.ops or [])
+            return ops
 
-            canon_bytes = json.dumps(self.doc, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
-            sha = hashlib.sha256(canon_bytes).hexdigest()
-            return {"docVersion": self.doc_version, "json": self.doc, "sha256": sha, "path": os.path.abspath(self.loop_path)}
+    def delta_payload(self, from_version: int) -> Optional[Dict[str, Any]]:
+        """'docDelta' message object bringing a client from from_version to current, or None."""
+        ops = self.deltas_since(from_version)
+        if not ops:
+            return None
+        snap = self.doc_snapshot()
+        return {
+            "type": "docDelta",
+            "ts": time.time(),
+            "payload": {"fromVersion": from_version, "toVersion": snap.version, "ops": ops, "sha256": snap.sha256},
+        }
+
+    def delta_message(self, from_version: int) -> Optional[str]:
+        msg = self.delta_payload(from_version)
+        return json.dumps(msg) if msg is not None else None
+
+    def doc_update_message(self, known_version: Optional[int], deltas: bool, encode: Callable[[Dict[str, Any]], Any] = json.dumps) -> tuple[int, Any]:
+        """Message bringing a client at known_version up to date: (version, msg).
+
+        msg is None when the client is current; a 'docDelta' (passed through
+        `encode`) when it opted in and the history reaches back far enough;
+        otherwise a full 'doc' as JSON text.
+        """
+        with self._lock:
+            cur = self.doc_version
+            if known_version == cur:
+                return cur, None
+            if deltas and known_version is not None:
+                msg = self.delta_payload(known_version)
+                if msg is not None:
+                    return cur, encode(msg)
+            return cur, self.doc_message()
+
+    def _record_delta(self, from_version: int, ops: Optional[List[Dict[str, Any]]]) -> None:
+        # No SHA here: delta_payload and the journal writer hash the doc only when needed
+        self._deltas.append(DocDelta(from_version, self.doc_version, ops))
+
+    def doc_message(self, req_id: Any = None) -> str:
+        """Outbound 'doc' message; only the envelope is serialized per call."""
+        snap = self.doc_snapshot()
+        head: Dict[str, Any] = {"type": "doc", "ts": time.time()}
+        if req_id is not None:
+            head["id"] = req_id
+        return json.dumps(head)[:-1] + ', "payload": ' + snap.payload_json + "}"
+
+    def upcoming(self, bars: int = 2) -> Dict[str, Any]:
+        """Notes and CC changes scheduled for the next `bars` bars from the playhead."""
+        with self._lock:
+            engine = self.engine
+            version = self.doc_version
+            bar_ticks = engine.step_ticks * int((self.doc.get("meta") or {}).get("stepsPerBar", 16))
+            # While playing, the current tick has already been emitted
+            start = int(engine.tick) + (1 if self.playing else 0)
+        bars = max(1, min(16, int(bars)))
+        end = start + bars * bar_ticks
+        out: Dict[str, Any] = {"docVersion": version, "fromTick": start, "toTick": end, "bars": bars, "barTicks": bar_ticks}
+        out.update(engine.preview(start, end))
+        return out
+
+    def ticks_per_second(self) -> float:
+        """Engine tick rate while playing (0 when stopped)."""
+        if not self.playing:
+            return 0.0
+        bpm = self.clock.bpm if self.clock_source == "internal" and self.clock else self._ext_bpm
+        ppq = int(self.doc.get("meta", {}).get("ppq", 96))
+        return float(bpm or 0.0) * ppq / 60.0
+
+    def transport_anchor(self, reason: str = "periodic") -> Dict[str, Any]:
+        """Playhead anchor for client-side extrapolation.
+
+        Clients place the playhead at tick + (now - serverTime) * ticksPerSecond
+        and drop anchors whose seq is older than the last one applied.
+        """
+        with self._lock:
+            tps = self.ticks_per_second()
+            self._anchor_tps = tps
+            return {
+                "seq": next(self._anchor_seq),
+                "tick": int(self.engine.tick),
+                "serverTime": time.monotonic(),
+                "ticksPerSecond": round(tps, 6),
+                "playing": self.playing,
+                "reason": reason,
+            }
+
+    def _notify_transport(self, reason: str) -> None:
+        cb = self.on_transport
+        if cb is not None:
+            try:
+                cb(reason)
+            except Exception:
+                pass
+
+    def _check_anchor_tempo(self) -> None:
+        # External BPM is an EMA that wobbles every pulse; only re-anchor on a real change
+        if not self.playing:
+            return
+        tps = self.ticks_per_second()
+        last = self._anchor_tps
+        if last <= 0 or abs(tps - last) / last > 0.01:
+            self._anchor_tps = tps
+            self._notify_transport("tempo")
+
+    # --- Clock/MIDI-in plumbing ---
+    def _advance_pulse(self) -> None:
+        """Advance the engine by one 24 PPQN clock pulse (meta.ppq // 24 ticks)."""
+        tracer = self.tracer
+        t0 = time.perf_counter() if tracer is not None else 0.0
+        meta = self.doc.get("meta", {})
+        ppq = int(meta.get("ppq", 96))
+        ratio = max(1, ppq // 24)
+        for _ in range(ratio):
+            nxt = self.engine.tick + 1
+            # Queued edits land before their tick is emitted
+            self._maybe_apply_pending(nxt)
+            self.engine.on_tick(nxt)
+        if tracer is not None:
+            tracer.add("clockPulse", "clock", t0, time.perf_counter(), {"tick": self.engine.tick})
+
+    def _traced_input(self, callback):
+        """Wrap a MIDI input callback so each message becomes a 'midiIn' span."""
+        tracer = self.tracer
+        if tracer is None:
+            return callback
+
+        def on_input(msg):
+            t0 = time.perf_counter()
+            try:
+                callback(msg)
+            finally:
+                tracer.add(str(getattr(msg, "type", "?")), "midiIn", t0, time.perf_counter())
+        return on_input
+
+    def dump_trace(self, path: Optional[str] = None) -> Optional[str]:
+        """Write the trace ring buffer as Chrome trace-event JSON; returns the path."""
+        if self.tracer is None:
+            return None
+        if not path:
+            d = os.path.dirname(os.path.abspath(self.loop_path)) or "."
+            path = os.path.join(d, time.strftime("trace-%Y%m%d-%H%M%S.json"))
+        return self.tracer.dump(path)
 
     # --- Control ---
     def do_play(self) -> None:
@@ -220,6 +503,7 @@ class Conductor:
                     self.engine.on_tick(self.engine.tick)
                 except Exception:
                     pass
+                self._notify_transport("start")
 
     def do_continue(self) -> None:
         # Same as play for MVP; tick preserved
@@ -230,11 +514,17 @@ class Conductor:
             if self.playing:
                 self.engine.stop()  # flush offs + panic
                 self.playing = False
+                self._notify_transport("stop")
+                # Nothing to wait for while stopped
+                for entry in self._queue.drain():
+                    self._apply_queued(entry)
                 # Do not send MIDI transport; device is transport authority
 
     def do_set_tempo(self, bpm: float) -> None:
         if self.clock and self.clock_source == "internal":
             self.clock.set_bpm(bpm)
+            self.engine.set_tempo(bpm)
+            self._notify_transport("tempo")
 
     def do_set_tempo_cc(self, bpm: float) -> None:
         """Set device tempo via CC80 on channel 0 using a 40..220 BPM scale.
@@ -276,16 +566,12 @@ class Conductor:
         # Recreate clock or input
         if self.clock_source == "internal":
             def on_clock_pulse(_):
-                meta = self.doc.get("meta", {})
-                ppq = int(meta.get("ppq", 96))
-                ratio = max(1, ppq // 24)
-                for _ in range(ratio):
-                    self.engine.on_tick(self.engine.tick + 1)
-                    self._maybe_apply_pending()
+                self._advance_pulse()
             def send_midi_clock():
                 return
             self.clock = InternalClock(bpm=float(self.doc.get("meta",{}).get("tempo", 120)), tick_handler=on_clock_pulse, send_midi_clock=send_midi_clock)
             self.clock.start()
+            self.engine.set_tempo(self.clock.bpm)
             self._ext_last_ts = None; self._ext_interval_ema = None
         else:
             def on_input(msg):
@@ -300,76 +586,472 @@ class Conductor:
                         meta = self.doc.get("meta", {})
                         ppq = int(meta.get("ppq", 96))
                         self.engine.tick = int(msg.pos * (ppq / 4))
+                        self._notify_transport("locate")
                     elif msg.type == "clock":
                         now = time.time()
                         if self._ext_last_ts is not None:
                             dt = max(1e-6, now - self._ext_last_ts)
                             self._ext_interval_ema = dt if self._ext_interval_ema is None else (0.85 * self._ext_interval_ema + 0.15 * dt)
                             self._ext_bpm = float(60.0 / (max(1e-6, self._ext_interval_ema) * 24.0))
+                            self.engine.set_tempo(self._ext_bpm)
+                            self._check_anchor_tempo()
                         self._ext_last_ts = now
-                        meta = self.doc.get("meta", {})
-                        ppq = int(meta.get("ppq", 96))
-                        ratio = max(1, ppq // 24)
-                        for _ in range(ratio):
-                            self.engine.on_tick(self.engine.tick + 1)
-                            self._maybe_apply_pending()
+                        self._advance_pulse()
                 except Exception:
                     pass
             self._ext_last_ts = None; self._ext_interval_ema = None
-            self.inp = open_mido_input(self._port_filter, callback=on_input)
+            self.inp = open_mido_input(self._port_filter, callback=self._traced_input(on_input))
+
+    def do_replace_json(self, base_version: int, new_doc: Dict[str, Any], ops: Optional[List[Dict[str, Any]]] = None, restore: Optional[int] = None, cow: bool = False, validated: bool = False) -> Dict[str, Any]:
+        """Validate, canonicalize, persist and install new_doc as the next version.
 
-    def do_replace_json(self, base_version: int, new_doc: Dict[str, Any]) -> Dict[str, Any]:
+        `ops` are the patch ops that produced new_doc from the current doc, if
+        known; they are kept as the version's delta when canonicalization
+        leaves new_doc unchanged. `restore` is the history version new_doc
+        re-installs (undo/redo) instead of being a new edit. `cow` marks
+        new_doc as apply_patch_cow output built on the current doc, so only
+        the containers the patch touched are re-sorted and nothing is copied.
+        `validated` skips validation for a doc the caller already checked
+        against the current one.
+        """
         with self._lock:
             if base_version != self.doc_version:
                 return {"ok": False, "error": "stale", "expected": self.doc_version}
             prev_doc = self.doc
-            errors = validate_loop(new_doc)
+            tracer = self.tracer
+            t0 = time.perf_counter()
+            if validated:
+                errors = []
+            elif self._doc_valid:
+                errors = validate_loop_incremental_compiled(new_doc, prev_doc, ops)
+            else:
+                errors = validate_loop_compiled(new_doc)
+            t1 = time.perf_counter()
+            if tracer is not None:
+                tracer.add("validate", "doc", t0, t1)
             if errors:
                 return {"ok": False, "error": "validation", "details": errors}
-            canon = canonicalize(new_doc)
+            shared = cow and self._doc_canonical
+            if shared:
+                canon, reordered = canonicalize_shared(new_doc, prev_doc)
+                # Own the root: an empty patch returns the live doc itself
+                canon = dict(canon)
+            else:
+                canon = canonicalize(new_doc)
+                reordered = canon != new_doc
+            t2 = time.perf_counter()
+            delta_ops: Optional[List[Dict[str, Any]]] = None
+            if ops is not None and not reordered:
+                delta_ops = list(ops)
             # increment version and persist
             self.doc_version += 1
+            if delta_ops is not None:
+                delta_ops.append({"op": "replace" if "docVersion" in canon else "add", "path": "/docVersion", "value": self.doc_version})
             canon["docVersion"] = self.doc_version
-            _atomic_write_json(self.loop_path, canon)
+            restored = self.history.get(restore) if restore is not None else None
+            if not shared:
+                canon = share_unchanged(restored if restored is not None else prev_doc, canon)
+            if tracer is not None:
+                tracer.add("canonicalize", "doc", t1, t2)
+            if self._persist is not None:
+                self._persist.submit(self.doc_version, canon)
+            elif self._journal is None:
+                self._write_doc(self.doc_version, canon)
+            self.doc = canon
+            self._doc_valid = self._doc_canonical = True
+            self._record_delta(base_version, delta_ops)
+            if restored is not None:
+                self.history.restored(self.doc_version, restore)
+            else:
+                self.history.record(self.doc_version, self.doc)
+            if self._journal_io is not None:
+                if delta_ops is None or self._journal_io.entries >= self.compact_every:
+                    # No patch to log (or log long enough): fold everything into the loop file
+                    self._journal_io.compact(self.doc_version, canon)
+                else:
+                    self._journal_io.append(self.doc_version, delta_ops, canon)
+            t4 = time.perf_counter()
+            self.engine.replace_doc(self.doc, delta_ops)
+            if tracer is not None:
+                tracer.add("engineReplace", "engine", t4, time.perf_counter(), {"docVersion": self.doc_version})
             try:
-                print(f"[ws] saved {self.loop_path} (docVersion={self.doc_version})", flush=True)
+                self._handle_tempo_change(prev_doc, self.doc)
             except Exception:
                 pass
+            return {"ok": True, "docVersion": self.doc_version}
+
+    def _write_doc(self, version: int, doc: Dict[str, Any]) -> None:
+        """Write doc to the loop file (inline, or on the persist worker thread)."""
+        t0 = time.perf_counter()
+        if self._persist is not None or self._journal is not None:
+            # Remember what we wrote so the file watcher can tell it from an
+            # external edit even when it lags behind the in-memory doc
+            self._own_writes.append(_doc_sha256(doc))
+        data = _encode_json(doc)
+        # Recorded before the rename so the watcher can never read the file first
+        self._own_file_shas.append(hashlib.sha256(data).hexdigest())
+        _atomic_write_bytes(self.loop_path, data)
+        if self.tracer is not None:
+            self.tracer.add("writeFile", "io", t0, time.perf_counter(), {"docVersion": version})
+        try:
+            print(f"[ws] saved {self.loop_path} (docVersion={version})", flush=True)
+        except Exception:
+            pass
+
+    def _compact(self) -> None:
+        """Queue a rewrite of the loop file at the current version and an empty journal."""
+        with self._lock:
+            if self._journal_io is None:
+                return
+            self._journal_io.compact(self.doc_version, self.doc)
+
+    def flush(self) -> None:
+        """Make sure the loop file holds the latest version (write-behind/journal modes)."""
+        if self._persist is not None:
+            self._persist.flush()
+        if self._journal_io is not None:
+            if self._journal_io.entries:
+                self._compact()
+            self._journal_io.wait()
+
+    def close(self) -> None:
+        self.stop_watch()
+        if self._persist is not None:
+            self._persist.close()
+        if self._journal_io is not None:
+            self.flush()
+            self._journal_io.close()
+
+    def persist_stats(self) -> Dict[str, Any]:
+        if self._journal_io is not None:
+            out = self._journal_io.stats()
+            out["mode"] = "journal"
+            out["compactEvery"] = self.compact_every
+            return out
+        if self._persist is None:
+            return {"mode": "sync"}
+        out = self._persist.snapshot()
+        out["mode"] = "writeBehind"
+        return out
+
+    def start_watch(self) -> Optional[FileWatcher]:
+        """Start watching the loop file for external edits (per watch_mode)."""
+        if self.watch_mode == "off" or self._watcher is not None:
+            return self._watcher
+        self._watcher = FileWatcher(self.loop_path, self._on_file_change, mode=self.watch_mode).start()
+        return self._watcher
+
+    def stop_watch(self) -> None:
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+
+    def watch_stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = self._watcher.stats() if self._watcher is not None else {"mode": "off"}
+        out.update(self._watch_counts)
+        return out
+
+    def _on_file_change(self, path: str) -> None:
+        """Watcher thread: read, parse and validate the file, then adopt it.
+
+        Only reload_from_disk takes the conductor lock; hashing, parsing and
+        validation run here, off the event loop and the clock thread.
+        """
+        t0 = time.perf_counter()
+        with open(path, "rb") as f:
+            data = f.read()
+        if hashlib.sha256(data).hexdigest() in self._own_file_shas:
+            self._watch_counts["ownWrites"] += 1
+            return
+        try:
+            loaded = json.loads(data)
+        except ValueError as e:
+            # Likely a save in progress by a non-atomic writer; the next event retries
+            self._watch_counts["invalid"] += 1
+            print(f"[ws] ignoring unreadable {path}: {e}", flush=True)
+            return
+        errors = validate_loop_compiled(loaded) if isinstance(loaded, dict) else ["/: expected object"]
+        if errors:
+            self._watch_counts["invalid"] += 1
+            print(f"[ws] ignoring invalid {path}: {errors[:3]}", flush=True)
+            return
+        sha = _doc_sha256(loaded)
+        stale = self._watch_counts["stale"]
+        if not self.reload_from_disk(loaded, sha=sha, validated=True):
+            if self._watch_counts["stale"] == stale:
+                self._watch_counts["unchanged"] += 1
+            return
+        self._watch_counts["reloads"] += 1
+        if self.tracer is not None:
+            self.tracer.add("reloadFile", "io", t0, time.perf_counter(), {"docVersion": self.doc_version})
+        print(f"[ws] reloaded {path} (docVersion={self.doc_version})", flush=True)
+        cb = self.on_file_reload
+        if cb is not None:
             try:
-                self._file_mtime = os.path.getmtime(self.loop_path)
+                cb()
             except Exception:
-                self._file_mtime = time.time()
-            self.doc = canon
-            self.engine.replace_doc(self.doc)
+                pass
+
+    def reload_from_disk(self, loaded: Dict[str, Any], sha: Optional[str] = None, validated: bool = False) -> bool:
+        """Adopt an externally edited loop file if it is valid and differs.
+
+        Returns True when the doc changed. Versions continue from the file's
+        docVersion when it is ahead, so external tools that bump it stay
+        ahead. A file behind the doc (see _merge_stale_file) never takes the
+        version backwards. `sha` (of the
+        canonical bytes) and `validated` let a caller that already did that
+        work outside the lock skip it here.
+        """
+        if sha is None:
+            sha = _doc_sha256(loaded)
+        with self._lock:
+            if sha == self.doc_snapshot().sha256 or sha in self._own_writes:
+                return False
+            if not validated and validate_loop_compiled(loaded):
+                return False
+            prev_doc = self.doc
+            prev_version = self.doc_version
+            canon = canonicalize(loaded)
+            file_version = int(canon.get("docVersion", self.doc_version))
+            if file_version < prev_version:
+                return self._merge_stale_file(file_version, canon)
+            if self._persist is not None:
+                # The file now holds the external edit; don't overwrite it with an older save
+                self._persist.cancel()
+            self.doc_version = max(prev_version, file_version) + 1
+            # Keep the edit as a patch: clients get a delta, the engine recompiles only what changed
+            ops = diff_loops(prev_doc, canon, ignore=("docVersion",))
+            ops.append({"op": "replace" if "docVersion" in prev_doc else "add", "path": "/docVersion", "value": self.doc_version})
+            self.doc = apply_patch_cow(prev_doc, ops)
+            self._doc_valid = self._doc_canonical = True
+            self._record_delta(prev_version, ops)
+            self.history.record(self.doc_version, self.doc)
+            if self._journal is not None:
+                # Logged patches were relative to the old file; rebase the log on the new one
+                self._compact()
+            self.engine.replace_doc(self.doc, ops)
             try:
                 self._handle_tempo_change(prev_doc, self.doc)
             except Exception:
                 pass
-            return {"ok": True, "docVersion": self.doc_version}
+            return True
         
+    def _merge_stale_file(self, file_version: int, canon: Dict[str, Any]) -> bool:
+        """Carry an external edit of a lagging loop file over the versions since.
+
+        In journal and write-behind modes the file can hold an older version
+        than memory. An edit made to it is diffed against the version it was
+        made on and rebased like a stale patch. When that version is no
+        longer in history, or the edit conflicts, it is refused and the file
+        is rewritten at the current version.
+        """
+        with self._lock:
+            base = self.history.get(file_version)
+            ops = diff_loops(base, canon, ignore=("docVersion",)) if base is not None else None
+            if ops == []:
+                return False
+            res: Dict[str, Any] = {"ok": False, "error": "stale", "expected": self.doc_version}
+            if ops is not None:
+                rebased, err = self.rebase_patch(file_version, ops, window=None)
+                res = err or self.do_apply_patch(self.doc_version, rebased, apply_now=True, rebase=False)
+            if res.get("ok"):
+                if self._journal is not None:
+                    # The journal was relative to the file this edit replaced
+                    self._compact()
+                return True
+            self._watch_counts["stale"] += 1
+            print(f"[ws] refusing edit of {self.loop_path} made at docVersion={file_version} (now {self.doc_version}): {res.get('error')}", flush=True)
+            if self._journal is not None:
+                self._compact()
+            else:
+                if self._persist is not None:
+                    self._persist.cancel()
+                self._write_doc(self.doc_version, self.doc)
+            return False
+
+    def rebase_patch(self, base_version: int, ops: List[Dict[str, Any]], window: Optional[int] = -1) -> tuple:
+        """(ops carried to the current version, None) or (None, error result).
+
+        A base further back than `window` versions (default rebase_window;
+        None = as far as the delta history reaches) is stale; ops touching
+        what changed since are a conflict listing their paths.
+        """
+        with self._lock:
+            cur = self.doc_version
+            if base_version == cur:
+                return list(ops), None
+            limit = self.rebase_window if window == -1 else window
+            since = None
+            if 0 <= base_version < cur and (limit is None or cur - base_version <= limit):
+                since = self.deltas_since(base_version)
+            if since is None:
+                self._rebase_counts["tooOld"] += 1
+                return None, {"ok": False, "error": "stale", "expected": cur}
+            rebased, conflicts = rebase_ops(since, ops)
+            if rebased is None:
+                self._rebase_counts["conflicts"] += 1
+                return None, {"ok": False, "error": "conflict", "paths": conflicts, "expected": cur}
+            self._rebase_counts["rebased"] += 1
+            return rebased, None
+
+    def rebase_stats(self) -> Dict[str, Any]:
+        return dict(self._rebase_counts, window=self.rebase_window)
+
+    def do_apply_patch(self, base_version: int, ops: List[Dict[str, Any]], apply_now: bool = False, quantize: Any = None, origin: Any = None, rebase: bool = True) -> Dict[str, Any]:
+        """Apply (or queue) RFC 6902 ops written against base_version.
+
+        Ops from an older version are rebased onto the current one first
+        (unless `rebase` is False); the ack then carries rebasedFrom.
+        """
+        with self._lock:
+            rebased_from = None
+            if base_version != self.doc_version:
+                if not rebase:
+                    return {"ok": False, "error": "stale", "expected": self.doc_version}
+                carried, err = self.rebase_patch(base_version, ops)
+                if err is not None:
+                    return err
+                ops, rebased_from = carried, base_version
+            try:
+                # Deltas keep concrete indices so later patches can be rebased over them
+                ops = resolve_appends(self.doc, ops)
+                patched = apply_patch_cow(self.doc, ops)
+            except Exception as e:
+                return {"ok": False, "error": "patch_apply", "details": str(e)}
+            res = self._schedule_or_apply(self.doc_version, patched, structural=is_structural_ops(ops), apply_now=apply_now, ops=ops, cow=True, quantize=quantize, origin=origin)
+            if rebased_from is not None and res.get("ok"):
+                res["rebasedFrom"] = rebased_from
+            return res
+
+    def do_apply_batch(self, base_version: int, patches: List[List[Dict[str, Any]]], versions: str = "one", apply_now: bool = False, quantize: Any = None, origin: Any = None, rebase: bool = True) -> Dict[str, Any]:
+        """Apply several op lists in order, all or nothing, with one ack.
+
+        Each list continues from the ops before it, as if all were one
+        patch. With versions="one" they are one patch (one validation, one persist,
+        one docVersion); versions="each" installs a docVersion per list, but
+        only once every list has applied and validated. A batch that waits
+        for a quantize boundary is always queued as a single version.
+        """
+        if not isinstance(patches, list) or not patches or not all(isinstance(p, list) for p in patches) or versions not in ("one", "each"):
+            return {"ok": False, "error": "invalid_batch"}
+        ops = [op for p in patches for op in p]
+        with self._lock:
+            if versions == "each" and len(patches) > 1:
+                try:
+                    q = parse_quantize("now" if apply_now else quantize if quantize is not None else "bar" if is_structural_ops(ops) else "now")
+                except ValueError as e:
+                    return {"ok": False, "error": "invalid_quantize", "details": str(e)}
+                tick, at = self._target_tick(q)
+                if at <= tick:
+                    return self._apply_batch_each(base_version, patches, rebase)
+            res = self.do_apply_patch(base_version, ops, apply_now=apply_now, quantize=quantize, origin=origin, rebase=rebase)
+            if res.get("ok"):
+                res["patches"] = len(patches)
+            return res
+
+    def _apply_batch_each(self, base_version: int, patches: List[List[Dict[str, Any]]], rebase: bool) -> Dict[str, Any]:
+        """Install one docVersion per op list right away (see do_apply_batch)."""
+        rebased_from = None
+        ops = [op for p in patches for op in p]
+        if base_version != self.doc_version:
+            if not rebase:
+                return {"ok": False, "error": "stale", "expected": self.doc_version}
+            ops, err = self.rebase_patch(base_version, ops)
+            if err is not None:
+                return err
+            rebased_from = base_version
+        parts: List[List[Dict[str, Any]]] = []
+        start = 0
+        for p in patches:
+            parts.append(ops[start:start + len(p)])
+            start += len(p)
+        # Dry run: every list must apply and validate before anything is installed
+        works: List[Dict[str, Any]] = []
+        cur, valid = self.doc, self._doc_valid
+        for i, part in enumerate(parts):
+            try:
+                part = parts[i] = resolve_appends(cur, part)
+                nxt = apply_patch_cow(cur, part)
+            except Exception as e:
+                return {"ok": False, "error": "patch_apply", "details": str(e), "index": i}
+            errors = validate_loop_incremental_compiled(nxt, cur, part) if valid else validate_loop_compiled(nxt)
+            if errors:
+                return {"ok": False, "error": "validation", "details": errors, "index": i}
+            works.append(nxt)
+            cur, valid = nxt, True
+        versions: List[int] = []
+        direct = True
+        for i, part in enumerate(parts):
+            if direct:
+                res = self.do_replace_json(self.doc_version, apply_patch_cow(self.doc, part), ops=part, cow=True, validated=True)
+            else:
+                res = self.do_apply_patch(self.doc_version, diff_loops(self.doc, works[i], ignore=("docVersion",)), apply_now=True)
+            if not res.get("ok"):
+                res["index"] = i
+                res["versions"] = versions
+                return res
+            versions.append(self.doc_version)
+            # Once a version comes out re-sorted, its indices no longer match
+            # what the later lists were written for: install their docs by diff
+            direct = direct and self._deltas[-1].ops is not None
+        res = {"ok": True, "docVersion": self.doc_version, "versions": versions, "patches": len(parts)}
+        if rebased_from is not None:
+            res["rebasedFrom"] = rebased_from
+        return res
+
+    def do_edit(self, commands: List[Dict[str, Any]], apply_now: bool = False, quantize: Any = None, origin: Any = None) -> Dict[str, Any]:
+        """Compile semantic edit commands against the current doc and apply them.
+
+        Commands name what to change, not where (see semantic_ops), so they
+        never go stale; the compiled ops take the applyPatch path and come
+        back in the ack. Commands that change nothing make no new version.
+        """
+        with self._lock:
+            try:
+                ops = compile_commands(self.doc, commands)
+            except ValueError as e:
+                return {"ok": False, "error": "invalid_command", "details": str(e)}
+            if not ops:
+                return {"ok": True, "docVersion": self.doc_version, "ops": []}
+            res = self.do_apply_patch(self.doc_version, ops, apply_now=apply_now, quantize=quantize, origin=origin)
+            if res.get("ok"):
+                res["ops"] = ops
+            return res
+
+    def do_overlay(self, changes: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply live mute/solo/transpose/velocity/CC changes (see conductor.overlay).
+
+        The engine picks them up on its next tick. The doc, its version,
+        history and loop file are untouched.
+        """
+        with self._lock:
+            engine = self.engine
+            try:
+                overlay = (engine.overlay or Overlay()).update(self.doc, changes, int(engine.tick), engine.get_cc_snapshot())
+            except ValueError as e:
+                return {"ok": False, "error": "invalid_overlay", "details": str(e)}
+            engine.set_overlay(overlay if overlay else None)
+            self.overlay_version += 1
+            return {"ok": True, "overlayVersion": self.overlay_version, "overlay": overlay.snapshot()}
+
+    def do_replace_diff(self, base_version: int, new_doc: Dict[str, Any], apply_now: bool = False, quantize: Any = None, origin: Any = None, rebase: bool = True) -> Dict[str, Any]:
+        """Install a whole doc as the patch diff_loops finds against its base.
+
+        The patch decides whether the change waits for the next bar, and it
+        takes the same incremental apply/validate path and delta broadcast
+        as an applyPatch. A doc built on an older (retained) version is
+        diffed against that version and rebased like a patch.
+        """
+        with self._lock:
+            base_doc = self.doc if base_version == self.doc_version else self.history.get(base_version) if rebase else None
+            if base_doc is None:
+                return {"ok": False, "error": "stale", "expected": self.doc_version}
+            ops = diff_loops(base_doc, new_doc, ignore=("docVersion",))
+            return self.do_apply_patch(base_version, ops, apply_now=apply_now, quantize=quantize, origin=origin, rebase=rebase)
+
     # --- Apply scheduling helpers ---
     def _is_structural_ops(self, ops: list) -> bool:
-        structural_prefixes = ("/meta/", "/deviceProfile")
-        track_structural_suffixes = (
-            "/id",
-            "/name",
-            "/type",
-            "/midiChannel",
-            "/role",
-            "/pattern/lengthBars",
-            "/drumKit",
-        )
-        for op in ops:
-            p = str(op.get("path", ""))
-            if any(p.startswith(pref) for pref in structural_prefixes):
-                return True
-            if p.startswith("/tracks/"):
-                parts = p.split("/")
-                if len(parts) >= 4:
-                    suffix = "/" + "/".join(parts[3:])
-                    if any(suffix.startswith(s) for s in track_structural_suffixes):
-                        return True
-        return False
+        return is_structural_ops(ops)
 
     @staticmethod
     def _extract_tempo(doc: Optional[Dict[str, Any]]) -> Optional[float]:
@@ -392,107 +1074,334 @@ class Conductor:
             self.do_set_tempo(new_bpm)
         self.do_set_tempo_cc(new_bpm)
 
-    def _schedule_or_apply(self, base_version: int, doc: Dict[str, Any], structural: bool, apply_now: bool = False) -> Dict[str, Any]:
-        if apply_now or not structural or not self.playing:
-            return self.do_replace_json(base_version, doc)
-        # queue for next bar boundary
+    def _schedule_or_apply(self, base_version: int, doc: Dict[str, Any], structural: bool, apply_now: bool = False, ops: Optional[List[Dict[str, Any]]] = None, restore: Optional[int] = None, cow: bool = False, quantize: Any = None, origin: Any = None) -> Dict[str, Any]:
+        """Apply doc now or queue it for the tick `quantize` names.
+
+        Without a quantize spec structural edits wait for the next bar and
+        everything else applies now; applyNow and a stopped transport always
+        apply now. Queued patches keep their ops and are re-applied at their
+        tick (see _apply_queued).
+        """
+        try:
+            q = parse_quantize("now" if apply_now else quantize if quantize is not None else "bar" if structural else "now")
+        except ValueError as e:
+            return {"ok": False, "error": "invalid_quantize", "details": str(e)}
         with self._lock:
-            self._pending_doc = doc
-        return {"ok": True, "pending": True, "when": "next_bar", "docVersion": self.doc_version}
+            if base_version != self.doc_version:
+                return {"ok": False, "error": "stale", "expected": self.doc_version}
+            tick, at = self._target_tick(q)
+            if at <= tick:
+                return self.do_replace_json(base_version, doc, ops=ops, restore=restore, cow=cow)
+            if not len(self._queue):
+                self._queue_versions.clear()
+            if ops is not None and restore is None:
+                entry = self._queue.push(at, q.label(), base_version, ops=list(ops), origin=origin)
+            else:
+                entry = self._queue.push(at, q.label(), base_version, doc=doc, restore=restore, origin=origin)
+            return {"ok": True, "pending": True, "when": q.label(), "atTick": at, "applyId": entry.apply_id, "docVersion": self.doc_version}
+
+    def _target_tick(self, q: Any) -> tuple:
+        """(current tick, tick q lands on); equal when it applies now."""
+        tick = int(self.engine.tick)
+        return tick, target_tick(q, tick, grid_for(self.doc)) if self.playing else tick
 
-    def _maybe_apply_pending(self) -> None:
-        if self._pending_doc is None:
+    def _maybe_apply_pending(self, tick: Optional[int] = None) -> None:
+        """Apply queued edits due at or before tick (default: the current tick)."""
+        queue = self._queue
+        due_tick = queue.next_tick()
+        if due_tick is None:
             return
-        # Apply at bar boundary (tick % bar_ticks == 0)
-        meta = self.doc.get("meta", {})
-        ppq = int(meta.get("ppq", 96))
-        spb = int(meta.get("stepsPerBar", 16))
-        step_ticks = int((ppq * 4) / spb) if spb > 0 else 0
-        bar_ticks = step_ticks * spb if step_ticks > 0 else 0
-        if bar_ticks <= 0 or (self.engine.tick % bar_ticks) == 0:
-            with self._lock:
-                nd = self._pending_doc
-                self._pending_doc = None
-            if isinstance(nd, dict):
-                self.do_replace_json(self.doc_version, nd)
-
-
-async def serve_ws(conductor: Conductor, host: str, port: int):
+        if tick is None:
+            tick = int(self.engine.tick)
+        if due_tick > tick:
+            return
+        with self._lock:
+            for entry in queue.pop_due(tick):
+                self._apply_queued(entry)
+
+    def _apply_queued(self, entry: PendingApply) -> Dict[str, Any]:
+        """Apply a queued edit to the current doc once its base has been rechecked.
+
+        A patch is rebased over the versions made since its base (and dropped
+        if they conflict); whole-doc edits only follow other queued edits.
+        """
+        with self._lock:
+            cur = self.doc_version
+            if entry.ops is not None:
+                # Versions made while it waited are not counted against the rebase window
+                ops, res = self.rebase_patch(entry.base_version, entry.ops, window=None)
+                if ops is not None:
+                    try:
+                        patched = apply_patch_cow(self.doc, ops)
+                    except Exception as e:
+                        res = {"ok": False, "error": "patch_apply", "details": str(e)}
+                    else:
+                        res = self.do_replace_json(cur, patched, ops=ops, cow=True)
+            elif any(v not in self._queue_versions for v in range(entry.base_version + 1, cur + 1)):
+                res = {"ok": False, "error": "stale", "expected": cur}
+            else:
+                res = self.do_replace_json(cur, entry.doc or {}, restore=entry.restore)
+            if res.get("ok"):
+                self._queue.applied += 1
+                self._queue_versions.add(self.doc_version)
+                if entry.restore is not None:
+                    res["restored"] = entry.restore
+            else:
+                self._queue.dropped += 1
+                print(f"[ws] queued edit {entry.apply_id} dropped: {res.get('error')}", flush=True)
+            res["applyId"] = entry.apply_id
+            cb = self.on_pending_result
+        if cb is not None:
+            try:
+                cb(entry, res)
+            except Exception:
+                pass
+        return res
+
+    def pending_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._queue.stats()
+
+    # --- History: undo/redo/checkout ---
+    def _restore(self, target: Optional[int], error: str, apply_now: bool, as_edit: bool = False, quantize: Any = None, origin: Any = None) -> Dict[str, Any]:
+        with self._lock:
+            doc = self.history.get(target) if target is not None else None
+            if doc is None:
+                return {"ok": False, "error": error}
+            res = self._schedule_or_apply(self.doc_version, doc, structural=True, apply_now=apply_now, restore=None if as_edit else target, quantize=quantize, origin=origin)
+        if res.get("ok"):
+            res["restored"] = target
+        return res
+
+    def undo(self, apply_now: bool = False, quantize: Any = None, origin: Any = None) -> Dict[str, Any]:
+        """Re-install the version before the current one (at the next bar while playing)."""
+        with self._lock:
+            return self._restore(self.history.undo_target(self._queue.last_restore()), "nothing_to_undo", apply_now, quantize=quantize, origin=origin)
+
+    def redo(self, apply_now: bool = False, quantize: Any = None, origin: Any = None) -> Dict[str, Any]:
+        with self._lock:
+            return self._restore(self.history.redo_target(self._queue.last_restore()), "nothing_to_redo", apply_now, quantize=quantize, origin=origin)
+
+    def checkout(self, version: int, apply_now: bool = False, quantize: Any = None, origin: Any = None) -> Dict[str, Any]:
+        """Install a copy of any retained version as a new edit (undo returns here)."""
+        return self._restore(version, "unknown_version", apply_now, as_edit=True, quantize=quantize, origin=origin)
+
+
+async def serve_ws(conductor: Conductor, host: str, port: int, upcoming_bars: int = 2):
     try:
         import websockets  # type: ignore
     except Exception:
         print("[ws] websockets not installed; cannot start Conductor WS")
         return
 
-    clients: Set[Any] = set()
+    clients: Dict[Any, ClientSession] = {}
+
+    evicted_total = 0
+    # Set when a client changes its subscription so the publisher re-plans its period
+    resubscribed = asyncio.Event()
+
+    def sync_doc(sess: ClientSession, force_full: bool = False, req_id: Any = None) -> None:
+        """Send whatever brings this client to the current docVersion."""
+        if force_full:
+            with conductor._lock:
+                version, msg = conductor.doc_version, conductor.doc_message(req_id)
+        else:
+            version, msg = conductor.doc_update_message(sess.doc_version, sess.deltas, encode=Outgoing)
+        if msg is not None:
+            sess.send(msg)
+        sess.doc_version = version
 
-    async def broadcast(obj: Dict[str, Any]):
-        if not clients:
+    def metrics_payload() -> Dict[str, Any]:
+        # Tolerate missing internal clock
+        clock_metrics = conductor.clock.get_metrics() if getattr(conductor, 'clock', None) else {"externalBpm": getattr(conductor, '_ext_bpm', None)}
+        return {
+            "engine": conductor.engine.get_metrics(),
+            "clock": clock_metrics,
+            "persist": conductor.persist_stats(),
+            "watch": conductor.watch_stats(),
+            "applyQueue": conductor.pending_stats(),
+            "rebase": conductor.rebase_stats(),
+            "ws": {
+                "clients": len(clients),
+                "evicted": evicted_total,
+                "perClient": [sess.stats() for sess in list(clients.values())],
+            },
+        }
+
+    def build_topic(topic: str) -> Optional[tuple]:
+        """(message, dedupe key or None) for a stream topic, or None to skip."""
+        if topic == "state":
+            return state_message(), None
+        if topic == "metrics":
+            return Outgoing({"type": "metrics", "ts": time.time(), "payload": metrics_payload()}), None
+        if topic == "anchor":
+            return anchor_message("periodic"), None
+        if topic == "cc":
+            body = conductor.engine.get_cc_snapshot()
+        elif topic == "notes":
+            body = conductor.engine.get_active_notes_snapshot()
+        elif topic == "trace":
+            if conductor.tracer is None:
+                return None
+            body = conductor.tracer.stats()
+        else:
+            return None
+        # cc/notes/trace are only re-sent when they change
+        body_json = json.dumps(body)
+        ts = time.time()
+        msg = Outgoing({"type": topic, "ts": ts, "payload": body}, '{"type": "%s", "ts": %r, "payload": %s}' % (topic, ts, body_json))
+        return msg, body_json
+
+    def state_message() -> Outgoing:
+        return Outgoing({"type": "state", "ts": time.time(), "payload": conductor.get_state()})
+
+    def anchor_message(reason: str) -> Outgoing:
+        return Outgoing({"type": "anchor", "ts": time.time(), "payload": conductor.transport_anchor(reason)})
+
+    def push_anchor(reason: str) -> None:
+        msg = anchor_message(reason)
+        for sess in list(clients.values()):
+            if sess.wants("anchor"):
+                sess.offer("anchor", msg)
+
+    # Last 'upcoming' window: (docVersion, bar) it was built for, and the message
+    upcoming_cache: Dict[str, Any] = {"key": None, "msg": None}
+
+    def upcoming_message(bars: int, req_id: Any = None) -> Outgoing:
+        head: Dict[str, Any] = {"type": "upcoming", "ts": time.time()}
+        if req_id is not None:
+            head["id"] = req_id
+        head["payload"] = conductor.upcoming(bars)
+        # Runs in a worker thread: pre-encode the common JSON form there too
+        return Outgoing(head, json.dumps(head))
+
+    async def publish_upcoming() -> None:
+        subs = [sess for sess in list(clients.values()) if sess.wants("upcoming")]
+        if not subs:
             return
-        msg = json.dumps(obj)
-        await asyncio.gather(*[c.send(msg) for c in list(clients)], return_exceptions=True)
+        bar_ticks = max(1, conductor.engine.step_ticks * int((conductor.doc.get("meta") or {}).get("stepsPerBar", 16)))
+        key = "%d:%d:%d" % (conductor.doc_version, conductor.overlay_version, conductor.engine.tick // bar_ticks)
+        if upcoming_cache["key"] != key:
+            # Look-ahead walks the schedule tick by tick; keep it off the event loop
+            upcoming_cache["msg"] = await asyncio.to_thread(upcoming_message, upcoming_bars)
+            upcoming_cache["key"] = key
+        for sess in subs:
+            sess.offer("upcoming", upcoming_cache["msg"], key=key)
 
-    last_doc_version = conductor.doc_version
-    async def metrics_task():
-        nonlocal last_doc_version
-        while True:
-            await asyncio.sleep(0.5)
-            # Broadcast metrics (tolerate missing internal clock)
+    async def client_writer(sess: ClientSession) -> None:
+        """Drain one client's outbound queue; a slow socket only stalls itself."""
+        try:
+            while sess.evicted is None:
+                await sess.wake.wait()
+                sess.wake.clear()
+                while sess.evicted is None:
+                    msg = sess.pop()
+                    if msg is None:
+                        break
+                    sess.writing_since = time.monotonic()
+                    await sess.ws.send(msg)
+                    sess.writing_since = None
+                    sess.sent += 1
+                    sess.bytes_sent += len(msg)
+        except Exception:
+            pass
+
+    def evict(sess: ClientSession) -> None:
+        """Close an evicted client's socket; safe to call again for the same session."""
+        nonlocal evicted_total
+        if not sess.close_once():
+            return
+        evicted_total += 1
+        try:
+            print(f"[ws] evicting slow client {sess.stats()['remote']}: {sess.evicted}", flush=True)
+        except Exception:
+            pass
+        # 1013 "try again later"; the handler's finally removes the session
+        asyncio.ensure_future(sess.ws.close(code=1013, reason=str(sess.evicted)))
+
+    def report_pending(entry: PendingApply, res: Dict[str, Any]) -> None:
+        """Tell the client that queued an edit how it landed, then push the doc."""
+        origin = entry.origin
+        if isinstance(origin, tuple) and origin[0] in clients.values():
+            sess, req_id = origin
+            sess.record_result(req_id, res)
             try:
-                clock_metrics = conductor.clock.get_metrics() if getattr(conductor, 'clock', None) else {"externalBpm": getattr(conductor, '_ext_bpm', None)}
-                await broadcast({
-                    "type": "metrics",
-                    "ts": time.time(),
-                    "payload": {
-                        "engine": conductor.engine.get_metrics(),
-                        "clock": clock_metrics,
-                        "ws": {"clients": len(clients)},
-                    },
-                })
+                sess.send(json.dumps({"type": "applied" if res.get("ok") else "error", "ts": time.time(), "id": req_id, "payload": res}))
             except Exception:
                 pass
-            # Broadcast state separately so a metrics error doesn't block state updates
+        sync_doc_subscribers()
+
+    def sync_doc_subscribers():
+        """Bring doc subscribers to the current version."""
+        for sess in list(clients.values()):
+            if sess.wants("doc") and sess.doc_version != conductor.doc_version:
+                try:
+                    sync_doc(sess)
+                except Exception:
+                    pass
+
+    async def publish_task():
+        next_watch = time.monotonic() + 0.5
+        while True:
+            periods = [p for p in (s.period() for s in list(clients.values())) if p]
             try:
-                await broadcast({"type": "state", "ts": time.time(), "payload": conductor.get_state()})
-            except Exception:
+                await asyncio.wait_for(resubscribed.wait(), timeout=min([0.5] + periods))
+            except asyncio.TimeoutError:
                 pass
-            # Detect external file edits and broadcast updated doc
+            resubscribed.clear()
+            now = time.monotonic()
+            # Each topic is built at most once per pass and shared by every client due for it
+            built: Dict[str, Optional[tuple]] = {}
+            for sess in list(clients.values()):
+                for topic in STREAM_TOPICS:
+                    if not sess.due(topic, now):
+                        continue
+                    if topic not in built:
+                        try:
+                            built[topic] = build_topic(topic)
+                        except Exception:
+                            built[topic] = None
+                    item = built[topic]
+                    if item is not None:
+                        sess.offer(topic, item[0], item[1])
+            # Also catches sessions send() marked queue_full: a stalled client
+            # sends nothing, so its handler would never notice
+            for sess in list(clients.values()):
+                if sess.check_slow(now) is not None:
+                    evict(sess)
             try:
-                m = os.path.getmtime(conductor.loop_path)
+                await publish_upcoming()
             except Exception:
-                m = None
-            if m and m != getattr(conductor, '_file_mtime', None):
-                try:
-                    loaded = _load_json(conductor.loop_path)
-                    # Compare canonical JSONs
-                    old_canon = json.dumps(conductor.doc, sort_keys=True, separators=(",", ":")).encode("utf-8")
-                    new_canon = json.dumps(loaded, sort_keys=True, separators=(",", ":")).encode("utf-8")
-                    import hashlib
-                    if hashlib.sha256(old_canon).hexdigest() != hashlib.sha256(new_canon).hexdigest():
-                        with conductor._lock:
-                            errs = validate_loop(loaded)
-                            if not errs:
-                                prev_doc = conductor.doc
-                                canon = canonicalize(loaded)
-                                conductor.doc_version = int(canon.get("docVersion", conductor.doc_version)) + 1
-                                canon["docVersion"] = conductor.doc_version
-                                conductor.doc = canon
-                                conductor.engine.replace_doc(conductor.doc)
-                                try:
-                                    conductor._handle_tempo_change(prev_doc, conductor.doc)
-                                except Exception:
-                                    pass
-                        await broadcast({"type": "doc", "ts": time.time(), "payload": conductor.get_doc()})
-                except Exception:
-                    pass
-                conductor._file_mtime = m
-            # Broadcast doc on version change (captures scheduled applies)
-            if conductor.doc_version != last_doc_version:
-                last_doc_version = conductor.doc_version
-                try:
-                    await broadcast({"type": "doc", "ts": time.time(), "payload": conductor.get_doc()})
-                except Exception:
-                    pass
+                pass
+            if now < next_watch:
+                continue
+            next_watch = now + 0.5
+            # Safety net; queued edits and file reloads push their own updates
+            sync_doc_subscribers()
+
+    def request_base(sess: ClientSession, payload: Dict[str, Any]) -> tuple:
+        """(baseVersion, None) for an edit request, or (None, error payload).
+
+        {"after": id} bases the edit on the version an earlier edit on this
+        connection produced, so dependent edits can be pipelined without
+        waiting for each ack; replies are matched to requests by id.
+        """
+        if "after" in payload:
+            return sess.result_base(payload["after"])
+        return int(payload.get("baseVersion", -1)), None
+
+    def send_result(sess: ClientSession, req_id: Any, res: Dict[str, Any], resync: bool = False) -> None:
+        """Ack or error for an edit request, after the doc it produced (or, with resync, the current doc)."""
+        sess.record_result(req_id, res)
+        if resync or res.get("ok"):
+            sync_doc(sess, force_full=not sess.deltas)
+        sess.send(json.dumps({"type": "ack" if res.get("ok") else "error", "ts": time.time(), "id": req_id, "payload": res}))
+
+    async def send_upcoming(sess: ClientSession, bars: int, req_id: Any) -> None:
+        try:
+            sess.send(await asyncio.to_thread(upcoming_message, bars, req_id))
+        except Exception:
+            pass
 
     async def handler(ws, *maybe_path):
         # Log client connection (helps debug UI connect issues)
@@ -501,19 +1410,27 @@ async def serve_ws(conductor: Conductor, host: str, port: int):
             print(f"[ws] client connected: {ra}", flush=True)
         except Exception:
             pass
-        clients.add(ws)
+        sess = ClientSession(ws)
+        clients[ws] = sess
+        writer = asyncio.create_task(client_writer(sess))
         # Send initial hello/doc/state
-        await ws.send(json.dumps({"type": "hello", "ts": time.time(), "payload": {"protocol": 1, "docVersion": conductor.doc_version}}))
-        await ws.send(json.dumps({"type": "doc", "ts": time.time(), "payload": conductor.get_doc()}))
-        await ws.send(json.dumps({"type": "state", "ts": time.time(), "payload": conductor.get_state()}))
+        sess.send(json.dumps({"type": "hello", "ts": time.time(), "payload": {"protocol": 1, "docVersion": conductor.doc_version}}))
+        sync_doc(sess, force_full=True)
+        sess.send(json.dumps({"type": "state", "ts": time.time(), "payload": conductor.get_state()}))
         try:
             async for message in ws:
                 try:
-                    obj = json.loads(message)
+                    if isinstance(message, bytes) and sess.encoding == "cbor":
+                        obj = cbor.loads(message)
+                    else:
+                        obj = json.loads(message)
+                    if not isinstance(obj, dict):
+                        continue
                 except Exception:
                     continue
                 t = obj.get("type")
                 req_id = obj.get("id")
+                t_msg = time.perf_counter()
                 # Debug log incoming command types
                 try:
                     print(f"[ws] recv type={t}", flush=True)
@@ -521,90 +1438,191 @@ async def serve_ws(conductor: Conductor, host: str, port: int):
                     pass
                 if t == "play" or t == "stop" or t == "continue":
                     # Transport is device-controlled; ignore UI transport commands
-                    await ws.send(json.dumps({"type": "error", "ts": time.time(), "id": req_id, "payload": {"ok": False, "error": "transport_external_only"}}))
+                    sess.send(json.dumps({"type": "error", "ts": time.time(), "id": req_id, "payload": {"ok": False, "error": "transport_external_only"}}))
                 
-                elif t == "subscribe":
-                    await ws.send(json.dumps({"type": "ack", "ts": time.time(), "id": req_id, "payload": {"ok": True, "subscribed": True}}))
+                elif t == "hello" or t == "subscribe":
+                    # Capability negotiation: {"deltas": true} opts into docDelta messages,
+                    # {"topics": [...] | {topic: maxHz}} replaces the default streams,
+                    # {"encoding": "cbor" | [prefs]} switches streamed topics to binary
+                    payload = obj.get("payload") or {}
+                    err = None
+                    try:
+                        topics = parse_topics(payload["topics"]) if "topics" in payload else None
+                    except ValueError as e:
+                        err = ("invalid_topics", str(e))
+                    try:
+                        encoding = parse_encoding(payload["encoding"]) if "encoding" in payload else None
+                    except ValueError as e:
+                        err = err or ("invalid_encoding", str(e))
+                    if err is not None:
+                        sess.send(json.dumps({"type": "error", "ts": time.time(), "id": req_id, "payload": {"ok": False, "error": err[0], "details": err[1]}}))
+                    else:
+                        if topics is not None:
+                            sess.subscribe(topics)
+                            resubscribed.set()
+                        if encoding is not None:
+                            sess.encoding = encoding
+                        if "deltas" in payload:
+                            sess.deltas = bool(payload.get("deltas"))
+                        ack = {"ok": True, "deltas": sess.deltas, "topics": sess.topics, "encoding": sess.encoding}
+                        if t == "subscribe":
+                            ack["subscribed"] = True
+                        else:
+                            ack["protocol"] = 1
+                        sess.send(json.dumps({"type": "ack", "ts": time.time(), "id": req_id, "payload": ack}))
                 elif t == "ping":
-                    await ws.send(json.dumps({"type": "pong", "ts": time.time(), "id": req_id}))
+                    sess.send(json.dumps({"type": "pong", "ts": time.time(), "id": req_id}))
+                elif t == "dumpTrace":
+                    payload = obj.get("payload") or {}
+                    if conductor.tracer is None:
+                        sess.send(json.dumps({"type": "error", "ts": time.time(), "id": req_id, "payload": {"ok": False, "error": "tracing_disabled"}}))
+                    elif payload.get("inline"):
+                        sess.send(json.dumps({"type": "trace", "ts": time.time(), "id": req_id, "payload": conductor.tracer.export()}))
+                    else:
+                        # Only a bare file name is honored; traces land next to the loop file
+                        name = os.path.basename(str(payload.get("file") or "")) or None
+                        path = conductor.dump_trace(os.path.join(os.path.dirname(os.path.abspath(conductor.loop_path)), name) if name else None)
+                        sess.send(json.dumps({"type": "ack", "ts": time.time(), "id": req_id, "payload": {"ok": True, "path": path, **conductor.tracer.stats()}}))
                 elif t == "setTempo":
                     bpm = float(obj.get("bpm", conductor.clock.bpm))
                     conductor.do_set_tempo(bpm)
-                    await ws.send(json.dumps({"type": "ack", "ts": time.time(), "id": req_id, "payload": {"ok": True}}))
+                    sess.send(json.dumps({"type": "ack", "ts": time.time(), "id": req_id, "payload": {"ok": True}}))
                 elif t == "setClockSource":
                     src = obj.get("source", "internal")
                     conductor.do_set_clock_source(str(src))
-                    await ws.send(json.dumps({"type": "ack", "ts": time.time(), "id": req_id, "payload": {"ok": True}}))
+                    sess.send(json.dumps({"type": "ack", "ts": time.time(), "id": req_id, "payload": {"ok": True}}))
                 elif t == "setTempoCC":
                     bpm = float(obj.get("bpm", 0))
                     conductor.do_set_tempo_cc(bpm)
-                    await ws.send(json.dumps({"type": "ack", "ts": time.time(), "id": req_id, "payload": {"ok": True}}))
+                    sess.send(json.dumps({"type": "ack", "ts": time.time(), "id": req_id, "payload": {"ok": True}}))
                 elif t == "getState":
                     # Explicit poll for current state (UI fallback)
-                    await ws.send(json.dumps({"type": "state", "ts": time.time(), "payload": conductor.get_state()}))
+                    sess.offer("state", state_message())
+                elif t == "getUpcoming":
+                    bars = (obj.get("payload") or {}).get("bars", upcoming_bars)
+                    try:
+                        bars = int(bars)
+                    except (TypeError, ValueError):
+                        sess.send(json.dumps({"type": "error", "ts": time.time(), "id": req_id, "payload": {"ok": False, "error": "invalid_bars"}}))
+                    else:
+                        # Built off the loop; requests read after it may be answered first
+                        asyncio.ensure_future(send_upcoming(sess, bars, req_id))
+                elif t == "undo" or t == "redo" or t == "checkout":
+                    payload = obj.get("payload") or {}
+                    apply_now = bool(payload.get("applyNow", False))
+                    when = dict(quantize=payload.get("quantize"), origin=(sess, req_id))
+                    if t == "checkout":
+                        try:
+                            res = conductor.checkout(int(payload.get("version")), apply_now=apply_now, **when)
+                        except (TypeError, ValueError):
+                            res = {"ok": False, "error": "invalid_version"}
+                    else:
+                        res = conductor.undo(apply_now, **when) if t == "undo" else conductor.redo(apply_now, **when)
+                    if res.get("ok"):
+                        sync_doc(sess, force_full=not sess.deltas)
+                    sess.send(json.dumps({"type": "ack" if res.get("ok") else "error", "ts": time.time(), "id": req_id, "payload": res}))
+                elif t == "getHistory":
+                    with conductor._lock:
+                        hist = conductor.history.stats()
+                    sess.send(json.dumps({"type": "history", "ts": time.time(), "id": req_id, "payload": hist}))
                 elif t == "getDoc":
-                    await ws.send(json.dumps({"type": "doc", "ts": time.time(), "id": req_id, "payload": conductor.get_doc()}))
+                    sync_doc(sess, force_full=True, req_id=req_id)
                 elif t == "replaceJSON":
                     payload = obj.get("payload", {})
-                    base = int(payload.get("baseVersion", -1))
+                    base, err = request_base(sess, payload)
                     new_doc = payload.get("doc")
                     apply_now = bool(payload.get("applyNow", False))
-                    if isinstance(new_doc, dict):
-                        # Determine structural by comparing key fields
-                        res = conductor._schedule_or_apply(base, new_doc, structural=True, apply_now=apply_now)
-                        await ws.send(json.dumps({"type": "doc", "ts": time.time(), "payload": conductor.get_doc()}))
-                        await ws.send(json.dumps({"type": "error", "ts": time.time(), "id": req_id, "payload": res}) if not res.get("ok") else json.dumps({"type": "ack", "ts": time.time(), "id": req_id, "payload": res}))
+                    if err is not None:
+                        send_result(sess, req_id, err)
+                    elif isinstance(new_doc, dict):
+                        res = conductor.do_replace_diff(base, new_doc, apply_now=apply_now, quantize=payload.get("quantize"), origin=(sess, req_id), rebase=payload.get("rebase", True) is not False)
+                        send_result(sess, req_id, res, resync=True)
+                elif t == "applyBatch":
+                    # {"patches": [[ops], ...], "versions": "one" | "each"}: one atomic edit, one ack
+                    try:
+                        payload = obj.get("payload") or {}
+                        base, err = request_base(sess, payload)
+                        if err is None:
+                            res = conductor.do_apply_batch(base, payload.get("patches"), versions=payload.get("versions", "one"), apply_now=bool(payload.get("applyNow", False)), quantize=payload.get("quantize"), origin=(sess, req_id), rebase=payload.get("rebase", True) is not False)
+                        else:
+                            res = err
+                        if not res.get("ok"):
+                            print(f"[ws] applyBatch failed: {res.get('error')} (docVersion={conductor.doc_version})", flush=True)
+                        send_result(sess, req_id, res)
+                    except Exception as e:
+                        send_result(sess, req_id, {"ok": False, "error": "exception", "details": str(e)})
+                elif t == "edit":
+                    # {"commands": [{"cmd": "transpose", "track": "t1", "semitones": 2}, ...]}
+                    payload = obj.get("payload") or {}
+                    res = conductor.do_edit(payload.get("commands"), apply_now=bool(payload.get("applyNow", False)), quantize=payload.get("quantize"), origin=(sess, req_id))
+                    send_result(sess, req_id, res)
+                elif t == "overlay":
+                    # {"mute": {"Bass": true}, "cc": [{"track": "Bass", "control": "cutoff", "value": 90, "ramp": {"beats": 2}}], ...}
+                    res = conductor.do_overlay(obj.get("payload") or {})
+                    sess.send(json.dumps({"type": "ack" if res.get("ok") else "error", "ts": time.time(), "id": req_id, "payload": res}))
                 elif t == "applyPatch":
                     try:
                         payload = obj.get("payload", {})
-                        base = int(payload.get("baseVersion", -1))
+                        base, err = request_base(sess, payload)
                         ops = payload.get("ops")
                         apply_now = bool(payload.get("applyNow", False))
                         print(f"[ws] applyPatch base={base} ops={ops} apply_now={apply_now}")
-                        if not isinstance(ops, list):
-                            await ws.send(json.dumps({"type": "error", "ts": time.time(), "id": req_id, "payload": {"ok": False, "error": "invalid_ops"}}))
+                        if err is not None:
+                            send_result(sess, req_id, err)
+                        elif not isinstance(ops, list):
+                            send_result(sess, req_id, {"ok": False, "error": "invalid_ops"})
                         else:
                             with conductor._lock:
                                 if base != conductor.doc_version:
                                     print(f"[ws] stale patch: client={base} server={conductor.doc_version}")
-                                    await ws.send(json.dumps({"type": "error", "ts": time.time(), "id": req_id, "payload": {"ok": False, "error": "stale", "expected": conductor.doc_version}}))
-                                else:
-                                    try:
-                                        patched = apply_json_patch(conductor.doc, ops)
-                                    except Exception as e:
-                                        print(f"[ws] patch_apply error: {e}")
-                                        await ws.send(json.dumps({"type": "error", "ts": time.time(), "id": req_id, "payload": {"ok": False, "error": "patch_apply", "details": str(e)}}))
-                                        patched = None
-                                    if isinstance(patched, dict):
-                                        structural = conductor._is_structural_ops(ops)
-                                        print(f"[ws] structural={structural}")
-                                        res = conductor._schedule_or_apply(conductor.doc_version, patched, structural=structural, apply_now=apply_now)
-                                        print(f"[ws] apply result: {res}")
-                                        if res.get("ok"):
-                                            print(f"[ws] patch applied ok; new docVersion={conductor.doc_version}")
-                                            await ws.send(json.dumps({"type": "doc", "ts": time.time(), "payload": conductor.get_doc()}))
-                                            await ws.send(json.dumps({"type": "ack", "ts": time.time(), "id": req_id, "payload": res}))
-                                        else:
-                                            print(f"[ws] patch error response: {res}")
-                                            await ws.send(json.dumps({"type": "error", "ts": time.time(), "id": req_id, "payload": res}))
+                                res = conductor.do_apply_patch(base, ops, apply_now=apply_now, quantize=payload.get("quantize"), origin=(sess, req_id), rebase=payload.get("rebase", True) is not False)
+                            print(f"[ws] apply result: {res}")
+                            if res.get("ok"):
+                                print(f"[ws] patch applied ok; new docVersion={conductor.doc_version}")
+                            else:
+                                print(f"[ws] patch error response: {res}")
+                            send_result(sess, req_id, res)
                     except Exception as e:
                         import traceback
                         traceback.print_exc()
                         try:
-                            await ws.send(json.dumps({"type": "error", "ts": time.time(), "id": req_id, "payload": {"ok": False, "error": "exception", "details": str(e)}}))
+                            sess.send(json.dumps({"type": "error", "ts": time.time(), "id": req_id, "payload": {"ok": False, "error": "exception", "details": str(e)}}))
                         except Exception:
                             pass
-                # broadcast updated state after commands (except explicit getState which already responded)
-                if t != "getState":
-                    await ws.send(json.dumps({"type": "state", "ts": time.time(), "payload": conductor.get_state()}))
+                # send updated state after commands (except explicit getState which already responded)
+                if t != "getState" and sess.wants("state"):
+                    sess.offer("state", state_message())
+                if conductor.tracer is not None:
+                    conductor.tracer.add(f"ws:{t}", "ws", t_msg, time.perf_counter(), {"id": req_id})
+                if sess.evicted is not None:
+                    evict(sess)
+                    break
         finally:
-            clients.discard(ws)
+            writer.cancel()
+            clients.pop(ws, None)
 
     async def main():
-        async with websockets.serve(handler, host, port):
-            print(f"[ws] Conductor listening on ws://{host}:{port}", flush=True)
-            asyncio.create_task(metrics_task())
-            await asyncio.Future()
+        loop = asyncio.get_running_loop()
+        # Transport changes arrive on clock/MIDI-in threads; hop onto the loop
+        conductor.on_transport = lambda reason: loop.call_soon_threadsafe(push_anchor, reason)
+        # External file edits are adopted on the watcher thread; push them right away
+        conductor.on_file_reload = lambda: loop.call_soon_threadsafe(sync_doc_subscribers)
+        # Queued edits fire on the clock thread
+        conductor.on_pending_result = lambda entry, res: loop.call_soon_threadsafe(report_pending, entry, res)
+        try:
+            conductor.start_watch()
+        except Exception as e:
+            print(f"[ws] file watch disabled: {e}", flush=True)
+        try:
+            async with websockets.serve(handler, host, port):
+                print(f"[ws] Conductor listening on ws://{host}:{port}", flush=True)
+                asyncio.create_task(publish_task())
+                await asyncio.Future()
+        finally:
+            conductor.on_transport = None
+            conductor.on_file_reload = None
+            conductor.on_pending_result = None
+            conductor.stop_watch()
 
     await main()
 
@@ -618,21 +1636,57 @@ def main():
     ap.add_argument("--ws-host", default="127.0.0.1")
     ap.add_argument("--ws-port", type=int, default=8765)
     ap.add_argument("--http-port", type=int, default=8080)
+    ap.add_argument("--instrument", action="store_true", help="Record per-tick phase timings into engine metrics")
+    ap.add_argument("--tick-budget", type=float, default=0.5, help="Shed CC load when a tick exceeds this fraction of its deadline (0 disables)")
+    ap.add_argument("--persist-delay", type=float, default=0.25, metavar="SECONDS", help="Coalesce loop.json saves until edits pause this long (0 writes every version)")
+    ap.add_argument("--journal", action="store_true", help="Append accepted patches to <loop>.journal.ndjson and rewrite loop.json only on compaction/shutdown")
+    ap.add_argument("--compact-every", type=int, default=500, metavar="N", help="Compact the journal into loop.json after N entries (with --journal)")
+    ap.add_argument("--history", type=int, default=64, metavar="N", help="Keep the last N doc versions for undo/redo/checkout")
+    ap.add_argument("--trace", type=int, default=0, metavar="SPANS", help="Record up to SPANS trace spans in a ring buffer (0 disables); dump with SIGUSR1 or WS dumpTrace")
+    ap.add_argument("--rebase-window", type=int, default=32, metavar="N", help="Rebase patches up to N versions behind onto the current doc instead of rejecting them as stale (0 disables)")
+    ap.add_argument("--watch", choices=["auto", "inotify", "poll", "off"], default="auto", help="How to notice external edits to the loop file (auto: inotify on Linux, else polling)")
     args = ap.parse_args()
 
-    conductor = Conductor(args.loop, args.port, args.bpm, clock_source=args.clock_source)
+    conductor = Conductor(
+        args.loop,
+        args.port,
+        args.bpm,
+        clock_source=args.clock_source,
+        instrument=args.instrument,
+        tick_budget_fraction=(args.tick_budget if args.tick_budget > 0 else None),
+        trace_capacity=args.trace,
+        persist_delay_s=args.persist_delay,
+        journal=args.journal,
+        compact_every=args.compact_every,
+        history_size=args.history,
+        watch=args.watch,
+        rebase_window=args.rebase_window,
+    )
 
     def shutdown(*_):
         try:
             conductor.do_stop()
         except Exception:
             pass
+        # Pending write-behind save must land before os._exit
+        try:
+            conductor.close()
+        except Exception as e:
+            print(f"[ws] final save failed: {e}", flush=True)
         print("[ws] shutting down")
         os._exit(0)
 
     signal.signal(signal.SIGINT, shutdown)
     signal.signal(signal.SIGTERM, shutdown)
 
+    if conductor.tracer is not None and hasattr(signal, "SIGUSR1"):
+        def dump_trace(*_):
+            try:
+                print(f"[trace] wrote {conductor.dump_trace()}", flush=True)
+            except Exception as e:
+                print(f"[trace] dump failed: {e}", flush=True)
+        signal.signal(signal.SIGUSR1, dump_trace)
+
     # Serve static UI in-process on 127.0.0.1
     def start_http_server():
         import http.server, socketserver
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+_EVENT = struct.Struct("iIII")
+
+WATCH_MODES = ("auto", "inotify", "poll", "off")
+
+
+class _Inotify:
+    """Minimal inotify binding over libc (Linux only)."""
+
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add = libc.inotify_add_watch
+        self._add.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._add.restype = ctypes.c_int
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.fd = fd
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._add(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read(self):
+        """(wd, mask, name) for each queued event."""
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        off = 0
+        while off + _EVENT.size <= len(buf):
+            wd, mask, _cookie, length = _EVENT.unpack_from(buf, off)
+            off += _EVENT.size
+            name = buf[off:off + length].rstrip(b"\0")
+            off += length
+            yield wd, mask, os.fsdecode(name)
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+def inotify_available() -> bool:
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        _Inotify().close()
+        return True
+    except Exception:
+        return False
+
+
+class FileWatcher:
+    """Calls on_change(path) from a daemon thread after the file changes.
+
+    With inotify the file's directory is watched, so editors that save by
+    writing a temp file and renaming it over the original (or by renaming
+    the original away first) are seen; the burst of events one save makes
+    is debounced into a single call once `debounce_s` passes without
+    another. Without inotify (or with mode="poll") the file's (mtime,
+    size, inode) is polled every `poll_s`. The callback runs on the watcher
+    thread and may be slow; changes arriving meanwhile are coalesced.
+    """
+
+    def __init__(self, path: str, on_change: Callable[[str], None], mode: str = "auto", debounce_s: float = 0.05, poll_s: float = 0.5) -> None:
+        if mode not in WATCH_MODES or mode == "off":
+            raise ValueError(f"unsupported watch mode: {mode}")
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.debounce_s = max(0.0, float(debounce_s))
+        self.poll_s = max(0.01, float(poll_s))
+        self._inotify: Optional[_Inotify] = None
+        if mode in ("auto", "inotify"):
+            try:
+                self._inotify = _Inotify()
+                self._inotify.add_watch(os.path.dirname(self.path) or ".", _WATCH_MASK)
+            except Exception as e:
+                if self._inotify is not None:
+                    self._inotify.close()
+                    self._inotify = None
+                if mode == "inotify":
+                    raise
+                print(f"[ws] inotify unavailable ({e}); polling {self.path}", flush=True)
+        self.mode = "inotify" if self._inotify is not None else "poll"
+        self._stop = threading.Event()
+        # Baseline for polling, taken now so changes right after start() count
+        self._last_sig = self._signature()
+        self.events = 0
+        self.changes = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._thread = threading.Thread(target=self._run, name="file-watch", daemon=True)
+
+    def start(self) -> "FileWatcher":
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 1.0) -> None:
+        self._stop.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        if self._inotify is not None:
+            self._inotify.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "events": self.events, "changes": self.changes, "errors": self.errors, "lastError": self.last_error}
+
+    def _fire(self) -> None:
+        self.changes += 1
+        try:
+            self.on_change(self.path)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+
+    def _run(self) -> None:
+        if self._inotify is not None:
+            self._run_inotify()
+        else:
+            self._run_poll()
+
+    def _run_inotify(self) -> None:
+        ino = self._inotify
+        assert ino is not None
+        name = os.path.basename(self.path)
+        due: Optional[float] = None
+        while not self._stop.is_set():
+            timeout = 0.25 if due is None else max(0.0, due - time.monotonic())
+            try:
+                ready, _, _ = select.select([ino.fd], [], [], timeout)
+            except (OSError, ValueError):
+                if self._stop.is_set():
+                    return
+                raise
+            if ready:
+                for _wd, mask, ev_name in ino.read():
+                    if mask & IN_Q_OVERFLOW or ev_name == name:
+                        self.events += 1
+                        due = time.monotonic() + self.debounce_s
+                    elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                        # The directory itself went away; fall back to polling
+                        self.mode = "poll"
+                        ino.close()
+                        self._inotify = None
+                        self._last_sig = self._signature()
+                        self._run_poll()
+                        return
+            elif due is not None and time.monotonic() >= due:
+                due = None
+                if os.path.exists(self.path):
+                    self._fire()
+
+    def _signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _run_poll(self) -> None:
+        while not self._stop.wait(self.poll_s):
+            if self._signature() == self._last_sig:
+                continue
+            self.events += 1
+            # Let a save in progress settle before reading it
+            if self.debounce_s and self._stop.wait(self.debounce_s):
+                return
+            self._last_sig = self._signature()
+            if self._last_sig is not None:
+                self._fire()
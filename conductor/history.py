@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+def share_unchanged(prev: Any, new: Any) -> Any:
+    """Return new with every subtree equal to prev's swapped for prev's object.
+
+    Docs are never mutated once installed, so consecutive versions can share
+    untouched tracks, lanes and steps instead of each holding a deep copy.
+    Dicts in lists are matched by "id" when both sides have one (tracks,
+    lanes), otherwise by position. Equality is type-strict (1 is not True).
+    """
+    return _share(prev, new)[0]
+
+
+def _share(prev: Any, new: Any) -> Tuple[Any, bool]:
+    if prev is new:
+        return new, True
+    if isinstance(new, dict):
+        if not isinstance(prev, dict):
+            return new, False
+        same = len(prev) == len(new)
+        for k, v in new.items():
+            if k not in prev:
+                same = False
+                continue
+            nv, s = _share(prev[k], v)
+            new[k] = nv
+            same = same and s
+        return (prev, True) if same else (new, False)
+    if isinstance(new, list):
+        if not isinstance(prev, list):
+            return new, False
+        same = len(prev) == len(new)
+        by_id = {p["id"]: p for p in prev if isinstance(p, dict) and "id" in p}
+        for i, v in enumerate(new):
+            if isinstance(v, dict) and "id" in v:
+                pv = by_id.get(v["id"])
+                same = same and pv is prev[i]
+            else:
+                pv = prev[i] if i < len(prev) else None
+            if pv is None:
+                same = False
+                continue
+            nv, s = _share(pv, v)
+            new[i] = nv
+            same = same and s
+        return (prev, True) if same else (new, False)
+    return new, type(prev) is type(new) and prev == new
+
+
+class DocHistory:
+    """Bounded linear history of doc versions with an undo/redo cursor.
+
+    record() appends an edited version and drops anything that was undone;
+    restored() notes that a new docVersion re-installed an older entry's
+    content and moves the cursor there, so undo/redo walk the timeline while
+    docVersion keeps increasing. Stored docs must not be mutated.
+    """
+
+    def __init__(self, capacity: int = 64) -> None:
+        self.capacity = max(1, int(capacity))
+        self._entries: Deque[Tuple[int, Dict[str, Any]]] = deque()
+        self._cursor: int = -1
+        # docVersions created by undo/redo/checkout -> timeline version they restored
+        self._alias: Dict[int, int] = {}
+
+    def record(self, version: int, doc: Dict[str, Any]) -> None:
+        while len(self._entries) > self._cursor + 1:
+            self._entries.pop()
+        self._entries.append((version, doc))
+        while len(self._entries) > self.capacity:
+            self._entries.popleft()
+        self._cursor = len(self._entries) - 1
+        self._prune_aliases()
+
+    def restored(self, version: int, target: int) -> None:
+        idx = self._index(target)
+        if idx is None:
+            return
+        self._cursor = idx
+        self._alias[version] = self._entries[idx][0]
+
+    def _index(self, version: int) -> Optional[int]:
+        version = self._alias.get(version, version)
+        for i, (v, _doc) in enumerate(self._entries):
+            if v == version:
+                return i
+        return None
+
+    def _prune_aliases(self) -> None:
+        live = {v for v, _doc in self._entries}
+        for k in [k for k, v in self._alias.items() if v not in live]:
+            del self._alias[k]
+
+    def get(self, version: int) -> Optional[Dict[str, Any]]:
+        idx = self._index(version)
+        return self._entries[idx][1] if idx is not None else None
+
+    def undo_target(self, from_version: Optional[int] = None) -> Optional[int]:
+        """Timeline version one step before from_version (default: the cursor)."""
+        idx = self._cursor if from_version is None else self._index(from_version)
+        if idx is None or idx <= 0:
+            return None
+        return self._entries[idx - 1][0]
+
+    def redo_target(self, from_version: Optional[int] = None) -> Optional[int]:
+        idx = self._cursor if from_version is None else self._index(from_version)
+        if idx is None or idx + 1 >= len(self._entries):
+            return None
+        return self._entries[idx + 1][0]
+
+    def versions(self) -> List[int]:
+        return [v for v, _doc in self._entries]
+
+    def stats(self) -> Dict[str, Any]:
+        current = self._entries[self._cursor][0] if self._cursor >= 0 else None
+        return {
+            "versions": self.versions(),
+            "current": current,
+            "canUndo": self.undo_target() is not None,
+            "canRedo": self.redo_target() is not None,
+            "capacity": self.capacity,
+        }
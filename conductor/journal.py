@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import copy
+import json
+import os
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from conductor.patch_utils import apply_patch_in_place
+
+
+def journal_path_for(loop_path: str) -> str:
+    return loop_path + ".journal.ndjson"
+
+
+class PatchJournal:
+    """Append-only NDJSON log of accepted patches next to the loop file.
+
+    One line per version: {"docVersion": N, "ops": [...], "sha": "<sha256>"},
+    where ops take version N-1 to N and sha is the SHA-256 of version N's
+    canonical bytes. The loop file is the base; entries at or below its
+    docVersion are already folded in. Compaction (rewrite the base, then
+    truncate()) is the owner's job.
+    """
+
+    def __init__(self, path: str, fsync: bool = True) -> None:
+        self.path = path
+        self.fsync = fsync
+        self.entries: int = 0
+        self.bytes: int = 0
+        self.appends: int = 0
+        self.compactions: int = 0
+        self._fh = None
+
+    def _open(self):
+        if self._fh is None:
+            self._fh = open(self.path, "a", encoding="utf-8")
+        return self._fh
+
+    def append(self, version: int, ops: List[Dict[str, Any]], sha: str) -> None:
+        self.append_many([(version, ops, sha)])
+
+    def append_many(self, records: List[tuple]) -> None:
+        """Append (version, ops, sha) records with a single flush and fsync."""
+        data = "".join(json.dumps({"docVersion": v, "ops": ops, "sha": sha}, ensure_ascii=False, separators=(",", ":")) + "\n" for v, ops, sha in records)
+        fh = self._open()
+        fh.write(data)
+        fh.flush()
+        if self.fsync:
+            os.fsync(fh.fileno())
+        self.entries += len(records)
+        self.appends += len(records)
+        self.bytes += len(data.encode("utf-8"))
+
+    def replay(self, base: Dict[str, Any], sha_of: Callable[[Dict[str, Any]], str]) -> Tuple[Dict[str, Any], int]:
+        """Apply logged patches on top of base; returns (doc, entries applied).
+
+        Patches go onto one private copy and only the final SHA is checked.
+        On a mismatch (or a gap, or ops that no longer apply) every entry is
+        verified to find the last good version. The log is then rewritten
+        to hold exactly the entries that were applied.
+        """
+        records, torn = self._read()
+        version = int(base.get("docVersion", 0))
+        pending = [r for r in records if r[0] > version]
+        doc, applied = self._apply(base, version, pending)
+        if applied and sha_of(doc) != pending[applied - 1][2]:
+            good = self._last_verified(base, version, pending[:applied], sha_of)
+            doc, applied = self._apply(base, version, pending[:good])
+        if torn or applied != len(records):
+            self._rewrite(pending[:applied])
+        self.entries = applied
+        return doc, applied
+
+    @staticmethod
+    def _apply(base: Dict[str, Any], version: int, pending: List[tuple]) -> Tuple[Dict[str, Any], int]:
+        if not pending:
+            return base, 0
+        doc = copy.deepcopy(base)
+        applied = 0
+        for v, ops, _sha in pending:
+            if v != version + 1:
+                break
+            try:
+                doc = apply_patch_in_place(doc, ops)
+            except Exception:
+                # The copy may be half-patched; replay up to the last clean entry
+                return PatchJournal._apply(base, int(base.get("docVersion", 0)), pending[:applied])[0], applied
+            version = v
+            applied += 1
+        return doc, applied
+
+    @staticmethod
+    def _last_verified(base: Dict[str, Any], version: int, pending: List[tuple], sha_of: Callable[[Dict[str, Any]], str]) -> int:
+        doc = copy.deepcopy(base)
+        good = 0
+        for v, ops, sha in pending:
+            doc = apply_patch_in_place(doc, ops)
+            if sha_of(doc) != sha:
+                break
+            good += 1
+        return good
+
+    def _read(self) -> Tuple[List[tuple], bool]:
+        out: List[tuple] = []
+        torn = False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                        out.append((int(rec["docVersion"]), list(rec["ops"]), str(rec["sha"])))
+                    except Exception:
+                        # Torn final write after a crash; nothing after it is trustworthy
+                        torn = True
+                        break
+        except FileNotFoundError:
+            pass
+        return out, torn
+
+    def _rewrite(self, records: List[tuple]) -> None:
+        self.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for v, ops, sha in records:
+                f.write(json.dumps({"docVersion": v, "ops": ops, "sha": sha}, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp, self.path)
+        self.bytes = os.path.getsize(self.path)
+
+    def truncate(self) -> None:
+        """Drop all entries; call after the loop file holds the latest version."""
+        self.close()
+        with open(self.path, "w", encoding="utf-8"):
+            pass
+        self.entries = 0
+        self.bytes = 0
+        self.compactions += 1
+
+    def close(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            finally:
+                self._fh = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": os.path.abspath(self.path),
+            "entries": self.entries,
+            "bytes": self.bytes,
+            "appends": self.appends,
+            "compactions": self.compactions,
+        }
+
+
+
+class JournalWriter:
+    """Background thread doing a PatchJournal's appends and compactions, in order.
+
+    append() and compact() only queue and return, so the conductor never
+    waits on fsync or on rewriting the loop file while holding its lock,
+    and the clock thread applying a quantized edit never waits at all.
+    Appends that queue up while a write is in progress share one fsync
+    (group commit); a compaction supersedes the appends queued before it.
+    Entry SHAs are computed here too, from the docs appends are queued with.
+    wait() blocks until everything queued is on disk.
+    """
+
+    def __init__(self, journal: PatchJournal, write_base: Callable[[int, Dict[str, Any]], None], sha_of: Callable[[Dict[str, Any]], str]) -> None:
+        self.journal = journal
+        self._write_base = write_base
+        self._sha_of = sha_of
+        # Entries logged since the last queued compaction (including queued ones)
+        self.entries: int = journal.entries
+        self._cond = threading.Condition()
+        self._queue: Deque[tuple] = deque()
+        self._busy = False
+        self._stopped = False
+        self.batches: int = 0
+        self.errors: int = 0
+        self.last_error: Optional[str] = None
+        self._thread = threading.Thread(target=self._run, name="journal", daemon=True)
+        self._thread.start()
+
+    def append(self, version: int, ops: List[Dict[str, Any]], doc: Dict[str, Any]) -> None:
+        """Queue ops taking version - 1 to doc (version; never mutated afterwards)."""
+        with self._cond:
+            self._queue.append(("append", version, ops, doc))
+            self.entries += 1
+            self._cond.notify_all()
+
+    def compact(self, version: int, doc: Dict[str, Any]) -> None:
+        """Queue a rewrite of the loop file at version, then an empty journal."""
+        with self._cond:
+            self._queue.append(("compact", version, doc))
+            self.entries = 0
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                batch = list(self._queue)
+                self._queue.clear()
+                self._busy = True
+            try:
+                self._write(batch)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                print(f"[ws] journal write failed: {e}", flush=True)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _write(self, batch: List[tuple]) -> None:
+        last = max((i for i, item in enumerate(batch) if item[0] == "compact"), default=-1)
+        if last >= 0:
+            _kind, version, doc = batch[last]
+            self._write_base(version, doc)
+            self.journal.truncate()
+        records = [(version, ops, self._sha_of(doc)) for _kind, version, ops, doc in batch[last + 1:]]
+        if records:
+            self.journal.append_many(records)
+        self.batches += 1
+
+    def wait(self) -> None:
+        """Block until every queued append and compaction has been written."""
+        with self._cond:
+            while self._queue or self._busy:
+                self._cond.wait()
+
+    def close(self) -> None:
+        self.wait()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout=2.0)
+        self.journal.close()
+
+    def stats(self) -> Dict[str, Any]:
+        out = self.journal.stats()
+        with self._cond:
+            out["queued"] = len(self._queue)
+        out["batches"] = self.batches
+        out["errors"] = self.errors
+        out["lastError"] = self.last_error
+        return out
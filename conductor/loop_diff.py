@@ -0,0 +1,147 @@
+"""Structural diff between two loop docs as RFC 6902 patch ops.
+
+diff_loops(old, new) returns ops that turn old into new, matching tracks,
+ccLanes and lfos by "id" and pattern steps by "idx", so an edit to one step
+comes out as one op at that step's path and not as a rewrite of the list.
+Other lists are compared by position. Equality is type-strict: 1, 1.0 and
+True are different values.
+
+is_structural_ops(ops) decides whether ops must wait for the next bar while
+playing; it holds the rules the conductor applies to client patches.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from conductor.patch_utils import json_equal
+
+
+# List key per container shape ("*" is a list index)
+_LIST_KEYS: Dict[Tuple[str, ...], str] = {
+    ("tracks",): "id",
+    ("tracks", "*", "pattern", "steps"): "idx",
+    ("tracks", "*", "ccLanes"): "id",
+    ("tracks", "*", "lfos"): "id",
+}
+
+_STRUCTURAL_PREFIXES = ("/meta/", "/deviceProfile")
+_TRACK_STRUCTURAL_SUFFIXES = (
+    "/id",
+    "/name",
+    "/type",
+    "/midiChannel",
+    "/role",
+    "/pattern/lengthBars",
+    "/drumKit",
+)
+
+
+def is_structural_ops(ops: List[Dict[str, Any]]) -> bool:
+    """Whether ops change timing, routing or device setup (applied on a bar boundary)."""
+    for op in ops:
+        p = str(op.get("path", ""))
+        if any(p.startswith(pref) for pref in _STRUCTURAL_PREFIXES):
+            return True
+        if p.startswith("/tracks/"):
+            parts = p.split("/")
+            if len(parts) >= 4:
+                suffix = "/" + "/".join(parts[3:])
+                if any(suffix.startswith(s) for s in _TRACK_STRUCTURAL_SUFFIXES):
+                    return True
+    return False
+
+
+def diff_loops(old: Dict[str, Any], new: Dict[str, Any], ignore: Iterable[str] = ()) -> List[Dict[str, Any]]:
+    """Patch ops turning old into new; top-level keys in `ignore` are left out.
+
+    Op values are new's own objects, not copies.
+    """
+    ops: List[Dict[str, Any]] = []
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return [{"op": "replace", "path": "", "value": new}]
+    skip = set(ignore)
+    _diff_dict({k: v for k, v in old.items() if k not in skip}, {k: v for k, v in new.items() if k not in skip}, "", (), ops)
+    return ops
+
+
+def _escape(key: str) -> str:
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def _diff(old: Any, new: Any, path: str, shape: Tuple[str, ...], ops: List[Dict[str, Any]]) -> None:
+    if json_equal(old, new):
+        return
+    if type(old) is not type(new) or not isinstance(new, (dict, list)):
+        ops.append({"op": "replace", "path": path, "value": new})
+    elif isinstance(new, dict):
+        _diff_dict(old, new, path, shape, ops)
+    else:
+        key = _LIST_KEYS.get(shape)
+        if key is None or not _diff_keyed(old, new, key, path, shape + ("*",), ops):
+            _diff_positional(old, new, path, shape + ("*",), ops)
+
+
+def _diff_dict(old: Dict[str, Any], new: Dict[str, Any], path: str, shape: Tuple[str, ...], ops: List[Dict[str, Any]]) -> None:
+    for k in old:
+        if k not in new:
+            ops.append({"op": "remove", "path": f"{path}/{_escape(k)}"})
+    for k, v in new.items():
+        p = f"{path}/{_escape(k)}"
+        if k in old:
+            _diff(old[k], v, p, shape + (k,), ops)
+        else:
+            ops.append({"op": "add", "path": p, "value": v})
+
+
+def _keys(items: List[Any], key: str) -> Optional[List[Tuple[type, Any]]]:
+    """Each item's (type, key) when all items are dicts with distinct hashable keys."""
+    out: List[Tuple[type, Any]] = []
+    for it in items:
+        if not isinstance(it, dict) or key not in it:
+            return None
+        k = it[key]
+        try:
+            out.append((type(k), k))
+            hash(k)
+        except TypeError:
+            return None
+    return out if len(set(out)) == len(out) else None
+
+
+def _diff_keyed(old: List[Any], new: List[Any], key: str, path: str, shape: Tuple[str, ...], ops: List[Dict[str, Any]]) -> bool:
+    """Diff lists of keyed dicts; False (nothing emitted) if the keys don't allow it."""
+    old_keys = _keys(old, key)
+    new_keys = _keys(new, key) if old_keys is not None else None
+    if old_keys is None or new_keys is None:
+        return False
+    new_set = set(new_keys)
+    old_at = {k: i for i, k in enumerate(old_keys)}
+    # Removals, from the back so earlier indices stay valid
+    for i in range(len(old_keys) - 1, -1, -1):
+        if old_keys[i] not in new_set:
+            ops.append({"op": "remove", "path": f"{path}/{i}"})
+    # Bring surviving items into new's relative order
+    work = [k for k in old_keys if k in new_set]
+    target = [k for k in new_keys if k in old_at]
+    for j, k in enumerate(target):
+        if work[j] != k:
+            i = work.index(k, j + 1)
+            ops.append({"op": "move", "from": f"{path}/{i}", "path": f"{path}/{j}"})
+            work.insert(j, work.pop(i))
+    # Insert new items in place; diff the surviving ones where they now sit
+    for j, k in enumerate(new_keys):
+        if k in old_at:
+            _diff(old[old_at[k]], new[j], f"{path}/{j}", shape, ops)
+        else:
+            ops.append({"op": "add", "path": f"{path}/{j}", "value": new[j]})
+    return True
+
+
+def _diff_positional(old: List[Any], new: List[Any], path: str, shape: Tuple[str, ...], ops: List[Dict[str, Any]]) -> None:
+    for i in range(min(len(old), len(new))):
+        _diff(old[i], new[i], f"{path}/{i}", shape, ops)
+    for i in range(len(old) - 1, len(new) - 1, -1):
+        ops.append({"op": "remove", "path": f"{path}/{i}"})
+    for i in range(len(old), len(new)):
+        ops.append({"op": "add", "path": f"{path}/{i}", "value": new[i]})
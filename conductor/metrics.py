@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+
+# Bucket upper bounds (inclusive). Values above the last bound land in the
+# overflow bucket, so counts always has len(bounds) + 1 entries.
+PHASE_BOUNDS_US: Sequence[float] = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+EVENT_BOUNDS: Sequence[float] = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+TICK_PHASES = ("offs", "ons", "drumKit", "cc")
+
+
+class FixedHistogram:
+    """Histogram with fixed, pre-sorted bucket bounds.
+
+    observe() is a bisect plus a few integer adds, cheap enough for the tick
+    hot path. snapshot() returns plain lists suitable for JSON.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds: Iterable[float]) -> None:
+        self.bounds: List[float] = sorted(float(b) for b in bounds)
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.count: int = 0
+        self.total: float = 0.0
+        self.max: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def reset(self) -> None:
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "bounds": list(self.bounds),
+            "counts": list(self.counts),
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+        }
+
+
+class TickStats:
+    """Per-tick phase timings and event counts for Engine.on_tick.
+
+    Phase times are recorded in microseconds; events examined/emitted are
+    per-tick counts (emitted = MIDI messages handed to the sink).
+    """
+
+    def __init__(self) -> None:
+        self.phases: Dict[str, FixedHistogram] = {p: FixedHistogram(PHASE_BOUNDS_US) for p in TICK_PHASES}
+        self.total = FixedHistogram(PHASE_BOUNDS_US)
+        self.examined = FixedHistogram(EVENT_BOUNDS)
+        self.emitted = FixedHistogram(EVENT_BOUNDS)
+        self.ticks: int = 0
+
+    def record(self, phase_s: Dict[str, float], examined: int, emitted: int) -> None:
+        total_us = 0.0
+        for name, secs in phase_s.items():
+            us = secs * 1e6
+            total_us += us
+            self.phases[name].observe(us)
+        self.total.observe(total_us)
+        self.examined.observe(examined)
+        self.emitted.observe(emitted)
+        self.ticks += 1
+
+    def reset(self) -> None:
+        for h in self.phases.values():
+            h.reset()
+        self.total.reset()
+        self.examined.reset()
+        self.emitted.reset()
+        self.ticks = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "ticks": self.ticks,
+            "phaseUs": {name: h.snapshot() for name, h in self.phases.items()},
+            "totalUs": self.total.snapshot(),
+            "eventsExamined": self.examined.snapshot(),
+            "eventsEmitted": self.emitted.snapshot(),
+        }
+
+
+# --- Log-bucketed streaming histogram (HDR-style) ---
+#
+# Integer values v < 2**_LOG_SUB_BITS get one bucket each; above that every
+# power-of-two range is split into 2**(_LOG_SUB_BITS-1) linear sub-buckets,
+# bounding relative error to ~1/2**(_LOG_SUB_BITS-1). Values are clamped to
+# _LOG_MAX_VALUE (exact max is tracked separately).
+
+_LOG_SUB_BITS = 5
+_LOG_SUB = 1 << _LOG_SUB_BITS
+_LOG_HALF = _LOG_SUB >> 1
+_LOG_MAX_VALUE = (1 << 27) - 1  # ~134 s when recording microseconds
+_LOG_BUCKETS = _LOG_SUB + (_LOG_MAX_VALUE.bit_length() - _LOG_SUB_BITS) * _LOG_HALF
+
+QUANTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999))
+
+
+def _log_index(v: int) -> int:
+    if v < _LOG_SUB:
+        return v if v > 0 else 0
+    if v > _LOG_MAX_VALUE:
+        v = _LOG_MAX_VALUE
+    shift = v.bit_length() - _LOG_SUB_BITS
+    return _LOG_SUB + (shift - 1) * _LOG_HALF + ((v >> shift) - _LOG_HALF)
+
+
+def _log_bucket_mid(idx: int) -> float:
+    if idx < _LOG_SUB:
+        return float(idx)
+    k = idx - _LOG_SUB
+    shift = k // _LOG_HALF + 1
+    lo = (k % _LOG_HALF + _LOG_HALF) << shift
+    return lo + ((1 << shift) - 1) / 2.0
+
+
+def _quantiles_from_counts(counts: List[int], total: int, max_value: float) -> Dict[str, float]:
+    out = {name: 0.0 for name, _ in QUANTILES}
+    if total <= 0:
+        return out
+    targets = [(name, max(1, int(q * total + 0.5))) for name, q in QUANTILES]
+    ti = 0
+    seen = 0
+    for idx, c in enumerate(counts):
+        if not c:
+            continue
+        seen += c
+        while ti < len(targets) and seen >= targets[ti][1]:
+            # Never report beyond the exact observed max
+            out[targets[ti][0]] = min(_log_bucket_mid(idx), max_value)
+            ti += 1
+        if ti >= len(targets):
+            break
+    return out
+
+
+class LogHistogram:
+    """Constant-memory log-bucketed histogram over non-negative integers.
+
+    Single-writer: observe() mutates in place without locking; readers take
+    a list copy (atomic under the GIL) so they never block the writer.
+    """
+
+    __slots__ = ("counts", "count", "max")
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * _LOG_BUCKETS
+        self.count: int = 0
+        self.max: int = 0
+
+    def observe(self, v: int) -> None:
+        self.counts[_log_index(v)] += 1
+        self.count += 1
+        if v > self.max:
+            self.max = v
+
+
+class JitterSketch:
+    """Streaming jitter quantiles with lifetime and rolling-window views.
+
+    Samples are recorded in microseconds. The rolling window is a ring of
+    `slices` sub-histograms, each covering `slice_s` seconds; the writer
+    swaps in a fresh list when it moves to a new slice instead of zeroing in
+    place, so a concurrent reader sees either the old or the new slice.
+    observe_ms() is O(1) and lock-free; snapshot() is O(buckets).
+    """
+
+    def __init__(self, window_s: float = 10.0, slices: int = 10) -> None:
+        self.slices = max(1, int(slices))
+        self.slice_s = max(1e-3, float(window_s) / self.slices)
+        self.lifetime = LogHistogram()
+        self._ring: List[List[int]] = [[0] * _LOG_BUCKETS for _ in range(self.slices)]
+        self._ring_ids: List[int] = [-1] * self.slices
+        self._ring_max: List[int] = [0] * self.slices
+
+    def observe_ms(self, ms: float, now: float) -> None:
+        us = int(ms * 1000.0 + 0.5)
+        if us < 0:
+            us = 0
+        self.lifetime.observe(us)
+        sid = int(now / self.slice_s)
+        slot = sid % self.slices
+        if self._ring_ids[slot] != sid:
+            self._ring[slot] = [0] * _LOG_BUCKETS
+            self._ring_max[slot] = 0
+            self._ring_ids[slot] = sid
+        self._ring[slot][_log_index(us)] += 1
+        if us > self._ring_max[slot]:
+            self._ring_max[slot] = us
+
+    def _window(self, now: float) -> Tuple[List[int], int]:
+        oldest = int(now / self.slice_s) - self.slices + 1
+        merged = [0] * _LOG_BUCKETS
+        wmax = 0
+        for slot in range(self.slices):
+            if self._ring_ids[slot] < oldest:
+                continue
+            counts = list(self._ring[slot])
+            for i, c in enumerate(counts):
+                if c:
+                    merged[i] += c
+            if self._ring_max[slot] > wmax:
+                wmax = self._ring_max[slot]
+        return merged, wmax
+
+    @staticmethod
+    def _view(counts: List[int], max_us: int) -> Dict[str, Any]:
+        total = sum(counts)
+        qs = _quantiles_from_counts(counts, total, float(max_us))
+        out: Dict[str, Any] = {"count": total}
+        for name, v in qs.items():
+            out[name + "Ms"] = round(v / 1000.0, 3)
+        out["maxMs"] = round(max_us / 1000.0, 3)
+        return out
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        win_counts, win_max = self._window(now)
+        life_counts = list(self.lifetime.counts)
+        return {
+            "windowS": round(self.slice_s * self.slices, 3),
+            "window": self._view(win_counts, win_max),
+            "lifetime": self._view(life_counts, self.lifetime.max),
+        }
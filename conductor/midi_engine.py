@@ -1,8 +1,87 @@
 from __future__ import annotations
 
+from bisect import bisect_right
 from dataclasses import dataclass
-from typing import Any, Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
 import random
+import time
+
+from conductor.metrics import TickStats
+from conductor.patch_utils import touched_tracks
+from conductor.watchdog import TickWatchdog
+
+if TYPE_CHECKING:
+    from conductor.overlay import BoundOverlay, Overlay, TrackFx
+
+
+# OP-XY default drum mapping (lowercase keys)
+DEFAULT_DRUM_MAP: Dict[str, int] = {
+    "kick": 53,
+    "kick_alt": 54,
+    "snare": 55,
+    "snare_alt": 56,
+    "rim": 57,
+    "clap": 58,
+    "tambourine": 59,
+    "shaker": 60,
+    "closed_hat": 61,
+    "open_hat": 62,
+    "pedal_hat": 63,
+    "low_tom": 65,
+    "crash": 66,
+    "mid_tom": 67,
+    "ride": 68,
+    "high_tom": 69,
+    "conga_low": 71,
+    "conga_high": 72,
+    "cowbell": 73,
+    "guiro": 74,
+    "metal": 75,
+    "chi": 76,
+}
+
+# alias map to allow short keys in drumKit patterns
+DRUM_ALIASES: Dict[str, str] = {
+    "ch": "closed_hat",
+    "oh": "open_hat",
+    "hh": "closed_hat",
+    "lt": "low_tom",
+    "mt": "mid_tom",
+    "ht": "high_tom",
+}
+
+# OP-XY fixed CC name map (subset; see docs)
+NAME_CC: Dict[str, int] = {
+    "track_volume": 7,
+    "track_mute": 9,
+    "track_pan": 10,
+    "param1": 12,
+    "param2": 13,
+    "param3": 14,
+    "param4": 15,
+    "amp_attack": 20,
+    "amp_decay": 21,
+    "amp_sustain": 22,
+    "amp_release": 23,
+    "filter_attack": 24,
+    "filter_decay": 25,
+    "filter_sustain": 26,
+    "filter_release": 27,
+    "voice_mode": 28,  # poly/mono/legato
+    "portamento": 29,
+    "pitchbend_amount": 30,
+    "engine_volume": 31,
+    "cutoff": 32,      # Filter cutoff
+    "resonance": 33,
+    "env_amount": 34,
+    "key_tracking": 35,
+    "send_ext": 36,
+    "send_tape": 37,
+    "send_fx1": 38,
+    "send_fx2": 39,
+    "lfo_dest": 40,
+    "lfo_param": 41,
+}
 
 
 @dataclass
@@ -15,6 +94,148 @@ class NoteEvent:
     note_id: int
 
 
+@dataclass
+class _PlannedNote:
+    prob: float
+    roll: int  # index of this event's probability roll within its track, -1 = none
+    velocity: int
+    reps: int
+    seg: int
+    pitches: List[int]
+
+
+@dataclass
+class _PlannedLane:
+    control: int
+    ticks: List[int]
+    points: List[Tuple[int, int, int]]  # (tick_in_period, value, easing), sorted by tick
+    hold: bool
+    clamp: Tuple[int, int] | None
+    channel: int | None
+
+
+@dataclass
+class _PlannedLfo:
+    control: int
+    depth: int
+    steps_per_cycle: int
+
+
+@dataclass
+class TrackPlan:
+    """One track of a doc resolved for playback.
+
+    Note-ons are keyed by tick within the track's period and drum hits by
+    (bar_in_loop, step_in_bar), so a tick only looks at what is due. A plan
+    depends on its track and on the engine's plan context (timing, key/mode,
+    drum map) only, and is shared by every doc version that keeps both.
+    """
+
+    channel: int
+    length_bars: int
+    period: int
+    rolls: int  # probabilistic events, each rolled once per tick
+    ons: Dict[int, List[_PlannedNote]]
+    drum: Dict[Tuple[int, int], List[Tuple[int, int, int]]] | None  # -> [(pitch, vel, length_ticks)]
+    lanes: List[_PlannedLane]
+    lane_count: int | None  # len(ccLanes), None if not a list
+    lfos: List[_PlannedLfo]
+    lfo_count: int | None
+    lfo_baseline: Dict[int, int]
+
+
+def _drum_map(dev: Any) -> Dict[str, int]:
+    # Start with defaults, then overlay any device-specific overrides
+    drum_map = dict(DEFAULT_DRUM_MAP)
+    if isinstance(dev, dict) and isinstance(dev.get("drumMap"), dict):
+        for k, v in dev["drumMap"].items():
+            if not isinstance(k, str):
+                continue
+            try:
+                drum_map[k.strip().lower()] = int(v)
+            except Exception:
+                continue
+    return drum_map
+
+
+_EASE_LINEAR, _EASE_EXP, _EASE_LOG, _EASE_S = 0, 1, 2, 3
+
+
+def _easing(curve: str) -> int:
+    curve_kind = str(curve or "linear").lower()
+    if curve_kind in ("exp", "exponential"):
+        return _EASE_EXP
+    if curve_kind in ("log", "logarithmic"):
+        return _EASE_LOG
+    if curve_kind in ("s-curve", "scurve", "smoothstep"):
+        return _EASE_S
+    return _EASE_LINEAR
+
+
+def _lane_value(lane: _PlannedLane, pos: int, period: int) -> int:
+    """A ccLane's value at tick pos of its period, interpolated between points."""
+    pts = lane.points
+    # Left and right points bracketing pos (circular)
+    left_i = bisect_right(lane.ticks, pos) - 1
+    if left_i < 0:
+        left_i = len(pts) - 1
+    t_left, v_left, ease = pts[left_i]
+    if lane.hold:
+        base_val = v_left
+    else:
+        t_right, v_right, _ease_right = pts[(left_i + 1) % len(pts)]
+        # Interpolate across segment duration with easing
+        if t_right == t_left:
+            frac = 0.0
+        else:
+            seg = (t_right - t_left) if t_right > t_left else (t_right + period - t_left)
+            prog = (pos - t_left) if pos >= t_left else (pos + period - t_left)
+            frac = max(0.0, min(1.0, prog / max(1, seg)))
+        if ease == _EASE_EXP:
+            eased = frac * frac
+        elif ease == _EASE_LOG:
+            eased = (frac ** 0.5)
+        elif ease == _EASE_S:
+            eased = (3 * (frac ** 2) - 2 * (frac ** 3))
+        else:
+            eased = frac
+        base_val = int(round(v_left + (v_right - v_left) * eased))
+    if lane.clamp is not None:
+        lo, hi = lane.clamp
+        base_val = max(lo, min(hi, base_val))
+    return max(0, min(127, int(base_val)))
+
+
+def _triangle(step: int, steps_per_cycle: int, depth: int) -> int:
+    """Triangle LFO offset in -depth..+depth; phase resets each cycle."""
+    phase = step % steps_per_cycle
+    half = steps_per_cycle / 2.0
+    if phase < half:
+        # rising from -1 to +1 across first half
+        norm = (phase / half) * 2 - 1
+    else:
+        # falling from +1 to -1 across second half
+        norm = ((steps_per_cycle - phase) / half) * 2 - 1
+    return int(round(norm * depth))
+
+
+def _lfo_baseline(lfos: Any, ctrl: int) -> int:
+    # LFO offset parameter (baseline): the 'offset' of the first LFO targeting ctrl
+    try:
+        for lf in lfos:
+            d = str(lf.get("dest", ""))
+            c = None
+            if d.startswith("cc:"):
+                c = int(d.split(":", 1)[1])
+            elif d.startswith("name:"):
+                c = NAME_CC.get(d.split(":", 1)[1])
+            if c == ctrl:
+                return int(lf.get("offset", 0))
+    except Exception:
+        pass
+    return 0
+
+
 class VirtualSink:
     """A minimal sink capturing events for tests and demos.
 
@@ -46,7 +267,7 @@ class Engine:
     - Active notes ledger guarantees Note Off, even on doc replace.
     """
 
-    def __init__(self, sink: VirtualSink, limits: Dict[str, int] | None = None) -> None:
+    def __init__(self, sink: VirtualSink, limits: Dict[str, float] | None = None, instrument: bool = False) -> None:
         self.sink = sink
         self.doc: Dict[str, Any] | None = None
         self.meta: Dict[str, Any] | None = None
@@ -66,6 +287,8 @@ class Engine:
             "msgs_note_off": 0,
             "msgs_cc": 0,
             "shed_cc": 0,
+            "tracks_compiled": 0,
+            "tracks_reused": 0,
         }
         # Simple per-tick CC guard limits (for tests/runtime safety)
         limits = limits or {}
@@ -73,19 +296,54 @@ class Engine:
         self.cc_limit_per_tick_track: int = int(limits.get("cc_per_tick_track", 1_000_000))
         # Deterministic RNG for probability-based events
         self._rng = random.Random(0)
+        # Optional per-tick instrumentation (phase timings, examined/emitted counts)
+        self._tick_stats: TickStats | None = TickStats() if instrument else None
+        self._examined: int = 0
+        self._drumkit_s: float = 0.0
+        # Optional tick-budget watchdog: limits["tick_budget_fraction"] enables it
+        frac = limits.get("tick_budget_fraction")
+        self._watchdog: TickWatchdog | None = TickWatchdog(fraction=float(frac)) if frac else None
+        self._tempo_override: float | None = None
+        self._tick_budget_s: float = 0.0
+        # Optional span recorder (conductor.trace.Tracer); phases become trace spans
+        self.tracer = None
+        # Compiled tracks of self.doc (None = interpreted per tick), the track
+        # objects they were built from and the context they were built for
+        self._plans: List[TrackPlan | None] = []
+        self._plan_tracks: List[Any] = []
+        self._plan_ctx: Tuple[Any, ...] | None = None
+        self._drum_map: Dict[str, int] = dict(DEFAULT_DRUM_MAP)
+        # Live performance overlay (conductor.overlay) and its binding to
+        # self.doc's tracks; replaced whole, never mutated
+        self.overlay: Overlay | None = None
+        self._overlay: BoundOverlay | None = None
 
     # --- Public control ---
-    def load(self, doc: Dict[str, Any]) -> None:
+    def load(self, doc: Dict[str, Any], ops: List[Dict[str, Any]] | None = None) -> None:
         self.doc = doc
         self.meta = doc.get("meta", {})
         ppq = int(self.meta.get("ppq", 96))
         spb = int(self.meta.get("stepsPerBar", 16))
         # assume 4/4: 4 quarter notes per bar
         self.step_ticks = int((ppq * 4) / spb) if spb > 0 else 0
+        self._update_tick_budget()
+        self._drum_map = _drum_map(doc.get("deviceProfile", {}))
+        self._compile_plans(ops)
+        self._overlay = self.overlay.bind(doc.get("tracks", [])) if self.overlay is not None else None
+
+    def replace_doc(self, doc: Dict[str, Any], ops: List[Dict[str, Any]] | None = None) -> None:
+        """Replace current document atomically; keep ledger intact.
 
-    def replace_doc(self, doc: Dict[str, Any]) -> None:
-        # Replace current document atomically; keep ledger intact
-        self.load(doc)
+        Only tracks that changed are recompiled. `ops` (the patch that took
+        the current doc to doc, if known) narrows that down further when
+        doc does not share structure with the current one.
+        """
+        self.load(doc, ops)
+
+    def set_overlay(self, overlay: Overlay | None) -> None:
+        """Install a performance overlay (None = play the doc as written)."""
+        self.overlay = overlay
+        self._overlay = overlay.bind(self.doc.get("tracks", [])) if overlay is not None and self.doc else None
 
     def start(self) -> None:
         self.playing = True
@@ -96,9 +354,38 @@ class Engine:
         self._panic()
         self.playing = False
 
+    def set_tempo(self, bpm: float | None) -> None:
+        """Override the tempo used for the tick deadline (None = follow meta.tempo)."""
+        self._tempo_override = float(bpm) if bpm else None
+        self._update_tick_budget()
+
+    def _update_tick_budget(self) -> None:
+        meta = self.meta or {}
+        try:
+            bpm = self._tempo_override or float(meta.get("tempo", 120))
+            ppq = int(meta.get("ppq", 96))
+            self._tick_budget_s = 60.0 / (bpm * ppq) if bpm > 0 and ppq > 0 else 0.0
+        except (TypeError, ValueError):
+            self._tick_budget_s = 0.0
+
+    def set_instrumentation(self, enabled: bool) -> None:
+        """Enable/disable per-tick instrumentation; enabling resets the histograms."""
+        self._tick_stats = TickStats() if enabled else None
+
     # --- Tick loop integration ---
     def on_tick(self, tick: int) -> None:
         """Call on every meta.ppq tick in monotonically increasing order."""
+        wd = self._watchdog
+        if self._tick_stats is not None or self.tracer is not None:
+            self._on_tick_instrumented(tick)
+        elif wd is None:
+            self._run_tick(tick)
+        else:
+            t0 = time.perf_counter()
+            self._run_tick(tick)
+            wd.observe(time.perf_counter() - t0, self._tick_budget_s, tick)
+
+    def _run_tick(self, tick: int) -> None:
         self.tick = tick
         # First: emit any due Note Offs
         self._emit_due_offs(tick)
@@ -107,11 +394,70 @@ class Engine:
         # Then: emit Note Ons due exactly at this tick
         self._emit_due_ons(tick)
         # CC/LFO updates on step boundaries
-        self._emit_cc_updates(tick)
+        if self._cc_due(tick):
+            self._emit_cc_updates(tick)
+
+    def _cc_due(self, tick: int) -> bool:
+        """Whether CC/LFO output runs this tick under the current load level.
+
+        Level 0 evaluates every tick; level 1 drops to quarter-step resolution;
+        level 2 defers CC to step boundaries. Values are recomputed from the
+        current tick when they run, so deferred changes are caught up, not lost.
+        """
+        wd = self._watchdog
+        if wd is None or wd.level == 0 or self.step_ticks <= 0:
+            return True
+        every = max(1, self.step_ticks // 4) if wd.level == 1 else self.step_ticks
+        if tick % every == 0:
+            return True
+        wd.cc_skipped_ticks += 1
+        return False
+
+    def _on_tick_instrumented(self, tick: int) -> None:
+        # Same phases as on_tick, timed individually. drumKit time is
+        # accumulated inside _emit_due_ons and subtracted from 'ons'.
+        clock = time.perf_counter
+        m = self.metrics
+        sent_before = m["msgs_note_on"] + m["msgs_note_off"] + m["msgs_cc"]
+        self._examined = 0
+        self._drumkit_s = 0.0
+        self.tick = tick
+        phases: Dict[str, float] = {}
+        t0 = clock()
+        self._emit_due_offs(tick)
+        t1 = clock()
+        phases["offs"] = t1 - t0
+        t2 = t3 = t1
+        if self.playing and self.doc:
+            self._emit_due_ons(tick)
+            t2 = clock()
+            phases["ons"] = max(0.0, (t2 - t1) - self._drumkit_s)
+            phases["drumKit"] = self._drumkit_s
+            if self._cc_due(tick):
+                self._emit_cc_updates(tick)
+            t3 = clock()
+            phases["cc"] = t3 - t2
+        sent = m["msgs_note_on"] + m["msgs_note_off"] + m["msgs_cc"] - sent_before
+        if self._tick_stats is not None:
+            self._tick_stats.record(phases, self._examined, sent)
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.add("on_tick", "engine", t0, t3, {"tick": tick, "examined": self._examined, "emitted": sent})
+            tracer.add("offs", "engine", t0, t1)
+            if t2 > t1:
+                tracer.add("ons+drumKit", "engine", t1, t2)
+                tracer.add("cc", "engine", t2, t3)
+        if self._watchdog is not None:
+            self._watchdog.observe(t3 - t0, self._tick_budget_s, tick)
 
-    def get_metrics(self) -> Dict[str, int]:
+    def get_metrics(self) -> Dict[str, Any]:
         # Return a shallow copy of metrics (e.g., for printing/broadcasting)
-        return dict(self.metrics)
+        out: Dict[str, Any] = dict(self.metrics)
+        if self._tick_stats is not None:
+            out["tick"] = self._tick_stats.snapshot()
+        if self._watchdog is not None:
+            out["load"] = self._watchdog.snapshot()
+        return out
 
     def get_cc_snapshot(self) -> Dict[int, Dict[int, int]]:
         out: Dict[int, Dict[int, int]] = {}
@@ -119,6 +465,9 @@ class Engine:
             out.setdefault(int(ch), {})[int(ctrl)] = int(val)
         return out
 
+    def get_overlay_snapshot(self) -> Dict[str, Any]:
+        return self.overlay.snapshot() if self.overlay is not None else {}
+
     def get_active_notes_snapshot(self) -> Dict[int, Dict[str, Any]]:
         """Return current active notes per channel with simple stats."""
         summary: Dict[int, Dict[str, Any]] = {}
@@ -132,6 +481,26 @@ class Engine:
             ent["pitches"].sort()
         return summary
 
+    def preview(self, start_tick: int, end_tick: int) -> Dict[str, List[Dict[str, Any]]]:
+        """Notes and CC changes the engine would emit for ticks [start_tick, end_tick).
+
+        Runs the real scheduling code on a scratch engine, so chords, degrees,
+        drumKit and microshift resolve exactly as in playback. Probabilistic
+        events are all included and carry their 'prob'; the live RNG, ledger
+        and sink are not touched.
+        """
+        shadow = _PreviewEngine(self)
+        if not shadow.doc or shadow.step_ticks <= 0:
+            return {"notes": [], "cc": []}
+        events = shadow.sink.events
+        for t in range(int(start_tick), int(end_tick)):
+            shadow._emit_due_ons(t)
+            n = len(events)
+            shadow._emit_cc_updates(t)
+            for _kind, ch, ctrl, val in events[n:]:
+                shadow.cc.append({"tick": t, "channel": ch, "control": ctrl, "value": val})
+        return {"notes": shadow.notes, "cc": shadow.cc}
+
     # --- Internals ---
     def _emit_due_ons(self, tick: int) -> None:
         if not self.doc or self.step_ticks <= 0:
@@ -140,163 +509,214 @@ class Engine:
         meta = self.doc.get("meta", {})
         spb = int(meta.get("stepsPerBar", 16))
         bar_ticks = self.step_ticks * spb
-        dev = self.doc.get("deviceProfile", {})
-        # OP-XY default mapping (lowercase keys)
-        default_drum_map = {
-            "kick": 53,
-            "kick_alt": 54,
-            "snare": 55,
-            "snare_alt": 56,
-            "rim": 57,
-            "clap": 58,
-            "tambourine": 59,
-            "shaker": 60,
-            "closed_hat": 61,
-            "open_hat": 62,
-            "pedal_hat": 63,
-            "low_tom": 65,
-            "crash": 66,
-            "mid_tom": 67,
-            "ride": 68,
-            "high_tom": 69,
-            "conga_low": 71,
-            "conga_high": 72,
-            "cowbell": 73,
-            "guiro": 74,
-            "metal": 75,
-            "chi": 76,
-        }
-        # Start with defaults, then overlay any device-specific overrides
-        drum_map = dict(default_drum_map)
-        if isinstance(dev, dict) and isinstance(dev.get("drumMap"), dict):
-            for k, v in dev["drumMap"].items():
-                if not isinstance(k, str):
-                    continue
-                try:
-                    drum_map[k.strip().lower()] = int(v)
-                except Exception:
+        plans = self._plans
+        ov = self._overlay
+        fx = None
+        examined = 0
+        for ti, tr in enumerate(tracks):
+            plan = plans[ti] if ti < len(plans) else None
+            if ov is not None:
+                if not (ov.audible >> ti) & 1:
+                    # Draw a muted track's rolls so the other tracks' outcomes stay put
+                    rolls = plan.rolls if plan is not None else self._track_rolls(tr)
+                    if rolls:
+                        rnd = self._rng.random
+                        for _ in range(rolls):
+                            rnd()
                     continue
-        for tr in tracks:
-            ch = int(tr.get("midiChannel", 0))
-            pat = tr.get("pattern", {})
-            steps = pat.get("steps", [])
-            length_bars = max(1, int(pat.get("lengthBars", 1)))
-            for st in steps:
-                idx = int(st.get("idx", -1))
-                if idx < 0:
+                fx = ov.fx[ti]
+            if plan is not None:
+                examined += self._emit_planned_ons(plan, tick, bar_ticks, fx)
+            else:
+                examined += self._emit_track_ons(tr, tick, meta, spb, bar_ticks, fx)
+        self._examined += examined
+
+    def _emit_planned_ons(self, plan: TrackPlan, tick: int, bar_ticks: int, fx: TrackFx | None = None) -> int:
+        """Emit one compiled track's note-ons at this tick; returns events examined."""
+        ch = plan.channel
+        if plan.rolls:
+            # One roll per probabilistic event per tick, in doc order, as the
+            # interpreted path draws them (keeps seeded runs reproducible)
+            rnd = self._rng.random
+            rolls = [rnd() for _ in range(plan.rolls)]
+        due = plan.ons.get(tick % plan.period)
+        examined = 0
+        if due:
+            examined = len(due)
+            for ev in due:
+                if ev.roll >= 0 and rolls[ev.roll] > ev.prob:
                     continue
-                period = max(1, bar_ticks * length_bars)
-                step_tick = (idx % (spb * length_bars)) * self.step_ticks
-                tick_in_loop = tick % period
-                # Handle events with microshift/ratchet: compute exact scheduled tick per event
-                events = st.get("events", [])
-                for e in events:
-                        # Probability
-                        prob = float(e.get("prob", 1.0))
-                        if prob <= 0:
-                            continue
-                        if prob < 1.0 and self._rng.random() > prob:
-                            continue
-
-                        vel = int(e.get("velocity", 100))
-                        ls = int(e.get("lengthSteps", 1))
-                        gate = float(e.get("gate", 1.0))
-                        ratchet = int(e.get("ratchet", 1) or 1)
-                        micro_ms = int(e.get("microshiftMs", 0) or 0)
-                        bpm = float(meta.get("tempo", 120))
-                        ppq = int(meta.get("ppq", 96))
-                        # ticks per ms = (ppq * bpm / 60) / 1000
-                        tpm = (ppq * bpm) / 60000.0
-                        offset_ticks = int(round(micro_ms * tpm))
-                        scheduled_tick = (step_tick + offset_ticks) % period
-                        if tick_in_loop != scheduled_tick:
-                            continue
-
-                        base_len = max(1, int(self.step_ticks * ls * gate))
-
-                        # Resolve pitches from pitch|degree|chord
-                        pitches: List[int] = []
-                        if isinstance(e.get("pitch"), (int, float)):
-                            pitches = [int(e.get("pitch"))]
-                        elif isinstance(e.get("degree"), (int, float)):
-                            pitches = [self._degree_to_pitch(int(e.get("degree")), int(e.get("octaveOffset", 0))) ]
-                        elif isinstance(e.get("chord"), str):
-                            pitches = self._expand_chord(str(e.get("chord")), e)
-                        else:
-                            continue
-
-                        reps = max(1, ratchet)
-                        seg = max(1, base_len // reps)
-                        for r_i in range(reps):
-                            on_tick_abs = tick + (r_i * seg)
-                            off_tick = on_tick_abs + seg
-                            for p in pitches:
-                                pitch = max(0, min(127, int(p)))
-                                note_id = self._next_note_id
-                                self._next_note_id += 1
-                                self.sink.note_on(ch, pitch, vel)
-                                self.metrics["msgs_note_on"] += 1
-                                key = (ch, pitch)
-                                self.active.setdefault(key, []).append(
-                                    NoteEvent(channel=ch, pitch=pitch, velocity=vel, on_tick=on_tick_abs, off_tick=off_tick, note_id=note_id)
-                                )
-
-            # drumKit runtime scheduling
-            dk = tr.get("drumKit")
-            if isinstance(dk, dict) and isinstance(dk.get("patterns"), list):
-                patterns = dk.get("patterns", [])
-                repeat_bars = max(1, int(dk.get("repeatBars", 1)))
-                default_len = max(1, int(dk.get("lengthSteps", 1)))
-                # Current bar within loop (1-based per spec)
-                bar_in_loop = ((tick // bar_ticks) % length_bars) + 1
-                # Step within current bar
-                if self.step_ticks > 0:
-                    step_in_bar = (tick % bar_ticks) // self.step_ticks
-                else:
-                    step_in_bar = 0
-                # Only schedule on exact step boundaries
-                if self.step_ticks == 0 or (tick % self.step_ticks) != 0:
-                    return
-                # alias map to allow short keys in patterns
-                alias = {
-                    "ch": "closed_hat",
-                    "oh": "open_hat",
-                    "hh": "closed_hat",
-                    "lt": "low_tom",
-                    "mt": "mid_tom",
-                    "ht": "high_tom",
-                }
-                for spec in patterns:
-                    try:
-                        b0 = int(spec.get("bar", 1))
-                        key = str(spec.get("key")).lower()
-                        key = alias.get(key, key)
-                        pattern_str = str(spec.get("pattern"))
-                    except Exception:
-                        continue
-                    # Active if bar_in_loop within [b0, b0+repeat_bars-1]
-                    if not (b0 <= bar_in_loop <= (b0 + repeat_bars - 1)):
+                seg = ev.seg
+                pitches, vel = ev.pitches, ev.velocity
+                if fx is not None:
+                    pitches, vel = fx.pitches(pitches), fx.velocity(vel)
+                for r_i in range(ev.reps):
+                    on_tick_abs = tick + (r_i * seg)
+                    for p in pitches:
+                        self._note_on(ch, p, vel, on_tick_abs, on_tick_abs + seg, ev.prob)
+        if plan.drum is not None and tick % self.step_ticks == 0:
+            t_dk = time.perf_counter() if self._tick_stats is not None else 0.0
+            bar_in_loop = ((tick // bar_ticks) % plan.length_bars) + 1
+            hits = plan.drum.get((bar_in_loop, (tick % bar_ticks) // self.step_ticks))
+            if hits:
+                examined += len(hits)
+                for pitch, vel, length_ticks in hits:
+                    self._note_on(ch, pitch, vel if fx is None else fx.velocity(vel), tick, tick + length_ticks)
+            if self._tick_stats is not None:
+                self._drumkit_s += time.perf_counter() - t_dk
+        return examined
+
+    def _emit_track_ons(self, tr: Dict[str, Any], tick: int, meta: Dict[str, Any], spb: int, bar_ticks: int, fx: TrackFx | None = None) -> int:
+        """Interpret one track's steps and drumKit at this tick; returns events examined.
+
+        Used for tracks that did not compile into a TrackPlan.
+        """
+        examined = 0
+        ch = int(tr.get("midiChannel", 0))
+        pat = tr.get("pattern", {})
+        steps = pat.get("steps", [])
+        length_bars = max(1, int(pat.get("lengthBars", 1)))
+        for st in steps:
+            idx = int(st.get("idx", -1))
+            if idx < 0 or st.get("mute") is True:
+                continue
+            period = max(1, bar_ticks * length_bars)
+            step_tick = (idx % (spb * length_bars)) * self.step_ticks
+            tick_in_loop = tick % period
+            # Handle events with microshift/ratchet: compute exact scheduled tick per event
+            events = st.get("events", [])
+            examined += len(events)
+            for e in events:
+                    # Probability
+                    prob = float(e.get("prob", 1.0))
+                    if prob <= 0:
                         continue
-                    if step_in_bar < 0 or step_in_bar >= len(pattern_str):
+                    if prob < 1.0 and self._rng.random() > prob:
                         continue
-                    if pattern_str[step_in_bar] != "x":
+
+                    vel = int(e.get("velocity", 100))
+                    ls = int(e.get("lengthSteps", 1))
+                    gate = float(e.get("gate", 1.0))
+                    ratchet = int(e.get("ratchet", 1) or 1)
+                    micro_ms = int(e.get("microshiftMs", 0) or 0)
+                    bpm = float(meta.get("tempo", 120))
+                    ppq = int(meta.get("ppq", 96))
+                    # ticks per ms = (ppq * bpm / 60) / 1000
+                    tpm = (ppq * bpm) / 60000.0
+                    offset_ticks = int(round(micro_ms * tpm))
+                    scheduled_tick = (step_tick + offset_ticks) % period
+                    if tick_in_loop != scheduled_tick:
                         continue
-                    # Resolve pitch from drum map (skip if unknown)
-                    if key not in drum_map:
+
+                    base_len = max(1, int(self.step_ticks * ls * gate))
+
+                    pitches = self._event_pitches(e)
+                    if pitches is None:
                         continue
-                    pitch = int(drum_map[key])
-                    vel = int(spec.get("vel", 100))
-                    ls = int(spec.get("lengthSteps", default_len))
-                    length_ticks = max(1, int(self.step_ticks * ls))
-                    on_tick = tick
-                    off_tick = tick + length_ticks
-                    note_id = self._next_note_id
-                    self._next_note_id += 1
-                    self.sink.note_on(ch, pitch, vel)
-                    self.metrics["msgs_note_on"] += 1
-                    self.active.setdefault((ch, pitch), []).append(
-                        NoteEvent(channel=ch, pitch=pitch, velocity=vel, on_tick=on_tick, off_tick=off_tick, note_id=note_id)
-                    )
+                    if fx is not None:
+                        pitches, vel = fx.pitches(pitches), fx.velocity(vel)
+
+                    reps = max(1, ratchet)
+                    seg = max(1, base_len // reps)
+                    for r_i in range(reps):
+                        on_tick_abs = tick + (r_i * seg)
+                        off_tick = on_tick_abs + seg
+                        for p in pitches:
+                            self._note_on(ch, max(0, min(127, int(p))), vel, on_tick_abs, off_tick, prob)
+
+        # drumKit runtime scheduling
+        dk = tr.get("drumKit")
+        if isinstance(dk, dict) and isinstance(dk.get("patterns"), list):
+            if self._tick_stats is not None:
+                t_dk = time.perf_counter()
+                examined += self._emit_drumkit_ons(dk, tick, ch, bar_ticks, length_bars, self._drum_map, fx)
+                self._drumkit_s += time.perf_counter() - t_dk
+            else:
+                examined += self._emit_drumkit_ons(dk, tick, ch, bar_ticks, length_bars, self._drum_map, fx)
+        return examined
+
+    @staticmethod
+    def _track_rolls(tr: Dict[str, Any]) -> int:
+        """Probability rolls _emit_track_ons draws for a track on every tick."""
+        rolls = 0
+        for st in tr.get("pattern", {}).get("steps", []):
+            if int(st.get("idx", -1)) < 0 or st.get("mute") is True:
+                continue
+            for e in st.get("events", []):
+                if 0 < float(e.get("prob", 1.0)) < 1.0:
+                    rolls += 1
+        return rolls
+
+    def _event_pitches(self, e: Dict[str, Any]) -> List[int] | None:
+        """Resolve an event's pitches from pitch|degree|chord; None if it has none."""
+        if isinstance(e.get("pitch"), (int, float)):
+            return [int(e.get("pitch"))]
+        if isinstance(e.get("degree"), (int, float)):
+            return [self._degree_to_pitch(int(e.get("degree")), int(e.get("octaveOffset", 0)))]
+        if isinstance(e.get("chord"), str):
+            return self._expand_chord(str(e.get("chord")), e)
+        return None
+
+    def _emit_drumkit_ons(
+        self,
+        dk: Dict[str, Any],
+        tick: int,
+        ch: int,
+        bar_ticks: int,
+        length_bars: int,
+        drum_map: Dict[str, int],
+        fx: TrackFx | None = None,
+    ) -> int:
+        """Emit drumKit note-ons for one track at this tick; returns patterns examined."""
+        patterns = dk.get("patterns", [])
+        repeat_bars = max(1, int(dk.get("repeatBars", 1)))
+        default_len = max(1, int(dk.get("lengthSteps", 1)))
+        # Current bar within loop (1-based per spec)
+        bar_in_loop = ((tick // bar_ticks) % length_bars) + 1
+        # Step within current bar
+        if self.step_ticks > 0:
+            step_in_bar = (tick % bar_ticks) // self.step_ticks
+        else:
+            step_in_bar = 0
+        # Only schedule on exact step boundaries
+        if self.step_ticks == 0 or (tick % self.step_ticks) != 0:
+            return 0
+        for spec in patterns:
+            try:
+                b0 = int(spec.get("bar", 1))
+                key = str(spec.get("key")).lower()
+                key = DRUM_ALIASES.get(key, key)
+                pattern_str = str(spec.get("pattern"))
+            except Exception:
+                continue
+            # Active if bar_in_loop within [b0, b0+repeat_bars-1]
+            if not (b0 <= bar_in_loop <= (b0 + repeat_bars - 1)):
+                continue
+            if step_in_bar < 0 or step_in_bar >= len(pattern_str):
+                continue
+            if pattern_str[step_in_bar] != "x":
+                continue
+            # Resolve pitch from drum map (skip if unknown)
+            if key not in drum_map:
+                continue
+            pitch = int(drum_map[key])
+            vel = int(spec.get("vel", 100))
+            ls = int(spec.get("lengthSteps", default_len))
+            length_ticks = max(1, int(self.step_ticks * ls))
+            if fx is not None:
+                vel = fx.velocity(vel)
+            self._note_on(ch, pitch, vel, tick, tick + length_ticks)
+        return len(patterns)
+
+    def _note_on(self, ch: int, pitch: int, vel: int, on_tick: int, off_tick: int, prob: float = 1.0) -> None:
+        """Send a Note On and record it in the ledger for its Note Off."""
+        note_id = self._next_note_id
+        self._next_note_id += 1
+        self.sink.note_on(ch, pitch, vel)
+        self.metrics["msgs_note_on"] += 1
+        self.active.setdefault((ch, pitch), []).append(
+            NoteEvent(channel=ch, pitch=pitch, velocity=vel, on_tick=on_tick, off_tick=off_tick, note_id=note_id)
+        )
 
     def _emit_due_offs(self, tick: int) -> None:
         # Iterate all active notes and emit offs due exactly at this tick
@@ -336,247 +756,356 @@ class Engine:
         # Reset LFO phase on first bar boundary after start
         if step_in_bar == 0 and self._started:
             self._started = False
-        # OP-XY fixed CC name map (subset; see docs)
-        name_cc = {
-            "track_volume": 7,
-            "track_mute": 9,
-            "track_pan": 10,
-            "param1": 12,
-            "param2": 13,
-            "param3": 14,
-            "param4": 15,
-            "amp_attack": 20,
-            "amp_decay": 21,
-            "amp_sustain": 22,
-            "amp_release": 23,
-            "filter_attack": 24,
-            "filter_decay": 25,
-            "filter_sustain": 26,
-            "filter_release": 27,
-            "voice_mode": 28,  # poly/mono/legato
-            "portamento": 29,
-            "pitchbend_amount": 30,
-            "engine_volume": 31,
-            "cutoff": 32,      # Filter cutoff
-            "resonance": 33,
-            "env_amount": 34,
-            "key_tracking": 35,
-            "send_ext": 36,
-            "send_tape": 37,
-            "send_fx1": 38,
-            "send_fx2": 39,
-            "lfo_dest": 40,
-            "lfo_param": 41,
-        }
         tracks = doc.get("tracks", [])
-        # Determine each track's pattern loop length in bars
-        for tr in tracks:
+        plans = self._plans
+        ov = self._overlay
+        for ti, tr in enumerate(tracks):
+            plan = plans[ti] if ti < len(plans) else None
+            if plan is not None:
+                ch, merged, channel_override = self._planned_cc(plan, tick)
+            else:
+                ch, merged, channel_override = self._track_cc(tr, tick, spb, bar_ticks)
+            if ov is not None:
+                merged = ov.ride(ti, merged, tick)
+            self._send_cc(ch, merged, channel_override, tick)
+
+    def _planned_cc(self, plan: TrackPlan, tick: int) -> Tuple[int, List[Tuple[int, int]], Dict[int, int]]:
+        """(channel, [(control, value)], per-control channel overrides) for a compiled track."""
+        base_values: Dict[int, int] = {}
+        channel_override: Dict[int, int] = {}
+        if plan.lane_count is not None:
+            self._examined += plan.lane_count
+            pos = tick % plan.period
+            for lane in plan.lanes:
+                base_values[lane.control] = _lane_value(lane, pos, plan.period)
+                if lane.channel is not None:
+                    channel_override[lane.control] = lane.channel
+        lfo_offsets: Dict[int, int] = {}
+        if plan.lfo_count is not None:
+            self._examined += plan.lfo_count
+            step = tick // max(1, self.step_ticks)
+            for lf in plan.lfos:
+                lfo_offsets[lf.control] = _triangle(step, lf.steps_per_cycle, lf.depth)
+        merged: List[Tuple[int, int]] = []
+        for ctrl in sorted(set(base_values) | set(lfo_offsets)):
+            value = plan.lfo_baseline.get(ctrl, 0) + base_values.get(ctrl, 64) + lfo_offsets.get(ctrl, 0)
+            merged.append((ctrl, max(0, min(127, value))))
+        return plan.channel, merged, channel_override
+
+    def _track_cc(self, tr: Dict[str, Any], tick: int, spb: int, bar_ticks: int) -> Tuple[int, List[Tuple[int, int]], Dict[int, int]]:
+        """Interpreted counterpart of _planned_cc for tracks without a TrackPlan."""
+        ch = int(tr.get("midiChannel", 0))
+        pat = tr.get("pattern", {})
+        length_bars = max(1, int(pat.get("lengthBars", 1)))
+        # Base values from ccLanes — high-resolution per tick with interpolation
+        base_values: Dict[int, int] = {}
+        base_value_channel_override: Dict[int, int] = {}
+        cc_lanes = tr.get("ccLanes") or []
+        if isinstance(cc_lanes, list):
+            self._examined += len(cc_lanes)
+            period = max(1, bar_ticks * length_bars)
+            for lane in cc_lanes:
+                try:
+                    planned = self._plan_lane(lane, spb, bar_ticks, length_bars)
+                except Exception:
+                    continue
+                if planned is None:
+                    continue
+                base_values[planned.control] = _lane_value(planned, tick % period, period)
+                # Optional per-lane MIDI channel override
+                if planned.channel is not None:
+                    base_value_channel_override[planned.control] = planned.channel
+
+        # LFO offsets (triangle only; rate sync values like '1/8' supported minimally)
+        lfos = tr.get("lfos") or []
+        lfo_offsets: Dict[int, int] = {}
+        if isinstance(lfos, list):
+            self._examined += len(lfos)
+            for lf in lfos:
+                try:
+                    planned_lfo = self._plan_lfo(lf, spb)
+                except Exception:
+                    continue
+                if planned_lfo is not None:
+                    step = tick // max(1, self.step_ticks)
+                    lfo_offsets[planned_lfo.control] = _triangle(step, planned_lfo.steps_per_cycle, planned_lfo.depth)
+
+        # Merge base + lfo offset, clamp
+        merged: List[Tuple[int, int]] = []
+        all_controls = set(base_values.keys()) | set(lfo_offsets.keys())
+        for ctrl in sorted(all_controls):
+            base = base_values.get(ctrl, 64)
+            off = lfo_offsets.get(ctrl, 0)
+            value = max(0, min(127, int(_lfo_baseline(lfos, ctrl) + base + off)))
+            merged.append((int(ctrl), value))
+        return ch, merged, base_value_channel_override
+
+    def _send_cc(self, ch: int, merged: List[Tuple[int, int]], channel_override: Dict[int, int], tick: int) -> None:
+        # Apply simple CC rate guards: per-track and global limits per tick
+        # Prefer to send earlier controls first; shed extras and count them
+        # Count CCs already sent this tick globally (reset at new tick)
+        if not hasattr(self, "_last_cc_tick") or self._last_cc_tick != tick:
+            self._last_cc_tick = tick
+            self._cc_sent_tick_global = 0
+            self._cc_sent_tick_per_track: Dict[int, int] = {}
+
+        for ctrl, value in merged:
+            # Check per-track limit
+            send_ch = int(channel_override.get(ctrl, ch))
+            per_track = self._cc_sent_tick_per_track.get(send_ch, 0)
+            if per_track >= self.cc_limit_per_tick_track or self._cc_sent_tick_global >= self.cc_limit_per_tick_global:
+                self.metrics["shed_cc"] += 1
+                continue
+            key = (send_ch, int(ctrl))
+            if self._last_cc.get(key) == value:
+                # unchanged; skip without counting toward limit
+                continue
+            # Send CC
+            try:
+                self.sink.control_change(send_ch, int(ctrl), value)
+                self.metrics["msgs_cc"] += 1
+                self._last_cc[key] = value
+                # increment counters
+                self._cc_sent_tick_global += 1
+                self._cc_sent_tick_per_track[send_ch] = per_track + 1
+            except Exception:
+                # treat as shed if send fails
+                self.metrics["shed_cc"] += 1
+
+    # --- Track plans ---
+    def _compile_plans(self, ops: List[Dict[str, Any]] | None = None) -> None:
+        """Compile a TrackPlan per track of self.doc, reusing unchanged tracks' plans.
+
+        A track keeps its plan when the compile context is unchanged and it
+        is the same object as one of the previous doc's tracks (docs share
+        untouched subtrees across versions), or when `ops` (the patch from
+        the previous doc) writes nowhere below it.
+        """
+        doc = self.doc or {}
+        tracks = doc.get("tracks", [])
+        if not isinstance(tracks, list):
+            tracks = []
+        ctx = self._plan_context()
+        reuse = ctx is not None and ctx == self._plan_ctx
+        prev_plans = self._plans
+        by_id = {id(t): p for t, p in zip(self._plan_tracks, prev_plans)} if reuse else {}
+        touched = touched_tracks(ops) if reuse and ops is not None else None
+        plans: List[TrackPlan | None] = []
+        for ti, tr in enumerate(tracks):
+            if id(tr) in by_id:
+                plans.append(by_id[id(tr)])
+            elif touched is not None and ti not in touched and ti < len(prev_plans):
+                plans.append(prev_plans[ti])
+            else:
+                plans.append(self._compile_track(tr, ctx) if ctx is not None else None)
+                self.metrics["tracks_compiled"] += 1
+                continue
+            self.metrics["tracks_reused"] += 1
+        self._plans = plans
+        self._plan_tracks = list(tracks)
+        self._plan_ctx = ctx
+
+    def _plan_context(self) -> Tuple[Any, ...] | None:
+        """Everything outside a track that its plan depends on (None: cannot compile)."""
+        meta = self.meta or {}
+        try:
+            spb = int(meta.get("stepsPerBar", 16))
+            if self.step_ticks <= 0 or spb <= 0:
+                return None
+            return (
+                self.step_ticks,
+                spb,
+                float(meta.get("tempo", 120)),
+                int(meta.get("ppq", 96)),
+                str(meta.get("key", "C")),
+                str(meta.get("mode", "major")).lower(),
+                self._drum_map,
+            )
+        except Exception:
+            return None
+
+    def _compile_track(self, tr: Dict[str, Any], ctx: Tuple[Any, ...]) -> TrackPlan | None:
+        """Resolve one track for ctx; None if it is malformed (it is then interpreted per tick)."""
+        step_ticks, spb, bpm, ppq, _key, _mode, drum_map = ctx
+        try:
+            bar_ticks = step_ticks * spb
             ch = int(tr.get("midiChannel", 0))
             pat = tr.get("pattern", {})
             length_bars = max(1, int(pat.get("lengthBars", 1)))
-            # Base values from ccLanes — high-resolution per tick with interpolation
-            base_values: Dict[int, int] = {}
-            base_value_channel_override: Dict[int, int] = {}
+            period = max(1, bar_ticks * length_bars)
+            # ticks per ms = (ppq * bpm / 60) / 1000
+            tpm = (ppq * bpm) / 60000.0
+            ons: Dict[int, List[_PlannedNote]] = {}
+            rolls = 0
+            for st in pat.get("steps", []):
+                idx = int(st.get("idx", -1))
+                # §5.1: a muted step ignores all of its events
+                if idx < 0 or st.get("mute") is True:
+                    continue
+                step_tick = (idx % (spb * length_bars)) * step_ticks
+                for e in st.get("events", []):
+                    prob = float(e.get("prob", 1.0))
+                    if prob <= 0:
+                        continue
+                    roll = -1
+                    if prob < 1.0:
+                        roll = rolls
+                        rolls += 1
+                    vel = int(e.get("velocity", 100))
+                    ls = int(e.get("lengthSteps", 1))
+                    gate = float(e.get("gate", 1.0))
+                    ratchet = int(e.get("ratchet", 1) or 1)
+                    micro_ms = int(e.get("microshiftMs", 0) or 0)
+                    scheduled_tick = (step_tick + int(round(micro_ms * tpm))) % period
+                    pitches = self._event_pitches(e)
+                    if pitches is None:
+                        continue
+                    reps = max(1, ratchet)
+                    seg = max(1, max(1, int(step_ticks * ls * gate)) // reps)
+                    ons.setdefault(scheduled_tick, []).append(
+                        _PlannedNote(prob, roll, vel, reps, seg, [max(0, min(127, int(p))) for p in pitches])
+                    )
+
+            drum: Dict[Tuple[int, int], List[Tuple[int, int, int]]] | None = None
+            dk = tr.get("drumKit")
+            if isinstance(dk, dict) and isinstance(dk.get("patterns"), list):
+                drum = {}
+                repeat_bars = max(1, int(dk.get("repeatBars", 1)))
+                default_len = max(1, int(dk.get("lengthSteps", 1)))
+                for spec in dk["patterns"]:
+                    try:
+                        b0 = int(spec.get("bar", 1))
+                        key = str(spec.get("key")).lower()
+                        key = DRUM_ALIASES.get(key, key)
+                        pattern_str = str(spec.get("pattern"))
+                    except Exception:
+                        continue
+                    # Steps hit and loop bars (1-based) the row is active in
+                    hit_steps = [s for s, c in enumerate(pattern_str[:spb]) if c == "x"]
+                    bars = range(max(1, b0), min(length_bars, b0 + repeat_bars - 1) + 1)
+                    if key not in drum_map or not hit_steps or not bars:
+                        continue
+                    hit = (int(drum_map[key]), int(spec.get("vel", 100)), max(1, int(step_ticks * int(spec.get("lengthSteps", default_len)))))
+                    for b in bars:
+                        for s in hit_steps:
+                            drum.setdefault((b, s), []).append(hit)
+
+            lanes: List[_PlannedLane] = []
+            lane_count: int | None = None
             cc_lanes = tr.get("ccLanes") or []
             if isinstance(cc_lanes, list):
+                lane_count = len(cc_lanes)
                 for lane in cc_lanes:
                     try:
-                        dest = str(lane.get("dest", ""))
-                        # Resolve control number
-                        control: int | None = None
-                        if isinstance(lane.get("dest"), int):
-                            control = int(lane.get("dest"))
-                        elif dest.startswith("cc:"):
-                            control = int(dest.split(":", 1)[1])
-                        elif dest.startswith("name:"):
-                            control = name_cc.get(dest.split(":", 1)[1])
-                        if control is None:
-                            continue
-                        pts = lane.get("points") or []
-                        if not isinstance(pts, list) or len(pts) == 0:
-                            continue
-                        # Convert points to absolute tick positions within the pattern period
-                        period = max(1, bar_ticks * length_bars)
-                        pts_conv: List[Tuple[int, int, str]] = []  # (tick_in_period, value, curve)
-                        for p in pts:
-                            t = p.get("t", {}) or {}
-                            v = int(p.get("v", 0))
-                            curve = str(p.get("curve", "linear"))
-                            if isinstance(t.get("ticks"), (int, float)):
-                                tt = int(t.get("ticks")) % period
-                            else:
-                                b = int(t.get("bar", 0))
-                                s = int(t.get("step", 0))
-                                tt = ((b % max(1, length_bars)) * bar_ticks + (s % spb) * self.step_ticks) % period
-                            pts_conv.append((tt, max(0, min(127, v)), curve))
-                        if not pts_conv:
-                            continue
-                        pts_conv.sort(key=lambda x: x[0])
-                        pos = tick % period
-                        # Find left and right points bracketing pos (circular)
-                        left_i = None
-                        for i, (tt, _vv, _cv) in enumerate(pts_conv):
-                            if tt <= pos:
-                                left_i = i
-                            else:
-                                break
-                        if left_i is None:
-                            left_i = len(pts_conv) - 1
-                        right_i = (left_i + 1) % len(pts_conv)
-                        t_left, v_left, curve_left = pts_conv[left_i]
-                        t_right, v_right, _curve_right = pts_conv[right_i]
-                        if lane.get("mode") == "hold":
-                            base_val = v_left
-                        else:
-                            # Interpolate across segment duration with easing
-                            if t_right == t_left:
-                                frac = 0.0
-                                seg = period
-                            else:
-                                seg = (t_right - t_left) if t_right > t_left else (t_right + period - t_left)
-                                prog = (pos - t_left) if pos >= t_left else (pos + period - t_left)
-                                frac = max(0.0, min(1.0, prog / max(1, seg)))
-                            mode = str(lane.get("mode", "points"))
-                            curve_kind = str(curve_left or "linear").lower()
-                            # Map frac through curve
-                            if mode == "ramp" and curve_kind == "linear":
-                                eased = frac
-                            else:
-                                if curve_kind in ("linear", "line"):
-                                    eased = frac
-                                elif curve_kind in ("exp", "exponential"):
-                                    eased = frac * frac
-                                elif curve_kind in ("log", "logarithmic"):
-                                    eased = (frac ** 0.5)
-                                elif curve_kind in ("s-curve", "scurve", "smoothstep"):
-                                    eased = (3 * (frac ** 2) - 2 * (frac ** 3))
-                                else:
-                                    eased = frac
-                            base_val = int(round(v_left + (v_right - v_left) * eased))
-                        # Apply optional lane range clamp, then 0..127
-                        rng = lane.get("range")
-                        if isinstance(rng, list) and len(rng) == 2:
-                            try:
-                                lo = int(rng[0]); hi = int(rng[1])
-                                if lo > hi:
-                                    lo, hi = hi, lo
-                                base_val = max(lo, min(hi, base_val))
-                            except Exception:
-                                pass
-                        base_values[int(control)] = max(0, min(127, int(base_val)))
-                        # Optional per-lane MIDI channel override
-                        if isinstance(lane.get("channel"), int) and 0 <= int(lane.get("channel")) <= 15:
-                            base_value_channel_override[int(control)] = int(lane.get("channel"))
+                        planned = self._plan_lane(lane, spb, bar_ticks, length_bars)
                     except Exception:
                         continue
+                    if planned is not None:
+                        lanes.append(planned)
 
-            # LFO offsets (triangle only; rate sync values like '1/8' supported minimally)
-            lfos = tr.get("lfos") or []
-            lfo_offsets: Dict[int, int] = {}
-            if isinstance(lfos, list):
-                for lf in lfos:
+            lfos: List[_PlannedLfo] = []
+            lfo_count: int | None = None
+            raw_lfos = tr.get("lfos") or []
+            if isinstance(raw_lfos, list):
+                lfo_count = len(raw_lfos)
+                for lf in raw_lfos:
                     try:
-                        dest = str(lf.get("dest", ""))
-                        control = None
-                        if dest.startswith("cc:"):
-                            control = int(dest.split(":", 1)[1])
-                        elif dest.startswith("name:"):
-                            control = name_cc.get(dest.split(":", 1)[1])
-                        if control is None:
-                            continue
-                        depth = int(lf.get("depth", 0))
-                        rate = lf.get("rate", {}) or {}
-                        sync = rate.get("sync") if isinstance(rate, dict) else None
-                        shape = str(lf.get("shape", "triangle"))
-                        # Only triangle supported in MVP
-                        if shape != "triangle":
-                            continue
-                        # Compute steps per cycle from sync string like '1/8'
-                        steps_per_cycle = 0
-                        if isinstance(sync, str) and "/" in sync:
-                            # In 4/4 with spb steps per bar, 1/n note = spb/n steps per cycle
-                            try:
-                                denom = int(sync.split("/", 1)[1])
-                                if denom > 0:
-                                    steps_per_cycle = max(1, int(spb // denom))
-                            except Exception:
-                                steps_per_cycle = 0
-                        if steps_per_cycle <= 0:
-                            # Default to 1/8
-                            steps_per_cycle = 2
-                        # Triangle from -depth..+depth. Phase resets each bar
-                        # Use fractional position within the current bar cycle
-                        phase = (tick // max(1, self.step_ticks)) % steps_per_cycle
-                        half = steps_per_cycle / 2.0
-                        if phase < half:
-                            # rising from -1 to +1 across first half
-                            norm = (phase / half) * 2 - 1
-                        else:
-                            # falling from +1 to -1 across second half
-                            norm = ((steps_per_cycle - phase) / half) * 2 - 1
-                        lfo = int(round(norm * depth))
-                        lfo_offsets[int(control)] = lfo
+                        planned_lfo = self._plan_lfo(lf, spb)
                     except Exception:
                         continue
+                    if planned_lfo is not None:
+                        lfos.append(planned_lfo)
+            controls = {lane.control for lane in lanes} | {lf.control for lf in lfos}
+            baselines = {ctrl: _lfo_baseline(raw_lfos, ctrl) for ctrl in controls}
+        except Exception:
+            return None
+        return TrackPlan(ch, length_bars, period, rolls, ons, drum, lanes, lane_count, lfos, lfo_count, baselines)
 
-            # Merge base + lfo offset, clamp
-            merged: List[Tuple[int, int]] = []
-            all_controls = set(base_values.keys()) | set(lfo_offsets.keys())
-            for ctrl in sorted(all_controls):
-                base = base_values.get(ctrl, 64)
-                off = lfo_offsets.get(ctrl, 0)
-                # LFO offset parameter (baseline) if provided on the LFO spec
-                # We approximate by looking for any lfo targeting this ctrl and reading its 'offset'
-                lfo_offset_baseline = 0
-                try:
-                    for lf in lfos:
-                        d = str(lf.get("dest", ""))
-                        c = None
-                        if d.startswith("cc:"):
-                            c = int(d.split(":", 1)[1])
-                        elif d.startswith("name:"):
-                            c = name_cc.get(d.split(":", 1)[1])
-                        if c == ctrl:
-                            lfo_offset_baseline = int(lf.get("offset", 0))
-                            break
-                except Exception:
-                    pass
-                value = max(0, min(127, int(lfo_offset_baseline + base + off)))
-                merged.append((int(ctrl), value))
-
-            # Apply simple CC rate guards: per-track and global limits per tick
-            # Prefer to send earlier controls first; shed extras and count them
-            sent_this_tick_global = 0
-            for tkey in list(self._cc_sent_tick.keys()) if hasattr(self, "_cc_sent_tick") else []:
+    def _plan_lane(self, lane: Dict[str, Any], spb: int, bar_ticks: int, length_bars: int) -> _PlannedLane | None:
+        """Resolve a ccLane's control and point ticks; None if it cannot sound."""
+        dest = str(lane.get("dest", ""))
+        # Resolve control number
+        control: int | None = None
+        if isinstance(lane.get("dest"), int):
+            control = int(lane.get("dest"))
+        elif dest.startswith("cc:"):
+            control = int(dest.split(":", 1)[1])
+        elif dest.startswith("name:"):
+            control = NAME_CC.get(dest.split(":", 1)[1])
+        if control is None:
+            return None
+        pts = lane.get("points") or []
+        if not isinstance(pts, list) or len(pts) == 0:
+            return None
+        # Convert points to absolute tick positions within the pattern period
+        period = max(1, bar_ticks * length_bars)
+        pts_conv: List[Tuple[int, int, int]] = []  # (tick_in_period, value, easing)
+        for p in pts:
+            t = p.get("t", {}) or {}
+            v = int(p.get("v", 0))
+            curve = str(p.get("curve", "linear"))
+            if isinstance(t.get("ticks"), (int, float)):
+                tt = int(t.get("ticks")) % period
+            else:
+                b = int(t.get("bar", 0))
+                s = int(t.get("step", 0))
+                tt = ((b % max(1, length_bars)) * bar_ticks + (s % spb) * self.step_ticks) % period
+            pts_conv.append((tt, max(0, min(127, v)), _easing(curve)))
+        pts_conv.sort(key=lambda x: x[0])
+        # Apply optional lane range clamp, then 0..127
+        clamp: Tuple[int, int] | None = None
+        rng = lane.get("range")
+        if isinstance(rng, list) and len(rng) == 2:
+            try:
+                lo = int(rng[0]); hi = int(rng[1])
+                if lo > hi:
+                    lo, hi = hi, lo
+                clamp = (lo, hi)
+            except Exception:
                 pass
-            # Count CCs already sent this tick globally (reset at new tick)
-            if not hasattr(self, "_last_cc_tick") or self._last_cc_tick != tick:
-                self._last_cc_tick = tick
-                self._cc_sent_tick_global = 0
-                self._cc_sent_tick_per_track: Dict[int, int] = {}
-
-            for ctrl, value in merged:
-                # Check per-track limit
-                send_ch = int(base_value_channel_override.get(ctrl, ch))
-                per_track = self._cc_sent_tick_per_track.get(send_ch, 0)
-                if per_track >= self.cc_limit_per_tick_track or self._cc_sent_tick_global >= self.cc_limit_per_tick_global:
-                    self.metrics["shed_cc"] += 1
-                    continue
-                key = (send_ch, int(ctrl))
-                if self._last_cc.get(key) == value:
-                    # unchanged; skip without counting toward limit
-                    continue
-                # Send CC
-                try:
-                    self.sink.control_change(send_ch, int(ctrl), value)
-                    self.metrics["msgs_cc"] += 1
-                    self._last_cc[key] = value
-                    # increment counters
-                    self._cc_sent_tick_global += 1
-                    self._cc_sent_tick_per_track[send_ch] = per_track + 1
-                except Exception:
-                    # treat as shed if send fails
-                    self.metrics["shed_cc"] += 1
+        channel: int | None = None
+        if isinstance(lane.get("channel"), int) and 0 <= int(lane.get("channel")) <= 15:
+            channel = int(lane.get("channel"))
+        return _PlannedLane(
+            control=int(control),
+            ticks=[x[0] for x in pts_conv],
+            points=pts_conv,
+            hold=lane.get("mode") == "hold",
+            clamp=clamp,
+            channel=channel,
+        )
+
+    def _plan_lfo(self, lf: Dict[str, Any], spb: int) -> _PlannedLfo | None:
+        """Resolve an LFO's control and cycle length; None if it cannot sound."""
+        dest = str(lf.get("dest", ""))
+        control = None
+        if dest.startswith("cc:"):
+            control = int(dest.split(":", 1)[1])
+        elif dest.startswith("name:"):
+            control = NAME_CC.get(dest.split(":", 1)[1])
+        if control is None:
+            return None
+        depth = int(lf.get("depth", 0))
+        rate = lf.get("rate", {}) or {}
+        sync = rate.get("sync") if isinstance(rate, dict) else None
+        shape = str(lf.get("shape", "triangle"))
+        # Only triangle supported in MVP
+        if shape != "triangle":
+            return None
+        # Compute steps per cycle from sync string like '1/8'
+        steps_per_cycle = 0
+        if isinstance(sync, str) and "/" in sync:
+            # In 4/4 with spb steps per bar, 1/n note = spb/n steps per cycle
+            try:
+                denom = int(sync.split("/", 1)[1])
+                if denom > 0:
+                    steps_per_cycle = max(1, int(spb // denom))
+            except Exception:
+                steps_per_cycle = 0
+        if steps_per_cycle <= 0:
+            # Default to 1/8
+            steps_per_cycle = 2
+        return _PlannedLfo(control=int(control), depth=depth, steps_per_cycle=steps_per_cycle)
 
     # --- Helpers: chord expansion ---
     @staticmethod
@@ -771,3 +1300,35 @@ class Engine:
         pc = (key_pc + scale[(degree - 1) % 7]) % 12
         base = 48 + pc
         return base + 12 * int(octave_offset)
+
+
+class _AlwaysRng:
+    """RNG stand-in for previews: every probability roll passes."""
+
+    @staticmethod
+    def random() -> float:
+        return 0.0
+
+
+class _PreviewEngine(Engine):
+    """Scratch copy of an Engine that records note-ons instead of sending them."""
+
+    def __init__(self, src: Engine) -> None:
+        super().__init__(VirtualSink())
+        # Same doc: every compiled track of the live engine is reused
+        self._plans, self._plan_tracks, self._plan_ctx = src._plans, src._plan_tracks, src._plan_ctx
+        self.overlay = src.overlay
+        if src.doc:
+            self.load(src.doc)
+        self.playing = True
+        self._rng = _AlwaysRng()  # type: ignore[assignment]
+        # Start from the live CC values so only changes are reported
+        self._last_cc = dict(src._last_cc)
+        self.notes: List[Dict[str, Any]] = []
+        self.cc: List[Dict[str, Any]] = []
+
+    def _note_on(self, ch: int, pitch: int, vel: int, on_tick: int, off_tick: int, prob: float = 1.0) -> None:
+        ev: Dict[str, Any] = {"tick": on_tick, "offTick": off_tick, "channel": ch, "pitch": pitch, "velocity": vel}
+        if prob < 1.0:
+            ev["prob"] = prob
+        self.notes.append(ev)
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import time
 from typing import Optional
 
 
@@ -23,16 +24,27 @@ class MidoSink(CoreSink):
     def __init__(self, out_port, also_send_clock: bool = False):
         self.out = out_port
         self.also_send_clock = also_send_clock
+        # Optional conductor.trace.Tracer; each send becomes a 'midi' span
+        self.tracer = None
+
+    def _send(self, msg) -> None:
+        tracer = self.tracer
+        if tracer is None:
+            self.out.send(msg)
+            return
+        t0 = time.perf_counter()
+        self.out.send(msg)
+        tracer.add(msg.type, "midi", t0, time.perf_counter())
 
     def note_on(self, channel: int, pitch: int, velocity: int) -> None:
         import mido
 
-        self.out.send(mido.Message("note_on", note=int(pitch), velocity=int(velocity), channel=int(channel)))
+        self._send(mido.Message("note_on", note=int(pitch), velocity=int(velocity), channel=int(channel)))
 
     def note_off(self, channel: int, pitch: int) -> None:
         import mido
 
-        self.out.send(mido.Message("note_off", note=int(pitch), velocity=0, channel=int(channel)))
+        self._send(mido.Message("note_off", note=int(pitch), velocity=0, channel=int(channel)))
 
     def panic(self) -> None:
         import mido
@@ -40,15 +52,15 @@ class MidoSink(CoreSink):
         # Send All Notes Off across all channels
         for ch in range(16):
             # Sustain off
-            self.out.send(mido.Message("control_change", control=64, value=0, channel=ch))
+            self._send(mido.Message("control_change", control=64, value=0, channel=ch))
             # All Sound Off (120) then All Notes Off (123)
-            self.out.send(mido.Message("control_change", control=120, value=0, channel=ch))
-            self.out.send(mido.Message("control_change", control=123, value=0, channel=ch))
+            self._send(mido.Message("control_change", control=120, value=0, channel=ch))
+            self._send(mido.Message("control_change", control=123, value=0, channel=ch))
 
     def control_change(self, channel: int, control: int, value: int) -> None:
         import mido
 
-        self.out.send(mido.Message("control_change", control=int(control), value=int(max(0, min(127, value))), channel=int(channel)))
+        self._send(mido.Message("control_change", control=int(control), value=int(max(0, min(127, value))), channel=int(channel)))
 
 
 def open_mido_output(name_filter: Optional[str] = None):
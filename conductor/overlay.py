@@ -0,0 +1,263 @@
+"""Ephemeral performance overlay applied on top of the doc at playback.
+
+Live gestures change what the engine emits without editing the doc, so
+they skip validation, canonicalization, persistence and versioning (and
+are not undoable, and are gone on restart):
+
+    {"mute": {track: bool}, "solo": {track: bool}}
+        silence note-ons; any solo silences every track not soloed
+    {"transpose": {track: semitones}}
+        shift note pitches (drumKit hits keep theirs); 0 clears
+    {"velocityScale": {track: factor}}
+        scale note and drumKit velocities, clamped to 1..127; 1 clears
+    {"cc": [{"track", "control", "value", "ramp"?}]}
+        hold a control at value (0..127) in place of its lanes/LFOs;
+        "value": null releases it back to the doc. "ramp" glides there
+        from the last sent value over {"ticks"|"steps"|"beats"|"bars": n}
+    {"clear": true}
+        drop everything above before applying the rest
+
+Tracks are named as in semantic_ops (id or unique name) and kept by id,
+so the overlay follows a track across edits that reorder tracks. CC
+controls are a number, "cc:N" or a NAME_CC name. Bad changes raise
+ValueError.
+
+An Overlay is never modified: update() returns a new one, which the
+engine binds to the current doc's track indices (BoundOverlay) and
+installs with a single assignment, so the clock thread always sees a
+whole gesture.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from conductor.midi_engine import NAME_CC
+from conductor.semantic_ops import resolve_track
+
+
+class TrackFx(NamedTuple):
+    transpose: int = 0
+    velocity_scale: float = 1.0
+
+    def pitches(self, pitches: List[int]) -> List[int]:
+        if not self.transpose:
+            return pitches
+        return [max(0, min(127, p + self.transpose)) for p in pitches]
+
+    def velocity(self, vel: int) -> int:
+        if self.velocity_scale == 1.0:
+            return vel
+        return max(1, min(127, int(round(vel * self.velocity_scale))))
+
+
+class CCRide(NamedTuple):
+    """One overridden control: a ramp from start_value to target.
+
+    target None is a release, ramping back to whatever the doc says.
+    start_value None (nothing sent yet) jumps straight to the target.
+    """
+
+    target: Optional[int]
+    start_value: Optional[int]
+    start_tick: int
+    ramp_ticks: int
+
+    def value_at(self, tick: int, base: Optional[int]) -> Optional[int]:
+        """Value at tick given the doc's value (None if the doc has none)."""
+        target = self.target if self.target is not None else base
+        if target is None or self.start_value is None or tick >= self.start_tick + self.ramp_ticks:
+            return target
+        frac = max(0, tick - self.start_tick) / self.ramp_ticks
+        return int(round(self.start_value + (target - self.start_value) * frac))
+
+
+class BoundOverlay(NamedTuple):
+    """An Overlay resolved against one doc's tracks, indexed like doc["tracks"]."""
+
+    mute: int  # bit ti set = track ti muted
+    solo: int
+    audible: int  # bit ti set = track ti emits note-ons
+    fx: Tuple[Optional[TrackFx], ...]
+    cc: Tuple[Optional[Dict[int, CCRide]], ...]
+
+    def ride(self, ti: int, merged: List[Tuple[int, int]], tick: int) -> List[Tuple[int, int]]:
+        """A track's (control, value) CC list with its overridden controls replaced."""
+        rides = self.cc[ti]
+        if not rides:
+            return merged
+        out: Dict[int, int] = dict(merged)
+        for ctrl, ride in rides.items():
+            value = ride.value_at(tick, out.get(ctrl))
+            if value is not None:
+                out[ctrl] = value
+        return sorted(out.items())
+
+
+class Overlay:
+    def __init__(
+        self,
+        muted: FrozenSet[str] = frozenset(),
+        soloed: FrozenSet[str] = frozenset(),
+        fx: Optional[Dict[str, TrackFx]] = None,
+        cc: Optional[Dict[Tuple[str, int], CCRide]] = None,
+    ) -> None:
+        self.muted = muted
+        self.soloed = soloed
+        self.fx: Dict[str, TrackFx] = fx or {}
+        self.cc: Dict[Tuple[str, int], CCRide] = cc or {}
+
+    def __bool__(self) -> bool:
+        return bool(self.muted or self.soloed or self.fx or self.cc)
+
+    def bind(self, tracks: List[Any]) -> Optional[BoundOverlay]:
+        """Resolve against doc["tracks"]; None when it changes nothing."""
+        if not self:
+            return None
+        ids = [tr.get("id") if isinstance(tr, dict) else None for tr in tracks]
+        mute = solo = 0
+        for ti, tid in enumerate(ids):
+            if tid in self.muted:
+                mute |= 1 << ti
+            if tid in self.soloed:
+                solo |= 1 << ti
+        everyone = (1 << len(ids)) - 1
+        rides: List[Optional[Dict[int, CCRide]]] = [None] * len(ids)
+        for (tid, ctrl), ride in self.cc.items():
+            for ti, other in enumerate(ids):
+                if other == tid:
+                    rides[ti] = rides[ti] or {}
+                    rides[ti][ctrl] = ride
+        return BoundOverlay(
+            mute=mute,
+            solo=solo,
+            audible=(solo or everyone) & ~mute,
+            fx=tuple(self.fx.get(tid) for tid in ids),
+            cc=tuple(rides),
+        )
+
+    def update(self, doc: Dict[str, Any], changes: Dict[str, Any], tick: int, cc_now: Dict[int, Dict[int, int]]) -> "Overlay":
+        """A new Overlay with changes applied (see module doc).
+
+        tick is the engine's current tick, where ramps start; cc_now is its
+        last sent CC values by channel, where they start from.
+        """
+        if not isinstance(changes, dict):
+            raise ValueError("overlay changes must be an object")
+        unknown = set(changes) - {"clear", "mute", "solo", "transpose", "velocityScale", "cc"}
+        if unknown:
+            raise ValueError(f"unknown overlay field: {sorted(unknown)[0]!r}")
+        base = Overlay() if changes.get("clear") is True else self
+        muted, soloed = set(base.muted), set(base.soloed)
+        fx = dict(base.fx)
+        # Finished releases are plain doc playback again
+        cc = {k: r for k, r in base.cc.items() if not (r.target is None and tick >= r.start_tick + r.ramp_ticks)}
+        for field, into in (("mute", muted), ("solo", soloed)):
+            for ref, on in _entries(changes, field):
+                if not isinstance(on, bool):
+                    raise ValueError(f"{field} values must be booleans")
+                tid = _track_id(doc, ref)
+                if on:
+                    into.add(tid)
+                else:
+                    into.discard(tid)
+        for ref, semis in _entries(changes, "transpose"):
+            if isinstance(semis, bool) or not isinstance(semis, int) or not -127 <= semis <= 127:
+                raise ValueError("transpose values must be integers in -127..127")
+            tid = _track_id(doc, ref)
+            fx[tid] = fx.get(tid, TrackFx())._replace(transpose=semis)
+        for ref, factor in _entries(changes, "velocityScale"):
+            if isinstance(factor, bool) or not isinstance(factor, (int, float)) or factor < 0:
+                raise ValueError("velocityScale values must be numbers >= 0")
+            tid = _track_id(doc, ref)
+            fx[tid] = fx.get(tid, TrackFx())._replace(velocity_scale=float(factor))
+        fx = {tid: f for tid, f in fx.items() if f != TrackFx()}
+        rides = changes.get("cc", [])
+        if not isinstance(rides, list):
+            raise ValueError("cc must be an array")
+        for i, spec in enumerate(rides):
+            try:
+                self._ride(doc, spec, tick, cc_now, cc)
+            except ValueError as e:
+                raise ValueError(f"cc[{i}]: {e}") from None
+        return Overlay(frozenset(muted), frozenset(soloed), fx, cc)
+
+    @staticmethod
+    def _ride(doc: Dict[str, Any], spec: Any, tick: int, cc_now: Dict[int, Dict[int, int]], cc: Dict[Tuple[str, int], CCRide]) -> None:
+        if not isinstance(spec, dict):
+            raise ValueError("cc entry must be an object")
+        _, tr = resolve_track(doc, spec.get("track"))
+        key = (str(tr.get("id")), _control(spec.get("control")))
+        if "value" not in spec:
+            raise ValueError("value is required (null releases)")
+        value = spec["value"]
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 127):
+            raise ValueError("value must be an integer in 0..127 or null")
+        ramp = _ramp_ticks(doc, spec.get("ramp"))
+        if ramp <= 0:
+            if value is None:
+                cc.pop(key, None)
+            else:
+                cc[key] = CCRide(value, None, tick, 0)
+            return
+        ch = tr.get("midiChannel", 0)
+        start = (cc_now.get(ch) or {}).get(key[1])
+        cc[key] = CCRide(value, start, tick, ramp)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON form for state messages; empty fields are left out."""
+        out: Dict[str, Any] = {}
+        if self.muted:
+            out["mute"] = sorted(self.muted)
+        if self.soloed:
+            out["solo"] = sorted(self.soloed)
+        transpose = {tid: f.transpose for tid, f in sorted(self.fx.items()) if f.transpose}
+        if transpose:
+            out["transpose"] = transpose
+        scale = {tid: f.velocity_scale for tid, f in sorted(self.fx.items()) if f.velocity_scale != 1.0}
+        if scale:
+            out["velocityScale"] = scale
+        if self.cc:
+            out["cc"] = [
+                {"track": tid, "control": ctrl, "value": r.target, "rampFrom": r.start_value, "startTick": r.start_tick, "rampTicks": r.ramp_ticks}
+                for (tid, ctrl), r in sorted(self.cc.items())
+            ]
+        return out
+
+
+def _entries(changes: Dict[str, Any], field: str):
+    value = changes.get(field, {})
+    if not isinstance(value, dict):
+        raise ValueError(f"{field} must be an object keyed by track")
+    return value.items()
+
+
+def _track_id(doc: Dict[str, Any], ref: Any) -> str:
+    return str(resolve_track(doc, ref)[1].get("id"))
+
+
+def _control(ref: Any) -> int:
+    if isinstance(ref, str):
+        name = ref.split(":", 1)[1] if ref.startswith(("cc:", "name:")) else ref
+        if ref.startswith("cc:") and name.isdigit():
+            ref = int(name)
+        elif name in NAME_CC:
+            ref = NAME_CC[name]
+    if isinstance(ref, bool) or not isinstance(ref, int) or not 0 <= ref <= 127:
+        raise ValueError(f"unknown control: {ref!r}")
+    return ref
+
+
+def _ramp_ticks(doc: Dict[str, Any], ramp: Any) -> int:
+    if ramp is None:
+        return 0
+    if not isinstance(ramp, dict) or len(ramp) != 1:
+        raise ValueError('ramp must be {"ticks"|"steps"|"beats"|"bars": n}')
+    (unit, n), = ramp.items()
+    meta = doc.get("meta") or {}
+    ppq = int(meta.get("ppq", 96))
+    spb = int(meta.get("stepsPerBar", 16))
+    per = {"ticks": 1, "steps": (ppq * 4) // spb if spb > 0 else 0, "beats": ppq, "bars": ppq * 4}.get(unit)
+    if per is None or isinstance(n, bool) or not isinstance(n, (int, float)) or n < 0:
+        raise ValueError('ramp must be {"ticks"|"steps"|"beats"|"bars": n} with n >= 0')
+    return int(round(n * per))
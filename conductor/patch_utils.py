@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import copy
-from typing import Any, Dict, List
+import json
+from typing import Any, Dict, List, Optional, Set
 
 
 def _json_pointer_get_parent(root: Any, pointer: str):
@@ -62,6 +63,24 @@ def _apply_remove(root: Any, path: str):
         del parent[key]
 
 
+def _apply_ops_fallback(base: Any, ops: List[Dict[str, Any]]) -> Any:
+    # Minimal fallback
+    for op in ops:
+        t = op.get("op")
+        path = op.get("path")
+        if not isinstance(path, str):
+            raise ValueError("invalid path in op")
+        if t == "replace":
+            _apply_replace(base, path, op.get("value"))
+        elif t == "add":
+            _apply_add(base, path, op.get("value"))
+        elif t == "remove":
+            _apply_remove(base, path)
+        else:
+            raise NotImplementedError(f"op '{t}' not supported in fallback")
+    return base
+
+
 def apply_patch(doc: Dict[str, Any], ops: List[Dict[str, Any]]) -> Dict[str, Any]:
     """Apply an RFC 6902 JSON Patch ops array to a deep copy of doc.
 
@@ -75,18 +94,217 @@ def apply_patch(doc: Dict[str, Any], ops: List[Dict[str, Any]]) -> Dict[str, Any
         patch = jsonpatch.JsonPatch(ops)
         return patch.apply(base, in_place=False)
     except Exception:
-        # Minimal fallback
-        for op in ops:
-            t = op.get("op")
-            path = op.get("path")
-            if not isinstance(path, str):
-                raise ValueError("invalid path in op")
-            if t == "replace":
-                _apply_replace(base, path, op.get("value"))
-            elif t == "add":
-                _apply_add(base, path, op.get("value"))
-            elif t == "remove":
-                _apply_remove(base, path)
+        return _apply_ops_fallback(base, ops)
+
+
+def apply_patch_in_place(doc: Dict[str, Any], ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply ops directly to doc, which the caller must own outright.
+
+    Used for replaying many patches onto one private copy (journal replay)
+    without a deep copy per patch. Errors propagate; doc may then be
+    partially patched.
+    """
+    try:
+        import jsonpatch  # type: ignore
+    except ImportError:
+        return _apply_ops_fallback(doc, ops)
+    return jsonpatch.JsonPatch(ops).apply(doc, in_place=True)
+
+
+def json_equal(a: Any, b: Any) -> bool:
+    """Equal as JSON: unlike ==, 1, 1.0 and True are three different values."""
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, (dict, list)):
+        if a != b:
+            return False
+        # == treats 1, 1.0 and True alike; the JSON text does not
+        try:
+            return json.dumps(a, sort_keys=True) == json.dumps(b, sort_keys=True)
+        except (TypeError, ValueError):
+            return False
+    return a == b
+
+
+def _test_equal(a: Any, b: Any) -> bool:
+    """RFC 6902 §4.6 "test" equality: 96 == 96.0, but True is never a number."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_test_equal(v, b[k]) for k, v in a.items())
+    if isinstance(a, list):
+        return len(a) == len(b) and all(_test_equal(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def _split_pointer(pointer: str) -> List[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise ValueError(f"invalid JSON pointer: {pointer!r}")
+    return [_unescape(p) for p in pointer[1:].split("/")]
+
+
+def _list_index(container: List[Any], token: str, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise ValueError(f"invalid array index: {token!r}")
+    idx = int(token)
+    if idx > len(container) or (idx == len(container) and not allow_end):
+        raise IndexError(f"array index out of range: {idx}")
+    return idx
+
+
+class _CowDoc:
+    """Copy-on-write view used by apply_patch_cow.
+
+    A container is copied (shallowly) the first time a path through it is
+    written, and written freely after that; everything else stays shared
+    with the source doc.
+    """
+
+    def __init__(self, doc: Any) -> None:
+        self.root = doc
+        # id -> copy; holding the copies keeps their ids from being reused
+        self._owned: Dict[int, Any] = {}
+
+    def _own(self, obj: Any) -> Any:
+        if id(obj) in self._owned:
+            return obj
+        copied = dict(obj) if isinstance(obj, dict) else list(obj)
+        self._owned[id(copied)] = copied
+        return copied
+
+    def get(self, parts: List[str]) -> Any:
+        cur = self.root
+        for p in parts:
+            if isinstance(cur, list):
+                cur = cur[_list_index(cur, p, False)]
+            elif isinstance(cur, dict):
+                cur = cur[p]
+            else:
+                raise KeyError(f"cannot traverse into {type(cur).__name__}")
+        return cur
+
+    def parent(self, parts: List[str]) -> Any:
+        """Owned container holding parts[-1], copying the path down to it."""
+        self.root = cur = self._own(self.root)
+        for p in parts[:-1]:
+            if isinstance(cur, list):
+                idx = _list_index(cur, p, False)
+                child = self._own(cur[idx])
+                cur[idx] = child
+            elif isinstance(cur, dict):
+                child = self._own(cur[p])
+                cur[p] = child
+            else:
+                raise KeyError(f"cannot traverse into {type(cur).__name__}")
+            if not isinstance(child, (dict, list)):
+                raise KeyError(f"cannot traverse into {type(child).__name__}")
+            cur = child
+        return cur
+
+    def add(self, parts: List[str], value: Any) -> None:
+        if not parts:
+            self.root = value
+            return
+        parent = self.parent(parts)
+        if isinstance(parent, list):
+            parent.insert(_list_index(parent, parts[-1], True), value)
+        else:
+            parent[parts[-1]] = value
+
+    def remove(self, parts: List[str]) -> Any:
+        if not parts:
+            raise KeyError("cannot remove root")
+        parent = self.parent(parts)
+        if isinstance(parent, list):
+            return parent.pop(_list_index(parent, parts[-1], False))
+        return parent.pop(parts[-1])
+
+    def replace(self, parts: List[str], value: Any) -> None:
+        if not parts:
+            self.root = value
+            return
+        parent = self.parent(parts)
+        if isinstance(parent, list):
+            parent[_list_index(parent, parts[-1], False)] = value
+        else:
+            if parts[-1] not in parent:
+                raise KeyError(f"cannot replace missing member: {parts[-1]!r}")
+            parent[parts[-1]] = value
+
+
+def apply_patch_cow(doc: Dict[str, Any], ops: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Apply an RFC 6902 patch without copying the whole doc.
+
+    Only the containers along each op's path are copied; every other
+    subtree of the result is the same object as in doc, which is left
+    untouched. Neither doc nor the result may be mutated afterwards (the
+    conductor replaces its doc, never edits it). Supports all six ops and
+    ~0/~1 escapes; raises ValueError/KeyError/IndexError on bad ops.
+    """
+    cow = _CowDoc(doc)
+    for op in ops:
+        if not isinstance(op, dict):
+            raise ValueError("patch op must be an object")
+        t = op.get("op")
+        path = op.get("path")
+        if not isinstance(path, str):
+            raise ValueError("invalid path in op")
+        parts = _split_pointer(path)
+        if t == "add":
+            cow.add(parts, op.get("value"))
+        elif t == "remove":
+            cow.remove(parts)
+        elif t == "replace":
+            cow.replace(parts, op.get("value"))
+        elif t == "move" or t == "copy":
+            src = op.get("from")
+            if not isinstance(src, str):
+                raise ValueError("invalid from in op")
+            src_parts = _split_pointer(src)
+            if t == "move":
+                if parts[:len(src_parts)] == src_parts and parts != src_parts:
+                    raise ValueError("cannot move a value into one of its children")
+                cow.add(parts, cow.remove(src_parts))
             else:
-                raise NotImplementedError(f"op '{t}' not supported in fallback")
-        return base
+                # A private copy: later ops may write through either location
+                cow.add(parts, copy.deepcopy(cow.get(src_parts)))
+        elif t == "test":
+            if not _test_equal(cow.get(parts), op.get("value")):
+                raise ValueError(f"test failed at {path}")
+        else:
+            raise ValueError(f"unknown op: {t!r}")
+    return cow.root
+
+
+def touched_tracks(ops: List[Dict[str, Any]]) -> Optional[Set[int]]:
+    """Track indices ops write below, or None if they restructure the track list."""
+    touched: Set[int] = set()
+    for op in ops:
+        if not isinstance(op, dict):
+            return None
+        for key in ("path", "from"):
+            p = op.get(key)
+            if p is None and key == "from":
+                continue
+            if not isinstance(p, str) or p == "":
+                return None
+            parts = p.split("/", 3)
+            if len(parts) >= 2 and parts[1] == "tracks":
+                if len(parts) < 4 or not parts[2].isdigit():
+                    return None
+                touched.add(int(parts[2]))
+    return touched
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class PersistWorker:
+    """Write-behind saver that coalesces rapid doc versions into one write.
+
+    submit() only records the newest (version, doc) and returns; a daemon
+    thread writes it once no new version has arrived for `quiet_s`, or once
+    the oldest unsaved version is `max_delay_s` old, whichever comes first.
+    Docs must not be mutated after submit (the conductor replaces, never
+    edits, its doc). flush() writes synchronously and is called on shutdown.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[int, Dict[str, Any]], None],
+        quiet_s: float = 0.25,
+        max_delay_s: float = 2.0,
+    ) -> None:
+        self._write = write
+        self.quiet_s = max(0.0, float(quiet_s))
+        self.max_delay_s = max(self.quiet_s, float(max_delay_s))
+        self._cond = threading.Condition()
+        # Serializes actual writes between the worker and flush()
+        self._write_lock = threading.Lock()
+        self._pending: Optional[tuple] = None
+        self._first_pending: Optional[float] = None
+        self._last_submit: float = 0.0
+        self._stopped = False
+        self.submitted_version: Optional[int] = None
+        self.written_version: Optional[int] = None
+        self.writes: int = 0
+        self.coalesced: int = 0
+        self.errors: int = 0
+        self.last_error: Optional[str] = None
+        self.last_write_ms: float = 0.0
+        self._thread = threading.Thread(target=self._run, name="persist", daemon=True)
+        self._thread.start()
+
+    def submit(self, version: int, doc: Dict[str, Any]) -> None:
+        now = time.monotonic()
+        with self._cond:
+            if self._pending is not None:
+                self.coalesced += 1
+            else:
+                self._first_pending = now
+            self._pending = (version, doc)
+            self._last_submit = now
+            self.submitted_version = version
+            self._cond.notify()
+
+    def _take_due(self) -> Optional[tuple]:
+        # Caller holds self._cond
+        while not self._stopped:
+            if self._pending is None:
+                self._cond.wait()
+                continue
+            now = time.monotonic()
+            due = min(self._last_submit + self.quiet_s, (self._first_pending or now) + self.max_delay_s)
+            if now >= due:
+                return self._take()
+            self._cond.wait(due - now)
+        return None
+
+    def _take(self) -> Optional[tuple]:
+        item = self._pending
+        self._pending = None
+        self._first_pending = None
+        return item
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                item = self._take_due()
+            if item is None:
+                return
+            self._write_item(item)
+
+    def _write_item(self, item: tuple) -> None:
+        version, doc = item
+        with self._write_lock:
+            # flush() may have written a newer version meanwhile
+            if self.written_version is not None and version <= self.written_version:
+                return
+            t0 = time.perf_counter()
+            try:
+                self._write(version, doc)
+                self.written_version = version
+                self.writes += 1
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+            self.last_write_ms = (time.perf_counter() - t0) * 1000.0
+
+    def cancel(self) -> None:
+        """Drop the pending version (e.g. superseded by an external edit on disk)."""
+        with self._cond:
+            self._take()
+
+    def flush(self) -> None:
+        """Write any pending version now, on the calling thread."""
+        with self._cond:
+            item = self._take()
+        if item is not None:
+            self._write_item(item)
+        else:
+            # Wait out a write the worker already started
+            with self._write_lock:
+                pass
+
+    def close(self) -> None:
+        self.flush()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join(timeout=2.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            first = self._first_pending
+            pending = self._pending is not None
+        return {
+            "pending": pending,
+            "lagMs": round((time.monotonic() - first) * 1000.0, 1) if first is not None else 0.0,
+            "submittedVersion": self.submitted_version,
+            "writtenVersion": self.written_version,
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "lastError": self.last_error,
+            "lastWriteMs": round(self.last_write_ms, 3),
+        }
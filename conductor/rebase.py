@@ -0,0 +1,208 @@
+"""Rebase RFC 6902 ops written against an older doc version.
+
+rebase_ops(applied, ops) carries ops over the ops applied since their base
+version: array indices are shifted past intervening inserts and removals,
+so edits to disjoint parts of the doc both land. When the two sides touch
+the same values the rebase fails with the conflicting paths of `ops`:
+
+- one side replaced or removed a value the other reads or writes, or a
+  container around it
+- both sides added the same object member
+- `ops` refers to an array element that has since been removed
+
+Inserts into the same array never conflict; at the same index the
+rebased insert goes after the one already applied. `applied` must use
+concrete array indices (see resolve_appends): an append's "-" says nothing
+about where the element ended up once other ops are carried past it.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from conductor.patch_utils import _CowDoc, _split_pointer, apply_patch_cow
+
+
+Tokens = List[str]
+
+
+class _Conflict(Exception):
+    pass
+
+
+class _Op:
+    """An op with parsed pointers; `src` is "from" for move/copy."""
+
+    __slots__ = ("op", "kind", "path", "src")
+
+    def __init__(self, op: Dict[str, Any]) -> None:
+        kind = op.get("op")
+        if kind not in ("add", "remove", "replace", "move", "copy", "test"):
+            raise ValueError(f"unknown op: {kind!r}")
+        self.op = op
+        self.kind = kind
+        self.path: Tokens = _split_pointer(op["path"])
+        self.src: Optional[Tokens] = _split_pointer(op["from"]) if kind in ("move", "copy") else None
+
+    def clone(self) -> "_Op":
+        out = _Op.__new__(_Op)
+        out.op = self.op
+        out.kind = self.kind
+        out.path = list(self.path)
+        out.src = list(self.src) if self.src is not None else None
+        return out
+
+    def refs(self) -> List[Tuple[Tokens, str]]:
+        """(pointer, role) pairs: role is "write", "read" or "insert"."""
+        if self.kind in ("replace", "remove"):
+            return [(self.path, "write")]
+        if self.kind == "test":
+            return [(self.path, "read")]
+        out: List[Tuple[Tokens, str]] = []
+        if self.src is not None:
+            out.append((self.src, "write" if self.kind == "move" else "read"))
+        out.append((self.path, "insert"))
+        return out
+
+    def edits(self) -> List[Tuple[str, Tokens]]:
+        """Structural effects in order: ("remove"|"insert"|"replace", pointer)."""
+        if self.kind == "remove":
+            return [("remove", self.path)]
+        if self.kind == "replace":
+            return [("replace", self.path)]
+        if self.kind == "add" or self.kind == "copy":
+            return [("insert", self.path)]
+        if self.kind == "move":
+            assert self.src is not None
+            return [("remove", self.src), ("insert", self.path)]
+        return []
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = dict(self.op)
+        out["path"] = _join(self.path)
+        if self.src is not None:
+            out["from"] = _join(self.src)
+        return out
+
+
+def _join(tokens: Tokens) -> str:
+    return "".join("/" + t.replace("~", "~0").replace("/", "~1") for t in tokens)
+
+
+def _under(a: Tokens, b: Tokens) -> bool:
+    """a is b or lies inside it."""
+    return len(a) >= len(b) and a[:len(b)] == b
+
+
+def _array_insert(toks: Tokens, role: str) -> bool:
+    return role == "insert" and bool(toks) and (toks[-1] == "-" or toks[-1].isdigit())
+
+
+def _overlaps(toks: Tokens, role: str, kind: str, at: Tokens) -> bool:
+    """Whether an op using toks (as role) collides with an applied edit at `at`."""
+    if _array_insert(toks, role):
+        # Inserting next to an element leaves it alone; only the array itself matters
+        return _under(toks[:-1], at)
+    if kind != "replace" and at and at[-1].isdigit():
+        # Array insert/remove: indices are shifted; only writes to an enclosing container collide
+        return len(at) > len(toks) and _under(at, toks)
+    return _under(toks, at) or _under(at, toks)
+
+
+def _shift(toks: Tokens, role: str, kind: str, at: Tokens, after: bool) -> None:
+    """Move toks across an array insert/remove at `at` (in place).
+
+    `after` decides the tie between two inserts at the same index.
+    """
+    if kind == "replace" or not at or not at[-1].isdigit():
+        return
+    n = len(at) - 1
+    if len(toks) <= n or toks[:n] != at[:n] or not toks[n].isdigit():
+        return
+    m, i = int(toks[n]), int(at[n])
+    exact = role == "insert" and len(toks) == n + 1
+    if kind == "remove":
+        if m > i:
+            m -= 1
+        elif m == i and not exact:
+            raise _Conflict
+    elif m > i or (m == i and (after or not exact)):
+        m += 1
+    toks[n] = str(m)
+
+
+def _carry(op: _Op, applied: _Op) -> None:
+    """Rewrite op (in place) to apply after `applied`; raises _Conflict."""
+    for kind, at in applied.edits():
+        if not at:
+            raise _Conflict
+        for toks, role in op.refs():
+            if _overlaps(toks, role, kind, at):
+                raise _Conflict
+            _shift(toks, role, kind, at, after=True)
+
+
+def _pass(applied: _Op, op: _Op) -> None:
+    """Rewrite an applied op (in place) as if it came after op."""
+    for kind, at in op.edits():
+        for toks, role in applied.refs():
+            _shift(toks, role, kind, at, after=False)
+
+
+def resolve_appends(doc: Dict[str, Any], ops: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """ops with each "/-" append path replaced by the index it appends at.
+
+    Returns ops itself when there is nothing to resolve; otherwise replays
+    the ops up to the last append (copy-on-write) to learn array lengths.
+    Raises like apply_patch_cow on ops that do not apply.
+    """
+    appends = {i for i, op in enumerate(ops) if isinstance(op, dict) and isinstance(op.get("path"), str) and op["path"].endswith("/-")}
+    if not appends:
+        return ops
+    last = max(appends)
+    out: List[Dict[str, Any]] = []
+    cur = doc
+    for i, op in enumerate(ops):
+        if i <= last:
+            if i in appends:
+                parts = _split_pointer(op["path"])
+                target = _CowDoc(cur).get(parts[:-1])
+                if isinstance(target, list):
+                    op = dict(op, path=_join(parts[:-1] + [str(len(target))]))
+            cur = apply_patch_cow(cur, [op])
+        out.append(op)
+    return out
+
+
+def rebase_ops(applied: List[Dict[str, Any]], ops: List[Dict[str, Any]], ignore: Tuple[str, ...] = ("/docVersion",)) -> Tuple[Optional[List[Dict[str, Any]]], List[str]]:
+    """(rebased ops, []) or (None, conflicting paths of ops).
+
+    `applied` are the ops applied since the version `ops` were written
+    against, in order. Malformed ops count as conflicts.
+    """
+    try:
+        inter = [_Op(a) for a in applied if a.get("path") not in ignore and a.get("op") != "test"]
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return None, [str(op.get("path")) if isinstance(op, dict) else str(op) for op in ops]
+    out: List[Dict[str, Any]] = []
+    conflicts: List[str] = []
+    for raw in ops:
+        try:
+            op = _Op(raw)
+            passed: List[_Op] = []
+            for a in inter:
+                # Step by step: a moves past op as it was before crossing a, and vice versa
+                moved = a.clone()
+                _pass(moved, op)
+                _carry(op, a)
+                passed.append(moved)
+            inter = passed
+        except (_Conflict, KeyError, TypeError, ValueError, AttributeError):
+            path = str(raw.get("path")) if isinstance(raw, dict) else str(raw)
+            if path not in conflicts:
+                conflicts.append(path)
+            continue
+        out.append(op.to_dict())
+    if conflicts:
+        return None, conflicts
+    return out, []
@@ -0,0 +1,336 @@
+"""Semantic edit commands compiled into minimal RFC 6902 patches.
+
+compile_commands(doc, commands) resolves each command against doc (and the
+commands before it) and returns the ops that carry it out: one op per value
+that actually changes, at the element's current index, with inserts placed
+where canonicalize() would sort them. Every command names its track by
+"track": a track id, a unique track name, or an index.
+
+    {"cmd": "setDrumRow", "track", "key", "pattern", "bar"=1, "vel"?}
+        set (or add) the drumKit row for key at bar
+    {"cmd": "transpose", "track", "semitones", "steps"?}
+        shift every pitch event; degree events only by whole octaves
+        (octaveOffset) and chord events not at all, else ValueError
+    {"cmd": "scaleVelocity", "track", "factor", "steps"?}
+        scale event velocities (and drumKit row vel), clamped to 1..127
+    {"cmd": "setStepEvent", "track", "step", "event", "index"=0}
+        merge fields into the event at step idx (null drops a field);
+        "event": null removes the event, and the step once it is empty
+    {"cmd": "moveCCPoint", "track", "lane", "point" | "at", "to"?, "v"?}
+        retime and/or re-level one point of a ccLane, by index or time
+    {"cmd": "mute" | "unmute", "track", "steps"?}
+        set or clear Step.mute (§5.1); drumKit rows are not steps, so
+        silence those with setDrumRow
+
+"steps" limits a command to the listed step idx values (default: all).
+Bad commands raise ValueError.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from conductor.patch_utils import apply_patch_cow
+from conductor.validator import drum_pattern_key, point_key, step_key
+
+
+Op = Dict[str, Any]
+
+
+def compile_commands(doc: Dict[str, Any], commands: List[Dict[str, Any]]) -> List[Op]:
+    """Ops for commands applied in order; each sees the ones before it."""
+    if not isinstance(commands, list) or not commands:
+        raise ValueError("commands must be a non-empty array")
+    ops: List[Op] = []
+    cur = doc
+    for i, cmd in enumerate(commands):
+        try:
+            step = compile_command(cur, cmd)
+        except ValueError as e:
+            raise ValueError(f"commands[{i}]: {e}") from None
+        if step:
+            cur = apply_patch_cow(cur, step)
+            ops.extend(step)
+    return ops
+
+
+def compile_command(doc: Dict[str, Any], cmd: Dict[str, Any]) -> List[Op]:
+    if not isinstance(cmd, dict):
+        raise ValueError("command must be an object")
+    fn = _COMMANDS.get(cmd.get("cmd"))
+    if fn is None:
+        raise ValueError(f"unknown command: {cmd.get('cmd')!r}")
+    ti, tr = resolve_track(doc, cmd.get("track"))
+    return fn(tr, f"/tracks/{ti}", cmd)
+
+
+def resolve_track(doc: Dict[str, Any], ref: Any) -> Tuple[int, Dict[str, Any]]:
+    """(index, track) for a track id, unique track name or index; ValueError if none."""
+    tracks = doc.get("tracks")
+    if not isinstance(tracks, list):
+        raise ValueError("doc has no tracks")
+    if isinstance(ref, int) and not isinstance(ref, bool):
+        if 0 <= ref < len(tracks) and isinstance(tracks[ref], dict):
+            return ref, tracks[ref]
+    elif isinstance(ref, str):
+        for ti, tr in enumerate(tracks):
+            if isinstance(tr, dict) and tr.get("id") == ref:
+                return ti, tr
+        named = [ti for ti, tr in enumerate(tracks) if isinstance(tr, dict) and tr.get("name") == ref]
+        if len(named) == 1:
+            return named[0], tracks[named[0]]
+    raise ValueError(f"unknown track: {ref!r}")
+
+
+def _int(cmd: Dict[str, Any], key: str, default: Optional[int] = None, minimum: Optional[int] = None) -> int:
+    v = cmd.get(key, default)
+    if isinstance(v, bool) or not isinstance(v, int) or (minimum is not None and v < minimum):
+        raise ValueError(f"{key} must be an integer" + (f" >= {minimum}" if minimum is not None else ""))
+    return v
+
+
+def _number(cmd: Dict[str, Any], key: str) -> float:
+    v = cmd.get(key)
+    if isinstance(v, bool) or not isinstance(v, (int, float)):
+        raise ValueError(f"{key} must be a number")
+    return float(v)
+
+
+def _step_filter(cmd: Dict[str, Any]) -> Optional[Set[int]]:
+    if "steps" not in cmd:
+        return None
+    steps = cmd["steps"]
+    if not isinstance(steps, list) or not all(isinstance(s, int) and not isinstance(s, bool) for s in steps):
+        raise ValueError("steps must be an array of step idx values")
+    return set(steps)
+
+
+def _steps(tr: Dict[str, Any], cmd: Dict[str, Any]):
+    """(list index, step) for the steps a command applies to."""
+    only = _step_filter(cmd)
+    steps = (tr.get("pattern") or {}).get("steps")
+    for si, st in enumerate(steps if isinstance(steps, list) else []):
+        if isinstance(st, dict) and (only is None or st.get("idx") in only):
+            yield si, st
+
+
+def _insert_at(items: List[Any], key: Callable[[Any], Any], value: Any) -> int:
+    """Index that keeps items sorted by key with value inserted (after equal keys)."""
+    k = key(value)
+    for i, item in enumerate(items):
+        try:
+            if key(item) > k:
+                return i
+        except (AttributeError, TypeError):
+            continue
+    return len(items)
+
+
+def _set(path: str, obj: Dict[str, Any], key: str, value: Any) -> List[Op]:
+    """Op setting obj[key] (at path/key), or none if it already has that value."""
+    if key in obj and type(obj[key]) is type(value) and obj[key] == value:
+        return []
+    return [{"op": "replace" if key in obj else "add", "path": f"{path}/{_escape(key)}", "value": value}]
+
+
+def _set_drum_row(tr: Dict[str, Any], tpath: str, cmd: Dict[str, Any]) -> List[Op]:
+    key, pattern = cmd.get("key"), cmd.get("pattern")
+    if not isinstance(key, str) or not isinstance(pattern, str):
+        raise ValueError("setDrumRow needs key and pattern strings")
+    bar = _int(cmd, "bar", 1, minimum=1)
+    spec: Dict[str, Any] = {"bar": bar, "key": key, "pattern": pattern}
+    if "vel" in cmd:
+        spec["vel"] = _int(cmd, "vel", minimum=1)
+    dk = tr.get("drumKit")
+    if dk is None:
+        return [{"op": "add", "path": f"{tpath}/drumKit", "value": {"patterns": [spec]}}]
+    if not isinstance(dk, dict):
+        raise ValueError("track drumKit is not an object")
+    pats = dk.get("patterns")
+    if not isinstance(pats, list):
+        return [{"op": "add", "path": f"{tpath}/drumKit/patterns", "value": [spec]}]
+    for pi, p in enumerate(pats):
+        if isinstance(p, dict) and p.get("bar") == bar and p.get("key") == key:
+            ppath = f"{tpath}/drumKit/patterns/{pi}"
+            ops = _set(ppath, p, "pattern", pattern)
+            if "vel" in spec:
+                ops += _set(ppath, p, "vel", spec["vel"])
+            return ops
+    return [{"op": "add", "path": f"{tpath}/drumKit/patterns/{_insert_at(pats, drum_pattern_key, spec)}", "value": spec}]
+
+
+def _transpose(tr: Dict[str, Any], tpath: str, cmd: Dict[str, Any]) -> List[Op]:
+    n = _int(cmd, "semitones")
+    ops: List[Op] = []
+    if n == 0:
+        return ops
+    for si, st in _steps(tr, cmd):
+        for ei, e in enumerate(st.get("events") or []):
+            if not isinstance(e, dict):
+                continue
+            epath = f"{tpath}/pattern/steps/{si}/events/{ei}"
+            p = e.get("pitch")
+            if isinstance(p, int) and not isinstance(p, bool):
+                if not 0 <= p + n <= 127:
+                    raise ValueError(f"pitch {p} at step {st.get('idx')} would leave 0..127")
+                ops.append({"op": "replace", "path": f"{epath}/pitch", "value": p + n})
+            elif "degree" in e and n % 12 == 0:
+                octave = e.get("octaveOffset", 0)
+                if isinstance(octave, bool) or not isinstance(octave, int):
+                    raise ValueError(f"degree event at step {st.get('idx')} has a non-integer octaveOffset")
+                ops += _set(epath, e, "octaveOffset", octave + n // 12)
+            elif "degree" in e or "chord" in e:
+                # Scale degrees and chord symbols name notes of meta.key, not semitones
+                kind = "degree" if "degree" in e else "chord"
+                raise ValueError(f"cannot transpose {kind} event at step {st.get('idx')} by {n} semitones (only whole octaves of degree events)")
+    return ops
+
+
+def _scale_velocity(tr: Dict[str, Any], tpath: str, cmd: Dict[str, Any]) -> List[Op]:
+    factor = _number(cmd, "factor")
+    if factor < 0:
+        raise ValueError("factor must be >= 0")
+
+    def scaled(v: int) -> int:
+        return max(1, min(127, int(round(v * factor))))
+
+    ops: List[Op] = []
+    for si, st in _steps(tr, cmd):
+        for ei, e in enumerate(st.get("events") or []):
+            v = e.get("velocity") if isinstance(e, dict) else None
+            if isinstance(v, int) and not isinstance(v, bool):
+                ops += _set(f"{tpath}/pattern/steps/{si}/events/{ei}", e, "velocity", scaled(v))
+    dk = tr.get("drumKit")
+    if "steps" not in cmd and isinstance(dk, dict) and isinstance(dk.get("patterns"), list):
+        for pi, p in enumerate(dk["patterns"]):
+            v = p.get("vel", 100) if isinstance(p, dict) else None
+            if isinstance(v, int) and not isinstance(v, bool):
+                ops += _set(f"{tpath}/drumKit/patterns/{pi}", p, "vel", scaled(v))
+    return ops
+
+
+def _set_step_event(tr: Dict[str, Any], tpath: str, cmd: Dict[str, Any]) -> List[Op]:
+    idx = _int(cmd, "step", minimum=0)
+    ei = _int(cmd, "index", 0, minimum=0)
+    event = cmd.get("event")
+    if event is not None and not isinstance(event, dict):
+        raise ValueError("event must be an object or null")
+    fields = {k: v for k, v in (event or {}).items() if v is not None}
+    spath = f"{tpath}/pattern/steps"
+    steps = (tr.get("pattern") or {}).get("steps")
+    if not isinstance(steps, list):
+        raise ValueError("track has no pattern steps")
+    si = next((i for i, st in enumerate(steps) if isinstance(st, dict) and st.get("idx") == idx), None)
+    if si is None:
+        if event is None:
+            return []
+        if ei != 0:
+            raise ValueError(f"step {idx} has no events; index must be 0")
+        new = {"idx": idx, "events": [fields]}
+        return [{"op": "add", "path": f"{spath}/{_insert_at(steps, step_key, new)}", "value": new}]
+    st = steps[si]
+    events = st.get("events")
+    epath = f"{spath}/{si}/events"
+    if not isinstance(events, list):
+        events = []
+        if event is not None:
+            if ei != 0:
+                raise ValueError(f"step {idx} has no events; index must be 0")
+            return [{"op": "add", "path": epath, "value": [fields]}]
+    if event is None:
+        if ei >= len(events):
+            return []
+        if len(events) == 1 and set(st) <= {"idx", "events"}:
+            return [{"op": "remove", "path": f"{spath}/{si}"}]
+        return [{"op": "remove", "path": f"{epath}/{ei}"}]
+    if ei == len(events):
+        return [{"op": "add", "path": f"{epath}/{ei}", "value": fields}]
+    if ei > len(events):
+        raise ValueError(f"step {idx} has {len(events)} events")
+    cur = events[ei]
+    if not isinstance(cur, dict):
+        return [{"op": "replace", "path": f"{epath}/{ei}", "value": fields}]
+    ops: List[Op] = []
+    for k, v in event.items():
+        if v is None:
+            if k in cur:
+                ops.append({"op": "remove", "path": f"{epath}/{ei}/{_escape(k)}"})
+        else:
+            ops += _set(f"{epath}/{ei}", cur, k, v)
+    return ops
+
+
+def _move_cc_point(tr: Dict[str, Any], tpath: str, cmd: Dict[str, Any]) -> List[Op]:
+    lanes = tr.get("ccLanes")
+    ref = cmd.get("lane")
+    li = None
+    if isinstance(lanes, list):
+        if isinstance(ref, int) and not isinstance(ref, bool) and 0 <= ref < len(lanes):
+            li = ref
+        else:
+            li = next((i for i, lane in enumerate(lanes) if isinstance(lane, dict) and lane.get("id") == ref), None)
+    if li is None or not isinstance(lanes[li], dict) or not isinstance(lanes[li].get("points"), list):
+        raise ValueError(f"unknown ccLane: {ref!r}")
+    pts = lanes[li]["points"]
+    if "point" in cmd:
+        pi = _int(cmd, "point", minimum=0)
+        if pi >= len(pts):
+            raise ValueError(f"lane has {len(pts)} points")
+    else:
+        at = cmd.get("at")
+        pi = next((i for i, p in enumerate(pts) if isinstance(p, dict) and p.get("t") == at), None)
+        if pi is None:
+            raise ValueError(f"no point at {at!r}")
+    pt = pts[pi]
+    if not isinstance(pt, dict):
+        raise ValueError("point is not an object")
+    to, v = cmd.get("to"), cmd.get("v")
+    if to is None and v is None:
+        raise ValueError("moveCCPoint needs to and/or v")
+    if to is not None and not (isinstance(to, dict) and ("ticks" in to or ("bar" in to and "step" in to))):
+        raise ValueError("to must be {ticks} or {bar, step}")
+    if v is not None and (isinstance(v, bool) or not isinstance(v, (int, float))):
+        raise ValueError("v must be a number")
+    ppath = f"{tpath}/ccLanes/{li}/points"
+    moved = dict(pt)
+    if to is not None:
+        moved["t"] = to
+    if v is not None:
+        moved["v"] = v
+    rest = pts[:pi] + pts[pi + 1:]
+    try:
+        dest = _insert_at(rest, point_key, moved)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError(f"invalid time: {to!r}") from None
+    if dest == pi:
+        ops = _set(f"{ppath}/{pi}", pt, "t", moved["t"]) if to is not None else []
+        return ops + (_set(f"{ppath}/{pi}", pt, "v", v) if v is not None else [])
+    # Keep the lane sorted by time: take the point out and insert it where it now belongs
+    return [{"op": "remove", "path": f"{ppath}/{pi}"}, {"op": "add", "path": f"{ppath}/{dest}", "value": moved}]
+
+
+def _mute(tr: Dict[str, Any], tpath: str, cmd: Dict[str, Any]) -> List[Op]:
+    ops: List[Op] = []
+    for si, st in _steps(tr, cmd):
+        if st.get("mute") is not True:
+            ops.append({"op": "add", "path": f"{tpath}/pattern/steps/{si}/mute", "value": True})
+    return ops
+
+
+def _unmute(tr: Dict[str, Any], tpath: str, cmd: Dict[str, Any]) -> List[Op]:
+    return [{"op": "remove", "path": f"{tpath}/pattern/steps/{si}/mute"} for si, st in _steps(tr, cmd) if "mute" in st]
+
+
+def _escape(key: str) -> str:
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+_COMMANDS: Dict[Any, Callable[[Dict[str, Any], str, Dict[str, Any]], List[Op]]] = {
+    "setDrumRow": _set_drum_row,
+    "transpose": _transpose,
+    "scaleVelocity": _scale_velocity,
+    "setStepEvent": _set_step_event,
+    "moveCCPoint": _move_cc_point,
+    "mute": _mute,
+    "unmute": _unmute,
+}
@@ -0,0 +1,57 @@
+"""Loop docs for tests.
+
+make_doc() is a valid opxyloop-1.0 doc (120 bpm, ppq 96, 16 steps/bar)
+with one Lead track playing pitch 60 on step 0; tests pass tracks and
+meta overrides for whatever they exercise, built with track/step/note.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+
+def note(pitch: int, velocity: int = 100, length_steps: int = 1, **fields: Any) -> Dict[str, Any]:
+    return {"pitch": pitch, "velocity": velocity, "lengthSteps": length_steps, **fields}
+
+
+def step(idx: int, *events: Dict[str, Any], **fields: Any) -> Dict[str, Any]:
+    return {"idx": idx, "events": list(events), **fields}
+
+
+def track(
+    tid: str = "t1",
+    name: str = "Lead",
+    channel: int = 0,
+    steps: Optional[Iterable[Dict[str, Any]]] = None,
+    length_bars: int = 1,
+    **fields: Any,
+) -> Dict[str, Any]:
+    """A sampler track; steps defaults to pitch 60 on step 0 (pass [] for none)."""
+    if steps is None:
+        steps = [step(0, note(60))]
+    return {
+        "id": tid,
+        "name": name,
+        "type": "sampler",
+        "midiChannel": channel,
+        "pattern": {"lengthBars": length_bars, "steps": list(steps)},
+        **fields,
+    }
+
+
+def make_doc(
+    tracks: Optional[Iterable[Dict[str, Any]]] = None,
+    drum_map: Optional[Mapping[str, int]] = None,
+    doc_version: Optional[int] = None,
+    **meta: Any,
+) -> Dict[str, Any]:
+    doc: Dict[str, Any] = {
+        "version": "opxyloop-1.0",
+        "meta": {"tempo": 120, "ppq": 96, "stepsPerBar": 16, **meta},
+        "tracks": [track()] if tracks is None else list(tracks),
+    }
+    if drum_map is not None:
+        doc["deviceProfile"] = {"drumMap": dict(drum_map)}
+    if doc_version is not None:
+        doc["docVersion"] = doc_version
+    return doc
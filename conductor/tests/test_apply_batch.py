@@ -0,0 +1,158 @@
+import asyncio
+import contextlib
+import json
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor.conductor_server import Conductor, serve_ws
+from conductor.tests.loops import make_doc
+from conductor.ws_clients import ClientSession
+
+
+STEPS = "/tracks/0/pattern/steps"
+
+
+def add_step(idx):
+    return [{"op": "add", "path": f"{STEPS}/-", "value": {"idx": idx, "events": [{"pitch": 62, "velocity": 90, "lengthSteps": 1}]}}]
+
+
+def set_velocity(i, v):
+    return [{"op": "replace", "path": f"{STEPS}/{i}/events/0/velocity", "value": v}]
+
+
+class TestApplyBatch(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+
+    def tearDown(self):
+        self.c.do_stop()
+        self.c.close()
+        self._tmp.cleanup()
+
+    def _steps(self):
+        return self.c.doc["tracks"][0]["pattern"]["steps"]
+
+    def test_one_version_for_dependent_lists(self):
+        res = self.c.do_apply_batch(0, [add_step(4), set_velocity(1, 70), set_velocity(0, 10)])
+        self.assertEqual((res["ok"], res["docVersion"], res["patches"]), (True, 1, 3))
+        self.assertEqual([(s["idx"], s["events"][0]["velocity"]) for s in self._steps()], [(0, 10), (4, 70)])
+        self.assertEqual(len(self.c.deltas_since(0)), 4)
+
+    def test_versions_each(self):
+        res = self.c.do_apply_batch(0, [add_step(4), set_velocity(1, 70)], versions="each")
+        self.assertEqual((res["docVersion"], res["versions"]), (2, [1, 2]))
+        self.assertEqual(self.c.deltas_since(1)[0]["path"], f"{STEPS}/1/events/0/velocity")
+        self.assertEqual(self.c.history.get(1)["tracks"][0]["pattern"]["steps"][1]["events"][0]["velocity"], 90)
+
+    def test_failing_list_leaves_doc_untouched(self):
+        bad = [{"op": "replace", "path": f"{STEPS}/0/events/0/velocity", "value": 999}]
+        for versions in ("one", "each"):
+            res = self.c.do_apply_batch(0, [add_step(4), set_velocity(1, 70), bad], versions=versions)
+            self.assertEqual(res["error"], "validation")
+            res = self.c.do_apply_batch(0, [add_step(4), set_velocity(5, 70)], versions=versions)
+            self.assertEqual(res["error"], "patch_apply")
+        self.assertEqual(res["index"], 1)
+        self.assertEqual((self.c.doc_version, len(self._steps())), (0, 1))
+        self.assertEqual(self.c.do_apply_batch(0, [])["error"], "invalid_batch")
+        self.assertEqual(self.c.do_apply_batch(0, [add_step(4)], versions="some")["error"], "invalid_batch")
+
+    def test_stale_batch_is_rebased(self):
+        self.c.do_apply_patch(0, add_step(8))
+        res = self.c.do_apply_batch(0, [add_step(4), set_velocity(1, 5)], versions="each")
+        self.assertEqual((res["ok"], res["rebasedFrom"], res["versions"]), (True, 0, [2, 3]))
+        self.assertEqual([(s["idx"], s["events"][0]["velocity"]) for s in self._steps()], [(0, 100), (4, 5), (8, 90)])
+
+    def test_quantized_batch_is_one_queued_edit(self):
+        self.c.do_play()
+        res = self.c.do_apply_batch(0, [add_step(4), set_velocity(0, 1)], versions="each", quantize="beat")
+        self.assertEqual((res["pending"], res["atTick"], res["patches"]), (True, 96, 2))
+        self.c.do_stop()
+        self.assertEqual(self.c.doc_version, 1)
+
+
+class TestResultTracking(unittest.TestCase):
+    def test_result_base(self):
+        s = ClientSession(None)
+        s.record_result("a", {"ok": True, "docVersion": 3})
+        s.record_result("b", {"ok": False, "error": "stale"})
+        s.record_result("c", {"ok": True, "pending": True, "docVersion": 3})
+        self.assertEqual(s.result_base("a"), (3, None))
+        self.assertEqual(s.result_base("b")[1]["error"], "dependency_failed")
+        self.assertEqual(s.result_base("c")[1]["error"], "dependency_pending")
+        self.assertEqual(s.result_base("zz")[1]["error"], "unknown_dependency")
+        self.assertEqual(s.result_base(["unhashable"])[1]["error"], "unknown_dependency")
+        s.record_result("c", {"ok": True, "docVersion": 5, "applyId": 1})
+        self.assertEqual(s.result_base("c"), (5, None))
+
+
+def _free_port() -> int:
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class TestWSPipelining(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+        self.port = _free_port()
+        self.server_task = asyncio.create_task(serve_ws(self.c, "127.0.0.1", self.port))
+        import websockets  # type: ignore
+        for _ in range(50):
+            try:
+                self.ws = await websockets.connect(f"ws://127.0.0.1:{self.port}")
+                break
+            except Exception:
+                await asyncio.sleep(0.05)
+
+    async def asyncTearDown(self):
+        with contextlib.suppress(Exception):
+            await self.ws.close()
+        self.server_task.cancel()
+        try:
+            await self.server_task
+        except BaseException:
+            pass
+        self.c.close()
+        self._tmp.cleanup()
+
+    async def _replies(self, ids, timeout=2.0):
+        out = {}
+        loop = asyncio.get_event_loop()
+        end = loop.time() + timeout
+        while set(ids) - set(out) and loop.time() < end:
+            try:
+                msg = json.loads(await asyncio.wait_for(self.ws.recv(), timeout=end - loop.time()))
+            except asyncio.TimeoutError:
+                break
+            if msg.get("id") in ids and msg.get("type") in ("ack", "error"):
+                out[msg["id"]] = msg
+        return out
+
+    async def test_dependent_patches_without_waiting(self):
+        send = self.ws.send
+        await send(json.dumps({"type": "applyPatch", "id": "p1", "payload": {"baseVersion": 0, "ops": add_step(4)}}))
+        await send(json.dumps({"type": "applyPatch", "id": "p2", "payload": {"after": "p1", "ops": set_velocity(1, 33)}}))
+        await send(json.dumps({"type": "applyPatch", "id": "p3", "payload": {"after": "p2", "ops": set_velocity(9, 1)}}))
+        await send(json.dumps({"type": "applyPatch", "id": "p4", "payload": {"after": "p3", "ops": set_velocity(0, 1)}}))
+        await send(json.dumps({"type": "applyBatch", "id": "b1", "payload": {"after": "p2", "patches": [add_step(8), set_velocity(2, 44)], "versions": "each"}}))
+        replies = await self._replies(["p1", "p2", "p3", "p4", "b1"])
+        self.assertEqual([replies[i]["payload"].get("docVersion") for i in ("p1", "p2")], [1, 2])
+        self.assertEqual(replies["p3"]["payload"]["error"], "patch_apply")
+        self.assertEqual(replies["p4"]["payload"]["error"], "dependency_failed")
+        self.assertEqual(replies["b1"]["payload"]["versions"], [3, 4])
+        steps = self.c.doc["tracks"][0]["pattern"]["steps"]
+        self.assertEqual([(s["idx"], s["events"][0]["velocity"]) for s in steps], [(0, 100), (4, 33), (8, 44)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor.apply_queue import Grid, Quantize, grid_for, parse_quantize, target_tick
+from conductor.conductor_server import Conductor
+from conductor.patch_utils import apply_patch
+from conductor.tests import loops
+from conductor.tests.loops import note, step, track
+
+
+def make_doc():
+    return loops.make_doc(tracks=[
+        track(length_bars=2),
+        track("t2", "Bass", 1, [step(4, note(40, 90, 2))], length_bars=3),
+    ])
+
+
+VEL0 = "/tracks/0/pattern/steps/0/events/0/velocity"
+VEL1 = "/tracks/1/pattern/steps/0/events/0/velocity"
+
+
+class TestQuantize(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_quantize("beat"), Quantize("beat"))
+        self.assertEqual(parse_quantize("1bar"), Quantize("bar"))
+        self.assertEqual(parse_quantize("4bars"), Quantize("bars", 4))
+        self.assertEqual(parse_quantize({"atTick": 960}).label(), {"atTick": 960})
+        for bad in ("0bars", "soon", {"atTick": -1}, {"atTick": True}, {"atTick": 1, "x": 2}, 3, None):
+            with self.assertRaises(ValueError):
+                parse_quantize(bad)
+
+    def test_targets(self):
+        grid = grid_for(make_doc())
+        self.assertEqual(grid, Grid(24, 96, 384, 384 * 6))
+        self.assertEqual(target_tick(Quantize("step"), 0, grid), 24)
+        self.assertEqual(target_tick(Quantize("step"), 24, grid), 48)
+        self.assertEqual(target_tick(Quantize("beat"), 100, grid), 192)
+        self.assertEqual(target_tick(Quantize("bar"), 383, grid), 384)
+        self.assertEqual(target_tick(Quantize("bars", 2), 400, grid), 768)
+        self.assertEqual(target_tick(Quantize("loopEnd"), 10, grid), 2304)
+        self.assertEqual(target_tick(Quantize("tick", 5), 10, grid), 10)
+        self.assertEqual(target_tick(Quantize("now"), 10, grid), 10)
+
+
+class TestQueuedApplies(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+        self.c.do_play()
+        self.results = []
+        self.c.on_pending_result = lambda entry, res: self.results.append((entry.apply_id, res))
+        # docVersion in effect when each tick is emitted
+        self.seen = {}
+        on_tick = self.c.engine.on_tick
+
+        def record(tick):
+            self.seen[tick] = self.c.doc_version
+            on_tick(tick)
+        self.c.engine.on_tick = record
+
+    def tearDown(self):
+        self.c.do_stop()
+        self.c.close()
+        self._tmp.cleanup()
+
+    def _advance_to(self, tick):
+        while self.c.engine.tick < tick:
+            self.c._advance_pulse()
+
+    def _patch(self, base, path, value, quantize=None):
+        ops = [{"op": "replace", "path": path, "value": value}]
+        return self.c.do_replace_diff(base, apply_patch(self.c.doc, ops), quantize=quantize)
+
+    def test_edits_land_on_their_ticks_in_time_order(self):
+        bar = self._patch(0, VEL0, 10, quantize="bar")
+        step = self._patch(0, VEL1, 20, quantize="step")
+        self.assertEqual((bar["atTick"], step["atTick"]), (384, 24))
+        self.assertEqual(self.c.get_state()["pendingApplies"][0]["atTick"], 24)
+        self._advance_to(24)
+        self.assertEqual(self.seen[23], 0)
+        self.assertEqual(self.seen[24], 1)
+        self.assertEqual(self.c.doc["tracks"][1]["pattern"]["steps"][0]["events"][0]["velocity"], 20)
+        self._advance_to(400)
+        self.assertEqual((self.seen[383], self.seen[384]), (1, 2))
+        self.assertEqual(self.c.doc["tracks"][0]["pattern"]["steps"][0]["events"][0]["velocity"], 10)
+        self.assertEqual([r["ok"] for _id, r in self.results], [True, True])
+        self.assertEqual(self.c.pending_stats(), {"pending": 0, "queued": 2, "applied": 2, "dropped": 0})
+
+    def test_structural_edit_defaults_to_next_bar(self):
+        new = json.loads(json.dumps(self.c.doc))
+        new["meta"]["tempo"] = 90
+        self._advance_to(100)
+        res = self.c.do_replace_diff(0, new)
+        self.assertEqual((res["when"], res["atTick"]), ("bar", 384))
+        self.assertEqual(self.c.do_replace_diff(0, new, quantize={"atTick": 200})["atTick"], 200)
+        self.assertEqual(self.c.do_replace_diff(0, new, quantize="sometime")["error"], "invalid_quantize")
+
+    def test_queued_edit_rechecks_its_base(self):
+        self._patch(0, VEL0, 10, quantize="beat")
+        self._patch(0, VEL1, 11, quantize="beat")
+        # An immediate edit to the first path lands meanwhile
+        self.assertTrue(self._patch(0, VEL0, 50, quantize="now")["ok"])
+        self._advance_to(96)
+        self.assertEqual([r.get("error") for _id, r in self.results], ["conflict", None])
+        self.assertEqual(self.results[0][1]["paths"], [VEL0])
+        self.assertEqual(self.c.doc["tracks"][0]["pattern"]["steps"][0]["events"][0]["velocity"], 50)
+        self.assertEqual(self.c.doc["tracks"][1]["pattern"]["steps"][0]["events"][0]["velocity"], 11)
+
+    def test_stop_applies_everything_queued(self):
+        self._patch(0, VEL0, 10, quantize="loopEnd")
+        self._patch(0, VEL1, 12, quantize="4bars")
+        self.c.do_stop()
+        self.assertEqual(self.c.doc_version, 2)
+        self.assertEqual(self.c.pending_stats()["pending"], 0)
+
+    def test_queued_undos_chain(self):
+        self.assertTrue(self._patch(0, VEL0, 10, quantize="now")["ok"])
+        self.assertTrue(self._patch(1, VEL0, 11, quantize="now")["ok"])
+        self.assertTrue(self.c.undo()["pending"])
+        self.assertTrue(self.c.undo()["pending"])
+        self._advance_to(384)
+        self.assertEqual([r["restored"] for _id, r in self.results], [1, 0])
+        self.assertEqual(self.c.doc["tracks"][0]["pattern"]["steps"][0]["events"][0]["velocity"], 100)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import math
+import unittest
+
+from conductor import cbor
+from conductor.cbor import _py_dumps, _py_loads
+
+
+class TestCbor(unittest.TestCase):
+    def test_rfc8949_vectors(self):
+        # Appendix A of RFC 8949
+        vectors = [
+            (0, "00"),
+            (23, "17"),
+            (24, "1818"),
+            (1000, "1903e8"),
+            (1000000, "1a000f4240"),
+            (18446744073709551615, "1bffffffffffffffff"),
+            (-1, "20"),
+            (-1000, "3903e7"),
+            (100000.0, "fa47c35000"),
+            (1.1, "fb3ff199999999999a"),
+            (False, "f4"),
+            (True, "f5"),
+            (None, "f6"),
+            ("", "60"),
+            ("ü", "62c3bc"),
+            ([1, [2, 3], [4, 5]], "8301820203820405"),
+            ({"a": 1, "b": [2, 3]}, "a26161016162820203"),
+            (b"\x01\x02\x03\x04", "4401020304"),
+        ]
+        for value, hexstr in vectors:
+            self.assertEqual(_py_dumps(value).hex(), hexstr, value)
+            self.assertEqual(_py_loads(bytes.fromhex(hexstr)), value)
+
+    def test_decodes_half_precision(self):
+        self.assertEqual(_py_loads(bytes.fromhex("f93e00")), 1.5)
+        self.assertTrue(math.isinf(_py_loads(bytes.fromhex("f97c00"))))
+
+    def test_round_trip_state_like_payload(self):
+        state = {
+            "type": "state",
+            "ts": 1760000000.123456,
+            "payload": {"tick": 1536, "bpm": 120.0, "ccNow": {0: {32: 64}}, "activeNotes": {1: {"count": 2, "pitches": [60, 64]}}},
+        }
+        for dumps, loads in ((_py_dumps, _py_loads), (cbor.dumps, cbor.loads)):
+            self.assertEqual(loads(dumps(state)), state)
+
+    def test_malformed_input(self):
+        for bad in ("", "62c3", "1903", "8301", "0000", "5f"):
+            with self.assertRaises(ValueError, msg=bad):
+                _py_loads(bytes.fromhex(bad))
+        with self.assertRaises(TypeError):
+            _py_dumps({1, 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor.conductor_server import Conductor
+from conductor.tests import loops
+from conductor.tests.loops import track
+
+
+def make_doc():
+    return loops.make_doc(tracks=[track(name="Lead ♪", steps=[])])
+
+
+class TestDocCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_sha_matches_canonical_serialization(self):
+        d = self.c.get_doc()
+        canon = json.dumps(self.c.doc, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8")
+        self.assertEqual(d["sha256"], hashlib.sha256(canon).hexdigest())
+        self.assertEqual(d["docVersion"], 0)
+
+    def test_snapshot_reused_until_version_changes(self):
+        s1 = self.c.doc_snapshot()
+        self.assertIs(self.c.doc_snapshot(), s1)
+        doc = json.loads(json.dumps(self.c.doc))
+        doc["tracks"][0]["pattern"]["steps"] = [{"idx": 0, "events": [{"pitch": 60, "velocity": 90, "lengthSteps": 1}]}]
+        self.assertTrue(self.c.do_replace_json(0, doc)["ok"])
+        s2 = self.c.doc_snapshot()
+        self.assertIsNot(s2, s1)
+        self.assertEqual(s2.version, 1)
+        self.assertNotEqual(s2.sha256, s1.sha256)
+
+    def test_edits_do_not_build_snapshots(self):
+        for v in range(3):
+            doc = json.loads(json.dumps(self.c.doc))
+            doc["meta"]["tempo"] = 100 + v
+            self.assertTrue(self.c.do_replace_json(v, doc, ops=[{"op": "replace", "path": "/meta/tempo", "value": 100 + v}])["ok"])
+        self.assertIsNone(self.c._doc_cache)
+        self.assertEqual(self.c.delta_payload(1)["payload"]["sha256"], self.c.get_doc()["sha256"])
+
+    def test_doc_message_envelope(self):
+        msg = json.loads(self.c.doc_message(7))
+        self.assertEqual(msg["type"], "doc")
+        self.assertEqual(msg["id"], 7)
+        self.assertEqual(msg["payload"], json.loads(json.dumps(self.c.get_doc())))
+        self.assertNotIn("id", json.loads(self.c.doc_message()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import asyncio
+import contextlib
+import json
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor.conductor_server import Conductor, serve_ws
+from conductor.patch_utils import apply_patch, apply_patch_cow
+from conductor.tests import loops
+from conductor.tests.loops import track
+
+
+def make_doc():
+    return loops.make_doc(tracks=[track(steps=[])])
+
+
+def note_ops(idx, pitch=60):
+    return [{"op": "add", "path": "/tracks/0/pattern/steps/-", "value": {"idx": idx, "events": [{"pitch": pitch, "velocity": 100, "lengthSteps": 1}]}}]
+
+
+def _free_port() -> int:
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class TestDeltaHistory(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external", delta_history=4)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _patch(self, ops):
+        base = self.c.doc_version
+        return self.c.do_replace_json(base, apply_patch(self.c.doc, ops), ops=ops)
+
+    def test_deltas_replay_to_current_doc(self):
+        start = json.loads(json.dumps(self.c.doc))
+        self.assertTrue(self._patch(note_ops(0))["ok"])
+        self.assertTrue(self._patch(note_ops(4, 64))["ok"])
+        ops = self.c.deltas_since(0)
+        self.assertIsNotNone(ops)
+        self.assertEqual(apply_patch(start, ops), self.c.doc)
+        self.assertEqual(self.c.deltas_since(self.c.doc_version), [])
+
+    def test_cow_patch_keeps_delta_and_leaves_old_doc_intact(self):
+        self._patch(note_ops(4))
+        old = self.c.doc
+        snapshot = json.loads(json.dumps(old))
+        ops = note_ops(0)
+        self.assertTrue(self.c.do_replace_json(self.c.doc_version, apply_patch_cow(old, ops), ops=ops, cow=True)["ok"])
+        self.assertEqual(old, snapshot)
+        # Out-of-order insert was re-sorted, so the delta falls back to a full doc
+        self.assertEqual([s["idx"] for s in self.c.doc["tracks"][0]["pattern"]["steps"]], [0, 4])
+        self.assertIsNone(self.c.deltas_since(1))
+        ops = note_ops(8)
+        self.c.do_replace_json(self.c.doc_version, apply_patch_cow(self.c.doc, ops), ops=ops, cow=True)
+        self.assertEqual(apply_patch(json.loads(json.dumps(self.c.history.get(2))), self.c.deltas_since(2)), self.c.doc)
+        self.assertIs(self.c.doc["meta"], old["meta"])
+
+    def test_delta_message_payload(self):
+        self._patch(note_ops(0))
+        msg = json.loads(self.c.delta_message(0))
+        self.assertEqual(msg["type"], "docDelta")
+        self.assertEqual(msg["payload"]["fromVersion"], 0)
+        self.assertEqual(msg["payload"]["toVersion"], 1)
+        self.assertEqual(msg["payload"]["sha256"], self.c.get_doc()["sha256"])
+
+    def test_history_gap_falls_back_to_full_doc(self):
+        for i in range(6):
+            self._patch(note_ops(i))
+        self.assertIsNone(self.c.deltas_since(0))
+        self.assertIsNotNone(self.c.deltas_since(self.c.doc_version - 4))
+        version, msg = self.c.doc_update_message(0, deltas=True)
+        self.assertEqual(version, self.c.doc_version)
+        self.assertEqual(json.loads(msg)["type"], "doc")
+
+    def test_replace_without_ops_breaks_delta_chain(self):
+        self._patch(note_ops(0))
+        doc = json.loads(json.dumps(self.c.doc))
+        doc["tracks"][0]["name"] = "Renamed"
+        self.assertTrue(self.c.do_replace_json(self.c.doc_version, doc)["ok"])
+        self.assertIsNone(self.c.deltas_since(0))
+        self.assertIsNone(self.c.deltas_since(1))
+
+    def test_external_reload_is_recorded_as_its_diff(self):
+        start = json.loads(json.dumps(self.c.doc))
+        doc = json.loads(json.dumps(self.c.doc))
+        doc["meta"]["tempo"] = 90
+        self.assertTrue(self.c.reload_from_disk(doc))
+        self.assertFalse(self.c.reload_from_disk(json.loads(json.dumps(self.c.doc))))
+        ops = self.c.deltas_since(0)
+        self.assertEqual(ops[0], {"op": "replace", "path": "/meta/tempo", "value": 90})
+        self.assertEqual(apply_patch(start, ops), self.c.doc)
+
+
+class TestWSDeltas(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+        self.port = _free_port()
+        self.server_task = asyncio.create_task(serve_ws(self.c, "127.0.0.1", self.port))
+        import websockets  # type: ignore
+        for _ in range(50):
+            try:
+                self.ws = await websockets.connect(f"ws://127.0.0.1:{self.port}")
+                break
+            except Exception:
+                await asyncio.sleep(0.05)
+
+    async def asyncTearDown(self):
+        with contextlib.suppress(Exception):
+            await self.ws.close()
+        self.server_task.cancel()
+        try:
+            await self.server_task
+        except BaseException:
+            pass
+        self._tmp.cleanup()
+
+    async def _recv_until(self, pred, timeout=2.0):
+        end = asyncio.get_event_loop().time() + timeout
+        while True:
+            left = end - asyncio.get_event_loop().time()
+            if left <= 0:
+                raise AssertionError("timed out waiting for message")
+            msg = json.loads(await asyncio.wait_for(self.ws.recv(), timeout=left))
+            if pred(msg):
+                return msg
+
+    async def test_opted_in_client_receives_delta(self):
+        first = await self._recv_until(lambda m: m.get("type") == "doc")
+        local = first["payload"]["json"]
+        await self.ws.send(json.dumps({"type": "hello", "id": "h", "payload": {"deltas": True}}))
+        ack = await self._recv_until(lambda m: m.get("id") == "h")
+        self.assertTrue(ack["payload"]["deltas"])
+        ops = note_ops(2)
+        await self.ws.send(json.dumps({"type": "applyPatch", "id": "p", "payload": {"baseVersion": 0, "ops": ops}}))
+        msg = await self._recv_until(lambda m: m.get("type") in ("doc", "docDelta"))
+        self.assertEqual(msg["type"], "docDelta")
+        self.assertEqual(msg["payload"]["fromVersion"], 0)
+        self.assertEqual(msg["payload"]["toVersion"], 1)
+        local = apply_patch(local, msg["payload"]["ops"])
+        self.assertEqual(local, self.c.doc)
+
+
+if __name__ == "__main__":
+    unittest.main()
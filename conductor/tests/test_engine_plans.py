@@ -0,0 +1,117 @@
+import copy
+import json
+import random
+import unittest
+from pathlib import Path
+
+from conductor.midi_engine import Engine, VirtualSink
+from conductor.patch_utils import apply_patch, apply_patch_cow
+from conductor.tests import loops
+from conductor.tests.loops import note, step, track
+
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+
+def make_doc():
+    return loops.make_doc(tempo=133, key="D", mode="minor", drum_map={"kick": 36, "ch": 42}, tracks=[
+        track("t-keys", "Keys", 1, [
+            step(0, {"chord": "Am", "velocity": 90, "lengthSteps": 4, "register": ["C3", "C5"]}),
+            step(3, note(64, 70, 2, ratchet=3, microshiftMs=-12)),
+            step(8, {"degree": 5, "octaveOffset": 1, "velocity": 80, "lengthSteps": 2, "prob": 0.5}),
+            step(8, {"chord": "iv", "velocity": 60, "lengthSteps": 1, "gate": 0.5, "prob": 0.3}),
+            step(20, note(200, microshiftMs=40)),
+            step(31, {"velocity": 100, "lengthSteps": 1}),
+        ], length_bars=2, ccLanes=[
+            {"id": "h", "dest": "cc:74", "mode": "hold", "points": [{"t": {"bar": 0, "step": 0}, "v": 10}, {"t": {"bar": 1, "step": 8}, "v": 90}]},
+            {"id": "s", "dest": "name:cutoff", "mode": "points", "range": [90, 20], "channel": 3, "points": [
+                {"t": {"ticks": 700}, "v": 127, "curve": "exp"},
+                {"t": {"bar": 0, "step": 4}, "v": 0, "curve": "s-curve"},
+                {"t": {"bar": 1, "step": 0}, "v": 64, "curve": "log"},
+            ]},
+        ], lfos=[
+            {"id": "w", "dest": "cc:74", "depth": 20, "rate": {"sync": "1/4"}, "shape": "triangle", "offset": 5},
+            {"id": "r", "dest": "name:resonance", "depth": 9, "rate": {"hz": 2}, "shape": "triangle"},
+            {"id": "x", "dest": "cc:1", "depth": 9, "rate": {"sync": "1/8"}, "shape": "sine"},
+        ]),
+        track("t-drums", "Kit", 9, [], length_bars=2, drumKit={"repeatBars": 2, "lengthSteps": 2, "patterns": [
+            {"bar": 1, "key": "kick", "pattern": "x...x...x...x...", "vel": 112},
+            {"bar": 2, "key": "CH", "pattern": "x.x.x.x.x.x.x.x.xxxx"},
+            {"bar": 1, "key": "nope", "pattern": "xxxxxxxxxxxxxxxx"},
+        ]}),
+    ])
+
+
+def play(doc, ticks, interpreted=False, seed=7):
+    sink = VirtualSink()
+    eng = Engine(sink)
+    eng._rng.seed(seed)
+    eng.load(doc)
+    if interpreted:
+        eng._plans = []
+    eng.start()
+    for t in range(ticks):
+        eng.on_tick(t)
+    return sink.events
+
+
+class TestTrackPlans(unittest.TestCase):
+    def test_compiled_playback_matches_interpreted(self):
+        docs = [make_doc()] + [json.loads(p.read_text()) for p in sorted(FIXTURES.glob("*.json"))]
+        for doc in docs:
+            ticks = 2 * 4 * int(doc["meta"].get("ppq", 96))
+            self.assertEqual(play(doc, ticks), play(doc, ticks, interpreted=True), doc["tracks"][0]["id"] if doc["tracks"] else "")
+
+    def test_randomized_docs_match_interpreted(self):
+        rng = random.Random(3)
+        base = make_doc()
+        for _ in range(15):
+            doc = copy.deepcopy(base)
+            keys = doc["tracks"][0]
+            for st in keys["pattern"]["steps"]:
+                st["idx"] = rng.randrange(-2, 40)
+                for e in st.get("events", []):
+                    e["microshiftMs"] = rng.choice([0, -30, 15, 55])
+                    e["prob"] = rng.choice([1.0, 0.5, 0.0, 0.9])
+            doc["meta"]["stepsPerBar"] = rng.choice([8, 12, 16])
+            seed = rng.random()
+            self.assertEqual(play(doc, 800, seed=seed), play(doc, 800, interpreted=True, seed=seed))
+
+    def test_malformed_track_is_interpreted(self):
+        doc = make_doc()
+        doc["tracks"][0]["pattern"]["steps"][0]["events"][0]["velocity"] = "loud"
+        eng = Engine(VirtualSink())
+        eng.load(doc)
+        self.assertIsNone(eng._plans[0])
+        self.assertIsNotNone(eng._plans[1])
+        eng.start()
+        with self.assertRaises(ValueError):
+            eng.on_tick(0)
+
+    def test_only_patched_track_is_recompiled(self):
+        doc = make_doc()
+        eng = Engine(VirtualSink())
+        eng.load(doc)
+        before = list(eng._plans)
+        ops = [{"op": "replace", "path": "/tracks/0/pattern/steps/1/events/0/velocity", "value": 99}]
+        eng.replace_doc(apply_patch_cow(doc, ops))
+        self.assertIsNot(eng._plans[0], before[0])
+        self.assertIs(eng._plans[1], before[1])
+        self.assertEqual(eng.metrics["tracks_compiled"], 3)
+        # A deep-copied doc shares nothing; the ops still tell which track changed
+        eng.replace_doc(apply_patch(eng.doc, ops), ops)
+        self.assertEqual(eng.metrics["tracks_compiled"], 4)
+        self.assertIs(eng._plans[1], before[1])
+
+    def test_context_change_recompiles_everything(self):
+        doc = make_doc()
+        eng = Engine(VirtualSink())
+        eng.load(doc)
+        ops = [{"op": "replace", "path": "/deviceProfile/drumMap/kick", "value": 35}]
+        eng.replace_doc(apply_patch_cow(doc, ops), ops)
+        self.assertEqual(eng.metrics["tracks_compiled"], 4)
+        self.assertEqual(eng.metrics["tracks_reused"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
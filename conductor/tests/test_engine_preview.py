@@ -0,0 +1,66 @@
+import unittest
+
+from conductor.midi_engine import Engine, VirtualSink
+from conductor.tests import loops
+from conductor.tests.loops import step, track
+
+
+def make_doc():
+    return loops.make_doc(key="C", mode="major", drum_map={"kick": 53}, tracks=[
+        track("t-keys", "Keys", 1, [
+            step(0, {"chord": "Am", "velocity": 90, "lengthSteps": 4}),
+            step(8, {"degree": 5, "octaveOffset": 0, "velocity": 80, "lengthSteps": 2, "prob": 0.5}),
+        ], ccLanes=[
+            {"id": "l1", "dest": "cc:74", "mode": "hold", "points": [{"t": {"bar": 0, "step": 0}, "v": 10}, {"t": {"bar": 0, "step": 8}, "v": 90}]},
+        ]),
+        track("t-drums", "Kit", 9, [], drumKit={"patterns": [{"bar": 1, "key": "kick", "pattern": "x...x...x...x...", "vel": 112}]}),
+    ])
+
+
+class TestEnginePreview(unittest.TestCase):
+    def setUp(self):
+        self.sink = VirtualSink()
+        self.eng = Engine(self.sink)
+        self.eng.load(make_doc())
+
+    def test_preview_matches_playback(self):
+        prev = self.eng.preview(0, 384)
+        self.eng.start()
+        for t in range(384):
+            self.eng.on_tick(t)
+        played = sorted((e[1], e[2], e[3]) for e in self.sink.events if e[0] == "on")
+        # The prob=0.5 note may or may not have played; the preview lists it regardless
+        certain = sorted((n["channel"], n["pitch"], n["velocity"]) for n in prev["notes"] if "prob" not in n)
+        maybe = [(n["channel"], n["pitch"], n["velocity"]) for n in prev["notes"] if "prob" in n]
+        self.assertEqual([p for p in played if p not in maybe], certain)
+        played_cc = [(e[1], e[2], e[3]) for e in self.sink.events if e[0] == "cc"]
+        self.assertEqual([(c["channel"], c["control"], c["value"]) for c in prev["cc"]], played_cc)
+
+    def test_chords_drumkit_and_probability_resolved(self):
+        notes = self.eng.preview(0, 384)["notes"]
+        chord = sorted(n["pitch"] for n in notes if n["tick"] == 0 and n["channel"] == 1)
+        self.assertEqual(chord, [57, 60, 64])
+        kicks = [n["tick"] for n in notes if n["channel"] == 9]
+        self.assertEqual(kicks, [0, 96, 192, 288])
+        maybe = [n for n in notes if "prob" in n]
+        self.assertEqual(len(maybe), 1)
+        self.assertEqual(maybe[0]["pitch"], 55)
+        self.assertEqual(maybe[0]["tick"], 192)
+        self.assertEqual(maybe[0]["prob"], 0.5)
+
+    def test_preview_has_no_side_effects(self):
+        state = self.eng._rng.getstate()
+        self.eng.preview(0, 768)
+        self.assertEqual(self.sink.events, [])
+        self.assertEqual(self.eng.active, {})
+        self.assertEqual(self.eng.metrics["msgs_note_on"], 0)
+        self.assertEqual(self.eng._rng.getstate(), state)
+
+    def test_cc_reported_as_changes_from_live_values(self):
+        self.eng._last_cc[(1, 74)] = 10
+        cc = self.eng.preview(0, 384)["cc"]
+        self.assertEqual([(c["tick"], c["value"]) for c in cc], [(192, 90)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from conductor.conductor_server import Conductor
+from conductor.file_watch import FileWatcher, inotify_available
+from conductor.tests import loops
+
+
+def make_doc():
+    return loops.make_doc(drum_map={"kick": 36})
+
+
+def editor_save(path, doc):
+    """Save the way vim does: move the original aside, write a new file, drop the backup."""
+    backup = str(path) + "~"
+    os.replace(path, backup)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(doc)[:10])
+        f.flush()
+        f.write(json.dumps(doc)[10:])
+    os.unlink(backup)
+
+
+def wait_for(pred, timeout=3.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if pred():
+            return True
+        time.sleep(0.01)
+    return pred()
+
+
+class _Recorder:
+    def __init__(self):
+        self.calls = []
+        self.contents = []
+        self.event = threading.Event()
+
+    def __call__(self, path):
+        self.calls.append(path)
+        self.contents.append(Path(path).read_text())
+        self.event.set()
+
+
+class TestFileWatcher(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp.name) / "loop.json"
+        self.path.write_text(json.dumps(make_doc()))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _watch(self, mode, **kw):
+        rec = _Recorder()
+        w = FileWatcher(str(self.path), rec, mode=mode, **kw).start()
+        self.addCleanup(w.stop)
+        return w, rec
+
+    @unittest.skipUnless(inotify_available(), "inotify not available")
+    def test_inotify_debounces_editor_save_into_one_call(self):
+        w, rec = self._watch("inotify", debounce_s=0.05)
+        self.assertEqual(w.mode, "inotify")
+        doc = make_doc()
+        doc["meta"]["tempo"] = 99
+        editor_save(self.path, doc)
+        self.assertTrue(rec.event.wait(2.0))
+        time.sleep(0.2)
+        self.assertEqual(len(rec.calls), 1)
+        self.assertGreater(w.events, 1)
+        self.assertEqual(json.loads(rec.contents[0])["meta"]["tempo"], 99)
+
+    @unittest.skipUnless(inotify_available(), "inotify not available")
+    def test_inotify_ignores_other_files_in_directory(self):
+        w, rec = self._watch("inotify", debounce_s=0.02)
+        (Path(self._tmp.name) / "other.json").write_text("{}")
+        time.sleep(0.15)
+        self.assertEqual(rec.calls, [])
+        self.path.write_text(json.dumps(make_doc()) + "\n")
+        self.assertTrue(rec.event.wait(2.0))
+
+    def test_poll_detects_atomic_replace(self):
+        w, rec = self._watch("poll", debounce_s=0.02, poll_s=0.05)
+        self.assertEqual(w.mode, "poll")
+        tmp = Path(self._tmp.name) / ".tmp"
+        tmp.write_text(json.dumps(make_doc()) + " ")
+        os.replace(tmp, self.path)
+        self.assertTrue(rec.event.wait(2.0))
+        self.assertEqual(w.stats()["changes"], 1)
+
+    def test_callback_errors_are_counted(self):
+        def boom(path):
+            raise ValueError("bad")
+        w = FileWatcher(str(self.path), boom, mode="poll", debounce_s=0.0, poll_s=0.02).start()
+        self.addCleanup(w.stop)
+        self.path.write_text("{} ")
+        self.assertTrue(wait_for(lambda: w.errors == 1))
+        self.assertIn("bad", w.stats()["lastError"])
+
+
+class TestConductorWatch(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+        self.reloaded = threading.Event()
+        self.c.on_file_reload = self.reloaded.set
+        self.c._watcher = FileWatcher(str(self.loop_path), self.c._on_file_change, mode="auto", debounce_s=0.02, poll_s=0.05).start()
+
+    def tearDown(self):
+        self.c.close()
+        self._tmp.cleanup()
+
+    def test_external_edit_is_adopted(self):
+        doc = make_doc()
+        doc["tracks"][0]["pattern"]["steps"][0]["events"][0]["velocity"] = 5
+        editor_save(self.loop_path, doc)
+        self.assertTrue(self.reloaded.wait(3.0))
+        self.assertEqual(self.c.doc["tracks"][0]["pattern"]["steps"][0]["events"][0]["velocity"], 5)
+        self.assertEqual(self.c.doc_version, 1)
+        self.assertEqual(self.c.watch_stats()["reloads"], 1)
+
+    def test_own_writes_are_ignored_by_content(self):
+        doc = json.loads(json.dumps(self.c.doc))
+        doc["meta"]["tempo"] = 100
+        self.assertTrue(self.c.do_replace_json(0, doc).get("ok"))
+        self.assertTrue(wait_for(lambda: self.c.watch_stats()["ownWrites"] >= 1))
+        self.assertFalse(self.reloaded.is_set())
+        self.assertEqual(self.c.doc_version, 1)
+
+    def test_invalid_edit_is_ignored(self):
+        self.loop_path.write_text("{\"tracks\": [")
+        self.assertTrue(wait_for(lambda: self.c.watch_stats()["invalid"] >= 1))
+        self.loop_path.write_text(json.dumps(dict(make_doc(), tracks=[])))
+        self.assertTrue(wait_for(lambda: self.c.watch_stats()["invalid"] >= 2))
+        self.assertEqual(self.c.doc_version, 0)
+        self.assertFalse(self.reloaded.is_set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import asyncio
+import contextlib
+import json
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor.conductor_server import Conductor, serve_ws
+from conductor.history import DocHistory, share_unchanged
+from conductor.tests import loops
+from conductor.tests.loops import track
+
+
+def make_doc():
+    return loops.make_doc(tracks=[track(), track("t2", "Bass", 1, [])])
+
+
+class TestShareUnchanged(unittest.TestCase):
+    def test_untouched_tracks_are_shared(self):
+        prev = make_doc()
+        new = json.loads(json.dumps(prev))
+        new["tracks"][0]["name"] = "Lead 2"
+        out = share_unchanged(prev, new)
+        self.assertIs(out["tracks"][1], prev["tracks"][1])
+        self.assertIs(out["tracks"][0]["pattern"], prev["tracks"][0]["pattern"])
+        self.assertIsNot(out["tracks"][0], prev["tracks"][0])
+        self.assertEqual(out["tracks"][0]["name"], "Lead 2")
+
+    def test_tracks_matched_by_id_after_insert(self):
+        prev = make_doc()
+        new = json.loads(json.dumps(prev))
+        new["tracks"].insert(0, {"id": "t0", "name": "New", "type": "sampler", "midiChannel": 2, "pattern": {"lengthBars": 1, "steps": []}})
+        out = share_unchanged(prev, new)
+        self.assertIs(out["tracks"][1], prev["tracks"][0])
+        self.assertIs(out["tracks"][2], prev["tracks"][1])
+
+    def test_equality_is_type_strict(self):
+        prev = {"a": {"mute": 1}}
+        new = {"a": {"mute": True}}
+        out = share_unchanged(prev, new)
+        self.assertIs(out["a"]["mute"], True)
+        self.assertIsNot(out["a"], prev["a"])
+
+
+class TestDocHistory(unittest.TestCase):
+    def test_undo_redo_and_branch(self):
+        h = DocHistory(8)
+        for v in range(3):
+            h.record(v, {"v": v})
+        self.assertEqual(h.undo_target(), 1)
+        h.restored(3, 1)
+        self.assertEqual((h.undo_target(), h.redo_target()), (0, 2))
+        # An alias created by undo resolves to the entry it restored
+        self.assertEqual(h.get(3), {"v": 1})
+        # A new edit drops the redo branch
+        h.record(4, {"v": 4})
+        self.assertEqual(h.versions(), [0, 1, 4])
+        self.assertIsNone(h.redo_target())
+
+    def test_capacity_bounds_entries(self):
+        h = DocHistory(3)
+        for v in range(5):
+            h.record(v, {"v": v})
+        self.assertEqual(h.versions(), [2, 3, 4])
+        self.assertIsNone(h.get(1))
+
+
+class TestConductorUndo(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+
+    def tearDown(self):
+        self.c.do_stop()
+        self.c.close()
+        self._tmp.cleanup()
+
+    def _rename(self, name):
+        doc = json.loads(json.dumps(self.c.doc))
+        doc["tracks"][0]["name"] = name
+        self.assertTrue(self.c.do_replace_json(self.c.doc_version, doc)["ok"])
+
+    def test_undo_redo_keep_version_increasing(self):
+        self._rename("A")
+        self._rename("B")
+        res = self.c.undo()
+        self.assertEqual((res["ok"], res["restored"], res["docVersion"]), (True, 1, 3))
+        self.assertEqual(self.c.doc["tracks"][0]["name"], "A")
+        self.assertEqual(self.c.doc["docVersion"], 3)
+        self.c.undo()
+        self.assertEqual(self.c.doc["tracks"][0]["name"], "Lead")
+        self.assertEqual(self.c.undo()["error"], "nothing_to_undo")
+        self.c.redo()
+        self.c.redo()
+        self.assertEqual(self.c.doc["tracks"][0]["name"], "B")
+        self.assertEqual(self.c.redo()["error"], "nothing_to_redo")
+        # Untouched track object is shared across every version
+        self.assertIs(self.c.doc["tracks"][1], self.c.history.get(0)["tracks"][1])
+
+    def test_checkout_is_a_new_edit(self):
+        self._rename("A")
+        self._rename("B")
+        self.assertTrue(self.c.checkout(0)["ok"])
+        self.assertEqual(self.c.doc["tracks"][0]["name"], "Lead")
+        self.c.undo()
+        self.assertEqual(self.c.doc["tracks"][0]["name"], "B")
+        self.assertEqual(self.c.checkout(99)["error"], "unknown_version")
+
+    def test_undo_waits_for_bar_while_playing(self):
+        self._rename("A")
+        self.c.playing = True
+        res = self.c.undo()
+        self.assertTrue(res.get("pending"))
+        self.assertEqual(self.c.doc["tracks"][0]["name"], "A")
+        self.c._maybe_apply_pending(res["atTick"])
+        self.assertEqual(self.c.doc["tracks"][0]["name"], "Lead")
+        self.assertEqual(self.c.history.stats()["current"], 0)
+
+
+def _free_port() -> int:
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class TestWSUndo(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+        self.port = _free_port()
+        self.server_task = asyncio.create_task(serve_ws(self.c, "127.0.0.1", self.port))
+        import websockets  # type: ignore
+        for _ in range(50):
+            try:
+                self.ws = await websockets.connect(f"ws://127.0.0.1:{self.port}")
+                break
+            except Exception:
+                await asyncio.sleep(0.05)
+
+    async def asyncTearDown(self):
+        with contextlib.suppress(Exception):
+            await self.ws.close()
+        self.server_task.cancel()
+        try:
+            await self.server_task
+        except BaseException:
+            pass
+        self._tmp.cleanup()
+
+    async def _reply(self, req_id):
+        while True:
+            msg = json.loads(await asyncio.wait_for(self.ws.recv(), timeout=2.0))
+            if msg.get("id") == req_id:
+                return msg
+
+    async def test_undo_and_history_over_ws(self):
+        ops = [{"op": "replace", "path": "/tracks/0/name", "value": "A"}]
+        await self.ws.send(json.dumps({"type": "applyPatch", "id": "p", "payload": {"baseVersion": 0, "ops": ops}}))
+        self.assertEqual((await self._reply("p"))["type"], "ack")
+        await self.ws.send(json.dumps({"type": "undo", "id": "u"}))
+        ack = await self._reply("u")
+        self.assertEqual(ack["type"], "ack")
+        self.assertEqual(ack["payload"]["restored"], 0)
+        self.assertEqual(self.c.doc["tracks"][0]["name"], "Lead")
+        await self.ws.send(json.dumps({"type": "getHistory", "id": "h"}))
+        hist = (await self._reply("h"))["payload"]
+        self.assertEqual((hist["versions"], hist["current"], hist["canRedo"]), ([0, 1], 0, True))
+        await self.ws.send(json.dumps({"type": "checkout", "id": "c", "payload": {"version": "x"}}))
+        self.assertEqual((await self._reply("c"))["payload"]["error"], "invalid_version")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import random
+import unittest
+
+from conductor.clock import InternalClock
+from conductor.metrics import JitterSketch
+
+
+def exact_quantile(values, q):
+    xs = sorted(values)
+    return xs[max(0, int(q * len(xs) + 0.5) - 1)]
+
+
+class TestJitterSketch(unittest.TestCase):
+    def test_quantiles_within_bucket_error(self):
+        rng = random.Random(1)
+        sk = JitterSketch(window_s=10.0, slices=10)
+        values = [rng.expovariate(1.0 / 0.4) for _ in range(20000)]  # ms, mean 0.4
+        for i, v in enumerate(values):
+            sk.observe_ms(v, now=i * 1e-4)
+        life = sk.snapshot(now=2.0)["lifetime"]
+        self.assertEqual(life["count"], len(values))
+        for name, q in (("p50Ms", 0.5), ("p95Ms", 0.95), ("p99Ms", 0.99), ("p999Ms", 0.999)):
+            want = exact_quantile(values, q)
+            self.assertAlmostEqual(life[name], want, delta=max(0.002, want * 0.07), msg=name)
+        self.assertAlmostEqual(life["maxMs"], max(values), delta=0.001)
+
+    def test_window_forgets_old_spikes_lifetime_keeps_them(self):
+        sk = JitterSketch(window_s=1.0, slices=4)
+        sk.observe_ms(50.0, now=0.0)
+        for i in range(100):
+            sk.observe_ms(0.1, now=0.1 + i * 0.004)
+        early = sk.snapshot(now=0.5)
+        self.assertEqual(early["window"]["maxMs"], 50.0)
+        later = sk.snapshot(now=5.0)
+        self.assertEqual(later["window"]["count"], 0)
+        self.assertEqual(later["lifetime"]["maxMs"], 50.0)
+        self.assertEqual(later["lifetime"]["count"], 101)
+
+    def test_clock_metrics_shape(self):
+        clk = InternalClock(bpm=120, tick_handler=lambda _p: None)
+        m = clk.get_metrics()
+        self.assertIn("jitterMsP95", m)
+        self.assertIn("jitterMsP99", m)
+        for view in ("window", "lifetime"):
+            for key in ("p50Ms", "p95Ms", "p99Ms", "p999Ms", "maxMs", "count"):
+                self.assertIn(key, m["jitter"][view])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import threading
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor.conductor_server import Conductor, _canonical_bytes
+from conductor.journal import PatchJournal, journal_path_for
+
+
+def _sha(doc):
+    return hashlib.sha256(_canonical_bytes(doc)).hexdigest()
+
+
+class TestPatchJournal(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.path = str(Path(self._tmp.name) / "loop.json.journal.ndjson")
+        self.base = {"docVersion": 0, "n": 0}
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _fill(self, j, count):
+        doc = dict(self.base)
+        for v in range(1, count + 1):
+            doc = {"docVersion": v, "n": v}
+            j.append(v, [{"op": "replace", "path": "/n", "value": v}, {"op": "replace", "path": "/docVersion", "value": v}], _sha(doc))
+        j.close()
+        return doc
+
+    def test_append_and_replay_round_trip(self):
+        expected = self._fill(PatchJournal(self.path, fsync=False), 3)
+        doc, applied = PatchJournal(self.path).replay(self.base, _sha)
+        self.assertEqual(applied, 3)
+        self.assertEqual(doc, expected)
+        # Base is untouched
+        self.assertEqual(self.base, {"docVersion": 0, "n": 0})
+
+    def test_torn_last_line_is_dropped(self):
+        self._fill(PatchJournal(self.path, fsync=False), 2)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"docVersion": 3, "ops": [{"op": "repl')
+        j = PatchJournal(self.path)
+        doc, applied = j.replay(self.base, _sha)
+        self.assertEqual((applied, doc["n"]), (2, 2))
+        self.assertEqual(len(Path(self.path).read_text().splitlines()), 2)
+
+    def test_sha_mismatch_stops_at_last_good_entry(self):
+        j = PatchJournal(self.path, fsync=False)
+        self._fill(j, 2)
+        j.append(3, [{"op": "replace", "path": "/n", "value": 3}, {"op": "replace", "path": "/docVersion", "value": 3}], "0" * 64)
+        j.close()
+        doc, applied = PatchJournal(self.path).replay(self.base, _sha)
+        self.assertEqual(applied, 2)
+        self.assertEqual(doc, {"docVersion": 2, "n": 2})
+
+    def test_entries_already_in_base_are_skipped(self):
+        self._fill(PatchJournal(self.path, fsync=False), 3)
+        doc, applied = PatchJournal(self.path).replay({"docVersion": 2, "n": 2}, _sha)
+        self.assertEqual(applied, 1)
+        self.assertEqual(doc["n"], 3)
+
+
+class TestConductorJournal(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps({
+            "version": "opxyloop-1.0",
+            "meta": {"tempo": 120, "ppq": 96, "stepsPerBar": 16},
+            "tracks": [{"id": "t1", "name": "Lead", "type": "sampler", "midiChannel": 0, "pattern": {"lengthBars": 1, "steps": []}}],
+            "docVersion": 0,
+        }))
+        self.journal_path = Path(journal_path_for(str(self.loop_path)))
+        self.c = self._open()
+
+    def tearDown(self):
+        self.c.close()
+        self._tmp.cleanup()
+
+    def _open(self, **kw):
+        return Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external", journal=True, **kw)
+
+    def _rename(self, c, name):
+        doc = json.loads(json.dumps(c.doc))
+        doc["tracks"][0]["name"] = name
+        ops = [{"op": "replace", "path": "/tracks/0/name", "value": name}]
+        self.assertTrue(c.do_replace_json(c.doc_version, doc, ops=ops)["ok"])
+        c._journal_io.wait()
+
+    def test_patches_append_instead_of_rewriting_loop_file(self):
+        before = self.loop_path.read_text()
+        self._rename(self.c, "A")
+        self._rename(self.c, "B")
+        self.assertEqual(self.loop_path.read_text(), before)
+        self.assertEqual(len(self.journal_path.read_text().splitlines()), 2)
+        stats = self.c.persist_stats()
+        self.assertEqual((stats["mode"], stats["entries"]), ("journal", 2))
+
+    def test_restart_replays_journal(self):
+        self._rename(self.c, "A")
+        self._rename(self.c, "B")
+        sha = self.c.doc_snapshot().sha256
+        # Simulate a crash: no close(), so nothing is compacted
+        self.c._journal.close()
+        c2 = self._open()
+        try:
+            self.assertEqual(c2.doc_version, 2)
+            self.assertEqual(c2.doc["tracks"][0]["name"], "B")
+            self.assertEqual(c2.doc_snapshot().sha256, sha)
+            # New patches continue the same log
+            self._rename(c2, "C")
+            self.assertEqual(len(self.journal_path.read_text().splitlines()), 3)
+        finally:
+            c2.close()
+
+    def test_close_compacts(self):
+        self._rename(self.c, "A")
+        self.c.close()
+        on_disk = json.loads(self.loop_path.read_text())
+        self.assertEqual((on_disk["docVersion"], on_disk["tracks"][0]["name"]), (1, "A"))
+        self.assertEqual(self.journal_path.read_text(), "")
+
+    def test_compacts_every_n_entries(self):
+        self.c.close()
+        self.c = self._open(compact_every=3)
+        for name in "ABCD":
+            self._rename(self.c, name)
+        self.assertEqual(json.loads(self.loop_path.read_text())["docVersion"], 4)
+        self.assertEqual(self.journal_path.read_text(), "")
+        self.assertEqual(self.c.persist_stats()["compactions"], 1)
+
+    def test_edit_without_ops_compacts(self):
+        self._rename(self.c, "A")
+        doc = json.loads(json.dumps(self.c.doc))
+        doc["tracks"][0]["name"] = "Full"
+        self.assertTrue(self.c.do_replace_json(self.c.doc_version, doc)["ok"])
+        self.c._journal_io.wait()
+        self.assertEqual(json.loads(self.loop_path.read_text())["tracks"][0]["name"], "Full")
+        self.assertEqual(self.journal_path.read_text(), "")
+
+    def test_io_runs_off_the_editing_thread(self):
+        threads = []
+        self.c.close()
+        self.c = self._open(compact_every=2)
+        write_doc = self.c._write_doc
+        self.c._journal_io._write_base = lambda v, d: (threads.append(threading.current_thread().name), write_doc(v, d))
+        # The edit that triggers compaction returns before the file is rewritten
+        entered, gate = threading.Event(), threading.Event()
+        append = self.c._journal.append_many
+        self.c._journal.append_many = lambda records: (entered.set(), gate.wait(2.0), append(records))
+        for name in "ABC":
+            doc = json.loads(json.dumps(self.c.doc))
+            doc["tracks"][0]["name"] = name
+            self.assertTrue(self.c.do_replace_json(self.c.doc_version, doc, ops=[{"op": "replace", "path": "/tracks/0/name", "value": name}])["ok"])
+            # The writer is stuck on the first append from here on
+            self.assertTrue(entered.wait(2.0))
+        self.assertEqual(json.loads(self.loop_path.read_text())["docVersion"], 0)
+        gate.set()
+        self.c._journal_io.wait()
+        self.assertEqual(json.loads(self.loop_path.read_text())["docVersion"], 3)
+        self.assertEqual(set(threads), {"journal"})
+
+    def test_external_edit_of_lagging_file_is_rebased(self):
+        for name in "ABC":
+            self._rename(self.c, name)
+        external = json.loads(self.loop_path.read_text())
+        self.assertEqual(external["docVersion"], 0)
+        external["meta"]["tempo"] = 90
+        self.assertTrue(self.c.reload_from_disk(external))
+        self.c._journal_io.wait()
+        self.assertEqual(self.c.doc_version, 4)
+        self.assertEqual((self.c.doc["tracks"][0]["name"], self.c.doc["meta"]["tempo"]), ("C", 90))
+        self.assertEqual(self.c.history.stats()["versions"], [0, 1, 2, 3, 4])
+        self.assertEqual(self.c.deltas_since(3)[-1], {"op": "replace", "path": "/docVersion", "value": 4})
+        # The journal was folded into a file that holds the merge
+        on_disk = json.loads(self.loop_path.read_text())
+        self.assertEqual((on_disk["docVersion"], on_disk["tracks"][0]["name"], on_disk["meta"]["tempo"]), (4, "C", 90))
+        self.assertEqual(self.journal_path.read_text(), "")
+
+    def test_conflicting_edit_of_lagging_file_is_refused(self):
+        self._rename(self.c, "A")
+        external = json.loads(self.loop_path.read_text())
+        external["tracks"][0]["name"] = "External"
+        self.assertFalse(self.c.reload_from_disk(external))
+        self.c._journal_io.wait()
+        self.assertEqual((self.c.doc_version, self.c.doc["tracks"][0]["name"]), (1, "A"))
+        self.assertEqual(self.c.watch_stats()["stale"], 1)
+        on_disk = json.loads(self.loop_path.read_text())
+        self.assertEqual((on_disk["docVersion"], on_disk["tracks"][0]["name"]), (1, "A"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import copy
+import json
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor.bench import make_large_doc
+from conductor.conductor_server import Conductor
+from conductor.loop_diff import diff_loops, is_structural_ops
+from conductor.patch_utils import apply_patch, apply_patch_cow
+
+
+def make_doc():
+    doc = make_large_doc(tracks=3, bars=1, lanes=2)
+    doc["tracks"][1]["lfos"] = [{"id": "w", "dest": "cc:74", "depth": 40, "rate": {"sync": "1/4"}, "shape": "triangle"}]
+    return doc
+
+
+def _text(doc):
+    return json.dumps(doc, sort_keys=True)
+
+
+def mutate(rng, doc):
+    """A handful of random loop edits, applied in place."""
+    for _ in range(rng.randint(1, 4)):
+        tracks = doc["tracks"]
+        tr = rng.choice(tracks)
+        steps = tr["pattern"]["steps"]
+        r = rng.random()
+        if r < 0.3 and steps:
+            rng.choice(steps)["events"][0]["velocity"] = rng.choice([1, 64, 127, 64.0, True])
+        elif r < 0.4 and steps:
+            steps.pop(rng.randrange(len(steps)))
+        elif r < 0.5:
+            steps.insert(rng.randrange(len(steps) + 1), {"idx": rng.randrange(100, 200), "events": []})
+        elif r < 0.6:
+            tracks.insert(rng.randrange(len(tracks) + 1), dict(copy.deepcopy(tr), id=f"n{rng.randrange(10**6)}"))
+        elif r < 0.65 and len(tracks) > 1:
+            tracks.pop(rng.randrange(len(tracks)))
+        elif r < 0.75:
+            rng.shuffle(tracks)
+        elif r < 0.8:
+            rng.shuffle(tr["ccLanes"])
+        elif r < 0.85:
+            tr["ccLanes"][0]["points"].append({"t": {"bar": 0, "step": rng.randrange(16)}, "v": 1})
+        elif r < 0.9:
+            doc["meta"][rng.choice(["tempo", "swing"])] = rng.choice([90, 120.0, "x"])
+        elif r < 0.95:
+            tr.pop("ccLanes", None)
+        else:
+            tr["name/odd~key"] = rng.random()
+    return doc
+
+
+class TestDiffLoops(unittest.TestCase):
+    def test_single_step_edit_is_one_op(self):
+        old = make_doc()
+        new = copy.deepcopy(old)
+        new["tracks"][2]["pattern"]["steps"][5]["events"][0]["velocity"] = 3
+        self.assertEqual(diff_loops(old, new), [{"op": "replace", "path": "/tracks/2/pattern/steps/5/events/0/velocity", "value": 3}])
+
+    def test_lists_matched_by_key(self):
+        old = make_doc()
+        new = copy.deepcopy(old)
+        new["tracks"].insert(0, dict(copy.deepcopy(old["tracks"][0]), id="t-new"))
+        del new["tracks"][2]["pattern"]["steps"][0]
+        ops = diff_loops(old, new)
+        self.assertEqual([(o["op"], o["path"]) for o in ops], [("add", "/tracks/0"), ("remove", "/tracks/2/pattern/steps/0")])
+
+    def test_reorder_becomes_moves(self):
+        old = make_doc()
+        new = copy.deepcopy(old)
+        new["tracks"].reverse()
+        ops = diff_loops(old, new)
+        self.assertTrue(all(o["op"] == "move" for o in ops))
+        self.assertEqual(_text(apply_patch(old, ops)), _text(new))
+
+    def test_type_strict(self):
+        old = make_doc()
+        new = copy.deepcopy(old)
+        new["tracks"][0]["midiChannel"] = float(old["tracks"][0]["midiChannel"])
+        self.assertEqual(len(diff_loops(old, new)), 1)
+        self.assertEqual(diff_loops(old, copy.deepcopy(old)), [])
+
+    def test_ignore_top_level_keys(self):
+        old = make_doc()
+        new = dict(old, docVersion=9)
+        self.assertEqual(diff_loops(old, new, ignore=("docVersion",)), [])
+
+    def test_random_edits_round_trip(self):
+        rng = random.Random(5)
+        for _ in range(300):
+            old = make_doc()
+            new = mutate(rng, copy.deepcopy(old))
+            ops = diff_loops(old, new)
+            self.assertEqual(_text(apply_patch_cow(old, ops)), _text(new), ops)
+            self.assertEqual(_text(apply_patch(old, ops)), _text(new), ops)
+
+    def test_structural_classification(self):
+        old = make_doc()
+        tempo = dict(copy.deepcopy(old), meta=dict(old["meta"], tempo=99))
+        channel = copy.deepcopy(old)
+        channel["tracks"][1]["midiChannel"] = 5
+        velocity = copy.deepcopy(old)
+        velocity["tracks"][1]["pattern"]["steps"][0]["events"][0]["velocity"] = 5
+        self.assertTrue(is_structural_ops(diff_loops(old, tempo)))
+        self.assertTrue(is_structural_ops(diff_loops(old, channel)))
+        self.assertFalse(is_structural_ops(diff_loops(old, velocity)))
+
+
+class TestReplaceDiff(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+        self.c.playing = True
+
+    def tearDown(self):
+        self.c.playing = False
+        self.c.close()
+        self._tmp.cleanup()
+
+    def test_note_edit_applies_now_and_keeps_delta(self):
+        new = json.loads(json.dumps(self.c.doc))
+        new["tracks"][0]["pattern"]["steps"][2]["events"][0]["velocity"] = 7
+        res = self.c.do_replace_diff(0, new)
+        self.assertEqual(res, {"ok": True, "docVersion": 1})
+        self.assertEqual(self.c.deltas_since(0)[0], {"op": "replace", "path": "/tracks/0/pattern/steps/2/events/0/velocity", "value": 7})
+        # Untouched tracks are the previous version's objects
+        self.assertIs(self.c.doc["tracks"][1], self.c.history.get(0)["tracks"][1])
+
+    def test_structural_edit_waits_for_bar(self):
+        new = json.loads(json.dumps(self.c.doc))
+        new["meta"]["tempo"] = 100
+        self.assertTrue(self.c.do_replace_diff(0, new).get("pending"))
+        self.assertEqual(self.c.do_replace_diff(5, new)["error"], "stale")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+import copy
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor.conductor_server import Conductor
+from conductor.midi_engine import Engine, VirtualSink
+from conductor.overlay import CCRide, Overlay
+from conductor.tests import loops
+from conductor.tests.loops import note, step, track
+
+
+def make_doc():
+    return loops.make_doc(drum_map={"kick": 53}, tracks=[
+        track("t-bass", "Bass", 1, [step(0, note(40, 100, 2)), step(8, note(43, 80, 2, prob=0.5))], ccLanes=[
+            {"id": "cut", "dest": "cc:32", "mode": "hold", "points": [{"t": {"ticks": 0}, "v": 10}, {"t": {"ticks": 192}, "v": 90}]},
+        ]),
+        track("t-drums", "Kit", 9, [], drumKit={"patterns": [{"bar": 1, "key": "kick", "pattern": "x...x...x...x...", "vel": 100}]}),
+        track("t-lead", "Lead", 2, [step(4, note(72, 90, prob=0.5))]),
+    ])
+
+
+def play(eng, ticks=384):
+    eng.sink.events.clear()
+    eng.start()
+    for t in range(ticks):
+        eng.on_tick(t)
+    return eng.sink.events
+
+
+def ons(events, ch):
+    return [(e[2], e[3]) for e in events if e[0] == "on" and e[1] == ch]
+
+
+class TestOverlayUpdate(unittest.TestCase):
+    def setUp(self):
+        self.doc = make_doc()
+
+    def test_bind_masks_follow_track_ids(self):
+        ov = Overlay().update(self.doc, {"mute": {"Kit": True}, "solo": {"t-bass": True, "Kit": True}}, 0, {})
+        self.assertEqual((ov.muted, ov.soloed), ({"t-drums"}, {"t-bass", "t-drums"}))
+        bound = ov.bind(self.doc["tracks"])
+        self.assertEqual((bound.mute, bound.solo, bound.audible), (0b010, 0b011, 0b001))
+        # Reordered tracks keep their overlay
+        tracks = list(reversed(self.doc["tracks"]))
+        self.assertEqual(ov.bind(tracks).audible, 0b100)
+        self.assertIsNone(Overlay().bind(tracks))
+        self.assertFalse(ov.update(self.doc, {"clear": True}, 0, {}))
+
+    def test_fx_entries_clear_at_identity(self):
+        ov = Overlay().update(self.doc, {"transpose": {"Bass": 12}, "velocityScale": {"Bass": 0.5}}, 0, {})
+        self.assertEqual(ov.snapshot(), {"transpose": {"t-bass": 12}, "velocityScale": {"t-bass": 0.5}})
+        ov = ov.update(self.doc, {"transpose": {"Bass": 0}, "velocityScale": {"Bass": 1}}, 0, {})
+        self.assertEqual(ov.snapshot(), {})
+
+    def test_cc_rides(self):
+        ov = Overlay().update(self.doc, {"cc": [{"track": "Bass", "control": "cutoff", "value": 100, "ramp": {"beats": 1}}]}, 50, {1: {32: 20}})
+        self.assertEqual(ov.cc, {("t-bass", 32): CCRide(100, 20, 50, 96)})
+        ride = ov.cc[("t-bass", 32)]
+        self.assertEqual([ride.value_at(t, 10) for t in (50, 98, 146, 500)], [20, 60, 100, 100])
+        # Releasing glides back to the doc's value, then drops out
+        ov = ov.update(self.doc, {"cc": [{"track": "Bass", "control": 32, "value": None, "ramp": {"ticks": 10}}]}, 200, {1: {32: 100}})
+        self.assertEqual(ov.cc[("t-bass", 32)].value_at(205, 90), 95)
+        self.assertEqual(ov.update(self.doc, {}, 210, {}).cc, {})
+        ov = Overlay().update(self.doc, {"cc": [{"track": "Bass", "control": "cc:7", "value": 3}]}, 0, {})
+        self.assertEqual(ov.cc[("t-bass", 7)].value_at(0, None), 3)
+
+    def test_invalid_changes(self):
+        for bad in (
+            {"mute": {"Nope": True}},
+            {"mute": {"Bass": 1}},
+            {"solo": ["Bass"]},
+            {"transpose": {"Bass": 0.5}},
+            {"velocityScale": {"Bass": -1}},
+            {"cc": [{"track": "Bass", "control": "warp", "value": 1}]},
+            {"cc": [{"track": "Bass", "control": 32, "value": 200}]},
+            {"cc": [{"track": "Bass", "control": 32, "value": 1, "ramp": {"seconds": 1}}]},
+            {"cc": [{"track": "Bass", "control": 32}]},
+            {"reverse": True},
+        ):
+            with self.assertRaises(ValueError, msg=bad):
+                Overlay().update(self.doc, bad, 0, {})
+
+
+class TestEngineOverlay(unittest.TestCase):
+    def setUp(self):
+        self.doc = make_doc()
+
+    def engines(self):
+        for compiled in (True, False):
+            eng = Engine(VirtualSink())
+            eng.load(copy.deepcopy(self.doc))
+            if not compiled:
+                eng._plans = []
+            yield eng
+
+    def test_mute_and_solo(self):
+        for eng in self.engines():
+            eng.set_overlay(Overlay().update(eng.doc, {"mute": {"Bass": True}}, 0, {}))
+            events = play(eng)
+            self.assertEqual(ons(events, 1), [])
+            self.assertEqual(len(ons(events, 9)), 4)
+            eng.set_overlay(Overlay().update(eng.doc, {"solo": {"Kit": True}}, 0, {}))
+            events = play(eng)
+            self.assertEqual([e[1] for e in events if e[0] == "on"], [9] * 4)
+            # Lanes keep running on muted tracks
+            self.assertIn(("cc", 1, 32, 90), events)
+
+    def test_muting_leaves_other_tracks_rolls_alone(self):
+        for seeded, eng in zip(self.engines(), self.engines()):
+            want = ons(play(seeded, 384 * 8), 2)
+            eng.set_overlay(Overlay().update(eng.doc, {"mute": {"Bass": True}}, 0, {}))
+            self.assertEqual(ons(play(eng, 384 * 8), 2), want)
+
+    def test_transpose_and_velocity(self):
+        for eng in self.engines():
+            eng.set_overlay(Overlay().update(eng.doc, {"transpose": {"Bass": 12, "Kit": 5}, "velocityScale": {"Bass": 2, "Kit": 0.5}}, 0, {}))
+            eng._rng.random = lambda: 0.0
+            events = play(eng)
+            self.assertEqual(ons(events, 1), [(52, 127), (55, 127)])
+            self.assertEqual(set(ons(events, 9)), {(53, 50)})
+            eng.set_overlay(None)
+            self.assertEqual(ons(play(eng), 1), [(40, 100), (43, 80)])
+
+    def test_cc_ride_overrides_lane_and_releases(self):
+        for eng in self.engines():
+            eng.set_overlay(Overlay().update(eng.doc, {"cc": [{"track": "Bass", "control": 32, "value": 64}, {"track": "Lead", "control": 7, "value": 100}]}, 0, {}))
+            events = play(eng)
+            self.assertEqual([e for e in events if e[0] == "cc"], [("cc", 1, 32, 64), ("cc", 2, 7, 100)])
+            eng.set_overlay(eng.overlay.update(eng.doc, {"cc": [{"track": "Bass", "control": 32, "value": None, "ramp": {"ticks": 4}}]}, 0, eng.get_cc_snapshot()))
+            cc = [e[3] for e in play(eng, 8) if e[0] == "cc"]
+            self.assertEqual(cc, [50, 37, 24, 10])
+
+    def test_preview_sees_overlay(self):
+        eng = Engine(VirtualSink())
+        eng.load(copy.deepcopy(self.doc))
+        eng.set_overlay(Overlay().update(eng.doc, {"solo": {"Bass": True}, "transpose": {"Bass": -12}}, 0, {}))
+        self.assertEqual(sorted(n["pitch"] for n in eng.preview(0, 384)["notes"]), [28, 31])
+
+
+class TestConductorOverlay(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+
+    def tearDown(self):
+        self.c.close()
+        self._tmp.cleanup()
+
+    def test_overlay_never_touches_the_doc(self):
+        doc, on_disk = self.c.doc, self.loop_path.read_bytes()
+        res = self.c.do_overlay({"mute": {"Kit": True}, "transpose": {"Bass": 7}})
+        self.assertEqual((res["ok"], res["overlayVersion"], res["overlay"]["mute"]), (True, 1, ["t-drums"]))
+        self.assertIs(self.c.doc, doc)
+        self.assertEqual((self.c.doc_version, self.c.history.stats()["versions"]), (0, [0]))
+        self.assertEqual(self.loop_path.read_bytes(), on_disk)
+        self.assertEqual(self.c.get_state()["overlay"], {"mute": ["t-drums"], "transpose": {"t-bass": 7}})
+        self.assertEqual(self.c.upcoming(1)["notes"][0]["pitch"], 47)
+
+    def test_overlay_survives_doc_edits(self):
+        self.c.do_overlay({"mute": {"Lead": True}})
+        self.c.do_apply_patch(0, [{"op": "remove", "path": "/tracks/0"}])
+        self.assertEqual(self.c.engine._overlay.mute, 0b10)
+        res = self.c.do_overlay({"solo": {"Bass": True}})
+        self.assertEqual(res["error"], "invalid_overlay")
+        self.assertTrue(self.c.do_overlay({"clear": True})["ok"])
+        self.assertIsNone(self.c.engine.overlay)
+        self.assertEqual(self.c.get_state()["overlay"], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,9 @@
+import copy
 import unittest
 
-from conductor.patch_utils import apply_patch
-from conductor.validator import validate_loop
+from conductor.bench import make_large_doc
+from conductor.patch_utils import apply_patch, apply_patch_cow
+from conductor.validator import canonicalize, canonicalize_shared, validate_loop
 
 
 class TestPatchUtils(unittest.TestCase):
@@ -33,3 +35,75 @@ class TestPatchUtils(unittest.TestCase):
         errors = validate_loop(patched)
         self.assertEqual(errors, [])
 
+
+class TestApplyPatchCow(unittest.TestCase):
+    def setUp(self):
+        self.doc = make_large_doc(tracks=3, bars=2, lanes=1)
+        self.before = copy.deepcopy(self.doc)
+
+    def _check(self, ops):
+        out = apply_patch_cow(self.doc, ops)
+        self.assertEqual(out, apply_patch(self.before, ops))
+        # Source doc is never written
+        self.assertEqual(self.doc, self.before)
+        return out
+
+    def test_matches_reference_for_all_ops(self):
+        self._check([{"op": "replace", "path": "/tracks/1/pattern/steps/3/events/0/velocity", "value": 1}])
+        self._check([{"op": "add", "path": "/tracks/0/pattern/steps/-", "value": {"idx": 40, "events": []}}])
+        self._check([{"op": "add", "path": "/tracks/0/pattern/steps/0", "value": {"idx": 0, "events": []}}])
+        self._check([{"op": "remove", "path": "/tracks/2"}])
+        self._check([{"op": "move", "from": "/tracks/0/name", "path": "/tracks/1/label"}])
+        self._check([{"op": "copy", "from": "/tracks/0/ccLanes", "path": "/tracks/1/ccLanes"},
+                     {"op": "replace", "path": "/tracks/1/ccLanes/0/id", "value": "x"}])
+        self._check([{"op": "test", "path": "/meta/ppq", "value": 96}, {"op": "add", "path": "/meta/a~1b", "value": 1}])
+        self._check([{"op": "test", "path": "/meta", "value": dict(reversed(list(self.doc["meta"].items())))}])
+        # Numbers compare by value (RFC 6902 §4.6), as jsonpatch does
+        self._check([{"op": "test", "path": "/meta/ppq", "value": 96.0}])
+        self._check([{"op": "test", "path": "/meta", "value": {**self.doc["meta"], "ppq": 96.0}}])
+
+    def test_untouched_subtrees_are_shared(self):
+        out = self._check([{"op": "replace", "path": "/tracks/1/pattern/steps/3/events/0/velocity", "value": 1}])
+        self.assertIs(out["tracks"][0], self.doc["tracks"][0])
+        self.assertIs(out["tracks"][1]["ccLanes"], self.doc["tracks"][1]["ccLanes"])
+        self.assertIs(out["tracks"][1]["pattern"]["steps"][4], self.doc["tracks"][1]["pattern"]["steps"][4])
+        self.assertIsNot(out["tracks"][1]["pattern"]["steps"][3], self.doc["tracks"][1]["pattern"]["steps"][3])
+
+    def test_errors(self):
+        for ops in (
+            [{"op": "replace", "path": "/nope", "value": 1}],
+            [{"op": "remove", "path": "/tracks/9"}],
+            [{"op": "test", "path": "/meta/ppq", "value": 1}],
+            [{"op": "test", "path": "/tracks/0/pattern/steps/0/events/0", "value": {**self.doc["tracks"][0]["pattern"]["steps"][0]["events"][0], "lengthSteps": True}}],
+            [{"op": "add", "path": "/tracks/01", "value": 1}],
+            [{"op": "frobnicate", "path": "/meta"}],
+        ):
+            with self.assertRaises((KeyError, IndexError, ValueError)):
+                apply_patch_cow(self.doc, ops)
+        self.assertEqual(self.doc, self.before)
+
+
+class TestCanonicalizeShared(unittest.TestCase):
+    def test_matches_full_canonicalize(self):
+        doc = make_large_doc(tracks=3, bars=1, lanes=2)
+        before = copy.deepcopy(doc)
+        ops = [
+            {"op": "replace", "path": "/tracks/0/id", "value": "zzz"},
+            {"op": "replace", "path": "/tracks/1/pattern/steps/0/idx", "value": 15},
+            {"op": "replace", "path": "/tracks/2/ccLanes/0/id", "value": "zlane"},
+            {"op": "add", "path": "/tracks/-", "value": {"id": "a", "name": "A", "type": "synth", "midiChannel": 0,
+                                                       "pattern": {"lengthBars": 1, "steps": [{"idx": 2}, {"idx": 1}]}}},
+        ]
+        patched = apply_patch_cow(doc, ops)
+        out, reordered = canonicalize_shared(patched, doc)
+        self.assertTrue(reordered)
+        self.assertEqual(out, canonicalize(apply_patch(before, ops)))
+        self.assertEqual(doc, before)
+
+    def test_in_order_edit_is_not_reordered(self):
+        doc = make_large_doc(tracks=2, bars=1, lanes=1)
+        patched = apply_patch_cow(doc, [{"op": "replace", "path": "/tracks/1/name", "value": "n"}])
+        out, reordered = canonicalize_shared(patched, doc)
+        self.assertFalse(reordered)
+        self.assertIs(out["tracks"][1]["pattern"], doc["tracks"][1]["pattern"])
+        self.assertEqual(validate_loop(out), [])
@@ -0,0 +1,121 @@
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from conductor.conductor_server import Conductor
+from conductor.persist import PersistWorker
+
+
+class TestPersistWorker(unittest.TestCase):
+    def setUp(self):
+        self.written = []
+        self.done = threading.Event()
+
+    def _write(self, version, doc):
+        self.written.append((version, doc))
+        self.done.set()
+
+    def test_burst_coalesces_into_one_write(self):
+        w = PersistWorker(self._write, quiet_s=0.1, max_delay_s=5.0)
+        for v in range(1, 6):
+            w.submit(v, {"v": v})
+        self.assertTrue(self.done.wait(2.0))
+        time.sleep(0.15)
+        self.assertEqual(self.written, [(5, {"v": 5})])
+        snap = w.snapshot()
+        self.assertEqual(snap["writtenVersion"], 5)
+        self.assertEqual(snap["coalesced"], 4)
+        self.assertFalse(snap["pending"])
+        w.close()
+
+    def test_max_delay_bounds_lag_under_constant_edits(self):
+        w = PersistWorker(self._write, quiet_s=0.2, max_delay_s=0.3)
+        t_end = time.monotonic() + 0.8
+        v = 0
+        while time.monotonic() < t_end:
+            v += 1
+            w.submit(v, {"v": v})
+            time.sleep(0.02)
+        # Edits never paused for quiet_s, yet saves happened
+        self.assertGreaterEqual(len(self.written), 2)
+        w.close()
+        self.assertEqual(self.written[-1][0], v)
+
+    def test_flush_and_close_write_latest(self):
+        w = PersistWorker(self._write, quiet_s=10.0, max_delay_s=10.0)
+        w.submit(1, {"v": 1})
+        self.assertTrue(w.snapshot()["pending"])
+        w.flush()
+        self.assertEqual(self.written, [(1, {"v": 1})])
+        w.submit(2, {"v": 2})
+        w.close()
+        self.assertEqual(self.written[-1], (2, {"v": 2}))
+
+    def test_write_errors_are_counted(self):
+        def boom(version, doc):
+            raise OSError("disk full")
+        w = PersistWorker(boom, quiet_s=10.0)
+        w.submit(1, {})
+        w.flush()
+        snap = w.snapshot()
+        self.assertEqual(snap["errors"], 1)
+        self.assertEqual(snap["lastError"], "disk full")
+        self.assertIsNone(snap["writtenVersion"])
+        w.close()
+
+
+class TestConductorWriteBehind(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps({
+            "version": "opxyloop-1.0",
+            "meta": {"tempo": 120, "ppq": 96, "stepsPerBar": 16},
+            "tracks": [{"id": "t1", "name": "Lead", "type": "sampler", "midiChannel": 0, "pattern": {"lengthBars": 1, "steps": []}}],
+            "docVersion": 0,
+        }))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external", persist_delay_s=5.0)
+
+    def tearDown(self):
+        self.c.close()
+        self._tmp.cleanup()
+
+    def _bump(self, name):
+        doc = json.loads(json.dumps(self.c.doc))
+        doc["tracks"][0]["name"] = name
+        self.assertTrue(self.c.do_replace_json(self.c.doc_version, doc)["ok"])
+
+    def test_saves_are_deferred_until_flush(self):
+        self._bump("A")
+        self._bump("B")
+        self.assertEqual(json.loads(self.loop_path.read_text())["docVersion"], 0)
+        self.assertTrue(self.c.persist_stats()["pending"])
+        self.c.flush()
+        on_disk = json.loads(self.loop_path.read_text())
+        self.assertEqual(on_disk["docVersion"], 2)
+        self.assertEqual(on_disk["tracks"][0]["name"], "B")
+        self.assertEqual(self.c.persist_stats()["writes"], 1)
+
+    def test_own_lagging_write_is_not_reloaded(self):
+        self._bump("A")
+        self.c.flush()
+        self._bump("B")
+        # The file holds our own v1 save while memory is at v2
+        self.assertFalse(self.c.reload_from_disk(json.loads(self.loop_path.read_text())))
+        self.assertEqual(self.c.doc_version, 2)
+
+    def test_external_edit_cancels_pending_save(self):
+        self._bump("A")
+        external = json.loads(json.dumps(self.c.doc))
+        external["tracks"][0]["name"] = "External"
+        self.loop_path.write_text(json.dumps(external))
+        self.assertTrue(self.c.reload_from_disk(external))
+        self.c.flush()
+        self.assertEqual(json.loads(self.loop_path.read_text())["tracks"][0]["name"], "External")
+
+
+if __name__ == "__main__":
+    unittest.main()
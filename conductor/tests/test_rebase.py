@@ -0,0 +1,172 @@
+import copy
+import json
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor.conductor_server import Conductor
+from conductor.patch_utils import apply_patch_cow
+from conductor.rebase import rebase_ops, resolve_appends
+from conductor.tests import loops
+from conductor.tests.loops import note, step, track
+
+
+STEPS = "/tracks/0/pattern/steps"
+
+
+def make_doc():
+    return loops.make_doc(tracks=[
+        track(steps=[step(i, note(60 + i)) for i in range(6)]),
+        track("t2", "Bass", 1, []),
+    ])
+
+
+def random_edits(rng, items, next_id, count):
+    """Ops on a list of {"id", "v"} items, plus the ids each op targets.
+
+    Inserted items get fresh ids from next_id, so every op's intent can be
+    stated by identity.
+    """
+    items = list(items)
+    ops, touched = [], set()
+    for _ in range(count):
+        r = rng.random()
+        if r < 0.4 and items:
+            i = rng.randrange(len(items))
+            ops.append({"op": "replace", "path": f"/items/{i}/v", "value": rng.randrange(1000)})
+            touched.add(items[i]["id"])
+            items[i] = dict(items[i], v=ops[-1]["value"])
+        elif r < 0.65 and items:
+            i = rng.randrange(len(items))
+            ops.append({"op": "remove", "path": f"/items/{i}"})
+            touched.add(items.pop(i)["id"])
+        else:
+            i = rng.randrange(len(items) + 1)
+            item = {"id": next(next_id), "v": 0}
+            ops.append({"op": "add", "path": f"/items/{i}" if rng.random() < 0.8 else "/items/-", "value": item})
+            if ops[-1]["path"] == "/items/-":
+                items.append(item)
+            else:
+                items.insert(i, item)
+    return ops, touched, items
+
+
+def _order(ids, among):
+    return [i for i in ids if i in among]
+
+
+class TestRebaseOps(unittest.TestCase):
+    def test_indices_shift_past_intervening_inserts_and_removals(self):
+        applied = [{"op": "add", "path": f"{STEPS}/1", "value": {}}, {"op": "remove", "path": f"{STEPS}/4"}]
+        ops = [{"op": "replace", "path": f"{STEPS}/5/events/0/velocity", "value": 9}, {"op": "move", "from": f"{STEPS}/0", "path": f"{STEPS}/2"}]
+        rebased, conflicts = rebase_ops(applied, ops)
+        self.assertEqual(conflicts, [])
+        self.assertEqual(rebased[0]["path"], f"{STEPS}/5/events/0/velocity")
+        self.assertEqual((rebased[1]["from"], rebased[1]["path"]), (f"{STEPS}/0", f"{STEPS}/3"))
+
+    def test_own_earlier_ops_are_accounted_for(self):
+        # The client inserted first, so its /3 is the base doc's /2, which was removed
+        applied = [{"op": "remove", "path": f"{STEPS}/2"}]
+        ops = [{"op": "add", "path": f"{STEPS}/0", "value": {}}, {"op": "replace", "path": f"{STEPS}/3/idx", "value": 1}]
+        self.assertEqual(rebase_ops(applied, ops), (None, [f"{STEPS}/3/idx"]))
+
+    def test_conflicts(self):
+        cases = [
+            ([{"op": "replace", "path": "/meta/tempo", "value": 1}], {"op": "replace", "path": "/meta/tempo", "value": 2}),
+            ([{"op": "replace", "path": "/tracks/0/pattern", "value": {}}], {"op": "replace", "path": f"{STEPS}/0/idx", "value": 2}),
+            ([{"op": "replace", "path": f"{STEPS}/0/idx", "value": 2}], {"op": "remove", "path": f"{STEPS}/0"}),
+            ([{"op": "add", "path": "/meta/swing", "value": 1}], {"op": "add", "path": "/meta/swing", "value": 2}),
+            ([{"op": "add", "path": f"{STEPS}/-", "value": {}}], {"op": "replace", "path": STEPS, "value": []}),
+            ([{"op": "remove", "path": "/meta/swing"}], {"op": "copy", "from": "/meta/swing", "path": "/meta/x"}),
+        ]
+        for applied, op in cases:
+            self.assertEqual(rebase_ops(applied, [op])[1], [op["path"]], (applied, op))
+
+    def test_resolve_appends(self):
+        doc = {"a": [1, 2], "m": {}}
+        ops = [{"op": "add", "path": "/a/-", "value": 3}, {"op": "remove", "path": "/a/0"}, {"op": "add", "path": "/a/-", "value": 4}, {"op": "add", "path": "/m/-", "value": 5}]
+        self.assertEqual([op["path"] for op in resolve_appends(doc, ops)], ["/a/2", "/a/0", "/a/2", "/m/-"])
+        self.assertEqual(doc, {"a": [1, 2], "m": {}})
+        plain = ops[1:2]
+        self.assertIs(resolve_appends(doc, plain), plain)
+
+    def test_disjoint_edits_and_appends_do_not_conflict(self):
+        applied = [{"op": "add", "path": f"{STEPS}/-", "value": {}}, {"op": "replace", "path": "/docVersion", "value": 3}]
+        ops = [{"op": "add", "path": f"{STEPS}/-", "value": {}}, {"op": "replace", "path": "/tracks/1/name", "value": "x"}]
+        self.assertEqual(rebase_ops(applied, ops), (ops, []))
+
+    def test_random_concurrent_edits_keep_both_intents(self):
+        rng = random.Random(11)
+        merged = 0
+        for _ in range(2000):
+            base = [{"id": i, "v": 0} for i in range(rng.randrange(0, 8))]
+            ids = iter(range(100, 10**6))
+            applied, a_touched, a_items = random_edits(rng, base, ids, rng.randrange(1, 4))
+            applied = resolve_appends({"items": base}, applied)
+            ops, c_touched, c_items = random_edits(rng, base, ids, rng.randrange(1, 4))
+            rebased, conflicts = rebase_ops(applied, ops)
+            base_ids = {it["id"] for it in base}
+            if a_touched & c_touched & base_ids:
+                self.assertIsNone(rebased, (base, applied, ops))
+                continue
+            self.assertEqual(conflicts, [], (base, applied, ops))
+            out = apply_patch_cow(apply_patch_cow({"items": base}, applied), rebased)["items"]
+            merged += 1
+            # Every item either side kept or created survives, with its latest value
+            want = {it["id"]: it for it in a_items if it["id"] not in base_ids or any(c["id"] == it["id"] for c in c_items)}
+            want.update({it["id"]: it for it in c_items if it["id"] not in base_ids or it["id"] in c_touched})
+            self.assertEqual({it["id"]: it for it in out}, want, (base, applied, ops))
+            # And each side's ordering of the items it can see is preserved
+            out_ids = [it["id"] for it in out]
+            self.assertEqual(_order(out_ids, {it["id"] for it in a_items}), _order([it["id"] for it in a_items], set(out_ids)))
+            self.assertEqual(_order(out_ids, {it["id"] for it in c_items}), _order([it["id"] for it in c_items], set(out_ids)))
+        self.assertGreater(merged, 500)
+
+
+class TestConductorRebase(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external", rebase_window=3)
+
+    def tearDown(self):
+        self.c.close()
+        self._tmp.cleanup()
+
+    def test_stale_patch_is_rebased(self):
+        self.assertTrue(self.c.do_apply_patch(0, [{"op": "remove", "path": f"{STEPS}/0"}])["ok"])
+        res = self.c.do_apply_patch(0, [{"op": "replace", "path": f"{STEPS}/3/events/0/velocity", "value": 7}])
+        self.assertEqual((res["ok"], res["rebasedFrom"], res["docVersion"]), (True, 0, 2))
+        self.assertEqual(self.c.doc["tracks"][0]["pattern"]["steps"][2]["events"][0], {"pitch": 63, "velocity": 7, "lengthSteps": 1})
+        # The delta clients receive is the rebased patch
+        self.assertEqual(self.c.deltas_since(1)[0]["path"], f"{STEPS}/2/events/0/velocity")
+        self.assertEqual(self.c.rebase_stats()["rebased"], 1)
+
+    def test_conflict_lists_paths(self):
+        self.c.do_apply_patch(0, [{"op": "replace", "path": "/tracks/1/name", "value": "A"}])
+        res = self.c.do_apply_patch(0, [{"op": "replace", "path": "/tracks/1/name", "value": "B"}, {"op": "replace", "path": "/meta/tempo", "value": 99}])
+        self.assertEqual((res["error"], res["paths"], res["expected"]), ("conflict", ["/tracks/1/name"], 1))
+        self.assertEqual(self.c.doc["tracks"][1]["name"], "A")
+
+    def test_window_and_opt_out(self):
+        for v in range(4):
+            self.c.do_apply_patch(v, [{"op": "replace", "path": "/tracks/1/name", "value": str(v)}])
+        edit = [{"op": "replace", "path": "/meta/tempo", "value": 99}]
+        self.assertEqual(self.c.do_apply_patch(0, edit)["error"], "stale")
+        self.assertEqual(self.c.do_apply_patch(1, edit, rebase=False)["error"], "stale")
+        self.assertTrue(self.c.do_apply_patch(1, edit)["ok"])
+
+    def test_stale_replace_json_is_diffed_against_its_base(self):
+        old = copy.deepcopy(self.c.doc)
+        self.c.do_apply_patch(0, [{"op": "remove", "path": f"{STEPS}/0"}])
+        old["tracks"][0]["pattern"]["steps"][3]["events"][0]["velocity"] = 3
+        res = self.c.do_replace_diff(0, old)
+        self.assertEqual((res["ok"], res["rebasedFrom"]), (True, 0), res)
+        steps = self.c.doc["tracks"][0]["pattern"]["steps"]
+        self.assertEqual((len(steps), steps[2]["idx"], steps[2]["events"][0]["velocity"]), (5, 3, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+import copy
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor.conductor_server import Conductor
+from conductor.midi_engine import Engine, VirtualSink
+from conductor.patch_utils import apply_patch_cow
+from conductor.semantic_ops import compile_commands
+from conductor.tests import loops
+from conductor.tests.loops import note, step, track
+from conductor.validator import canonicalize
+
+
+def make_doc():
+    return loops.make_doc(drum_map={"kick": 53, "snare": 55}, tracks=[
+        track("t-bass", "Bass", 1, [
+            step(0, note(40, 100, 2)),
+            step(8, note(43, 80, 2), {"degree": 3, "octaveOffset": 0, "velocity": 60, "lengthSteps": 1}),
+        ], ccLanes=[
+            {"id": "cut", "dest": "cc:32", "mode": "ramp", "points": [{"t": {"ticks": 0}, "v": 10}, {"t": {"ticks": 96}, "v": 60}, {"t": {"ticks": 192}, "v": 90}]},
+        ]),
+        track("t-drums", "Kit", 9, [], drumKit={"patterns": [{"bar": 1, "key": "snare", "pattern": "....x.......x...", "vel": 100}]}),
+    ])
+
+
+def run(doc, *commands):
+    ops = compile_commands(doc, list(commands))
+    return ops, apply_patch_cow(doc, ops)
+
+
+class TestCompileCommands(unittest.TestCase):
+    def setUp(self):
+        self.doc = make_doc()
+
+    def test_set_drum_row(self):
+        ops, out = run(self.doc, {"cmd": "setDrumRow", "track": "Kit", "key": "kick", "pattern": "x...x...x...x..."})
+        self.assertEqual(ops, [{"op": "add", "path": "/tracks/1/drumKit/patterns/0", "value": {"bar": 1, "key": "kick", "pattern": "x...x...x...x..."}}])
+        self.assertEqual(out, canonicalize(out))
+        ops, _ = run(self.doc, {"cmd": "setDrumRow", "track": "t-drums", "key": "snare", "pattern": "....x.......x.x.", "vel": 100})
+        self.assertEqual(ops, [{"op": "replace", "path": "/tracks/1/drumKit/patterns/0/pattern", "value": "....x.......x.x."}])
+        ops, out = run(self.doc, {"cmd": "setDrumRow", "track": 0, "key": "kick", "pattern": "x" * 16})
+        self.assertEqual(out["tracks"][0]["drumKit"], {"patterns": [{"bar": 1, "key": "kick", "pattern": "x" * 16}]})
+
+    def test_transpose_touches_pitches_only(self):
+        ops, out = run(self.doc, {"cmd": "transpose", "track": "t-bass", "semitones": -2, "steps": [0]})
+        self.assertEqual(ops, [{"op": "replace", "path": "/tracks/0/pattern/steps/0/events/0/pitch", "value": 38}])
+        self.assertEqual(out["tracks"][0]["pattern"]["steps"][1], self.doc["tracks"][0]["pattern"]["steps"][1])
+        # Degree events can only move by octaves
+        with self.assertRaisesRegex(ValueError, "degree event at step 8"):
+            compile_commands(self.doc, [{"cmd": "transpose", "track": "t-bass", "semitones": 3, "steps": [8]}])
+        ops, _ = run(self.doc, {"cmd": "transpose", "track": "t-bass", "semitones": -12, "steps": [8]})
+        self.assertEqual(ops, [
+            {"op": "replace", "path": "/tracks/0/pattern/steps/1/events/0/pitch", "value": 31},
+            {"op": "replace", "path": "/tracks/0/pattern/steps/1/events/1/octaveOffset", "value": -1},
+        ])
+        chord = copy.deepcopy(self.doc)
+        chord["tracks"][0]["pattern"]["steps"][0]["events"].append({"chord": "Am", "velocity": 90, "lengthSteps": 2})
+        with self.assertRaisesRegex(ValueError, "chord event at step 0"):
+            compile_commands(chord, [{"cmd": "transpose", "track": "t-bass", "semitones": 12}])
+        with self.assertRaises(ValueError):
+            compile_commands(self.doc, [{"cmd": "transpose", "track": "t-bass", "semitones": 100}])
+
+    def test_scale_velocity_clamps_and_skips_unchanged(self):
+        ops, out = run(self.doc, {"cmd": "scaleVelocity", "track": "t-bass", "factor": 1.5})
+        self.assertEqual([op["value"] for op in ops], [127, 120, 90])
+        ops, out = run(self.doc, {"cmd": "scaleVelocity", "track": "t-drums", "factor": 0.5})
+        self.assertEqual(ops, [{"op": "replace", "path": "/tracks/1/drumKit/patterns/0/vel", "value": 50}])
+        self.assertEqual(run(self.doc, {"cmd": "scaleVelocity", "track": "t-bass", "factor": 1})[0], [])
+
+    def test_set_step_event(self):
+        ops, out = run(self.doc, {"cmd": "setStepEvent", "track": "t-bass", "step": 0, "event": {"velocity": 70, "gate": 0.5, "lengthSteps": 2}})
+        self.assertEqual(ops, [
+            {"op": "replace", "path": "/tracks/0/pattern/steps/0/events/0/velocity", "value": 70},
+            {"op": "add", "path": "/tracks/0/pattern/steps/0/events/0/gate", "value": 0.5},
+        ])
+        ops, out = run(self.doc, {"cmd": "setStepEvent", "track": "t-bass", "step": 4, "event": {"pitch": 45, "velocity": 90, "lengthSteps": 1}})
+        self.assertEqual(ops[0]["path"], "/tracks/0/pattern/steps/1")
+        self.assertEqual([s["idx"] for s in out["tracks"][0]["pattern"]["steps"]], [0, 4, 8])
+        ops, out = run(self.doc, {"cmd": "setStepEvent", "track": "t-bass", "step": 0, "event": None})
+        self.assertEqual(ops, [{"op": "remove", "path": "/tracks/0/pattern/steps/0"}])
+        ops, _ = run(self.doc, {"cmd": "setStepEvent", "track": "t-bass", "step": 8, "index": 1, "event": None})
+        self.assertEqual(ops, [{"op": "remove", "path": "/tracks/0/pattern/steps/1/events/1"}])
+
+    def test_move_cc_point_keeps_time_order(self):
+        ops, out = run(self.doc, {"cmd": "moveCCPoint", "track": "t-bass", "lane": "cut", "point": 1, "v": 70})
+        self.assertEqual(ops, [{"op": "replace", "path": "/tracks/0/ccLanes/0/points/1/v", "value": 70}])
+        ops, out = run(self.doc, {"cmd": "moveCCPoint", "track": "t-bass", "lane": "cut", "at": {"ticks": 0}, "to": {"ticks": 300}})
+        self.assertEqual([op["op"] for op in ops], ["remove", "add"])
+        self.assertEqual([p["t"]["ticks"] for p in out["tracks"][0]["ccLanes"][0]["points"]], [96, 192, 300])
+        with self.assertRaises(ValueError):
+            compile_commands(self.doc, [{"cmd": "moveCCPoint", "track": "t-bass", "lane": "nope", "point": 0, "v": 1}])
+
+    def test_mute_unmute(self):
+        ops, out = run(self.doc, {"cmd": "mute", "track": "t-bass", "steps": [8]})
+        self.assertEqual(ops, [{"op": "add", "path": "/tracks/0/pattern/steps/1/mute", "value": True}])
+        self.assertEqual(run(out, {"cmd": "mute", "track": "t-bass", "steps": [8]})[0], [])
+        ops, out = run(out, {"cmd": "unmute", "track": "t-bass"})
+        self.assertEqual(ops, [{"op": "remove", "path": "/tracks/0/pattern/steps/1/mute"}])
+
+    def test_commands_see_earlier_commands(self):
+        ops, out = run(self.doc,
+                       {"cmd": "setStepEvent", "track": "t-bass", "step": 4, "event": {"pitch": 45, "velocity": 90, "lengthSteps": 1}},
+                       {"cmd": "transpose", "track": "t-bass", "semitones": 12, "steps": [4, 8]})
+        self.assertEqual([op["path"] for op in ops[1:]], [
+            "/tracks/0/pattern/steps/1/events/0/pitch", "/tracks/0/pattern/steps/2/events/0/pitch", "/tracks/0/pattern/steps/2/events/1/octaveOffset",
+        ])
+        with self.assertRaisesRegex(ValueError, r"commands\[1\]: unknown track"):
+            compile_commands(self.doc, [{"cmd": "mute", "track": 0}, {"cmd": "mute", "track": "zz"}])
+        with self.assertRaisesRegex(ValueError, "unknown command"):
+            compile_commands(self.doc, [{"cmd": "explode", "track": 0}])
+
+
+class TestMutedSteps(unittest.TestCase):
+    def test_engine_skips_muted_steps(self):
+        doc = make_doc()
+        doc["tracks"][0]["pattern"]["steps"][0]["mute"] = True
+        for compiled in (True, False):
+            sink = VirtualSink()
+            eng = Engine(sink)
+            eng.load(copy.deepcopy(doc))
+            if not compiled:
+                eng._plans = []
+            eng.start()
+            for t in range(384):
+                eng.on_tick(t)
+            pitches = [e[2] for e in sink.events if e[0] == "on" and e[1] == 1]
+            self.assertNotIn(40, pitches)
+            self.assertIn(43, pitches)
+
+
+class TestConductorEdit(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+
+    def tearDown(self):
+        self.c.close()
+        self._tmp.cleanup()
+
+    def test_edit_applies_compiled_ops(self):
+        res = self.c.do_edit([{"cmd": "transpose", "track": "Bass", "semitones": 12}, {"cmd": "mute", "track": "Bass", "steps": [0]}])
+        self.assertEqual((res["ok"], res["docVersion"], len(res["ops"])), (True, 1, 4))
+        self.assertEqual(self.c.deltas_since(0)[:4], res["ops"])
+        step0 = self.c.doc["tracks"][0]["pattern"]["steps"][0]
+        self.assertEqual((step0["events"][0]["pitch"], step0["mute"]), (52, True))
+
+    def test_noop_and_invalid(self):
+        self.assertEqual(self.c.do_edit([{"cmd": "unmute", "track": "Bass"}]), {"ok": True, "docVersion": 0, "ops": []})
+        self.assertEqual(self.c.do_edit([{"cmd": "transpose", "track": "Nope", "semitones": 1}])["error"], "invalid_command")
+        self.assertEqual(self.c.do_edit([{"cmd": "setStepEvent", "track": "Bass", "step": 0, "event": {"velocity": 0}}])["error"], "validation")
+        self.assertEqual(self.c.doc_version, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
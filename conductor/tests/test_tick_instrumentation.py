@@ -0,0 +1,67 @@
+import unittest
+
+from conductor.metrics import FixedHistogram
+from conductor.midi_engine import Engine, VirtualSink
+from conductor.tests import loops
+from conductor.tests.loops import track
+
+
+def make_doc():
+    return loops.make_doc(drum_map={"kick": 53}, tracks=[
+        track(ccLanes=[
+            {"id": "cut", "dest": "cc:32", "mode": "ramp", "points": [{"t": {"bar": 0, "step": 0}, "v": 0}, {"t": {"bar": 0, "step": 15}, "v": 127}]},
+        ]),
+        track("t2", "Drums", 9, [], drumKit={"patterns": [{"bar": 1, "key": "kick", "pattern": "x...x...x...x...", "vel": 110}]}),
+    ])
+
+
+class TestFixedHistogram(unittest.TestCase):
+    def test_bucketing_and_overflow(self):
+        h = FixedHistogram([1, 10, 100])
+        for v in (0.5, 1, 5, 50, 5000):
+            h.observe(v)
+        snap = h.snapshot()
+        self.assertEqual(snap["counts"], [2, 1, 1, 1])
+        self.assertEqual(snap["count"], 5)
+        self.assertEqual(snap["max"], 5000)
+
+
+class TestTickInstrumentation(unittest.TestCase):
+    def test_disabled_by_default(self):
+        eng = Engine(VirtualSink())
+        eng.load(make_doc())
+        eng.start()
+        eng.on_tick(0)
+        self.assertNotIn("tick", eng.get_metrics())
+
+    def test_phase_histograms_and_counts(self):
+        sink = VirtualSink()
+        eng = Engine(sink, instrument=True)
+        eng.load(make_doc())
+        eng.start()
+        bar_ticks = eng.step_ticks * 16
+        for t in range(bar_ticks):
+            eng.on_tick(t)
+        tick = eng.get_metrics()["tick"]
+        self.assertEqual(tick["ticks"], bar_ticks)
+        for phase in ("offs", "ons", "drumKit", "cc"):
+            self.assertEqual(tick["phaseUs"][phase]["count"], bar_ticks)
+        # Every message handed to the sink is accounted for in eventsEmitted
+        emitted = tick["eventsEmitted"]
+        sent = len([e for e in sink.events if e[0] in ("on", "off", "cc")])
+        self.assertEqual(sum(emitted["counts"]), bar_ticks)
+        self.assertAlmostEqual(emitted["mean"] * bar_ticks, sent, delta=1.0)
+        # One step event + one drum row + one lane examined on every tick
+        self.assertEqual(tick["eventsExamined"]["max"], 3)
+
+    def test_stopped_engine_only_times_offs(self):
+        eng = Engine(VirtualSink(), instrument=True)
+        eng.load(make_doc())
+        eng.on_tick(0)
+        tick = eng.get_metrics()["tick"]
+        self.assertEqual(tick["phaseUs"]["offs"]["count"], 1)
+        self.assertEqual(tick["phaseUs"]["ons"]["count"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
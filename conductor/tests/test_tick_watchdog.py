@@ -0,0 +1,77 @@
+import unittest
+
+from conductor.midi_engine import Engine, VirtualSink
+from conductor.tests import loops
+from conductor.tests.loops import note, step, track
+from conductor.watchdog import TickWatchdog
+
+
+def make_doc():
+    return loops.make_doc(tracks=[
+        track(steps=[step(i, note(60)) for i in range(16)], ccLanes=[
+            {"id": "cut", "dest": "cc:32", "mode": "ramp", "points": [{"t": {"bar": 0, "step": 0}, "v": 0}, {"t": {"bar": 0, "step": 15}, "v": 127}]},
+        ]),
+    ])
+
+
+class TestTickWatchdog(unittest.TestCase):
+    def test_escalates_and_recovers(self):
+        wd = TickWatchdog(fraction=0.5, escalate_after=2, recover_after=3)
+        budget = 0.001
+        for t in range(2):
+            wd.observe(0.0009, budget, t)
+        self.assertEqual(wd.level, 1)
+        for t in range(2, 4):
+            wd.observe(0.0009, budget, t)
+        self.assertEqual(wd.level, 2)
+        # Stays at the top level
+        for t in range(4, 10):
+            wd.observe(0.0009, budget, t)
+        self.assertEqual(wd.level, 2)
+        for t in range(10, 16):
+            wd.observe(0.0001, budget, t)
+        self.assertEqual(wd.level, 0)
+        snap = wd.snapshot()
+        self.assertEqual(snap["escalations"], 2)
+        self.assertEqual(snap["recoveries"], 2)
+        self.assertEqual([tr["to"] for tr in snap["transitions"]], ["ccReduced", "ccDeferred", "ccReduced", "normal"])
+
+    def test_engine_budget_follows_tempo(self):
+        eng = Engine(VirtualSink(), limits={"tick_budget_fraction": 0.5})
+        eng.load(make_doc())
+        self.assertAlmostEqual(eng._tick_budget_s, 60.0 / (120 * 96))
+        eng.set_tempo(60)
+        self.assertAlmostEqual(eng._tick_budget_s, 60.0 / (60 * 96))
+        eng.set_tempo(None)
+        self.assertAlmostEqual(eng._tick_budget_s, 60.0 / (120 * 96))
+        self.assertIn("load", eng.get_metrics())
+
+    def test_shedding_defers_cc_but_never_notes(self):
+        def run(level):
+            sink = VirtualSink()
+            eng = Engine(sink, limits={"tick_budget_fraction": 0.5})
+            eng.load(make_doc())
+            # Pin the level: unreachable thresholds keep it where we put it
+            eng._watchdog.level = level
+            eng._watchdog.fraction = 1e9
+            eng._watchdog.recover_after = 10**9
+            eng.start()
+            for t in range(eng.step_ticks * 16):
+                eng.on_tick(t)
+            return sink.events, eng
+        normal, _ = run(0)
+        reduced, _ = run(1)
+        deferred, eng = run(2)
+        notes = lambda evs: [e for e in evs if e[0] in ("on", "off")]
+        ccs = lambda evs: [e for e in evs if e[0] == "cc"]
+        self.assertEqual(notes(normal), notes(reduced))
+        self.assertEqual(notes(normal), notes(deferred))
+        self.assertGreater(len(ccs(normal)), len(ccs(reduced)))
+        self.assertGreater(len(ccs(reduced)), len(ccs(deferred)))
+        # Deferred CC still reaches the lane's end value at its step
+        self.assertEqual(ccs(deferred)[-1][3], 127)
+        self.assertGreater(eng.get_metrics()["load"]["ccSkippedTicks"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor.conductor_server import Conductor
+from conductor.midi_engine import Engine, VirtualSink
+from conductor.tests.loops import make_doc
+from conductor.trace import Tracer
+
+
+class TestTracer(unittest.TestCase):
+    def test_ring_keeps_newest_spans(self):
+        tr = Tracer(capacity=16)
+        for i in range(40):
+            tr.add(f"s{i}", "test", float(i), float(i) + 0.5)
+        out = tr.export()
+        spans = [e for e in out["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual([e["name"] for e in spans], [f"s{i}" for i in range(24, 40)])
+        self.assertEqual(out["otherData"]["dropped"], 24)
+        self.assertTrue(all(e["dur"] == 500000.0 for e in spans))
+        self.assertTrue(any(e["ph"] == "M" and e["name"] == "thread_name" for e in out["traceEvents"]))
+
+    def test_out_of_order_adds_and_clear(self):
+        tr = Tracer(capacity=16)
+        # The add that drew slot 1 finishes before the one that drew slot 0
+        tr._seq = iter([1, 0])
+        tr.add("late", "test", 0.0, 1.0)
+        tr.add("early", "test", 0.0, 1.0, {"k": 1})
+        self.assertEqual(tr.stats()["recorded"], 2)
+        self.assertEqual([e["name"] for e in tr.export()["traceEvents"] if e["ph"] == "X"], ["early", "late"])
+        tr.clear()
+        self.assertEqual((tr.stats()["recorded"], tr.export()["traceEvents"]), (0, []))
+        self.assertEqual((tr._cat[0], tr._args[0], tr._tid[0]), (None, None, 0))
+        tr.add("again", "test", 0.0, 1.0)
+        self.assertEqual(tr.stats()["recorded"], 1)
+
+    def test_engine_phases_recorded(self):
+        eng = Engine(VirtualSink())
+        eng.tracer = Tracer(capacity=1024)
+        eng.load(make_doc())
+        eng.start()
+        eng.on_tick(0)
+        names = [e["name"] for e in eng.tracer.export()["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual(names, ["on_tick", "offs", "ons+drumKit", "cc"])
+
+
+class TestConductorTrace(unittest.TestCase):
+    def test_doc_pipeline_spans_and_dump(self):
+        with tempfile.TemporaryDirectory() as d:
+            loop_path = Path(d) / "loop.json"
+            loop_path.write_text(json.dumps(make_doc()))
+            c = Conductor(str(loop_path), port_filter=None, bpm=120.0, clock_source="external", trace_capacity=4096)
+            doc = dict(c.doc)
+            doc["meta"] = {"tempo": 121, "ppq": 96, "stepsPerBar": 16}
+            self.assertTrue(c.do_replace_json(c.doc_version, doc)["ok"])
+            path = c.dump_trace(str(Path(d) / "t.json"))
+            trace = json.loads(Path(path).read_text())
+            cats = {(e.get("cat"), e["name"]) for e in trace["traceEvents"] if e["ph"] == "X"}
+            self.assertIn(("doc", "validate"), cats)
+            self.assertIn(("doc", "canonicalize"), cats)
+            self.assertIn(("io", "writeFile"), cats)
+
+    def test_disabled_by_default(self):
+        with tempfile.TemporaryDirectory() as d:
+            loop_path = Path(d) / "loop.json"
+            loop_path.write_text(json.dumps(make_doc()))
+            c = Conductor(str(loop_path), port_filter=None, bpm=120.0, clock_source="external")
+            self.assertIsNone(c.tracer)
+            self.assertIsNone(c.dump_trace())
+
+
+if __name__ == "__main__":
+    unittest.main()
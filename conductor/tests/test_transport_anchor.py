@@ -0,0 +1,104 @@
+import asyncio
+import contextlib
+import json
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor.conductor_server import Conductor, serve_ws
+from conductor.tests.loops import make_doc
+
+
+class TestTransportAnchor(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+        self.reasons = []
+        self.c.on_transport = self.reasons.append
+
+    def tearDown(self):
+        self.c.do_stop()
+        self._tmp.cleanup()
+
+    def test_stopped_anchor_does_not_advance(self):
+        a = self.c.transport_anchor()
+        self.assertFalse(a["playing"])
+        self.assertEqual(a["ticksPerSecond"], 0.0)
+        self.assertGreater(self.c.transport_anchor()["seq"], a["seq"])
+
+    def test_start_stop_notify_and_rate(self):
+        self.c._ext_bpm = 120.0
+        self.c.do_play()
+        a = self.c.transport_anchor("start")
+        self.assertTrue(a["playing"])
+        self.assertAlmostEqual(a["ticksPerSecond"], 120.0 * 96 / 60.0)
+        self.c.do_stop()
+        self.assertEqual(self.reasons, ["start", "stop"])
+
+    def test_tempo_wobble_is_ignored(self):
+        self.c._ext_bpm = 120.0
+        self.c.do_play()
+        self.c.transport_anchor("start")
+        self.c._ext_bpm = 120.5
+        self.c._check_anchor_tempo()
+        self.assertEqual(self.reasons, ["start"])
+        self.c._ext_bpm = 125.0
+        self.c._check_anchor_tempo()
+        self.assertEqual(self.reasons, ["start", "tempo"])
+
+
+def _free_port() -> int:
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class TestWSAnchor(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps(make_doc()))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+        self.port = _free_port()
+        self.server_task = asyncio.create_task(serve_ws(self.c, "127.0.0.1", self.port))
+        import websockets  # type: ignore
+        for _ in range(50):
+            try:
+                self.ws = await websockets.connect(f"ws://127.0.0.1:{self.port}")
+                break
+            except Exception:
+                await asyncio.sleep(0.05)
+
+    async def asyncTearDown(self):
+        self.c.do_stop()
+        with contextlib.suppress(Exception):
+            await self.ws.close()
+        self.server_task.cancel()
+        try:
+            await self.server_task
+        except BaseException:
+            pass
+        self._tmp.cleanup()
+
+    async def test_anchor_pushed_on_start(self):
+        await self.ws.send(json.dumps({"type": "subscribe", "id": "s", "payload": {"topics": {"anchor": 0.1}}}))
+        while json.loads(await asyncio.wait_for(self.ws.recv(), timeout=2.0)).get("id") != "s":
+            pass
+        # Consume the immediate periodic anchor that follows a (re)subscribe
+        first = json.loads(await asyncio.wait_for(self.ws.recv(), timeout=2.0))
+        self.assertEqual(first["type"], "anchor")
+        self.c.do_play()
+        msg = json.loads(await asyncio.wait_for(self.ws.recv(), timeout=2.0))
+        self.assertEqual(msg["type"], "anchor")
+        self.assertEqual(msg["payload"]["reason"], "start")
+        self.assertTrue(msg["payload"]["playing"])
+        self.assertGreater(msg["payload"]["seq"], first["payload"]["seq"])
+
+
+if __name__ == "__main__":
+    unittest.main()
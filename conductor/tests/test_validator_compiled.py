@@ -0,0 +1,80 @@
+import copy
+import json
+import random
+import unittest
+from pathlib import Path
+
+from conductor.bench import make_large_doc
+from conductor.patch_utils import apply_patch_cow
+from conductor.validator import validate_loop, validate_loop_incremental
+from conductor.validator_compiled import validate_loop_compiled, validate_loop_incremental_compiled
+
+
+ROOT = Path(__file__).resolve().parents[2]
+VALUES = [0, 1, 2, 8, 15, 16, 127, 128, -1, 0.5, 1.5, float("inf"), float("nan"), "x", "cc:7", "name:cut", "", "x...",
+          "sine", "points", None, True, False, {}, [], [0, 127], {"ticks": 3}, {"bar": 0, "step": 20}]
+
+
+def _docs():
+    docs = [json.loads(p.read_text()) for p in sorted((ROOT / "conductor/tests/fixtures").glob("*.json"))]
+    docs.append(json.loads((ROOT / "loop.json").read_text()))
+    return docs
+
+
+def _paths(node, prefix=""):
+    yield prefix
+    if isinstance(node, dict):
+        for k, v in node.items():
+            yield from _paths(v, f"{prefix}/{k.replace('~', '~0').replace('/', '~1')}")
+    elif isinstance(node, list):
+        for i, v in enumerate(node):
+            yield from _paths(v, f"{prefix}/{i}")
+
+
+def _outcome(fn, *args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        return type(e)
+
+
+class TestCompiledValidator(unittest.TestCase):
+    def test_fixtures_match_reference(self):
+        for doc in _docs() + [make_large_doc(tracks=4, bars=4)]:
+            self.assertEqual(validate_loop_compiled(doc), validate_loop(doc))
+
+    def test_differential_mutations(self):
+        rng = random.Random(42)
+        docs = [d for d in _docs() if isinstance(d.get("tracks"), list) and validate_loop(d) == []]
+        self.assertTrue(docs)
+        paths = [list(_paths(d))[1:] for d in docs]
+        failing = 0
+        for _ in range(3000):
+            di = rng.randrange(len(docs))
+            path = rng.choice(paths[di])
+            if rng.random() < 0.85:
+                ops = [{"op": "replace", "path": path, "value": copy.deepcopy(rng.choice(VALUES))}]
+            else:
+                ops = [{"op": "remove", "path": path}]
+            new = apply_patch_cow(docs[di], ops)
+            expected = _outcome(validate_loop, new)
+            self.assertEqual(_outcome(validate_loop_compiled, new), expected, ops)
+            self.assertEqual(_outcome(validate_loop_incremental_compiled, new, docs[di], ops),
+                             _outcome(validate_loop_incremental, new, docs[di], ops), ops)
+            failing += expected != []
+        self.assertGreater(failing, 1000)
+
+    def test_context_is_rebound_per_doc(self):
+        doc = make_large_doc(tracks=1, bars=1)
+        doc["deviceProfile"] = {"drumMap": {"kick": 36}}
+        doc["tracks"][0]["drumKit"] = {"patterns": [{"bar": 1, "key": "kick", "pattern": "x" * 16}]}
+        self.assertEqual(validate_loop_compiled(doc), [])
+        eight = apply_patch_cow(doc, [{"op": "replace", "path": "/meta/stepsPerBar", "value": 8}])
+        self.assertEqual(validate_loop_compiled(eight), validate_loop(eight))
+        self.assertNotEqual(validate_loop(eight), [])
+        # And back: a cached checker for 16 steps is reused
+        self.assertEqual(validate_loop_compiled(doc), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import copy
+import random
+import unittest
+
+from conductor.bench import make_large_doc
+from conductor.patch_utils import apply_patch, apply_patch_cow
+from conductor.validator import validate_loop, validate_loop_incremental
+
+
+VALUES = [0, 1, 2, 7, 15, 16, 127, 128, -1, 1.5, "x", "cc:7", "", None, True, False, {}, [], {"bar": 0, "step": 3}]
+
+
+def make_doc():
+    doc = make_large_doc(tracks=3, bars=1, lanes=1)
+    doc["deviceProfile"] = {"drumMap": {"kick": 36, "snare": 38}}
+    doc["tracks"][1]["lfos"] = [{
+        "id": "wob", "dest": "cc:74", "depth": 40, "rate": {"sync": "1/4"}, "shape": "sine",
+        "on": [{"from": {"bar": 0, "step": 0}, "to": {"bar": 0, "step": 8}}],
+    }]
+    doc["tracks"][2]["drumKit"] = {"patterns": [{"bar": 1, "key": "kick", "pattern": "x...x...x...x...", "vel": 120}]}
+    assert validate_loop(doc) == []
+    return doc
+
+
+def _paths(node, prefix=""):
+    yield prefix, node
+    if isinstance(node, dict):
+        for k, v in node.items():
+            yield from _paths(v, f"{prefix}/{k}")
+    elif isinstance(node, list):
+        for i, v in enumerate(node):
+            yield from _paths(v, f"{prefix}/{i}")
+
+
+def random_ops(rng, doc):
+    """One to three ops: mostly leaf edits inside tracks, some structural or header edits."""
+    ops = []
+    for _ in range(rng.randint(1, 3)):
+        r = rng.random()
+        ti = rng.randrange(len(doc["tracks"]))
+        if r < 0.6:
+            candidates = list(_paths(doc["tracks"][ti], f"/tracks/{ti}"))[1:]
+            if not candidates:
+                continue
+            path, _node = rng.choice(candidates)
+            if rng.random() < 0.8:
+                ops.append({"op": "replace", "path": path, "value": rng.choice(VALUES)})
+            else:
+                ops.append({"op": "remove", "path": path})
+        elif r < 0.7:
+            ops.append({"op": "add", "path": f"/tracks/{ti}/pattern/steps/-", "value": {"idx": rng.choice(VALUES), "events": [{"pitch": 60, "velocity": rng.choice(VALUES), "lengthSteps": 1}]}})
+        elif r < 0.8:
+            choice = rng.random()
+            if choice < 0.4:
+                ops.append({"op": "add", "path": "/tracks/0", "value": copy.deepcopy(doc["tracks"][ti])})
+            elif choice < 0.7:
+                ops.append({"op": "move", "from": f"/tracks/{ti}", "path": "/tracks/-"})
+            else:
+                ops.append({"op": "replace", "path": f"/tracks/{ti}", "value": rng.choice(VALUES)})
+        elif r < 0.9:
+            ops.append(rng.choice([
+                {"op": "replace", "path": "/meta/stepsPerBar", "value": rng.choice([8, 16, "16", 16.0])},
+                {"op": "replace", "path": "/meta/tempo", "value": rng.choice([90, 133.5, "fast"])},
+                {"op": "remove", "path": "/deviceProfile/drumMap/kick"},
+                {"op": "add", "path": "/deviceProfile/drumMap/clap", "value": 39},
+                {"op": "replace", "path": "/version", "value": "opxyloop-0.9"},
+            ]))
+        else:
+            ops.append({"op": "copy", "from": f"/tracks/{ti}/pattern/steps", "path": f"/tracks/{ti}/pattern/steps2"})
+        try:
+            doc = apply_patch_cow(doc, ops[-1:])
+        except Exception:
+            ops.pop()
+    return ops
+
+
+def _outcome(fn, *args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        return type(e)
+
+
+class TestIncrementalValidation(unittest.TestCase):
+    def test_differential_against_full_validation(self):
+        rng = random.Random(1234)
+        prev = make_doc()
+        checked = invalid = 0
+        for _ in range(1000):
+            ops = random_ops(rng, prev)
+            if not ops:
+                continue
+            new = apply_patch_cow(prev, ops)
+            full = _outcome(validate_loop, new)
+            self.assertEqual(_outcome(validate_loop_incremental, new, prev, ops), full, ops)
+            self.assertEqual(_outcome(validate_loop_incremental, new, prev, None), full, ops)
+            # Deep-copied patch results carry no shared objects; ops alone must suffice
+            self.assertEqual(_outcome(validate_loop_incremental, apply_patch(prev, ops), prev, ops), full, ops)
+            checked += 1
+            if full == []:
+                prev = new
+            else:
+                invalid += 1
+                if rng.random() < 0.2:
+                    prev = make_doc()
+        # The generator must exercise both outcomes
+        self.assertGreater(invalid, 100)
+        self.assertGreater(checked - invalid, 100)
+
+    def test_only_touched_track_is_rechecked(self):
+        prev = make_doc()
+        calls = []
+        from conductor import validator
+        orig = validator._validate_track
+        validator._validate_track = lambda tr, ti, *a: (calls.append(ti), orig(tr, ti, *a))
+        try:
+            ops = [{"op": "replace", "path": "/tracks/1/pattern/steps/0/events/0/velocity", "value": 0}]
+            errors = validate_loop_incremental(apply_patch_cow(prev, ops), prev, ops)
+        finally:
+            validator._validate_track = orig
+        self.assertEqual(calls, [1])
+        self.assertEqual(errors, ["/tracks/1/pattern/steps[0]/events[0]/velocity: integer 1..127 required"])
+
+    def test_context_change_rechecks_drum_tracks(self):
+        prev = make_doc()
+        ops = [{"op": "remove", "path": "/deviceProfile/drumMap/kick"}]
+        errors = validate_loop_incremental(apply_patch_cow(prev, ops), prev, ops)
+        self.assertEqual(errors, ["/tracks/2/drumKit/patterns[0]/key: must exist in deviceProfile.drumMap"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+
+from conductor.ws_clients import ClientSession
+
+
+class TestClientSendQueue(unittest.TestCase):
+    def test_ordered_messages_before_streams(self):
+        s = ClientSession(None)
+        s.offer("state", "s1")
+        s.send("ack1")
+        s.send("doc2")
+        s.offer("state", "s2")
+        self.assertEqual([s.pop(), s.pop(), s.pop(), s.pop()], ["ack1", "doc2", "s2", None])
+        self.assertEqual(s.stats()["dropped"], 1)
+
+    def test_queue_full_evicts(self):
+        s = ClientSession(None, high_water=2, max_queue=4)
+        for i in range(3):
+            self.assertTrue(s.send(str(i)))
+        self.assertFalse(s.send("3"))
+        self.assertEqual(s.evicted, "queue_full")
+        self.assertFalse(s.send("4"))
+        self.assertFalse(s.offer("state", "x"))
+        self.assertEqual(s.stats()["peakQueued"], 4)
+
+    def test_sustained_high_water_evicts(self):
+        s = ClientSession(None, high_water=2, max_queue=100, evict_after_s=1.0)
+        for i in range(3):
+            s.send(str(i))
+        self.assertIsNone(s.check_slow(10.0))
+        self.assertIsNone(s.check_slow(10.5))
+        # Draining below the mark resets the timer
+        s.pop()
+        self.assertIsNone(s.check_slow(10.9))
+        s.send("again")
+        self.assertIsNone(s.check_slow(11.0))
+        self.assertEqual(s.check_slow(12.0), "slow_consumer")
+
+    def test_blocked_write_evicts(self):
+        s = ClientSession(None, evict_after_s=1.0)
+        s.writing_since = 5.0
+        self.assertIsNone(s.check_slow(5.5))
+        self.assertEqual(s.check_slow(6.0), "slow_consumer")
+
+    def test_stats_shape(self):
+        s = ClientSession(None)
+        s.send("a")
+        s.offer("metrics", "m")
+        st = s.stats()
+        self.assertEqual(st["queued"], 1)
+        self.assertEqual(st["pendingStreams"], 1)
+        self.assertEqual(st["topics"], ["anchor", "doc", "metrics", "state"])
+
+    def test_close_once(self):
+        s = ClientSession(None, high_water=1, max_queue=1)
+        s.send("a")
+        self.assertEqual(s.check_slow(0.0), "queue_full")
+        self.assertTrue(s.close_once())
+        self.assertFalse(s.close_once())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -132,7 +132,8 @@ async def test_ws_stale_error_on_back_to_back_without_ack(tmp_path: Path):
             stepA = {"idx": 1, "events": [{"pitch": 60, "velocity": 100, "lengthSteps": 1}]}
             stepB = {"idx": 3, "events": [{"pitch": 60, "velocity": 100, "lengthSteps": 1}]}
             m1 = {"type": "applyPatch", "id": 10, "payload": {"baseVersion": base, "ops": [{"op": "add", "path": "/tracks/0/pattern/steps/-", "value": stepA}], "applyNow": False}}
-            m2 = {"type": "applyPatch", "id": 11, "payload": {"baseVersion": base, "ops": [{"op": "add", "path": "/tracks/0/pattern/steps/-", "value": stepB}], "applyNow": False}}
+            # Opt out of server-side rebase to get the strict stale check
+            m2 = {"type": "applyPatch", "id": 11, "payload": {"baseVersion": base, "ops": [{"op": "add", "path": "/tracks/0/pattern/steps/-", "value": stepB}], "applyNow": False, "rebase": False}}
             # Send back-to-back without waiting for doc
             await ws.send(json.dumps(m1))
             await ws.send(json.dumps(m2))
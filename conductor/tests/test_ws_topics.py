@@ -0,0 +1,188 @@
+import asyncio
+import contextlib
+import json
+import socket
+import tempfile
+import unittest
+from pathlib import Path
+
+from conductor import cbor
+from conductor.conductor_server import Conductor, serve_ws
+from conductor.ws_clients import DEFAULT_HZ, MAX_HZ, ClientSession, parse_topics
+
+
+class TestTopicParsing(unittest.TestCase):
+    def test_list_uses_default_rates(self):
+        self.assertEqual(parse_topics(["doc", "state"]), {"doc": None, "state": DEFAULT_HZ["state"]})
+
+    def test_mapping_clamps_rate(self):
+        topics = parse_topics({"state": 1000, "metrics": True, "cc": False})
+        self.assertEqual(topics, {"state": MAX_HZ, "metrics": DEFAULT_HZ["metrics"]})
+
+    def test_unknown_topic_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_topics(["doc", "nope"])
+
+
+class TestClientSession(unittest.TestCase):
+    def test_due_respects_rate(self):
+        s = ClientSession(None)
+        s.subscribe({"state": 10.0})
+        self.assertTrue(s.due("state", 0.0))
+        self.assertFalse(s.due("state", 0.05))
+        self.assertTrue(s.due("state", 0.1))
+        self.assertFalse(s.due("metrics", 0.1))
+        self.assertAlmostEqual(s.period(), 0.1)
+
+    def test_offer_keeps_newest_only(self):
+        s = ClientSession(None)
+        s.offer("state", "a")
+        s.offer("state", "b")
+        s.offer("metrics", "m")
+        self.assertEqual(sorted([s.pop(), s.pop()]), ["b", "m"])
+        self.assertEqual(s.coalesced, 1)
+        self.assertIsNone(s.pop())
+
+    def test_offer_with_key_skips_unchanged(self):
+        s = ClientSession(None)
+        self.assertTrue(s.offer("cc", "m1", key="{}"))
+        s.pop()
+        self.assertFalse(s.offer("cc", "m2", key="{}"))
+        self.assertTrue(s.offer("cc", "m3", key='{"0": {}}'))
+
+
+def _free_port() -> int:
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class TestWSTopics(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.loop_path = Path(self._tmp.name) / "loop.json"
+        self.loop_path.write_text(json.dumps({
+            "version": "opxyloop-1.0",
+            "meta": {"tempo": 120, "ppq": 96, "stepsPerBar": 16},
+            "tracks": [{"id": "t1", "name": "Lead", "type": "sampler", "midiChannel": 0, "pattern": {"lengthBars": 1, "steps": []}}],
+            "docVersion": 0,
+        }))
+        self.c = Conductor(str(self.loop_path), port_filter=None, bpm=120.0, clock_source="external")
+        self.port = _free_port()
+        self.server_task = asyncio.create_task(serve_ws(self.c, "127.0.0.1", self.port))
+        import websockets  # type: ignore
+        for _ in range(50):
+            try:
+                self.ws = await websockets.connect(f"ws://127.0.0.1:{self.port}")
+                break
+            except Exception:
+                await asyncio.sleep(0.05)
+
+    async def asyncTearDown(self):
+        with contextlib.suppress(Exception):
+            await self.ws.close()
+        self.server_task.cancel()
+        try:
+            await self.server_task
+        except BaseException:
+            pass
+        self._tmp.cleanup()
+
+    async def _collect(self, seconds):
+        out = []
+        loop = asyncio.get_event_loop()
+        end = loop.time() + seconds
+        while True:
+            left = end - loop.time()
+            if left <= 0:
+                return out
+            try:
+                out.append(json.loads(await asyncio.wait_for(self.ws.recv(), timeout=left)))
+            except asyncio.TimeoutError:
+                return out
+
+    async def test_fast_state_stream(self):
+        await self.ws.send(json.dumps({"type": "subscribe", "id": "s", "payload": {"topics": {"state": 30}}}))
+        msgs = await self._collect(0.6)
+        ack = [m for m in msgs if m.get("id") == "s"][0]
+        self.assertEqual(ack["payload"]["topics"], {"state": 30.0})
+        states = [m for m in msgs if m.get("type") == "state"]
+        self.assertGreaterEqual(len(states), 8)
+        self.assertFalse([m for m in msgs if m.get("type") == "metrics" and msgs.index(m) > msgs.index(ack)])
+
+    async def test_doc_only_client_gets_no_state(self):
+        await self.ws.send(json.dumps({"type": "subscribe", "id": "s", "payload": {"topics": ["doc"]}}))
+        await self._collect(0.1)
+        await self.ws.send(json.dumps({"type": "ping", "id": "p"}))
+        msgs = await self._collect(0.7)
+        self.assertIn("pong", [m.get("type") for m in msgs])
+        self.assertFalse([m for m in msgs if m.get("type") in ("state", "metrics")])
+
+    async def test_metrics_report_per_client_queues(self):
+        await self.ws.send(json.dumps({"type": "subscribe", "id": "s", "payload": {"topics": {"metrics": 20}}}))
+        msgs = await self._collect(0.4)
+        metrics = [m for m in msgs if m.get("type") == "metrics"]
+        self.assertTrue(metrics)
+        ws_stats = metrics[-1]["payload"]["ws"]
+        self.assertEqual(ws_stats["clients"], 1)
+        self.assertEqual(ws_stats["evicted"], 0)
+        self.assertGreater(ws_stats["perClient"][0]["sent"], 0)
+
+    async def test_upcoming_window(self):
+        await self.ws.send(json.dumps({"type": "subscribe", "id": "s", "payload": {"topics": ["upcoming"]}}))
+        msgs = await self._collect(0.8)
+        ups = [m for m in msgs if m.get("type") == "upcoming"]
+        self.assertEqual(len(ups), 1)
+        self.assertEqual(ups[0]["payload"]["docVersion"], 0)
+        self.assertEqual(ups[0]["payload"]["toTick"] - ups[0]["payload"]["fromTick"], 2 * 384)
+        await self.ws.send(json.dumps({"type": "getUpcoming", "id": "u", "payload": {"bars": 1}}))
+        reply = [m for m in await self._collect(0.3) if m.get("id") == "u"][0]
+        self.assertEqual(reply["payload"]["bars"], 1)
+
+    async def test_cbor_encoding_for_streams(self):
+        await self.ws.send(json.dumps({"type": "hello", "id": "h", "payload": {"encoding": ["msgpack", "cbor"], "deltas": True, "topics": {"doc": True, "state": 20}}}))
+        ack = None
+        frames = []
+        loop = asyncio.get_event_loop()
+        end = loop.time() + 0.5
+        while loop.time() < end:
+            try:
+                raw = await asyncio.wait_for(self.ws.recv(), timeout=end - loop.time())
+            except asyncio.TimeoutError:
+                break
+            if isinstance(raw, bytes):
+                frames.append(cbor.loads(raw))
+            elif json.loads(raw).get("id") == "h":
+                ack = json.loads(raw)
+        self.assertEqual(ack["payload"]["encoding"], "cbor")
+        states = [f for f in frames if f["type"] == "state"]
+        self.assertTrue(states)
+        self.assertIn("tick", states[-1]["payload"])
+        ops = [{"op": "replace", "path": "/meta/tempo", "value": 121}]
+        await self.ws.send(json.dumps({"type": "applyPatch", "id": "p", "payload": {"baseVersion": 0, "ops": ops}}))
+        delta = None
+        for _ in range(50):
+            raw = await asyncio.wait_for(self.ws.recv(), timeout=2.0)
+            if isinstance(raw, bytes) and cbor.loads(raw)["type"] == "docDelta":
+                delta = cbor.loads(raw)
+                break
+        self.assertEqual(delta["payload"]["toVersion"], 1)
+
+    async def test_unsupported_encoding_is_an_error(self):
+        await self.ws.send(json.dumps({"type": "hello", "id": "h", "payload": {"encoding": "xml"}}))
+        msgs = await self._collect(0.2)
+        err = [m for m in msgs if m.get("id") == "h"][0]
+        self.assertEqual(err["payload"]["error"], "invalid_encoding")
+
+    async def test_unknown_topic_is_an_error(self):
+        await self.ws.send(json.dumps({"type": "subscribe", "id": "s", "payload": {"topics": ["bogus"]}}))
+        msgs = await self._collect(0.2)
+        err = [m for m in msgs if m.get("id") == "s"][0]
+        self.assertEqual(err["type"], "error")
+        self.assertEqual(err["payload"]["error"], "invalid_topics")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class Tracer:
+    """Span recorder backed by a preallocated ring buffer.
+
+    Spans are stored as parallel fixed-size lists (no per-span allocation
+    beyond the args dict) and exported as Chrome trace-event JSON, loadable
+    in chrome://tracing or ui.perfetto.dev. Safe to call from the clock,
+    asyncio and rtmidi callback threads: the slot index comes from an
+    itertools counter, whose next() is atomic under the GIL.
+    """
+
+    def __init__(self, capacity: int = 65536) -> None:
+        self.capacity = max(16, int(capacity))
+        self._t0 = time.perf_counter()
+        self.clear()
+
+    def add(self, name: str, cat: str, t0: float, t1: float, args: Optional[Dict[str, Any]] = None) -> None:
+        """Record a complete span from perf_counter() timestamps t0..t1."""
+        n = next(self._seq)
+        i = n % self.capacity
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads[tid] = threading.current_thread().name
+        self._name[i] = name
+        self._cat[i] = cat
+        self._ts[i] = t0
+        self._dur[i] = t1 - t0
+        self._tid[i] = tid
+        self._args[i] = args
+        # Concurrent adds can finish out of order; never step back over a later one
+        self._written = max(self._written, n + 1)
+
+    def clear(self) -> None:
+        """Drop every span and thread name (timestamps keep the same origin)."""
+        self._name: List[Optional[str]] = [None] * self.capacity
+        self._cat: List[Optional[str]] = [None] * self.capacity
+        self._ts: List[float] = [0.0] * self.capacity
+        self._dur: List[float] = [0.0] * self.capacity
+        self._tid: List[int] = [0] * self.capacity
+        self._args: List[Optional[Dict[str, Any]]] = [None] * self.capacity
+        self._threads: Dict[int, str] = {}
+        self._seq = itertools.count()
+        self._written = 0
+
+    def stats(self) -> Dict[str, Any]:
+        written = self._written
+        return {
+            "capacity": self.capacity,
+            "recorded": written,
+            "retained": min(written, self.capacity),
+            "dropped": max(0, written - self.capacity),
+        }
+
+    def export(self) -> Dict[str, Any]:
+        """Return the retained spans, oldest first, as a Chrome trace object."""
+        written = self._written
+        start = max(0, written - self.capacity)
+        pid = os.getpid()
+        events: List[Dict[str, Any]] = []
+        for tid, tname in list(self._threads.items()):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": tname}})
+        for n in range(start, written):
+            i = n % self.capacity
+            name = self._name[i]
+            if name is None:
+                continue
+            ev: Dict[str, Any] = {
+                "name": name,
+                "cat": self._cat[i],
+                "ph": "X",
+                "ts": round((self._ts[i] - self._t0) * 1e6, 3),
+                "dur": round(self._dur[i] * 1e6, 3),
+                "pid": pid,
+                "tid": self._tid[i],
+            }
+            if self._args[i]:
+                ev["args"] = self._args[i]
+            events.append(ev)
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": self.stats()}
+
+    def dump(self, path: str) -> str:
+        data = json.dumps(self.export(), separators=(",", ":"))
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(data)
+        return os.path.abspath(path)
@@ -5,7 +5,9 @@ import copy
 import hashlib
 import json
 import sys
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from conductor.patch_utils import touched_tracks
 
 
 SPEC_PATH = "docs/opxyloop-1.0.md"
@@ -27,7 +29,61 @@ def validate_loop(loop: Dict[str, Any]) -> List[str]:
     while keeping strict enough to catch common mistakes.
     """
     errors: List[str] = []
+    meta, dev = _validate_header(loop, errors)
+    tracks = loop.get("tracks")
+    if not isinstance(tracks, list) or len(tracks) == 0:
+        _err(errors, "/tracks", "required non-empty array")
+    else:
+        for ti, tr in enumerate(tracks):
+            _validate_track(tr, ti, meta, dev, errors)
+    return errors
+
+
+def validate_loop_incremental(loop: Dict[str, Any], prev: Dict[str, Any], ops: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    """validate_loop() for a doc derived from prev, which must be valid and unmodified.
+
+    Header checks always run. Tracks are re-checked only if ops could have
+    changed them: those named by a /tracks/N/... path, or, when ops restructure
+    the track list or are unknown, those that are not prev's own objects. A
+    change to what tracks are checked against (meta.stepsPerBar,
+    deviceProfile.drumMap) re-checks every track. Returns exactly the errors
+    validate_loop(loop) would.
+    """
+    errors: List[str] = []
+    meta, dev = _validate_header(loop, errors)
+    tracks = loop.get("tracks")
+    if not isinstance(tracks, list) or len(tracks) == 0:
+        _err(errors, "/tracks", "required non-empty array")
+        return errors
+    for ti in tracks_to_check(loop, prev, ops):
+        _validate_track(tracks[ti], ti, meta, dev, errors)
+    return errors
+
 
+def tracks_to_check(loop: Dict[str, Any], prev: Dict[str, Any], ops: Optional[List[Dict[str, Any]]]) -> Iterable[int]:
+    """Indices of loop's tracks (a non-empty list) that may no longer be valid."""
+    tracks = loop["tracks"]
+    if _track_context(loop) != _track_context(prev):
+        return range(len(tracks))
+    touched = touched_tracks(ops) if ops is not None else None
+    if touched is None:
+        prev_tracks = prev.get("tracks")
+        shared = {id(t) for t in prev_tracks} if isinstance(prev_tracks, list) else set()
+        return [ti for ti, tr in enumerate(tracks) if id(tr) not in shared]
+    return sorted(ti for ti in touched if ti < len(tracks))
+
+
+def _track_context(loop: Dict[str, Any]) -> Tuple[Any, ...]:
+    # Everything _validate_track reads outside its own track
+    meta = loop.get("meta")
+    dev = loop.get("deviceProfile")
+    spb = meta.get("stepsPerBar") if isinstance(meta, dict) else None
+    dmap = dev.get("drumMap", {}) if isinstance(dev, dict) else {}
+    return (isinstance(meta, dict), type(spb), spb, type(dmap), dmap)
+
+
+def _validate_header(loop: Dict[str, Any], errors: List[str]) -> Tuple[Any, Any]:
+    """Top-level, meta and deviceProfile checks; returns (meta, deviceProfile)."""
     # §1: Top-level
     if loop.get("version") != "opxyloop-1.0":
         _err(errors, "/version", "must equal 'opxyloop-1.0'")
@@ -58,262 +114,285 @@ def validate_loop(loop: Dict[str, Any]) -> List[str]:
                 ):
                     _err(errors, "/deviceProfile/drumMap", "string→integer[0..127] map required")
 
-    tracks = loop.get("tracks")
-    if not isinstance(tracks, list) or len(tracks) == 0:
-        _err(errors, "/tracks", "required non-empty array")
+    return meta, dev
+
+
+def _validate_track(tr: Any, ti: int, meta: Any, dev: Any, errors: List[str]) -> None:
+    """Checks for /tracks/{ti}; depends on the rest of the doc only via meta.stepsPerBar and deviceProfile.drumMap."""
+    tpath = f"/tracks/{ti}"
+    if not isinstance(tr, dict):
+        _err(errors, tpath, "must be object")
+        return
+    for key in ("id", "name", "type"):
+        if not isinstance(tr.get(key), str):
+            _err(errors, f"{tpath}/{key}", "required string")
+    ch = tr.get("midiChannel")
+    if not isinstance(ch, int) or not (0 <= ch <= 15):
+        _err(errors, f"{tpath}/midiChannel", "required integer 0..15")
+
+    # §5: pattern
+    pat = tr.get("pattern")
+    if not isinstance(pat, dict):
+        _err(errors, f"{tpath}/pattern", "required object")
     else:
-        for ti, tr in enumerate(tracks):
-            tpath = f"/tracks/{ti}"
-            if not isinstance(tr, dict):
-                _err(errors, tpath, "must be object")
-                continue
-            for key in ("id", "name", "type"):
-                if not isinstance(tr.get(key), str):
-                    _err(errors, f"{tpath}/{key}", "required string")
-            ch = tr.get("midiChannel")
-            if not isinstance(ch, int) or not (0 <= ch <= 15):
-                _err(errors, f"{tpath}/midiChannel", "required integer 0..15")
-
-            # §5: pattern
-            pat = tr.get("pattern")
-            if not isinstance(pat, dict):
-                _err(errors, f"{tpath}/pattern", "required object")
+        lb = pat.get("lengthBars")
+        steps = pat.get("steps")
+        if not isinstance(lb, int) or lb < 1:
+            _err(errors, f"{tpath}/pattern/lengthBars", "integer ≥1 required")
+        if not isinstance(steps, list):
+            _err(errors, f"{tpath}/pattern/steps", "required array (sparse allowed)")
+        else:
+            for si, st in enumerate(steps):
+                spath = f"{tpath}/pattern/steps[{si}]"
+                if not isinstance(st, dict):
+                    _err(errors, spath, "must be object")
+                    continue
+                idx = st.get("idx")
+                if not isinstance(idx, int) or idx < 0:
+                    _err(errors, f"{spath}/idx", "required integer ≥0")
+                ev = st.get("events")
+                if ev is not None:
+                    if not isinstance(ev, list):
+                        _err(errors, f"{spath}/events", "must be array if present")
+                    else:
+                        for ei, e in enumerate(ev):
+                            epath = f"{spath}/events[{ei}]"
+                            if not isinstance(e, dict):
+                                _err(errors, epath, "must be object")
+                                continue
+                            has_pitch = any(k in e for k in ("pitch", "degree", "chord"))
+                            if not has_pitch:
+                                _err(errors, epath, "requires one of pitch|degree|chord")
+                            if "degree" in e and "octaveOffset" not in e:
+                                _err(errors, epath + "/octaveOffset", "required when using degree")
+                            vel = e.get("velocity")
+                            if not isinstance(vel, int) or not (1 <= vel <= 127):
+                                _err(errors, epath + "/velocity", "integer 1..127 required")
+                            ls = e.get("lengthSteps")
+                            if not isinstance(ls, int) or ls < 1:
+                                _err(errors, epath + "/lengthSteps", "integer ≥1 required")
+                            rat = e.get("ratchet")
+                            if rat is not None and (not isinstance(rat, int) or rat < 2 or rat > 8):
+                                _err(errors, epath + "/ratchet", "integer ≥2 and ≤8 (guardrail)")
+
+    # §5.1.2: optional drumKit helper
+    dk = tr.get("drumKit")
+    if dk is not None:
+        if not isinstance(dk, dict):
+            _err(errors, f"{tpath}/drumKit", "must be object if present")
+        else:
+            pats = dk.get("patterns")
+            if not isinstance(pats, list) or len(pats) == 0:
+                _err(errors, f"{tpath}/drumKit/patterns", "required non-empty array")
             else:
-                lb = pat.get("lengthBars")
-                steps = pat.get("steps")
-                if not isinstance(lb, int) or lb < 1:
-                    _err(errors, f"{tpath}/pattern/lengthBars", "integer ≥1 required")
-                if not isinstance(steps, list):
-                    _err(errors, f"{tpath}/pattern/steps", "required array (sparse allowed)")
+                dmap = (dev or {}).get("drumMap", {}) if isinstance(dev, dict) else {}
+                spb = (meta or {}).get("stepsPerBar") if isinstance(meta, dict) else None
+                for pi, spec in enumerate(pats):
+                    ppath = f"{tpath}/drumKit/patterns[{pi}]"
+                    if not isinstance(spec, dict):
+                        _err(errors, ppath, "must be object")
+                        continue
+                    bar = spec.get("bar")
+                    key = spec.get("key")
+                    pattern = spec.get("pattern")
+                    if not isinstance(bar, int) or bar < 1:
+                        _err(errors, ppath + "/bar", "integer ≥1 required")
+                    if not isinstance(key, str):
+                        _err(errors, ppath + "/key", "required string")
+                    elif key not in dmap:
+                        _err(errors, ppath + "/key", "must exist in deviceProfile.drumMap")
+                    if not isinstance(pattern, str):
+                        _err(errors, ppath + "/pattern", "required string")
+                    else:
+                        if not isinstance(spb, int):
+                            _err(errors, "/meta/stepsPerBar", "required for drumKit validation")
+                        else:
+                            if len(pattern) != spb:
+                                _err(errors, ppath + "/pattern", f"length must equal meta.stepsPerBar ({spb})")
+                            for c in pattern:
+                                if c not in ("x", ".", "-"):
+                                    _err(errors, ppath + "/pattern", "allowed chars: 'x' '.' '-' only")
+                    if "vel" in spec:
+                        v = spec["vel"]
+                        if not isinstance(v, int) or not (1 <= v <= 127):
+                            _err(errors, ppath + "/vel", "integer 1..127 required")
+                    if "lengthSteps" in spec:
+                        ls = spec["lengthSteps"]
+                        if not isinstance(ls, int) or ls < 1:
+                            _err(errors, ppath + "/lengthSteps", "integer ≥1 required")
+
+    # §6: ccLanes (optional)
+    lanes = tr.get("ccLanes")
+    if lanes is not None:
+        if not isinstance(lanes, list):
+            _err(errors, f"{tpath}/ccLanes", "must be array if present")
+        else:
+            for li, lane in enumerate(lanes):
+                lpath = f"{tpath}/ccLanes[{li}]"
+                if not isinstance(lane, dict):
+                    _err(errors, lpath, "must be object")
+                    continue
+                if not isinstance(lane.get("id"), str):
+                    _err(errors, lpath + "/id", "required string")
+                dest = lane.get("dest")
+                if not (isinstance(dest, int) or (isinstance(dest, str) and (dest.startswith("cc:") or dest.startswith("name:")))):
+                    _err(errors, lpath + "/dest", "integer CC# or 'cc:<num>' or 'name:<id>' required")
+                mode = lane.get("mode")
+                if mode not in ("points", "hold", "ramp"):
+                    _err(errors, lpath + "/mode", "must be 'points'|'hold'|'ramp'")
+                if "channel" in lane:
+                    chv = lane.get("channel")
+                    if not isinstance(chv, int) or not (0 <= chv <= 15):
+                        _err(errors, lpath + "/channel", "integer 0..15 required when present")
+                if "range" in lane:
+                    rng = lane.get("range")
+                    ok = isinstance(rng, list) and len(rng) == 2 and all(isinstance(v, (int, float)) for v in rng)
+                    if ok:
+                        lo, hi = int(rng[0]), int(rng[1])
+                        if not (0 <= lo <= 127 and 0 <= hi <= 127 and lo <= hi):
+                            ok = False
+                    if not ok:
+                        _err(errors, lpath + "/range", "must be [lo,hi] with 0..127 and lo<=hi")
+                points = lane.get("points")
+                if not isinstance(points, list) or len(points) == 0:
+                    _err(errors, lpath + "/points", "required non-empty array")
                 else:
-                    for si, st in enumerate(steps):
-                        spath = f"{tpath}/pattern/steps[{si}]"
-                        if not isinstance(st, dict):
-                            _err(errors, spath, "must be object")
+                    for pi, pt in enumerate(points):
+                        ppath = f"{lpath}/points[{pi}]"
+                        if not isinstance(pt, dict):
+                            _err(errors, ppath, "must be object")
                             continue
-                        idx = st.get("idx")
-                        if not isinstance(idx, int) or idx < 0:
-                            _err(errors, f"{spath}/idx", "required integer ≥0")
-                        ev = st.get("events")
-                        if ev is not None:
-                            if not isinstance(ev, list):
-                                _err(errors, f"{spath}/events", "must be array if present")
+                        t = pt.get("t")
+                        v = pt.get("v")
+                        if not isinstance(v, (int, float)) or not (0 <= v <= 127):
+                            _err(errors, ppath + "/v", "0..127 required")
+                        if not isinstance(t, dict) or not ("ticks" in t or ("bar" in t and "step" in t)):
+                            _err(errors, ppath + "/t", "must be {ticks:n} or {bar:n, step:n}")
+                        curve = pt.get("curve")
+                        if curve is not None and not (isinstance(curve, str) and curve in ("linear", "line", "exp", "exponential", "log", "logarithmic", "s-curve", "scurve", "smoothstep")):
+                            _err(errors, ppath + "/curve", "must be one of 'linear'|'exp'|'log'|'s-curve' if present")
+                        if isinstance(t, dict):
+                            if "ticks" in t:
+                                if not isinstance(t["ticks"], (int, float)) or int(t["ticks"]) < 0:
+                                    _err(errors, ppath + "/t/ticks", "non-negative number required")
                             else:
-                                for ei, e in enumerate(ev):
-                                    epath = f"{spath}/events[{ei}]"
-                                    if not isinstance(e, dict):
-                                        _err(errors, epath, "must be object")
-                                        continue
-                                    has_pitch = any(k in e for k in ("pitch", "degree", "chord"))
-                                    if not has_pitch:
-                                        _err(errors, epath, "requires one of pitch|degree|chord")
-                                    if "degree" in e and "octaveOffset" not in e:
-                                        _err(errors, epath + "/octaveOffset", "required when using degree")
-                                    vel = e.get("velocity")
-                                    if not isinstance(vel, int) or not (1 <= vel <= 127):
-                                        _err(errors, epath + "/velocity", "integer 1..127 required")
-                                    ls = e.get("lengthSteps")
-                                    if not isinstance(ls, int) or ls < 1:
-                                        _err(errors, epath + "/lengthSteps", "integer ≥1 required")
-                                    rat = e.get("ratchet")
-                                    if rat is not None and (not isinstance(rat, int) or rat < 2 or rat > 8):
-                                        _err(errors, epath + "/ratchet", "integer ≥2 and ≤8 (guardrail)")
-
-            # §5.1.2: optional drumKit helper
-            dk = tr.get("drumKit")
-            if dk is not None:
-                if not isinstance(dk, dict):
-                    _err(errors, f"{tpath}/drumKit", "must be object if present")
+                                bar = t.get("bar"); step = t.get("step")
+                                if not isinstance(bar, (int, float)) or int(bar) < 0:
+                                    _err(errors, ppath + "/t/bar", "non-negative number required")
+                                if not isinstance(step, (int, float)):
+                                    _err(errors, ppath + "/t/step", "number required")
+                                else:
+                                    if isinstance(meta.get("stepsPerBar"), int):
+                                        spb_val = int(meta.get("stepsPerBar"))
+                                        if not (0 <= int(step) < spb_val):
+                                            _err(errors, ppath + "/t/step", f"must be in 0..{spb_val-1}")
+
+    # §7: lfos (optional)
+    lfos = tr.get("lfos")
+    if lfos is not None:
+        if not isinstance(lfos, list):
+            _err(errors, f"{tpath}/lfos", "must be array if present")
+        else:
+            for li, lfo in enumerate(lfos):
+                lpath = f"{tpath}/lfos[{li}]"
+                if not isinstance(lfo, dict):
+                    _err(errors, lpath, "must be object")
+                    continue
+                if not isinstance(lfo.get("id"), str):
+                    _err(errors, lpath + "/id", "required string")
+                dest = lfo.get("dest")
+                if not (isinstance(dest, int) or (isinstance(dest, str) and (dest.startswith("cc:") or dest.startswith("name:")))):
+                    _err(errors, lpath + "/dest", "integer CC# or 'cc:<num>' or 'name:<id>' required")
+                depth = lfo.get("depth")
+                if not isinstance(depth, int) or not (0 <= depth <= 127):
+                    _err(errors, lpath + "/depth", "integer 0..127 required")
+                rate = lfo.get("rate")
+                if not isinstance(rate, dict) or not ("sync" in rate or "hz" in rate):
+                    _err(errors, lpath + "/rate", "must be {sync:""}|{hz:n}")
                 else:
-                    pats = dk.get("patterns")
-                    if not isinstance(pats, list) or len(pats) == 0:
-                        _err(errors, f"{tpath}/drumKit/patterns", "required non-empty array")
+                    if "hz" in rate:
+                        if not isinstance(rate.get("hz"), (int, float)) or float(rate.get("hz", 0)) <= 0:
+                            _err(errors, lpath + "/rate/hz", "number > 0 required")
+                    if "sync" in rate:
+                        if not isinstance(rate.get("sync"), str) or not rate.get("sync"):
+                            _err(errors, lpath + "/rate/sync", "non-empty string required")
+                shape = lfo.get("shape")
+                if shape not in ("sine", "triangle", "saw", "ramp", "square", "samplehold"):
+                    _err(errors, lpath + "/shape", "invalid shape")
+                if "channel" in lfo:
+                    chv = lfo.get("channel")
+                    if not isinstance(chv, int) or not (0 <= chv <= 15):
+                        _err(errors, lpath + "/channel", "integer 0..15 required when present")
+                if "offset" in lfo:
+                    off = lfo.get("offset")
+                    if not isinstance(off, int) or not (0 <= off <= 127):
+                        _err(errors, lpath + "/offset", "integer 0..127 required when present")
+                if "phase" in lfo:
+                    ph = lfo.get("phase")
+                    if not isinstance(ph, (int, float)) or not (0.0 <= float(ph) <= 1.0):
+                        _err(errors, lpath + "/phase", "number 0..1 required when present")
+                if "fadeMs" in lfo:
+                    fm = lfo.get("fadeMs")
+                    if not isinstance(fm, int) or fm < 0:
+                        _err(errors, lpath + "/fadeMs", "integer ≥0 required when present")
+                if "stereoSpread" in lfo:
+                    ss = lfo.get("stereoSpread")
+                    if not isinstance(ss, (int, float)) or not (0.0 <= float(ss) <= 1.0):
+                        _err(errors, lpath + "/stereoSpread", "number 0..1 required when present")
+                if "on" in lfo:
+                    wins = lfo.get("on")
+                    if not isinstance(wins, list):
+                        _err(errors, lpath + "/on", "must be array if present")
                     else:
-                        dmap = (dev or {}).get("drumMap", {}) if isinstance(dev, dict) else {}
-                        spb = (meta or {}).get("stepsPerBar") if isinstance(meta, dict) else None
-                        for pi, spec in enumerate(pats):
-                            ppath = f"{tpath}/drumKit/patterns[{pi}]"
-                            if not isinstance(spec, dict):
-                                _err(errors, ppath, "must be object")
+                        for wi, w in enumerate(wins):
+                            wpath = f"{lpath}/on[{wi}]"
+                            if not isinstance(w, dict):
+                                _err(errors, wpath, "must be object")
                                 continue
-                            bar = spec.get("bar")
-                            key = spec.get("key")
-                            pattern = spec.get("pattern")
-                            if not isinstance(bar, int) or bar < 1:
-                                _err(errors, ppath + "/bar", "integer ≥1 required")
-                            if not isinstance(key, str):
-                                _err(errors, ppath + "/key", "required string")
-                            elif key not in dmap:
-                                _err(errors, ppath + "/key", "must exist in deviceProfile.drumMap")
-                            if not isinstance(pattern, str):
-                                _err(errors, ppath + "/pattern", "required string")
-                            else:
-                                if not isinstance(spb, int):
-                                    _err(errors, "/meta/stepsPerBar", "required for drumKit validation")
+                            fr = w.get("from"); to = w.get("to")
+                            for lab, tref in (("from", fr), ("to", to)):
+                                if not isinstance(tref, dict) or not ("ticks" in tref or ("bar" in tref and "step" in tref)):
+                                    _err(errors, wpath + f"/{lab}", "must be {ticks:n} or {bar:n, step:n}")
                                 else:
-                                    if len(pattern) != spb:
-                                        _err(errors, ppath + "/pattern", f"length must equal meta.stepsPerBar ({spb})")
-                                    for c in pattern:
-                                        if c not in ("x", ".", "-"):
-                                            _err(errors, ppath + "/pattern", "allowed chars: 'x' '.' '-' only")
-                            if "vel" in spec:
-                                v = spec["vel"]
-                                if not isinstance(v, int) or not (1 <= v <= 127):
-                                    _err(errors, ppath + "/vel", "integer 1..127 required")
-                            if "lengthSteps" in spec:
-                                ls = spec["lengthSteps"]
-                                if not isinstance(ls, int) or ls < 1:
-                                    _err(errors, ppath + "/lengthSteps", "integer ≥1 required")
-
-            # §6: ccLanes (optional)
-            lanes = tr.get("ccLanes")
-            if lanes is not None:
-                if not isinstance(lanes, list):
-                    _err(errors, f"{tpath}/ccLanes", "must be array if present")
-                else:
-                    for li, lane in enumerate(lanes):
-                        lpath = f"{tpath}/ccLanes[{li}]"
-                        if not isinstance(lane, dict):
-                            _err(errors, lpath, "must be object")
-                            continue
-                        if not isinstance(lane.get("id"), str):
-                            _err(errors, lpath + "/id", "required string")
-                        dest = lane.get("dest")
-                        if not (isinstance(dest, int) or (isinstance(dest, str) and (dest.startswith("cc:") or dest.startswith("name:")))):
-                            _err(errors, lpath + "/dest", "integer CC# or 'cc:<num>' or 'name:<id>' required")
-                        mode = lane.get("mode")
-                        if mode not in ("points", "hold", "ramp"):
-                            _err(errors, lpath + "/mode", "must be 'points'|'hold'|'ramp'")
-                        if "channel" in lane:
-                            chv = lane.get("channel")
-                            if not isinstance(chv, int) or not (0 <= chv <= 15):
-                                _err(errors, lpath + "/channel", "integer 0..15 required when present")
-                        if "range" in lane:
-                            rng = lane.get("range")
-                            ok = isinstance(rng, list) and len(rng) == 2 and all(isinstance(v, (int, float)) for v in rng)
-                            if ok:
-                                lo, hi = int(rng[0]), int(rng[1])
-                                if not (0 <= lo <= 127 and 0 <= hi <= 127 and lo <= hi):
-                                    ok = False
-                            if not ok:
-                                _err(errors, lpath + "/range", "must be [lo,hi] with 0..127 and lo<=hi")
-                        points = lane.get("points")
-                        if not isinstance(points, list) or len(points) == 0:
-                            _err(errors, lpath + "/points", "required non-empty array")
-                        else:
-                            for pi, pt in enumerate(points):
-                                ppath = f"{lpath}/points[{pi}]"
-                                if not isinstance(pt, dict):
-                                    _err(errors, ppath, "must be object")
-                                    continue
-                                t = pt.get("t")
-                                v = pt.get("v")
-                                if not isinstance(v, (int, float)) or not (0 <= v <= 127):
-                                    _err(errors, ppath + "/v", "0..127 required")
-                                if not isinstance(t, dict) or not ("ticks" in t or ("bar" in t and "step" in t)):
-                                    _err(errors, ppath + "/t", "must be {ticks:n} or {bar:n, step:n}")
-                                curve = pt.get("curve")
-                                if curve is not None and not (isinstance(curve, str) and curve in ("linear", "line", "exp", "exponential", "log", "logarithmic", "s-curve", "scurve", "smoothstep")):
-                                    _err(errors, ppath + "/curve", "must be one of 'linear'|'exp'|'log'|'s-curve' if present")
-                                if isinstance(t, dict):
-                                    if "ticks" in t:
-                                        if not isinstance(t["ticks"], (int, float)) or int(t["ticks"]) < 0:
-                                            _err(errors, ppath + "/t/ticks", "non-negative number required")
+                                    if "ticks" in tref:
+                                        if not isinstance(tref["ticks"], (int, float)) or int(tref["ticks"]) < 0:
+                                            _err(errors, wpath + f"/{lab}/ticks", "non-negative number required")
                                     else:
-                                        bar = t.get("bar"); step = t.get("step")
-                                        if not isinstance(bar, (int, float)) or int(bar) < 0:
-                                            _err(errors, ppath + "/t/bar", "non-negative number required")
-                                        if not isinstance(step, (int, float)):
-                                            _err(errors, ppath + "/t/step", "number required")
+                                        b = tref.get("bar"); s = tref.get("step")
+                                        if not isinstance(b, (int, float)) or int(b) < 0:
+                                            _err(errors, wpath + f"/{lab}/bar", "non-negative number required")
+                                        if not isinstance(s, (int, float)):
+                                            _err(errors, wpath + f"/{lab}/step", "number required")
                                         else:
                                             if isinstance(meta.get("stepsPerBar"), int):
                                                 spb_val = int(meta.get("stepsPerBar"))
-                                                if not (0 <= int(step) < spb_val):
-                                                    _err(errors, ppath + "/t/step", f"must be in 0..{spb_val-1}")
-
-            # §7: lfos (optional)
-            lfos = tr.get("lfos")
-            if lfos is not None:
-                if not isinstance(lfos, list):
-                    _err(errors, f"{tpath}/lfos", "must be array if present")
-                else:
-                    for li, lfo in enumerate(lfos):
-                        lpath = f"{tpath}/lfos[{li}]"
-                        if not isinstance(lfo, dict):
-                            _err(errors, lpath, "must be object")
-                            continue
-                        if not isinstance(lfo.get("id"), str):
-                            _err(errors, lpath + "/id", "required string")
-                        dest = lfo.get("dest")
-                        if not (isinstance(dest, int) or (isinstance(dest, str) and (dest.startswith("cc:") or dest.startswith("name:")))):
-                            _err(errors, lpath + "/dest", "integer CC# or 'cc:<num>' or 'name:<id>' required")
-                        depth = lfo.get("depth")
-                        if not isinstance(depth, int) or not (0 <= depth <= 127):
-                            _err(errors, lpath + "/depth", "integer 0..127 required")
-                        rate = lfo.get("rate")
-                        if not isinstance(rate, dict) or not ("sync" in rate or "hz" in rate):
-                            _err(errors, lpath + "/rate", "must be {sync:""}|{hz:n}")
-                        else:
-                            if "hz" in rate:
-                                if not isinstance(rate.get("hz"), (int, float)) or float(rate.get("hz", 0)) <= 0:
-                                    _err(errors, lpath + "/rate/hz", "number > 0 required")
-                            if "sync" in rate:
-                                if not isinstance(rate.get("sync"), str) or not rate.get("sync"):
-                                    _err(errors, lpath + "/rate/sync", "non-empty string required")
-                        shape = lfo.get("shape")
-                        if shape not in ("sine", "triangle", "saw", "ramp", "square", "samplehold"):
-                            _err(errors, lpath + "/shape", "invalid shape")
-                        if "channel" in lfo:
-                            chv = lfo.get("channel")
-                            if not isinstance(chv, int) or not (0 <= chv <= 15):
-                                _err(errors, lpath + "/channel", "integer 0..15 required when present")
-                        if "offset" in lfo:
-                            off = lfo.get("offset")
-                            if not isinstance(off, int) or not (0 <= off <= 127):
-                                _err(errors, lpath + "/offset", "integer 0..127 required when present")
-                        if "phase" in lfo:
-                            ph = lfo.get("phase")
-                            if not isinstance(ph, (int, float)) or not (0.0 <= float(ph) <= 1.0):
-                                _err(errors, lpath + "/phase", "number 0..1 required when present")
-                        if "fadeMs" in lfo:
-                            fm = lfo.get("fadeMs")
-                            if not isinstance(fm, int) or fm < 0:
-                                _err(errors, lpath + "/fadeMs", "integer ≥0 required when present")
-                        if "stereoSpread" in lfo:
-                            ss = lfo.get("stereoSpread")
-                            if not isinstance(ss, (int, float)) or not (0.0 <= float(ss) <= 1.0):
-                                _err(errors, lpath + "/stereoSpread", "number 0..1 required when present")
-                        if "on" in lfo:
-                            wins = lfo.get("on")
-                            if not isinstance(wins, list):
-                                _err(errors, lpath + "/on", "must be array if present")
-                            else:
-                                for wi, w in enumerate(wins):
-                                    wpath = f"{lpath}/on[{wi}]"
-                                    if not isinstance(w, dict):
-                                        _err(errors, wpath, "must be object")
-                                        continue
-                                    fr = w.get("from"); to = w.get("to")
-                                    for lab, tref in (("from", fr), ("to", to)):
-                                        if not isinstance(tref, dict) or not ("ticks" in tref or ("bar" in tref and "step" in tref)):
-                                            _err(errors, wpath + f"/{lab}", "must be {ticks:n} or {bar:n, step:n}")
-                                        else:
-                                            if "ticks" in tref:
-                                                if not isinstance(tref["ticks"], (int, float)) or int(tref["ticks"]) < 0:
-                                                    _err(errors, wpath + f"/{lab}/ticks", "non-negative number required")
-                                            else:
-                                                b = tref.get("bar"); s = tref.get("step")
-                                                if not isinstance(b, (int, float)) or int(b) < 0:
-                                                    _err(errors, wpath + f"/{lab}/bar", "non-negative number required")
-                                                if not isinstance(s, (int, float)):
-                                                    _err(errors, wpath + f"/{lab}/step", "number required")
-                                                else:
-                                                    if isinstance(meta.get("stepsPerBar"), int):
-                                                        spb_val = int(meta.get("stepsPerBar"))
-                                                        if not (0 <= int(s) < spb_val):
-                                                            _err(errors, wpath + f"/{lab}/step", f"must be in 0..{spb_val-1}")
+                                                if not (0 <= int(s) < spb_val):
+                                                    _err(errors, wpath + f"/{lab}/step", f"must be in 0..{spb_val-1}")
 
-    return errors
+
+# Sort keys canonicalize() orders by, public so editors (semantic_ops) can
+# insert an element where canonicalize() would put it.
+def point_key(p: Dict[str, Any]) -> Tuple[int, int, int]:
+    t = p.get("t", {})
+    if "ticks" in t:
+        return (0, int(t.get("ticks", 0)), 0)
+    return (1, int(t.get("bar", 0)), int(t.get("step", 0)))
+
+
+def track_key(t: Dict[str, Any]) -> Any:
+    return t.get("id", "")
+
+
+def step_key(s: Dict[str, Any]) -> Any:
+    return s.get("idx", 0)
+
+
+def lane_key(l: Dict[str, Any]) -> Any:
+    return l.get("id", "")
+
+
+def drum_pattern_key(p: Dict[str, Any]) -> Any:
+    return (p.get("bar", 0), p.get("key", ""))
 
 
 def canonicalize(loop: Dict[str, Any]) -> Dict[str, Any]:
@@ -328,36 +407,88 @@ def canonicalize(loop: Dict[str, Any]) -> Dict[str, Any]:
     """
     doc = copy.deepcopy(loop)
 
-    def sort_points(points: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        def key_fn(p: Dict[str, Any]) -> Tuple[int, int, int]:
-            t = p.get("t", {})
-            if "ticks" in t:
-                return (0, int(t.get("ticks", 0)), 0)
-            return (1, int(t.get("bar", 0)), int(t.get("step", 0)))
-
-        return sorted(points, key=key_fn)
-
     tracks = doc.get("tracks")
     if isinstance(tracks, list):
-        tracks.sort(key=lambda t: t.get("id", ""))
+        tracks.sort(key=track_key)
         for tr in tracks:
             pat = tr.get("pattern")
             if isinstance(pat, dict) and isinstance(pat.get("steps"), list):
-                pat["steps"].sort(key=lambda s: s.get("idx", 0))
+                pat["steps"].sort(key=step_key)
             if isinstance(tr.get("ccLanes"), list):
-                tr["ccLanes"].sort(key=lambda l: l.get("id", ""))
+                tr["ccLanes"].sort(key=lane_key)
                 for lane in tr["ccLanes"]:
                     if isinstance(lane.get("points"), list):
-                        lane["points"] = sort_points(lane["points"])
+                        lane["points"] = sorted(lane["points"], key=point_key)
             if isinstance(tr.get("lfos"), list):
-                tr["lfos"].sort(key=lambda l: l.get("id", ""))
+                tr["lfos"].sort(key=lane_key)
             dk = tr.get("drumKit")
             if isinstance(dk, dict) and isinstance(dk.get("patterns"), list):
-                dk["patterns"].sort(key=lambda p: (p.get("bar", 0), p.get("key", "")))
+                dk["patterns"].sort(key=drum_pattern_key)
 
     return doc
 
 
+def _resort(owner: Dict[str, Any], key: str, sort_key: Any, prev_owner: Any) -> bool:
+    lst = owner.get(key)
+    if not isinstance(lst, list) or (isinstance(prev_owner, dict) and prev_owner.get(key) is lst):
+        return False
+    out = sorted(lst, key=sort_key)
+    if all(a is b for a, b in zip(out, lst)):
+        return False
+    owner[key] = out
+    return True
+
+
+def _by_id(items: Any) -> Dict[Any, Any]:
+    if not isinstance(items, list):
+        return {}
+    return {x.get("id"): x for x in items if isinstance(x, dict)}
+
+
+def canonicalize_shared(loop: Dict[str, Any], prev: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """Canonicalize a doc produced from canonical prev by a copy-on-write patch.
+
+    Same ordering as canonicalize(), but containers that are still the very
+    objects of prev are skipped, and a list is replaced (never sorted in
+    place) only when its order actually changes; such lists were rebuilt by
+    the patch, so their owners are private to loop. Returns (doc, reordered);
+    doc is loop itself.
+    """
+    reordered = False
+    tracks = loop.get("tracks")
+    prev_tracks = prev.get("tracks")
+    if not isinstance(tracks, list) or tracks is prev_tracks:
+        return loop, False
+    reordered |= _resort(loop, "tracks", track_key, prev)
+    prev_by_id = _by_id(prev_tracks)
+    prev_objs = {id(t) for t in prev_by_id.values()}
+    for tr in loop["tracks"]:
+        if id(tr) in prev_objs or not isinstance(tr, dict):
+            continue
+        ptr = prev_by_id.get(tr.get("id"))
+        pat = tr.get("pattern")
+        if isinstance(pat, dict):
+            ppat = ptr.get("pattern") if isinstance(ptr, dict) else None
+            if pat is not ppat:
+                reordered |= _resort(pat, "steps", step_key, ppat)
+        reordered |= _resort(tr, "ccLanes", lane_key, ptr)
+        lanes = tr.get("ccLanes")
+        if isinstance(lanes, list) and not (isinstance(ptr, dict) and ptr.get("ccLanes") is lanes):
+            prev_lanes = _by_id(ptr.get("ccLanes")) if isinstance(ptr, dict) else {}
+            for lane in lanes:
+                if isinstance(lane, dict):
+                    plane = prev_lanes.get(lane.get("id"))
+                    if lane is not plane:
+                        reordered |= _resort(lane, "points", point_key, plane)
+        reordered |= _resort(tr, "lfos", lane_key, ptr)
+        dk = tr.get("drumKit")
+        if isinstance(dk, dict):
+            pdk = ptr.get("drumKit") if isinstance(ptr, dict) else None
+            if dk is not pdk:
+                reordered |= _resort(dk, "patterns", drum_pattern_key, pdk)
+    return loop, reordered
+
+
 def sha256_canonical(doc: Dict[str, Any]) -> str:
     """Compute SHA-256 of canonical JSON string (sorted keys, compact)."""
     s = json.dumps(doc, sort_keys=True, separators=(",", ":"))
@@ -0,0 +1,289 @@
+"""Compiled form of the opxyloop-1.0 track rules in conductor/validator.py.
+
+The rules are declared once as a tree of _Obj/_ListOf/_Test nodes and
+compiled at import into a single Python function, with every field check
+inlined. It is then bound per doc context (meta.stepsPerBar, drumMap).
+The result only answers "valid or not", so it builds no path strings and
+collects no errors. A track that fails is handed to the reference
+_validate_track, which produces the messages, so error output is identical
+to validate_loop by construction.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from conductor.validator import _err, _validate_header, _validate_track, tracks_to_check
+
+
+Pred = Callable[[Any], bool]
+
+# Rule modes: REQUIRED checks o.get(key) (missing -> None); NOT_NONE skips
+# absent/null values; PRESENT checks any value whose key exists (null included).
+REQUIRED, NOT_NONE, PRESENT = 0, 1, 2
+
+_SHAPES = ("sine", "triangle", "saw", "ramp", "square", "samplehold")
+_CURVES = ("linear", "line", "exp", "exponential", "log", "logarithmic", "s-curve", "scurve", "smoothstep")
+_MODES = ("points", "hold", "ramp")
+
+
+class _Emitter:
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+        self._n = 0
+
+    def var(self) -> str:
+        self._n += 1
+        return f"v{self._n}"
+
+    def line(self, depth: int, text: str) -> None:
+        self.lines.append("    " * depth + text)
+
+
+class _Rule:
+    def emit(self, em: _Emitter, v: str, depth: int) -> None:
+        raise NotImplementedError
+
+
+class _Test(_Rule):
+    """Leaf check: a Python expression over {v}."""
+
+    def __init__(self, expr: str) -> None:
+        self.expr = expr
+
+    def emit(self, em: _Emitter, v: str, depth: int) -> None:
+        em.line(depth, f"if not ({self.expr.format(v=v)}): return False")
+
+
+class _Obj(_Rule):
+    def __init__(self, fields: List[Tuple[str, _Rule, int]], *extra: str) -> None:
+        self.fields = fields
+        self.extra = extra
+
+    def emit(self, em: _Emitter, v: str, depth: int) -> None:
+        em.line(depth, f"if not isinstance({v}, dict): return False")
+        for key, rule, mode in self.fields:
+            x = em.var()
+            if mode == REQUIRED:
+                em.line(depth, f"{x} = {v}.get({key!r})")
+                rule.emit(em, x, depth)
+            elif mode == NOT_NONE:
+                em.line(depth, f"{x} = {v}.get({key!r})")
+                em.line(depth, f"if {x} is not None:")
+                rule.emit(em, x, depth + 1)
+            else:
+                em.line(depth, f"if {key!r} in {v}:")
+                em.line(depth + 1, f"{x} = {v}[{key!r}]")
+                rule.emit(em, x, depth + 1)
+        for expr in self.extra:
+            em.line(depth, f"if not ({expr.format(v=v)}): return False")
+
+
+class _ListOf(_Rule):
+    def __init__(self, item: _Rule, nonempty: bool = False) -> None:
+        self.item = item
+        self.nonempty = nonempty
+
+    def emit(self, em: _Emitter, v: str, depth: int) -> None:
+        em.line(depth, f"if not isinstance({v}, list){' or not ' + v if self.nonempty else ''}: return False")
+        it = em.var()
+        em.line(depth, f"for {it} in {v}:")
+        self.item.emit(em, it, depth + 1)
+
+
+def _int_range(lo: int, hi: Optional[int] = None) -> _Test:
+    if hi is None:
+        return _Test(f"isinstance({{v}}, int) and {{v}} >= {lo}")
+    return _Test(f"isinstance({{v}}, int) and {lo} <= {{v}} <= {hi}")
+
+
+_STR = _Test("isinstance({v}, str)")
+_DEST = _Test("isinstance({v}, int) or (isinstance({v}, str) and ({v}.startswith('cc:') or {v}.startswith('name:')))")
+_UNIT = _Test("isinstance({v}, NUM) and 0.0 <= float({v}) <= 1.0")
+_TIME_REF = _Test("time_ref({v})")
+
+
+def _time_ref(meta_is_dict: bool, spb: Any) -> Pred:
+    """{ticks:n} | {bar:n, step:n}, with step inside the bar when stepsPerBar is an int."""
+    def check(t: Any) -> bool:
+        if not isinstance(t, dict):
+            return False
+        if "ticks" in t:
+            ticks = t["ticks"]
+            return isinstance(ticks, (int, float)) and int(ticks) >= 0
+        if "bar" not in t or "step" not in t:
+            return False
+        b = t["bar"]
+        s = t["step"]
+        if not (isinstance(b, (int, float)) and int(b) >= 0 and isinstance(s, (int, float))):
+            return False
+        if not meta_is_dict:
+            # The reference reads meta.get() here and raises; let it
+            return False
+        return not isinstance(spb, int) or 0 <= int(s) < spb
+    return check
+
+
+def _range(v: Any) -> bool:
+    if not (isinstance(v, list) and len(v) == 2 and isinstance(v[0], (int, float)) and isinstance(v[1], (int, float))):
+        return False
+    lo, hi = int(v[0]), int(v[1])
+    return 0 <= lo <= 127 and 0 <= hi <= 127 and lo <= hi
+
+
+def _rate(r: Any) -> bool:
+    if not isinstance(r, dict) or not ("sync" in r or "hz" in r):
+        return False
+    if "hz" in r and not (isinstance(r.get("hz"), (int, float)) and float(r.get("hz", 0)) > 0):
+        return False
+    if "sync" in r and not (isinstance(r.get("sync"), str) and r.get("sync")):
+        return False
+    return True
+
+
+# The opxyloop-1.0 track rules (see _validate_track); SPB and DMAP are the
+# doc's meta.stepsPerBar and drumMap, bound at compile time.
+_EVENT = _Obj([
+    ("velocity", _int_range(1, 127), REQUIRED),
+    ("lengthSteps", _int_range(1), REQUIRED),
+    ("ratchet", _int_range(2, 8), NOT_NONE),
+], "'pitch' in {v} or 'degree' in {v} or 'chord' in {v}", "'degree' not in {v} or 'octaveOffset' in {v}")
+_STEP = _Obj([
+    ("idx", _int_range(0), REQUIRED),
+    ("events", _ListOf(_EVENT), NOT_NONE),
+])
+_DRUM_SPEC = _Obj([
+    ("bar", _int_range(1), REQUIRED),
+    ("key", _Test("isinstance({v}, str) and {v} in DMAP"), REQUIRED),
+    ("pattern", _Test("isinstance({v}, str) and SPB_IS_INT and len({v}) == SPB and DRUM_CHARS.issuperset({v})"), REQUIRED),
+    ("vel", _int_range(1, 127), PRESENT),
+    ("lengthSteps", _int_range(1), PRESENT),
+])
+_POINT = _Obj([
+    ("v", _Test("isinstance({v}, NUM) and 0 <= {v} <= 127"), REQUIRED),
+    ("t", _TIME_REF, REQUIRED),
+    ("curve", _Test(f"isinstance({{v}}, str) and {{v}} in {_CURVES!r}"), NOT_NONE),
+])
+_LANE = _Obj([
+    ("id", _STR, REQUIRED),
+    ("dest", _DEST, REQUIRED),
+    ("mode", _Test(f"{{v}} in {_MODES!r}"), REQUIRED),
+    ("channel", _int_range(0, 15), PRESENT),
+    ("range", _Test("check_range({v})"), PRESENT),
+    ("points", _ListOf(_POINT, nonempty=True), REQUIRED),
+])
+_LFO = _Obj([
+    ("id", _STR, REQUIRED),
+    ("dest", _DEST, REQUIRED),
+    ("depth", _int_range(0, 127), REQUIRED),
+    ("rate", _Test("check_rate({v})"), REQUIRED),
+    ("shape", _Test(f"{{v}} in {_SHAPES!r}"), REQUIRED),
+    ("channel", _int_range(0, 15), PRESENT),
+    ("offset", _int_range(0, 127), PRESENT),
+    ("phase", _UNIT, PRESENT),
+    ("fadeMs", _int_range(0), PRESENT),
+    ("stereoSpread", _UNIT, PRESENT),
+    ("on", _ListOf(_Obj([("from", _TIME_REF, REQUIRED), ("to", _TIME_REF, REQUIRED)])), PRESENT),
+])
+_TRACK = _Obj([
+    ("id", _STR, REQUIRED),
+    ("name", _STR, REQUIRED),
+    ("type", _STR, REQUIRED),
+    ("midiChannel", _int_range(0, 15), REQUIRED),
+    ("pattern", _Obj([("lengthBars", _int_range(1), REQUIRED), ("steps", _ListOf(_STEP), REQUIRED)]), REQUIRED),
+    ("drumKit", _Obj([("patterns", _ListOf(_DRUM_SPEC, nonempty=True), REQUIRED)]), NOT_NONE),
+    ("ccLanes", _ListOf(_LANE), NOT_NONE),
+    ("lfos", _ListOf(_LFO), NOT_NONE),
+])
+
+
+def _generate(rule: _Rule) -> str:
+    em = _Emitter()
+    em.line(0, "def check(v0):")
+    rule.emit(em, "v0", 1)
+    em.line(1, "return True")
+    return "\n".join(em.lines) + "\n"
+
+
+_TRACK_SOURCE = _generate(_TRACK)
+_TRACK_CODE = compile(_TRACK_SOURCE, "<opxyloop track rules>", "exec")
+
+
+def compile_track_checker(meta: Any, dev: Any) -> Pred:
+    """Bind the compiled track rules to a doc's meta and deviceProfile."""
+    meta_is_dict = isinstance(meta, dict)
+    spb = meta.get("stepsPerBar") if meta_is_dict else None
+    namespace: Dict[str, Any] = {
+        "NUM": (int, float),
+        "SPB": spb,
+        "SPB_IS_INT": isinstance(spb, int),
+        "DMAP": dev.get("drumMap", {}) if isinstance(dev, dict) else {},
+        "DRUM_CHARS": frozenset("x.-"),
+        "time_ref": _time_ref(meta_is_dict, spb),
+        "check_range": _range,
+        "check_rate": _rate,
+    }
+    exec(_TRACK_CODE, namespace)
+    track = namespace["check"]
+
+    def check(tr: Any) -> bool:
+        try:
+            return track(tr)
+        except Exception:
+            # Malformed input the reference may choke on; let it report (or raise)
+            return False
+    return check
+
+
+_cache: Dict[Any, Pred] = {}
+
+
+def track_checker(meta: Any, dev: Any) -> Pred:
+    """compile_track_checker, memoized on the context the rules depend on."""
+    meta_is_dict = isinstance(meta, dict)
+    spb = meta.get("stepsPerBar") if meta_is_dict else None
+    dmap = dev.get("drumMap", {}) if isinstance(dev, dict) else {}
+    if not isinstance(dmap, dict):
+        return compile_track_checker(meta, dev)
+    try:
+        key = (meta_is_dict, type(spb), spb, frozenset(dmap))
+        hash(key)
+    except TypeError:
+        return compile_track_checker(meta, dev)
+    checker = _cache.get(key)
+    if checker is None:
+        if len(_cache) >= 32:
+            _cache.clear()
+        checker = _cache[key] = compile_track_checker(meta, dev)
+    return checker
+
+
+def validate_loop_compiled(loop: Dict[str, Any]) -> List[str]:
+    """Same result as validate_loop(loop)."""
+    errors: List[str] = []
+    meta, dev = _validate_header(loop, errors)
+    tracks = loop.get("tracks")
+    if not isinstance(tracks, list) or len(tracks) == 0:
+        _err(errors, "/tracks", "required non-empty array")
+        return errors
+    ok = track_checker(meta, dev)
+    for ti, tr in enumerate(tracks):
+        if not ok(tr):
+            _validate_track(tr, ti, meta, dev, errors)
+    return errors
+
+
+def validate_loop_incremental_compiled(loop: Dict[str, Any], prev: Dict[str, Any], ops: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    """Same result as validate_loop_incremental(loop, prev, ops)."""
+    errors: List[str] = []
+    meta, dev = _validate_header(loop, errors)
+    tracks = loop.get("tracks")
+    if not isinstance(tracks, list) or len(tracks) == 0:
+        _err(errors, "/tracks", "required non-empty array")
+        return errors
+    ok = track_checker(meta, dev)
+    for ti in tracks_to_check(loop, prev, ops):
+        tr = tracks[ti]
+        if not ok(tr):
+            _validate_track(tr, ti, meta, dev, errors)
+    return errors
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Deque, Dict, List
+
+
+# Degradation levels, mildest first. Note on/off scheduling is never shed.
+LEVEL_NAMES = ("normal", "ccReduced", "ccDeferred")
+
+
+class TickWatchdog:
+    """Track per-tick processing time against the tick deadline.
+
+    The deadline is the time until the next engine tick at the current tempo
+    (60 / (bpm * ppq)). A tick is over budget when it takes longer than
+    `fraction` of that. After `escalate_after` consecutive over-budget ticks
+    the level goes up one step; after `recover_after` consecutive ticks under
+    `recover_fraction` of the deadline it comes back down one step.
+    Every transition is counted and kept in a short history for metrics.
+    """
+
+    def __init__(
+        self,
+        fraction: float = 0.5,
+        escalate_after: int = 3,
+        recover_after: int = 96,
+        recover_fraction: float | None = None,
+        history: int = 32,
+    ) -> None:
+        self.fraction = max(0.01, float(fraction))
+        self.recover_fraction = float(recover_fraction) if recover_fraction is not None else self.fraction / 2.0
+        self.escalate_after = max(1, int(escalate_after))
+        self.recover_after = max(1, int(recover_after))
+        self.level: int = 0
+        self._over_run: int = 0
+        self._under_run: int = 0
+        self.over_budget_ticks: int = 0
+        self.escalations: int = 0
+        self.recoveries: int = 0
+        self.cc_skipped_ticks: int = 0
+        self.last_us: float = 0.0
+        self.worst_us: float = 0.0
+        self.budget_us: float = 0.0
+        self.transitions: Deque[Dict[str, Any]] = deque(maxlen=max(1, int(history)))
+
+    def observe(self, elapsed_s: float, budget_s: float, tick: int) -> None:
+        elapsed_us = elapsed_s * 1e6
+        self.last_us = elapsed_us
+        if elapsed_us > self.worst_us:
+            self.worst_us = elapsed_us
+        self.budget_us = budget_s * 1e6
+        if budget_s <= 0:
+            return
+        if elapsed_s > budget_s * self.fraction:
+            self.over_budget_ticks += 1
+            self._under_run = 0
+            self._over_run += 1
+            if self._over_run >= self.escalate_after and self.level < len(LEVEL_NAMES) - 1:
+                self._transition(self.level + 1, tick, elapsed_us)
+                self.escalations += 1
+                self._over_run = 0
+        elif elapsed_s < budget_s * self.recover_fraction:
+            self._over_run = 0
+            self._under_run += 1
+            if self._under_run >= self.recover_after and self.level > 0:
+                self._transition(self.level - 1, tick, elapsed_us)
+                self.recoveries += 1
+                self._under_run = 0
+        else:
+            # In the grey zone: neither escalate nor count toward recovery
+            self._over_run = 0
+            self._under_run = 0
+
+    def _transition(self, new_level: int, tick: int, elapsed_us: float) -> None:
+        self.transitions.append({
+            "tick": int(tick),
+            "from": LEVEL_NAMES[self.level],
+            "to": LEVEL_NAMES[new_level],
+            "elapsedUs": round(elapsed_us, 1),
+            "budgetUs": round(self.budget_us, 1),
+        })
+        self.level = new_level
+
+    def snapshot(self) -> Dict[str, Any]:
+        transitions: List[Dict[str, Any]] = list(self.transitions)
+        return {
+            "level": self.level,
+            "levelName": LEVEL_NAMES[self.level],
+            "budgetUs": round(self.budget_us, 1),
+            "fraction": self.fraction,
+            "lastTickUs": round(self.last_us, 1),
+            "worstTickUs": round(self.worst_us, 1),
+            "overBudgetTicks": self.over_budget_ticks,
+            "escalations": self.escalations,
+            "recoveries": self.recoveries,
+            "ccSkippedTicks": self.cc_skipped_ticks,
+            "transitions": transitions,
+        }
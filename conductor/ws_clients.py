@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Union
+
+from conductor import cbor
+
+
+# Topics a WS client can subscribe to. 'doc' and 'upcoming' are event-driven
+# (sent on each docVersion change, and for 'upcoming' also once per bar); the
+# others are sampled streams limited to maxHz. 'anchor' is additionally
+# pushed on every transport change.
+TOPICS = ("doc", "state", "metrics", "cc", "notes", "trace", "anchor", "upcoming")
+EVENT_TOPICS = ("doc", "upcoming")
+STREAM_TOPICS = ("state", "metrics", "cc", "notes", "trace", "anchor")
+DEFAULT_HZ: Dict[str, float] = {"state": 2.0, "metrics": 2.0, "cc": 10.0, "notes": 10.0, "trace": 1.0, "anchor": 1.0}
+MAX_HZ = 60.0
+MIN_HZ = 0.1
+
+# Outbound queue limits: a client whose ordered queue stays above
+# SEND_HIGH_WATER for SLOW_EVICT_S, whose socket write blocks that long, or
+# whose queue ever reaches SEND_MAX_QUEUE is disconnected as a slow consumer.
+SEND_HIGH_WATER = 64
+SEND_MAX_QUEUE = 1024
+SLOW_EVICT_S = 5.0
+
+# Wire encodings a client can select in hello; JSON text frames are the default.
+# Under 'cbor', stream topics, docDelta and upcoming go out as binary CBOR
+# frames; acks, errors and full docs stay JSON text.
+ENCODINGS = ("json", "cbor")
+
+# Edit results a session remembers for {"after": id} pipelining
+RESULT_HISTORY = 256
+
+# What a client gets before (or without ever) sending subscribe
+LEGACY_TOPICS: Dict[str, Optional[float]] = {"doc": None, "state": 2.0, "metrics": 2.0, "anchor": 1.0}
+
+
+def parse_topics(spec: Any) -> Dict[str, Optional[float]]:
+    """Parse a subscribe 'topics' payload.
+
+    Accepts a list of names (default rates) or a mapping name -> maxHz, where
+    true/null selects the default rate. Raises ValueError on unknown topics.
+    """
+    if isinstance(spec, str):
+        spec = [spec]
+    if isinstance(spec, (list, tuple)):
+        spec = {name: None for name in spec}
+    if not isinstance(spec, dict):
+        raise ValueError("topics must be a list or an object")
+    out: Dict[str, Optional[float]] = {}
+    for name, rate in spec.items():
+        if name not in TOPICS:
+            raise ValueError(f"unknown topic: {name}")
+        if rate is False:
+            continue
+        if name in EVENT_TOPICS:
+            out[name] = None
+            continue
+        if rate is None or rate is True:
+            hz = DEFAULT_HZ[name]
+        else:
+            hz = float(rate)
+        out[name] = min(MAX_HZ, max(MIN_HZ, hz))
+    return out
+
+
+def parse_encoding(spec: Any) -> str:
+    """Pick the first supported encoding from a name or preference list."""
+    prefs = [spec] if isinstance(spec, str) else spec
+    if isinstance(prefs, (list, tuple)):
+        for name in prefs:
+            if name in ENCODINGS:
+                return str(name)
+    raise ValueError(f"unsupported encoding: {spec}")
+
+
+class Outgoing:
+    """A message built once and serialized lazily, at most once per encoding."""
+
+    __slots__ = ("obj", "_wire")
+
+    def __init__(self, obj: Dict[str, Any], json_text: Optional[str] = None) -> None:
+        self.obj = obj
+        self._wire: Dict[str, Union[str, bytes]] = {}
+        if json_text is not None:
+            self._wire["json"] = json_text
+
+    def encode(self, encoding: str) -> Union[str, bytes]:
+        wire = self._wire.get(encoding)
+        if wire is None:
+            wire = cbor.dumps(self.obj) if encoding == "cbor" else json.dumps(self.obj)
+            self._wire[encoding] = wire
+        return wire
+
+
+Message = Union[str, bytes, Outgoing]
+
+
+class ClientSession:
+    """Per-connection state for the conductor WS server.
+
+    Outbound messages go through a per-client queue drained by a writer
+    task, so one stalled socket never blocks the others. Replies and doc
+    updates are kept in order; stream topics are coalesced newest-only:
+    offer() replaces any message for the same topic the client has not been
+    sent yet, so a slow client skips intermediate states instead of falling
+    behind.
+    """
+
+    def __init__(
+        self,
+        ws: Any,
+        high_water: int = SEND_HIGH_WATER,
+        max_queue: int = SEND_MAX_QUEUE,
+        evict_after_s: float = SLOW_EVICT_S,
+    ) -> None:
+        self.ws = ws
+        # Client opted into 'docDelta' messages (hello/subscribe payload {"deltas": true})
+        self.deltas: bool = False
+        # Last docVersion this client was sent (full doc or delta)
+        self.doc_version: Optional[int] = None
+        self.topics: Dict[str, Optional[float]] = dict(LEGACY_TOPICS)
+        self.subscribed: bool = False
+        self.encoding: str = "json"
+        self.high_water = max(1, int(high_water))
+        self.max_queue = max(self.high_water, int(max_queue))
+        self.evict_after_s = float(evict_after_s)
+        self.sent: int = 0
+        self.bytes_sent: int = 0
+        self.coalesced: int = 0
+        self.peak_depth: int = 0
+        self.evicted: Optional[str] = None
+        # Set once the server has started closing the socket (see close_once)
+        self.closed: bool = False
+        self._over_since: Optional[float] = None
+        # monotonic start of the socket write in progress, if any
+        self.writing_since: Optional[float] = None
+        self._queue: Deque[Union[str, bytes]] = deque()
+        self._next_due: Dict[str, float] = {}
+        self._last_key: Dict[str, str] = {}
+        self._latest: Dict[str, Union[str, bytes]] = {}
+        # req id -> docVersion the edit produced, "pending", or an error name
+        self._results: OrderedDict[Any, Union[int, str]] = OrderedDict()
+        self.wake = asyncio.Event()
+
+    def subscribe(self, topics: Dict[str, Optional[float]]) -> None:
+        self.topics = dict(topics)
+        self.subscribed = True
+        self._next_due.clear()
+        self._last_key.clear()
+
+    def wants(self, topic: str) -> bool:
+        return topic in self.topics
+
+    def period(self) -> Optional[float]:
+        """Shortest stream period this client asked for, or None."""
+        rates = [hz for name, hz in self.topics.items() if name not in EVENT_TOPICS and hz]
+        return 1.0 / max(rates) if rates else None
+
+    def due(self, topic: str, now: float) -> bool:
+        hz = self.topics.get(topic)
+        if not hz:
+            return False
+        if now < self._next_due.get(topic, 0.0):
+            return False
+        self._next_due[topic] = now + 1.0 / hz
+        return True
+
+    def send(self, msg: Message) -> bool:
+        """Queue an ordered message (reply, doc, delta). False once evicted."""
+        if self.evicted is not None:
+            return False
+        self._queue.append(msg.encode(self.encoding) if isinstance(msg, Outgoing) else msg)
+        depth = len(self._queue)
+        if depth > self.peak_depth:
+            self.peak_depth = depth
+        if depth >= self.max_queue:
+            self.evicted = "queue_full"
+        self.wake.set()
+        return self.evicted is None
+
+    def offer(self, topic: str, msg: Message, key: Optional[str] = None) -> bool:
+        """Queue msg as the newest for topic; with key, skip unchanged payloads."""
+        if self.evicted is not None:
+            return False
+        if key is not None:
+            if self._last_key.get(topic) == key:
+                return False
+            self._last_key[topic] = key
+        if topic in self._latest:
+            self.coalesced += 1
+        self._latest[topic] = msg.encode(self.encoding) if isinstance(msg, Outgoing) else msg
+        self.wake.set()
+        return True
+
+    def pop(self) -> Optional[Union[str, bytes]]:
+        """Next message to write: ordered queue first, then stream topics."""
+        if self._queue:
+            return self._queue.popleft()
+        if self._latest:
+            topic = next(iter(self._latest))
+            return self._latest.pop(topic)
+        return None
+
+    def record_result(self, req_id: Any, res: Dict[str, Any]) -> None:
+        """Remember how an edit request ended, for later {"after": req_id} edits."""
+        if req_id is None:
+            return
+        if not res.get("ok"):
+            outcome: Union[int, str] = str(res.get("error") or "failed")
+        elif res.get("pending"):
+            outcome = "pending"
+        else:
+            outcome = int(res.get("docVersion", -1))
+        try:
+            self._results[req_id] = outcome
+            self._results.move_to_end(req_id)
+        except TypeError:
+            return
+        while len(self._results) > RESULT_HISTORY:
+            self._results.popitem(last=False)
+
+    def result_base(self, req_id: Any) -> tuple:
+        """(docVersion produced by request req_id, None) or (None, error payload)."""
+        try:
+            outcome = self._results.get(req_id)
+        except TypeError:
+            outcome = None
+        if outcome is None:
+            return None, {"ok": False, "error": "unknown_dependency", "after": req_id}
+        if outcome == "pending":
+            return None, {"ok": False, "error": "dependency_pending", "after": req_id}
+        if isinstance(outcome, str):
+            return None, {"ok": False, "error": "dependency_failed", "after": req_id, "details": outcome}
+        return outcome, None
+
+    def check_slow(self, now: float) -> Optional[str]:
+        """Mark and return the eviction reason if the client has fallen too far behind."""
+        if self.evicted is not None:
+            return self.evicted
+        if self.writing_since is not None and now - self.writing_since >= self.evict_after_s:
+            # A single write stuck this long means the peer stopped reading
+            self.evicted = "slow_consumer"
+            return self.evicted
+        if len(self._queue) > self.high_water:
+            if self._over_since is None:
+                self._over_since = now
+            elif now - self._over_since >= self.evict_after_s:
+                self.evicted = "slow_consumer"
+        else:
+            self._over_since = None
+        return self.evicted
+
+    def close_once(self) -> bool:
+        """True the first time it is called: whoever evicts closes the socket once."""
+        if self.closed:
+            return False
+        self.closed = True
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            remote = str(getattr(self.ws, "remote_address", None))
+        except Exception:
+            remote = None
+        return {
+            "remote": remote,
+            "queued": len(self._queue),
+            "pendingStreams": len(self._latest),
+            "peakQueued": self.peak_depth,
+            "encoding": self.encoding,
+            "sent": self.sent,
+            "bytesSent": self.bytes_sent,
+            "dropped": self.coalesced,
+            "topics": sorted(self.topics),
+        }